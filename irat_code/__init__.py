@@ -1,10 +1,11 @@
-from irat_code import algorithms, envs, runner, scripts, utils, config
+from irat_code import algorithms, benchmarks, envs, runner, scripts, utils, config
 
 
 __version__ = "0.1.0"
 
 __all__ = [
     "algorithms",
+    "benchmarks",
     "envs",
     "runner",
     "scripts",
@@ -35,6 +35,8 @@ class R_MAPPOPolicy:
                                                  lr=self.critic_lr,
                                                  eps=self.opti_eps,
                                                  weight_decay=self.weight_decay)
+        if args.use_popart:
+            self.critic.v_out.set_optimizer(self.critic_optimizer)
 
     def lr_decay(self, episode, episodes):
         """
@@ -113,6 +115,16 @@ class R_MAPPOPolicy:
         values, _ = self.critic(cent_obs, rnn_states_critic, masks)
         return values, action_log_probs, dist_entropy, act_dists
 
+    def log_probs(self, act_dists, action):
+        """
+        Get log probabilities of given actions under action distributions returned by get_actions.
+        :param act_dists: (list) action distributions, one per action head.
+        :param action: (torch.Tensor) actions whose log probabilities to compute.
+
+        :return action_log_probs: (torch.Tensor) log probabilities of the input actions.
+        """
+        return self.actor.act.log_probs(act_dists, action)
+
     def act(self, obs, rnn_states_actor, masks, available_actions=None, deterministic=False):
         """
         Compute actions using the given inputs.
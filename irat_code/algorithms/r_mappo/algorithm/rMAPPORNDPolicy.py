@@ -41,6 +41,9 @@ class R_MAPPO_RND_Policy:
                                                       lr=self.critic_lr,
                                                       eps=self.opti_eps,
                                                       weight_decay=self.weight_decay)
+        if args.use_popart:
+            self.idv_critic.v_out.set_optimizer(self.idv_critic_optimizer)
+            self.team_critic.v_out.set_optimizer(self.team_critic_optimizer)
 
     def lr_decay(self, episode, episodes):
         """
@@ -39,7 +39,8 @@ class R_Actor(nn.Module):
         self.base = base(args, obs_shape)
 
         if self._use_naive_recurrent_policy or self._use_recurrent_policy:
-            self.rnn = RNNLayer(self.hidden_size, self.hidden_size, self._recurrent_N, self._use_orthogonal)
+            self.rnn = RNNLayer(self.hidden_size, self.hidden_size, self._recurrent_N, self._use_orthogonal,
+                                args.use_masked_rnn_scan)
 
         self.act = ACTLayer(action_space, self.hidden_size, self._use_orthogonal, self._gain,
                             self.std_seperated, self.std_fixed, self.output_use_tanh, self.action_scale)
@@ -154,7 +155,8 @@ class R_Critic(nn.Module):
         # print("critic", cent_obs_shape)
 
         if self._use_naive_recurrent_policy or self._use_recurrent_policy:
-            self.rnn = RNNLayer(self.hidden_size, self.hidden_size, self._recurrent_N, self._use_orthogonal)
+            self.rnn = RNNLayer(self.hidden_size, self.hidden_size, self._recurrent_N, self._use_orthogonal,
+                                args.use_masked_rnn_scan)
 
         if self._use_popart:
             # print(self._use_popart)
@@ -3,7 +3,9 @@ import torch
 import torch.nn as nn
 from irat_code.utils.util import get_gard_norm, huber_loss, mse_loss
 from irat_code.utils.valuenorm import ValueNorm
-from irat_code.algorithms.utils.util import check
+from irat_code.algorithms.utils.util import check, normalize_advantages
+from irat_code.utils.util import buffer_to_device
+from irat_code.utils.timer import PhaseTimer
 
 class R_MAPPO():
     """
@@ -19,6 +21,7 @@ class R_MAPPO():
 
         self.device = device
         self.tpdv = dict(dtype=torch.float32, device=device)
+        self.timer = PhaseTimer()
         self.policy = policy
 
         self.clip_param = args.clip_param
@@ -41,6 +44,7 @@ class R_MAPPO():
         self._use_valuenorm = args.use_valuenorm
         self._use_value_active_masks = args.use_value_active_masks
         self._use_policy_active_masks = args.use_policy_active_masks
+        self._use_device_buffer = args.use_device_buffer
         
         assert (self._use_popart and self._use_valuenorm) == False, ("self._use_popart and self._use_valuenorm can not be set True simultaneously")
         
@@ -71,7 +75,6 @@ class R_MAPPO():
         value_pred_clipped = value_preds_batch + (values - value_preds_batch).clamp(-self.clip_param,
                                                                                         self.clip_param)
         if self._use_popart or self._use_valuenorm:
-            self.value_normalizer.update(return_batch)
             error_clipped = self.value_normalizer.normalize(return_batch) - value_pred_clipped
             error_original = self.value_normalizer.normalize(return_batch) - values
         else:
@@ -120,7 +123,12 @@ class R_MAPPO():
         return_batch = check(return_batch).to(**self.tpdv)
         active_masks_batch = check(active_masks_batch).to(**self.tpdv)
 
+        # update the normalizer before the forward pass, popart rescales the weights of the critic in place
+        if self._use_popart or self._use_valuenorm:
+            self.value_normalizer.update(return_batch)
+
         # Reshape to do in a single forward pass for all steps
+        self.timer.start("ppo_forward")
         values, action_log_probs, dist_entropy, _ = self.policy.evaluate_actions(share_obs_batch,
                                                                                  obs_batch,
                                                                                  rnn_states_batch,
@@ -129,7 +137,9 @@ class R_MAPPO():
                                                                                  masks_batch,
                                                                                  available_actions_batch,
                                                                                  active_masks_batch)
+        self.timer.stop("ppo_forward")
         # actor update
+        self.timer.start("ppo_losses")
         imp_weights = torch.exp(action_log_probs - old_action_log_probs_batch)
         # if torch.isnan(imp_weights).any():
         #     print("imp_weights has nan")
@@ -163,29 +173,40 @@ class R_MAPPO():
         self.policy.actor_optimizer.zero_grad()
 
         policy_total_loss = policy_loss - dist_entropy * self.entropy_coef
+        self.timer.stop("ppo_losses")
+        self.timer.start("ppo_backward")
         if update_actor:
             policy_total_loss.backward()
+        self.timer.stop("ppo_backward")
 
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             actor_grad_norm = nn.utils.clip_grad_norm_(self.policy.actor.parameters(), self.max_grad_norm)
         else:
             actor_grad_norm = get_gard_norm(self.policy.actor.parameters())
 
         self.policy.actor_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # critic update
+        self.timer.start("ppo_losses")
         value_loss = self.cal_value_loss(values, value_preds_batch, return_batch, active_masks_batch)
+        self.timer.stop("ppo_losses")
 
         self.policy.critic_optimizer.zero_grad()
 
+        self.timer.start("ppo_backward")
         (value_loss * self.value_loss_coef).backward()
+        self.timer.stop("ppo_backward")
 
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             critic_grad_norm = nn.utils.clip_grad_norm_(self.policy.critic.parameters(), self.max_grad_norm)
         else:
             critic_grad_norm = get_gard_norm(self.policy.critic.parameters())
 
         self.policy.critic_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # if torch.isnan(policy_total_loss).any():
         #     print("policy_total_loss has nan")
@@ -201,15 +222,16 @@ class R_MAPPO():
 
         :return train_info: (dict) contains information regarding training update (e.g. loss, grad norms, etc).
         """
+        if self._use_device_buffer:
+            # every epoch and minibatch is sampled from this copy, the advantages are computed on the device as well
+            buffer = buffer_to_device(buffer, self.device)
+
         if self._use_popart or self._use_valuenorm:
-            advantages = buffer.returns[:-1] - self.value_normalizer.denormalize(buffer.value_preds[:-1])
+            advantages = buffer.returns[:-1] - self.value_normalizer.denormalize(
+                buffer.value_preds[:-1], to_numpy=not self._use_device_buffer)
         else:
             advantages = buffer.returns[:-1] - buffer.value_preds[:-1]
-        advantages_copy = advantages.copy()
-        advantages_copy[buffer.active_masks[:-1] == 0.0] = np.nan
-        mean_advantages = np.nanmean(advantages_copy)
-        std_advantages = np.nanstd(advantages_copy)
-        advantages = (advantages - mean_advantages) / (std_advantages + 1e-5)
+        advantages = normalize_advantages(advantages, buffer.active_masks[:-1])
         
 
         train_info = {}
@@ -267,7 +289,7 @@ class R_MAPPO():
         for k in train_info.keys():
             train_info[k] /= num_updates
 
-        train_info['Av_advantages'] = np.mean(advantages)
+        train_info['Av_advantages'] = advantages.mean().item()
 
         self.update_entropy_coef()
  
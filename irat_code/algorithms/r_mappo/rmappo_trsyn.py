@@ -3,9 +3,11 @@ import torch
 import torch.nn as nn
 from irat_code.utils.util import get_gard_norm, huber_loss, mse_loss
 from irat_code.utils.valuenorm import ValueNorm
-from irat_code.algorithms.utils.util import check
+from irat_code.algorithms.utils.util import check, normalize_advantages, masked_mean, warn_nonfinite, TrainMetrics
+from irat_code.utils.util import buffer_to_device
+from irat_code.utils.timer import PhaseTimer
 from torch.distributions import kl_divergence
-from irat_code.algorithms.utils.distributions import FixedCategorical, FixedNormal, FixedBernoulli
+from irat_code.algorithms.utils.distributions import FixedCategorical, FixedNormal, FixedBernoulli, params_to_dists
 # torch.autograd.set_detect_anomaly(True)
 
 
@@ -25,6 +27,7 @@ class RMappoTrSyn:
 
         self.device = device
         self.tpdv = dict(dtype=torch.float32, device=device)
+        self.timer = PhaseTimer()
         self.idv_policy = idv_policy
         self.team_policy = team_policy
 
@@ -65,6 +68,9 @@ class RMappoTrSyn:
         self._use_valuenorm = args.use_valuenorm
         self._use_value_active_masks = args.use_value_active_masks
         self._use_policy_active_masks = args.use_policy_active_masks
+        self._use_device_buffer = args.use_device_buffer
+        self.diagnostics_interval = args.diagnostics_interval
+        self._num_updates = 0
 
         self.idv_use_two_clip = args.idv_use_two_clip
         self.idv_use_kl_loss = args.idv_use_kl_loss
@@ -149,13 +155,14 @@ class RMappoTrSyn:
         :param value_preds_batch: (torch.Tensor) "old" value  predictions from data batch (used for value clip loss)
         :param return_batch: (torch.Tensor) reward to go returns.
         :param active_masks_batch: (torch.Tensor) denotes if agent is active or dead at a given timesep.
+        :param value_normalizer: (ValueNorm) normalizer of the returns, already updated with return_batch, None to use the
+                                 returns as they are.
 
         :return value_loss: (torch.Tensor) value function loss.
         """
         value_pred_clipped = value_preds_batch + (values - value_preds_batch).clamp(-self.clip_param,
                                                                                     self.clip_param)
-        if self._use_popart or self._use_valuenorm:
-            value_normalizer.update(return_batch)
+        if value_normalizer is not None:
             error_clipped = value_normalizer.normalize(return_batch) - value_pred_clipped
             error_original = value_normalizer.normalize(return_batch) - values
         else:
@@ -181,19 +188,23 @@ class RMappoTrSyn:
 
         return value_loss
 
-    def ppo_update(self, sample, episode, update_actor=True):
+    def compute_losses(self, sample, episode, compute_diagnostics=True, normalize_returns=True):
         """
-        Update actor and critic networks.
+        Compute the actor and critic losses of both policies on a data batch, without updating the networks.
         :param sample: (Tuple) contains data batch with which to update networks.
-        :update_actor: (bool) whether to update actor network.
+        :param episode: (int) current training episode.
+        :param compute_diagnostics: (bool) whether to compute the clip and surrogate diagnostics.
+        :param normalize_returns: (bool) whether to update the value normalizers with the returns of the batch and
+                                  normalize them, False if the returns of the batch are normalized already.
 
-        :return value_loss: (torch.Tensor) value function loss.
-        :return critic_grad_norm: (torch.Tensor) gradient norm from critic up9date.
-        ;return policy_loss: (torch.Tensor) actor(policy) loss value.
-        :return dist_entropy: (torch.Tensor) action entropies.
-        :return actor_grad_norm: (torch.Tensor) gradient norm from actor update.
-        :return imp_weights: (torch.Tensor) importance sampling weights.
+        :return losses: (dict) losses, importance weights and diagnostics of both policies, the diagnostics are None if
+                         compute_diagnostics is False.
         """
+        if normalize_returns:
+            idv_value_normalizer, team_value_normalizer = self.idv_value_normalizer, self.team_value_normalizer
+        else:
+            idv_value_normalizer = team_value_normalizer = None
+
         idv_share_obs_batch, team_share_obs_batch, obs_batch, \
         idv_rnn_states_batch, team_rnn_states_batch, idv_rnn_states_critic_batch, team_rnn_states_critic_batch,\
         actions_batch, idv_act_dists_batch, team_act_dists_batch, \
@@ -215,10 +226,17 @@ class RMappoTrSyn:
 
         active_masks_batch = check(active_masks_batch).to(**self.tpdv)
 
-        idv_action_log_probs_batch[idv_action_log_probs_batch < -20.] = -20.
-        team_action_log_probs_batch[team_action_log_probs_batch < -20.] = -20.
+        idv_action_log_probs_batch = idv_action_log_probs_batch.clamp(min=-20.)
+        team_action_log_probs_batch = team_action_log_probs_batch.clamp(min=-20.)
+
+        # update the normalizers before the forward pass, popart rescales the weights of the critics in place
+        if idv_value_normalizer is not None:
+            idv_value_normalizer.update(idv_return_batch)
+        if team_value_normalizer is not None:
+            team_value_normalizer.update(team_return_batch)
 
         # Reshape to do in a single forward pass for all steps
+        self.timer.start("ppo_forward")
         idv_new_values, idv_new_action_log_probs, idv_new_dist_entropy, idv_new_act_dists = \
             self.idv_policy.evaluate_actions(idv_share_obs_batch,
                                              obs_batch,
@@ -238,37 +256,30 @@ class RMappoTrSyn:
                                               masks_batch,
                                               available_actions_batch,
                                               active_masks_batch)
+        self.timer.stop("ppo_forward")
+        self.timer.start("ppo_losses")
+
+        # action distributions of both policies at rollout time, one batched distribution per action head
+        idv_old_act_dists = params_to_dists(check(idv_act_dists_batch).to(**self.tpdv), idv_new_act_dists)
+        team_old_act_dists = params_to_dists(check(team_act_dists_batch).to(**self.tpdv), team_new_act_dists)
 
-        # print(idv_act_dists_batch.shape, len(idv_new_act_dists))
-        # print(idv_new_act_dists)
-        # print(idv_act_dists_batch)
         idv_kl_loss = 0
-        idv_cross_entropy = torch.zeros(1)
+        idv_cross_entropy = torch.zeros(1, **self.tpdv)
         team_entropy = 0
         for ai in range(len(team_new_act_dists)):
             if type(idv_new_act_dists[ai]) == FixedCategorical:
                 if self.idv_kl_loss_use_present:
                     tmp_probs = team_new_act_dists[ai].probs.clone().detach()
                 else:
-                    tmp_other_dists = team_act_dists_batch[:, ai]
-                    tmp_probs = []
-                    for tp in tmp_other_dists:
-                        tmp_probs.append(tp.probs.clone().detach())
-                    # print(tmp_probs)
-                    tmp_probs = torch.stack(tmp_probs).to(**self.tpdv)
+                    tmp_probs = team_old_act_dists[ai].probs
                 other_dists = type(idv_new_act_dists[ai])(probs=tmp_probs)
             elif type(idv_new_act_dists[ai]) == FixedNormal:
                 if self.idv_kl_loss_use_present:
                     tmp_mu = team_new_act_dists[ai].loc.clone().detach()
                     tmp_sigma = team_new_act_dists[ai].scale.clone().detach()
                 else:
-                    tmp_other_dists = team_act_dists_batch[:, ai]
-                    tmp_mu, tmp_sigma = [], []
-                    for tp in tmp_other_dists:
-                        tmp_mu.append(tp.loc.clone().detach())
-                        tmp_sigma.append(tp.scale.clone().detach())
-                    tmp_mu = torch.stack(tmp_mu).to(**self.tpdv)
-                    tmp_sigma = torch.stack(tmp_sigma).to(**self.tpdv)
+                    tmp_mu = team_old_act_dists[ai].loc
+                    tmp_sigma = team_old_act_dists[ai].scale
                 other_dists = type(idv_new_act_dists[ai])(loc=tmp_mu, scale=tmp_sigma)
                 # print(ai, other_dists)
             else:
@@ -279,32 +290,22 @@ class RMappoTrSyn:
             team_entropy += other_dists.entropy().mean()
 
         team_kl_loss = 0
-        team_cross_entropy = torch.zeros(1)
+        team_cross_entropy = torch.zeros(1, **self.tpdv)
         idv_entropy = 0
         for ai in range(len(idv_new_act_dists)):
             if type(team_new_act_dists[ai]) == FixedCategorical:
                 if self.team_kl_loss_use_present:
                     tmp_probs = idv_new_act_dists[ai].probs.clone().detach()
                 else:
-                    tmp_other_dists = idv_act_dists_batch[:, ai]
-                    tmp_probs = []
-                    for tp in tmp_other_dists:
-                        tmp_probs.append(tp.probs.clone().detach())
-                    # print(tmp_probs)
-                    tmp_probs = torch.stack(tmp_probs).to(**self.tpdv)
+                    tmp_probs = idv_old_act_dists[ai].probs
                 other_dists = type(team_new_act_dists[ai])(probs=tmp_probs)
             elif type(team_new_act_dists[ai]) == FixedNormal:
                 if self.team_kl_loss_use_present:
                     tmp_mu = idv_new_act_dists[ai].loc.clone().detach()
                     tmp_sigma = idv_new_act_dists[ai].scale.clone().detach()
                 else:
-                    tmp_other_dists = idv_act_dists_batch[:, ai]
-                    tmp_mu, tmp_sigma = [], []
-                    for tp in tmp_other_dists:
-                        tmp_mu.append(tp.loc.clone().detach())
-                        tmp_sigma.append(tp.scale.clone().detach())
-                    tmp_mu = torch.stack(tmp_mu).to(**self.tpdv)
-                    tmp_sigma = torch.stack(tmp_sigma).to(**self.tpdv)
+                    tmp_mu = idv_old_act_dists[ai].loc
+                    tmp_sigma = idv_old_act_dists[ai].scale
                 other_dists = type(team_new_act_dists[ai])(loc=tmp_mu, scale=tmp_sigma)
             else:
                 raise NotImplementedError
@@ -409,23 +410,26 @@ class RMappoTrSyn:
         # print("surr3", torch.isnan(surr3).any(), torch.sum(surr3))
         # print(surr3)
 
-        tn = imp_weights.clone().detach().view(-1, 1).shape[0]
-        tg = imp_weights >= (1.0 - self.clip_param)
-        tl = imp_weights <= (1.0 + self.clip_param)
-        tcr = (tl & tg).float().sum() / tn
-        tgs = so_weights >= (1.0 - self.idv_clip_ratio)
-        tls = so_weights <= (1.0 + self.idv_clip_ratio)
-        tcrs = (tgs & tls).float().sum() / tn
-
-        ts12 = surr1 <= surr2
-        ts13 = surr1 <= surr3
-        ts1 = (ts12 & ts13).float().sum() / tn
-        tsl1 = surr1.clone().detach()[ts12 & ts13].mean()
-        ts31 = surr3 <= surr1
-        ts32 = surr3 <= surr2
-        t3 = ts31 & ts32 & tgs & tls
-        ts3 = t3.float().sum() / tn
-        tsl3 = surr3.clone().detach()[t3].mean()
+        if compute_diagnostics:
+            tn = imp_weights.numel()
+            tg = imp_weights >= (1.0 - self.clip_param)
+            tl = imp_weights <= (1.0 + self.clip_param)
+            tcr = (tl & tg).float().sum() / tn
+            tgs = so_weights >= (1.0 - self.idv_clip_ratio)
+            tls = so_weights <= (1.0 + self.idv_clip_ratio)
+            tcrs = (tgs & tls).float().sum() / tn
+
+            ts12 = surr1 <= surr2
+            ts13 = surr1 <= surr3
+            ts1 = (ts12 & ts13).float().sum() / tn
+            tsl1 = masked_mean(surr1.detach(), ts12 & ts13)
+            ts31 = surr3 <= surr1
+            ts32 = surr3 <= surr2
+            t3 = ts31 & ts32 & tgs & tls
+            ts3 = t3.float().sum() / tn
+            tsl3 = masked_mean(surr3.detach(), t3)
+        else:
+            tcr = tcrs = ts1 = tsl1 = ts3 = tsl3 = None
 
         idv_min = torch.min(surr1, surr2)
         if self.idv_use_two_clip:
@@ -465,7 +469,7 @@ class RMappoTrSyn:
 
         # individual critic loss
         idv_value_loss = self.cal_value_loss(idv_new_values, idv_value_preds_batch, idv_return_batch,
-                                             active_masks_batch, self.idv_value_normalizer)
+                                             active_masks_batch, idv_value_normalizer)
 
         if self.change_reward and episode > self.change_reward_episode:
             if self.change_use_policy == "team":
@@ -494,42 +498,6 @@ class RMappoTrSyn:
         idv_entropy_prop = idv_entropy_abs / idv_loss_abs
         idv_kl_prop = idv_kl_abs / idv_loss_abs
 
-        # update individual actor
-        if torch.isnan(idv_loss).any():
-            print("idv loss has nan")
-        if torch.isinf(idv_loss).any():
-            print("idv loss has inf")
-        if torch.isnan(so_weights).any():
-            print("so_weights has nan")
-        if torch.isinf(so_weights).any():
-            print("so_weights has inf")
-        if torch.isnan(imp_weights).any():
-            print("imp_weights has nan")
-        if torch.isinf(imp_weights).any():
-            print("imp_weights has inf")
-        self.idv_policy.actor_optimizer.zero_grad()
-        if update_actor:
-            # with torch.autograd.detect_anomaly():
-            idv_loss.backward()
-            # if torch.isinf(so_weights).any():
-            #     for p in list(self.idv_policy.actor.parameters()):
-            #         print(p.grad)
-        if self._use_max_grad_norm:
-            idv_actor_grad_norm = nn.utils.clip_grad_norm_(self.idv_policy.actor.parameters(), self.max_grad_norm)
-        else:
-            idv_actor_grad_norm = get_gard_norm(self.idv_policy.actor.parameters())
-        self.idv_policy.actor_optimizer.step()
-
-        # update individual critic
-        self.idv_policy.critic_optimizer.zero_grad()
-        # with torch.autograd.detect_anomaly():
-        (idv_value_loss * self.value_loss_coef).backward()
-        if self._use_max_grad_norm:
-            idv_critic_grad_norm = nn.utils.clip_grad_norm_(self.idv_policy.critic.parameters(), self.max_grad_norm)
-        else:
-            idv_critic_grad_norm = get_gard_norm(self.idv_policy.critic.parameters())
-        self.idv_policy.critic_optimizer.step()
-
         # team actor update
         if self.team_clip_use_present:
             team_imp_weights = torch.exp(team_new_action_log_probs - idv_new_action_log_probs.clone().detach())
@@ -543,13 +511,16 @@ class RMappoTrSyn:
         tclp = torch.clamp(team_imp_weights, 1.0 - self.team_clip_ratio, 1.0 + self.team_clip_ratio)
         team_surr2 = tclp * team_adv_targ
 
-        ttn = team_imp_weights.clone().detach().view(-1, 1).shape[0]
-        ttg = team_imp_weights >= (1.0 - self.team_clip_ratio)
-        ttl = team_imp_weights <= (1.0 + self.team_clip_ratio)
-        ttcr = (ttl & ttg).float().sum() / ttn
-        tts = team_surr1 <= team_surr2
-        tsr = tts.float().sum() / ttn
-        tsl = team_surr1.clone().detach()[tts].mean()
+        if compute_diagnostics:
+            ttn = team_imp_weights.numel()
+            ttg = team_imp_weights >= (1.0 - self.team_clip_ratio)
+            ttl = team_imp_weights <= (1.0 + self.team_clip_ratio)
+            ttcr = (ttl & ttg).float().sum() / ttn
+            tts = team_surr1 <= team_surr2
+            tsr = tts.float().sum() / ttn
+            tsl = masked_mean(team_surr1.detach(), tts)
+        else:
+            ttcr = tsr = tsl = None
 
         team_min = team_surr1
         if self.team_use_clip:
@@ -574,7 +545,7 @@ class RMappoTrSyn:
             team_kl_abs = torch.zeros(1)
 
         team_value_loss = self.cal_value_loss(team_new_values, team_value_preds_batch, team_return_batch,
-                                              active_masks_batch, self.team_value_normalizer)
+                                              active_masks_batch, team_value_normalizer)
 
         if self.change_reward and episode > self.change_reward_episode:
             if self.change_use_policy == "team":
@@ -605,212 +576,189 @@ class RMappoTrSyn:
         team_ppo_prop = team_ppo_abs / team_loss_abs
         team_entropy_prop = team_entropy_abs / team_loss_abs
         team_kl_prop = team_kl_abs / team_loss_abs
+        self.timer.stop("ppo_losses")
+
+        return dict(
+            idv_value_loss=idv_value_loss, team_value_loss=team_value_loss, idv_policy_loss=idv_policy_loss,
+            team_policy_loss=team_policy_loss, idv_new_dist_entropy=idv_new_dist_entropy,
+            team_new_dist_entropy=team_new_dist_entropy, idv_kl_loss=idv_kl_loss, team_kl_loss=team_kl_loss,
+            idv_cross_entropy=idv_cross_entropy, team_cross_entropy=team_cross_entropy, imp_weights=imp_weights,
+            so_weights=so_weights, team_imp_weights=team_imp_weights, clp=clp, tcr=tcr, tcrs=tcrs, ts1=ts1,
+            tsl1=tsl1, ts3=ts3, tsl3=tsl3, tclp=tclp, ttcr=ttcr, tsr=tsr, tsl=tsl, idv_loss=idv_loss,
+            idv_ppo_abs=idv_ppo_abs, idv_ppo_prop=idv_ppo_prop, idv_entropy_prop=idv_entropy_prop,
+            idv_kl_prop=idv_kl_prop, team_loss=team_loss, team_ppo_abs=team_ppo_abs, team_ppo_prop=team_ppo_prop,
+            team_entropy_prop=team_entropy_prop, team_kl_prop=team_kl_prop)
+
+    def update_network(self, module, optimizer, loss=None):
+        """
+        Backpropagate a loss into a network and take an optimizer step.
+        :param module: (torch.nn.Module) network to update.
+        :param optimizer: (torch.optim.Optimizer) optimizer of the network.
+        :param loss: (torch.Tensor) loss to backpropagate, None to step without gradients.
 
-        # update team actor
-        if torch.isnan(team_loss).any():
-            print("team loss has nan")
-        if torch.isinf(team_loss).any():
-            print("team loss has inf")
-        if torch.isnan(team_imp_weights).any():
-            print("team has nan")
-        if torch.isinf(team_imp_weights).any():
-            print("team has inf")
-        self.team_policy.actor_optimizer.zero_grad()
-        if update_actor:
-            # with torch.autograd.detect_anomaly():
-            team_loss.backward()
-        if self._use_max_grad_norm:
-            team_actor_grad_norm = nn.utils.clip_grad_norm_(self.team_policy.actor.parameters(), self.max_grad_norm)
-        else:
-            team_actor_grad_norm = get_gard_norm(self.team_policy.actor.parameters())
-        self.team_policy.actor_optimizer.step()
+        :return grad_norm: (torch.Tensor) gradient norm of the network.
+        """
+        optimizer.zero_grad()
+        self.timer.start("ppo_backward")
+        if loss is not None:
+            loss.backward()
+        self.timer.stop("ppo_backward")
+        return self.clip_and_step(module, optimizer)
+
+    def clip_and_step(self, module, optimizer):
+        """
+        Clip the gradient of a network and take an optimizer step.
+        :param module: (torch.nn.Module) network to update.
+        :param optimizer: (torch.optim.Optimizer) optimizer of the network.
 
-        # update team critic
-        self.team_policy.critic_optimizer.zero_grad()
-        # with torch.autograd.detect_anomaly():
-        (team_value_loss * self.value_loss_coef).backward()
+        :return grad_norm: (torch.Tensor) gradient norm of the network.
+        """
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
-            team_critic_grad_norm = nn.utils.clip_grad_norm_(self.team_policy.critic.parameters(), self.max_grad_norm)
+            grad_norm = nn.utils.clip_grad_norm_(module.parameters(), self.max_grad_norm)
         else:
-            team_critic_grad_norm = get_gard_norm(self.team_policy.critic.parameters())
-        self.team_policy.critic_optimizer.step()
+            grad_norm = get_gard_norm(module.parameters())
+        optimizer.step()
+        self.timer.stop("ppo_step")
+        return grad_norm
 
-        # if torch.isnan(idv_loss).any():
-        #     print("idv_loss has nan")
-        # if torch.isnan(team_loss).any():
-        #     print("team_loss has nan")
-
-        return idv_value_loss, team_value_loss, idv_critic_grad_norm, team_critic_grad_norm,\
-               idv_policy_loss, team_policy_loss, idv_new_dist_entropy, team_new_dist_entropy, \
-               idv_kl_loss, team_kl_loss, idv_cross_entropy, team_cross_entropy, idv_actor_grad_norm, team_actor_grad_norm,\
-               imp_weights, so_weights, team_imp_weights, clp, tcr, tcrs, ts1, tsl1, ts3, tsl3, tclp, ttcr, tsr, tsl, \
-               idv_loss, idv_ppo_abs, idv_ppo_prop, idv_entropy_prop, idv_kl_prop, \
-               team_loss, team_ppo_abs, team_ppo_prop, team_entropy_prop, team_kl_prop
+    def ppo_update(self, sample, episode, update_actor=True, compute_diagnostics=True):
+        """
+        Update actor and critic networks.
+        :param sample: (Tuple) contains data batch with which to update networks.
+        :update_actor: (bool) whether to update actor network.
+        :param compute_diagnostics: (bool) whether to compute the clip and surrogate diagnostics.
 
-    def train(self, buffer, episode, update_actor=True):
+        :return losses: (dict) losses of compute_losses and the gradient norms of the four networks.
         """
-        Perform a training update using minibatch GD.
+        losses = self.compute_losses(sample, episode, compute_diagnostics)
+        if compute_diagnostics:
+            warn_nonfinite({"idv loss": losses["idv_loss"], "so_weights": losses["so_weights"],
+                            "imp_weights": losses["imp_weights"], "team loss": losses["team_loss"],
+                            "team": losses["team_imp_weights"]})
+
+        # the team losses do not depend on the individual networks, the order of the four updates does not matter
+        losses["idv_actor_grad_norm"] = self.update_network(self.idv_policy.actor, self.idv_policy.actor_optimizer,
+                                                            losses["idv_loss"] if update_actor else None)
+        losses["idv_critic_grad_norm"] = self.update_network(self.idv_policy.critic, self.idv_policy.critic_optimizer,
+                                                             losses["idv_value_loss"] * self.value_loss_coef)
+        losses["team_actor_grad_norm"] = self.update_network(self.team_policy.actor, self.team_policy.actor_optimizer,
+                                                             losses["team_loss"] if update_actor else None)
+        losses["team_critic_grad_norm"] = self.update_network(self.team_policy.critic,
+                                                              self.team_policy.critic_optimizer,
+                                                              losses["team_value_loss"] * self.value_loss_coef)
+        return losses
+
+    def compute_advantages(self, buffer):
+        """
+        Compute the normalized advantages of both policies.
         :param buffer: (SharedReplayBuffer) buffer containing training data.
-        :param update_actor: (bool) whether to update actor network.
 
-        :return train_info: (dict) contains information regarding training update (e.g. loss, grad norms, etc).
+        :return idv_advantages: (np.ndarray) advantages of the individual policy.
+        :return team_advantages: (np.ndarray) advantages of the team policy.
         """
+        to_numpy = not self._use_device_buffer
         if self._use_popart or self._use_valuenorm:
-            idv_advantages = buffer.idv_returns[:-1] - self.idv_value_normalizer.denormalize(buffer.idv_value_preds[:-1])
+            idv_advantages = buffer.idv_returns[:-1] - self.idv_value_normalizer.denormalize(
+                buffer.idv_value_preds[:-1], to_numpy=to_numpy)
         else:
             idv_advantages = buffer.idv_returns[:-1] - buffer.idv_value_preds[:-1]
-        idv_advantages_copy = idv_advantages.copy()
-        idv_advantages_copy[buffer.active_masks[:-1] == 0.0] = np.nan
-        idv_mean_advantages = np.nanmean(idv_advantages_copy)
-        idv_std_advantages = np.nanstd(idv_advantages_copy)
-        idv_advantages = (idv_advantages - idv_mean_advantages) / (idv_std_advantages + 1e-5)
+        idv_advantages = normalize_advantages(idv_advantages, buffer.active_masks[:-1])
 
         if self._use_popart or self._use_valuenorm:
-            team_advantages = buffer.team_returns[:-1] - self.team_value_normalizer.denormalize(buffer.team_value_preds[:-1])
+            team_advantages = buffer.team_returns[:-1] - self.team_value_normalizer.denormalize(
+                buffer.team_value_preds[:-1], to_numpy=to_numpy)
         else:
             team_advantages = buffer.team_returns[:-1] - buffer.team_value_preds[:-1]
-        team_advantages_copy = team_advantages.copy()
-        team_advantages_copy[buffer.active_masks[:-1] == 0.0] = np.nan
-        team_mean_advantages = np.nanmean(team_advantages_copy)
-        team_std_advantages = np.nanstd(team_advantages_copy)
-        team_advantages = (team_advantages - team_mean_advantages) / (team_std_advantages + 1e-5)
-
-        train_info = {}
-
-        train_info['Aa_idv_actor_loss'] = 0
-
-        train_info['Ab_policy_loss'] = 0
-        train_info['Ac_idv_ppo_loss_abs'] = 0
-        train_info['Ad_idv_ppo_prop'] = 0
-
-        train_info['Ae_eta'] = 0
-        train_info['Af_noclip_proportion'] = 0
-        train_info['Ag_update_proportion'] = 0
-        train_info['Ah_update_loss'] = 0
-
-        train_info['Ai_idv_epsilon\''] = 0
-        train_info['Aj_idv_sigma'] = 0
-        train_info['Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')'] = 0
-        train_info['Al_idv_noclip_proportion'] = 0
-        train_info['Am_idv_(sigma*A)update_proportion'] = 0
-        train_info['An_idv_(sigma*A)update_loss'] = 0
-
-        train_info['Ao_idv_entropy_prop'] = 0
-        train_info['Ap_dist_entropy'] = 0
-
-        train_info['Aq_idv_kl_prop'] = 0
-        train_info['Ar_idv_kl_coef'] = 0
-        train_info['As_idv_kl_loss'] = 0
-        train_info['At_idv_cross_entropy'] = 0
-
-        train_info['Au_value_loss'] = 0
-        train_info['Av_advantages'] = 0
-        train_info['Aw_idv_actor_norm'] = 0
-        train_info['Ax_idv_critic_norm'] = 0
-
-        train_info['Ta_team_actor_loss'] = 0
-
-        train_info['Tb_team_policy_loss'] = 0
-        train_info['Tc_team_ppo_loss_abs'] = 0
-        train_info['Td_team_ppo_prop'] = 0
-
-        train_info['Te_team_epsilon^'] = 0
-        train_info['Tf_team_sigma^'] = 0
-        train_info['Tg_team_clip(sigma^, 1-epislon^\', 1+epislon^\')'] = 0
-        train_info['Th_team_noclip_proportion'] = 0
-        train_info['Ti_team_(sigma^*A)update_proportion'] = 0
-        train_info['Tj_team_(sigma^*A)update_loss'] = 0
-
-        train_info['Tk_team_entropy_prop'] = 0
-        train_info['Tl_team_dist_entropy'] = 0
-
-        train_info['Tm_team_kl_prop'] = 0
-        train_info['Tn_team_kl_coef'] = 0
-        train_info['To_team_kl_loss'] = 0
-        train_info['Tp_team_cross_entropy'] = 0
-
-        train_info['Tq_team_value_loss'] = 0
-        train_info['Tr_team_advantages'] = 0
-        train_info['Ts_team_actor_norm'] = 0
-        train_info['Tt_team_critic_norm'] = 0
+        team_advantages = normalize_advantages(team_advantages, buffer.active_masks[:-1])
+        return idv_advantages, team_advantages
 
-        for _ in range(self.ppo_epoch):
-            if self._use_recurrent_policy:
-                data_generator = buffer.recurrent_generator(idv_advantages,
-                                                            team_advantages,
-                                                            self.num_mini_batch,
-                                                            self.data_chunk_length)
-            elif self._use_naive_recurrent:
-                data_generator = buffer.naive_recurrent_generator(idv_advantages,
-                                                                  team_advantages,
-                                                                  self.num_mini_batch)
-            else:
-                data_generator = buffer.feed_forward_generator(idv_advantages,
-                                                               team_advantages,
-                                                               self.num_mini_batch)
-
-            for sample in data_generator:
-                # print("in", ppi)
-                idv_value_loss, team_value_loss, idv_critic_grad_norm, team_critic_grad_norm, \
-                idv_policy_loss, team_policy_loss, idv_new_dist_entropy, team_new_dist_entropy, \
-                idv_kl_loss, team_kl_loss, idv_cross_entropy, team_cross_entropy, idv_actor_grad_norm, team_actor_grad_norm, \
-                imp_weights, so_weights, team_imp_weights, clp, tcr, tcrs, ts1, tsl1, ts3, tsl3, tclp, ttcr, tsr, tsl,\
-                idv_loss, idv_ppo_abs, idv_ppo_prop, idv_entropy_prop, idv_kl_prop,\
-                team_loss, team_ppo_abs, team_ppo_prop, team_entropy_prop, team_kl_prop\
-                    = self.ppo_update(sample, episode, update_actor)
-
-                train_info['Aa_idv_actor_loss'] += idv_loss.item()
-                train_info['Ab_policy_loss'] += idv_policy_loss.item()
-                train_info['Ac_idv_ppo_loss_abs'] += idv_ppo_abs.item()
-                train_info['Ad_idv_ppo_prop'] += idv_ppo_prop.item()
-                train_info['Ae_eta'] += imp_weights.mean()
-                train_info['Af_noclip_proportion'] += tcr
-                train_info['Ag_update_proportion'] += ts1
-                train_info['Ah_update_loss'] += tsl1
-                train_info['Aj_idv_sigma'] += so_weights.mean()
-                train_info['Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')'] += clp.mean()
-                train_info['Al_idv_noclip_proportion'] += tcrs
-                train_info['Am_idv_(sigma*A)update_proportion'] += ts3
-                train_info['An_idv_(sigma*A)update_loss'] += tsl3
-                train_info['Ao_idv_entropy_prop'] += idv_entropy_prop.item()
-                train_info['Ap_dist_entropy'] += idv_new_dist_entropy.item()
-                train_info['Aq_idv_kl_prop'] += idv_kl_prop.item()
-                train_info['As_idv_kl_loss'] += idv_kl_loss.item()
-                train_info['At_idv_cross_entropy'] += idv_cross_entropy.item()
-                train_info['Au_value_loss'] += idv_value_loss.item()
-                train_info['Aw_idv_actor_norm'] += idv_actor_grad_norm
-                train_info['Ax_idv_critic_norm'] += idv_critic_grad_norm
-
-                train_info['Ta_team_actor_loss'] += team_loss.item()
-                train_info['Tb_team_policy_loss'] += team_policy_loss.item()
-                train_info['Tc_team_ppo_loss_abs'] += team_ppo_abs.item()
-                train_info['Td_team_ppo_prop'] += team_ppo_prop.item()
-                train_info['Tf_team_sigma^'] += team_imp_weights.mean()
-                train_info['Tg_team_clip(sigma^, 1-epislon^\', 1+epislon^\')'] += tclp.mean()
-                train_info['Th_team_noclip_proportion'] += ttcr
-                train_info['Ti_team_(sigma^*A)update_proportion'] += tsr
-                train_info['Tj_team_(sigma^*A)update_loss'] += tsl
-                train_info['Tk_team_entropy_prop'] += team_entropy_prop.item()
-                train_info['Tl_team_dist_entropy'] += team_new_dist_entropy.item()
-                train_info['Tm_team_kl_prop'] += team_kl_prop.item()
-                train_info['To_team_kl_loss'] += team_kl_loss.item()
-                train_info['Tp_team_cross_entropy'] += team_cross_entropy.item()
-                train_info['Tq_team_value_loss'] += team_value_loss.item()
-                train_info['Ts_team_actor_norm'] += team_actor_grad_norm
-                train_info['Tt_team_critic_norm'] += team_critic_grad_norm
-
-        num_updates = self.ppo_epoch * self.num_mini_batch
-
-        for k in train_info.keys():
-            train_info[k] /= num_updates
+    def data_generator(self, buffer, idv_advantages, team_advantages):
+        """
+        Minibatch generator of one ppo epoch.
+        :param buffer: (SharedReplayBuffer) buffer containing training data.
+        :param idv_advantages: (np.ndarray) advantages of the individual policy.
+        :param team_advantages: (np.ndarray) advantages of the team policy.
+        """
+        if self._use_recurrent_policy:
+            return buffer.recurrent_generator(idv_advantages,
+                                              team_advantages,
+                                              self.num_mini_batch,
+                                              self.data_chunk_length)
+        elif self._use_naive_recurrent:
+            return buffer.naive_recurrent_generator(idv_advantages,
+                                                    team_advantages,
+                                                    self.num_mini_batch)
+        else:
+            return buffer.feed_forward_generator(idv_advantages,
+                                                 team_advantages,
+                                                 self.num_mini_batch)
+
+    def log_update(self, metrics, losses):
+        """
+        Record the losses and diagnostics of one ppo_update.
+        :param metrics: (TrainMetrics) metrics of the current train() call.
+        :param losses: (dict) returned by ppo_update.
+        """
+        metrics.add({
+            'Aa_idv_actor_loss': losses['idv_loss'],
+            'Ab_policy_loss': losses['idv_policy_loss'],
+            'Ac_idv_ppo_loss_abs': losses['idv_ppo_abs'],
+            'Ad_idv_ppo_prop': losses['idv_ppo_prop'],
+            'Ae_eta': losses['imp_weights'].mean(),
+            'Af_noclip_proportion': losses['tcr'],
+            'Ag_update_proportion': losses['ts1'],
+            'Ah_update_loss': losses['tsl1'],
+            'Aj_idv_sigma': losses['so_weights'].mean(),
+            'Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')': losses['clp'].mean(),
+            'Al_idv_noclip_proportion': losses['tcrs'],
+            'Am_idv_(sigma*A)update_proportion': losses['ts3'],
+            'An_idv_(sigma*A)update_loss': losses['tsl3'],
+            'Ao_idv_entropy_prop': losses['idv_entropy_prop'],
+            'Ap_dist_entropy': losses['idv_new_dist_entropy'],
+            'Aq_idv_kl_prop': losses['idv_kl_prop'],
+            'As_idv_kl_loss': losses['idv_kl_loss'],
+            'At_idv_cross_entropy': losses['idv_cross_entropy'],
+            'Au_value_loss': losses['idv_value_loss'],
+            'Aw_idv_actor_norm': losses['idv_actor_grad_norm'],
+            'Ax_idv_critic_norm': losses['idv_critic_grad_norm'],
+
+            'Ta_team_actor_loss': losses['team_loss'],
+            'Tb_team_policy_loss': losses['team_policy_loss'],
+            'Tc_team_ppo_loss_abs': losses['team_ppo_abs'],
+            'Td_team_ppo_prop': losses['team_ppo_prop'],
+            'Tf_team_sigma^': losses['team_imp_weights'].mean(),
+            'Tg_team_clip(sigma^, 1-epislon^\', 1+epislon^\')': losses['tclp'].mean(),
+            'Th_team_noclip_proportion': losses['ttcr'],
+            'Ti_team_(sigma^*A)update_proportion': losses['tsr'],
+            'Tj_team_(sigma^*A)update_loss': losses['tsl'],
+            'Tk_team_entropy_prop': losses['team_entropy_prop'],
+            'Tl_team_dist_entropy': losses['team_new_dist_entropy'],
+            'Tm_team_kl_prop': losses['team_kl_prop'],
+            'To_team_kl_loss': losses['team_kl_loss'],
+            'Tp_team_cross_entropy': losses['team_cross_entropy'],
+            'Tq_team_value_loss': losses['team_value_loss'],
+            'Ts_team_actor_norm': losses['team_actor_grad_norm'],
+            'Tt_team_critic_norm': losses['team_critic_grad_norm'],
+        })
+
+    def finish_train(self, metrics, idv_advantages, team_advantages):
+        """
+        Reduce the metrics of a train() call and anneal the coefficients.
+        :param metrics: (TrainMetrics) metrics of the train() call.
+        :param idv_advantages: (np.ndarray) advantages of the individual policy.
+        :param team_advantages: (np.ndarray) advantages of the team policy.
+
+        :return train_info: (dict) contains information regarding training update (e.g. loss, grad norms, etc).
+        """
+        # the diagnostics of this call are copied to the host here, once
+        metrics.add({'Av_advantages': idv_advantages.mean(), 'Tr_team_advantages': team_advantages.mean()})
+        train_info = metrics.reduce()
 
         train_info['Ai_idv_epsilon\''] = self.idv_clip_ratio
         train_info['Ar_idv_kl_coef'] = self.idv_kl_coef
-        train_info['Av_advantages'] = np.nanmean(idv_advantages)
-
         train_info['Te_team_epsilon^'] = self.team_clip_ratio
         train_info['Tn_team_kl_coef'] = self.team_kl_coef
-        train_info['Tr_team_advantages'] = np.nanmean(team_advantages)
 
         self.update_entropy_coef()
         if self.idv_use_two_clip:
@@ -825,6 +773,28 @@ class RMappoTrSyn:
 
         return train_info
 
+    def train(self, buffer, episode, update_actor=True):
+        """
+        Perform a training update using minibatch GD.
+        :param buffer: (SharedReplayBuffer) buffer containing training data.
+        :param update_actor: (bool) whether to update actor network.
+
+        :return train_info: (dict) contains information regarding training update (e.g. loss, grad norms, etc).
+        """
+        if self._use_device_buffer:
+            # every epoch and minibatch is sampled from this copy, the advantages are computed on the device as well
+            buffer = buffer_to_device(buffer, self.device)
+        idv_advantages, team_advantages = self.compute_advantages(buffer)
+
+        metrics = TrainMetrics()
+        for _ in range(self.ppo_epoch):
+            for sample in self.data_generator(buffer, idv_advantages, team_advantages):
+                compute_diagnostics = self._num_updates % self.diagnostics_interval == 0
+                self._num_updates += 1
+                self.log_update(metrics, self.ppo_update(sample, episode, update_actor, compute_diagnostics))
+
+        return self.finish_train(metrics, idv_advantages, team_advantages)
+
     def idv_prep_training(self):
         self.idv_policy.actor.train()
         self.idv_policy.critic.train()
@@ -0,0 +1,201 @@
+import warnings
+from collections import defaultdict
+import torch
+import torch.nn as nn
+from torch.distributions import Distribution
+from torch.func import functional_call, grad, vmap
+from irat_code.utils.util import buffer_to_device
+from irat_code.algorithms.utils.util import check, warn_nonfinite, TrainMetrics
+from irat_code.algorithms.utils.rnn import RNNLayer
+from irat_code.utils.timer import PhaseTimer
+
+
+class TrSynLoss(nn.Module):
+    """
+    The four networks of a RMappoTrSyn trainer as one module whose forward returns the summed losses of
+    compute_losses, so that the weights of other agents can be swapped in with torch.func.functional_call.
+    :param trainer: (RMappoTrSyn) trainer whose losses to compute.
+    """
+
+    def __init__(self, trainer):
+        super(TrSynLoss, self).__init__()
+        self.trainer = trainer
+        self.idv_actor = trainer.idv_policy.actor
+        self.idv_critic = trainer.idv_policy.critic
+        self.team_actor = trainer.team_policy.actor
+        self.team_critic = trainer.team_policy.critic
+
+    def forward(self, sample, episode, update_actor, compute_diagnostics):
+        losses = self.trainer.compute_losses(sample, episode, compute_diagnostics, normalize_returns=False)
+        # the networks share no parameters and the losses of one policy only see the other one detached,
+        # so the gradient of the sum is the gradient of every loss with respect to its own network
+        loss = (losses["idv_value_loss"] + losses["team_value_loss"]) * self.trainer.value_loss_coef
+        if update_actor:
+            loss = loss + losses["idv_loss"] + losses["team_loss"]
+        # vmap only returns tensors, the diagnostics that were not computed are dropped here
+        return loss.sum(), {k: v for k, v in losses.items() if v is not None}
+
+
+class RMappoTrSynBatched:
+    """
+    Trains the RMappoTrSyn trainers of the separated policies together. The weights of the agents are stacked and
+    the forward and backward passes of all agents run as one vmapped computation, while every agent keeps its own
+    optimizers, value normalizers and coefficient schedules. Falls back to training the agents one after the other,
+    with a warning, when their networks can not be stacked.
+    :param args: (argparse.Namespace) arguments containing relevant model, policy, and env information.
+    :param trainers: (list) RMappoTrSyn trainer of every agent.
+    """
+
+    def __init__(self, args, trainers):
+        self.trainers = trainers
+        self.ppo_epoch = args.ppo_epoch
+        self.max_grad_norm = args.max_grad_norm
+        self._use_max_grad_norm = args.use_max_grad_norm
+        self._use_device_buffer = args.use_device_buffer
+        self.timer = PhaseTimer()
+
+        self.nets = [TrSynLoss(trainer) for trainer in trainers]
+        self.params = [dict(net.named_parameters()) for net in self.nets]
+        self.buffers = [dict(net.named_buffers()) for net in self.nets]
+
+        shapes = [[(name, p.shape) for name, p in net.named_parameters()] for net in self.nets]
+        # popart rescales its weights while computing the loss, the change_reward losses are created outside of the
+        # networks and networks of different shapes can not be stacked
+        fallback = None
+        if args.use_popart:
+            fallback = "popart"
+        elif args.change_reward:
+            fallback = "change_reward"
+        elif any(s != shapes[0] for s in shapes[1:]):
+            fallback = "networks of different shapes"
+        self.batched = fallback is None
+        if not self.batched:
+            warnings.warn("--use_batched_agents does not support {}, the agents are trained one after the "
+                          "other".format(fallback))
+        else:
+            if args.use_recurrent_policy or args.use_naive_recurrent_policy:
+                warnings.warn("--use_batched_agents runs recurrent policies one step at a time, which can be slower "
+                              "than training the agents one after the other")
+            # the weights of every agent are swapped into the networks of the first one
+            for module in self.nets[0].modules():
+                if isinstance(module, RNNLayer):
+                    module.step_by_step = True
+        self._grad = vmap(grad(self.loss, has_aux=True), in_dims=(0, 0, 0, None, None, None))
+
+    def loss(self, params, buffers, sample, episode, update_actor, compute_diagnostics):
+        return functional_call(self.nets[0], (params, buffers), (sample, episode, update_actor, compute_diagnostics))
+
+    def prepare_sample(self, trainer, sample):
+        """
+        Move a sample to the training device and normalize its returns, which updates the value normalizers outside
+        of the vmapped loss.
+        :param trainer: (RMappoTrSyn) trainer of the agent.
+        :param sample: (Tuple) data batch of the agent.
+
+        :return sample: (list) data batch with tensors and normalized returns.
+        """
+        sample = [None if x is None else check(x).to(**trainer.tpdv) for x in sample]
+        # the returns are the 13th and 14th fields of a sample
+        for i, value_normalizer in ((12, trainer.idv_value_normalizer), (13, trainer.team_value_normalizer)):
+            if value_normalizer is not None:
+                value_normalizer.update(sample[i])
+                sample[i] = value_normalizer.normalize(sample[i])
+        return sample
+
+    def clip_grads(self, grads):
+        """
+        Clip the stacked gradients of one network of every agent, like nn.utils.clip_grad_norm_ does per agent.
+        :param grads: (list) gradients of the parameters of the network, stacked along the agents.
+
+        :return grad_norm: (torch.Tensor) gradient norm of the network of every agent.
+        """
+        grad_norm = torch.linalg.vector_norm(
+            torch.stack([torch.linalg.vector_norm(g.flatten(1), dim=1) for g in grads], dim=1), dim=1)
+        if self._use_max_grad_norm:
+            clip_coef = (self.max_grad_norm / (grad_norm + 1e-6)).clamp(max=1.0)
+            for g in grads:
+                g.mul_(clip_coef.view(-1, *([1] * (g.dim() - 1))))
+        return grad_norm
+
+    def ppo_update(self, samples, episode, update_actor=True, compute_diagnostics=True):
+        """
+        Update the actor and critic networks of all agents.
+        :param samples: (list) data batch of every agent.
+        :param update_actor: (bool) whether to update actor network.
+        :param compute_diagnostics: (bool) whether to compute the clip and surrogate diagnostics.
+
+        :return losses: (list) losses and gradient norms of every agent, as returned by RMappoTrSyn.ppo_update.
+        """
+        samples = [self.prepare_sample(trainer, sample) for trainer, sample in zip(self.trainers, samples)]
+        sample = tuple(None if x[0] is None else torch.stack(x) for x in zip(*samples))
+        with torch.no_grad():
+            params = {name: torch.stack([p[name] for p in self.params]) for name in self.params[0]}
+            buffers = {name: torch.stack([b[name] for b in self.buffers]) for name in self.buffers[0]}
+
+        validate_args = Distribution._validate_args
+        # argument validation branches on the values of the tensors, which vmap does not support
+        Distribution.set_default_validate_args(False)
+        try:
+            # the forward and the backward pass of all agents in one, ppo_forward and ppo_losses are counted in it
+            with self.timer.phase("ppo_grad"):
+                grads, losses = self._grad(params, buffers, sample, episode, update_actor, compute_diagnostics)
+        finally:
+            Distribution.set_default_validate_args(validate_args)
+        if compute_diagnostics:
+            warn_nonfinite({"idv loss": losses["idv_loss"], "so_weights": losses["so_weights"],
+                            "imp_weights": losses["imp_weights"], "team loss": losses["team_loss"],
+                            "team": losses["team_imp_weights"]})
+
+        self.timer.start("ppo_step")
+        agent_losses = [defaultdict(lambda: None, {k: v[i] for k, v in losses.items()})
+                        for i in range(len(self.trainers))]
+        for net, has_grad in (("idv_actor", update_actor), ("idv_critic", True),
+                              ("team_actor", update_actor), ("team_critic", True)):
+            names = [name for name in grads if name.startswith(net + ".")]
+            if has_grad:
+                grad_norm = self.clip_grads([grads[name] for name in names])
+            else:
+                grad_norm = torch.zeros(len(self.trainers))
+            for i, agent_loss in enumerate(agent_losses):
+                for name in names:
+                    self.params[i][name].grad = grads[name][i] if has_grad else None
+                agent_loss[net + "_grad_norm"] = grad_norm[i]
+
+        for trainer in self.trainers:
+            trainer.idv_policy.actor_optimizer.step()
+            trainer.idv_policy.critic_optimizer.step()
+            trainer.team_policy.actor_optimizer.step()
+            trainer.team_policy.critic_optimizer.step()
+        self.timer.stop("ppo_step")
+        return agent_losses
+
+    def train(self, buffers, episode, update_actor=True):
+        """
+        Perform a training update of every agent using minibatch GD.
+        :param buffers: (list) SeparatedReplayBuffer of every agent.
+        :param update_actor: (bool) whether to update actor network.
+
+        :return train_infos: (list) train_info of every agent, as returned by RMappoTrSyn.train.
+        """
+        if not self.batched:
+            return [trainer.train(buffer, episode, update_actor) for trainer, buffer in zip(self.trainers, buffers)]
+
+        if self._use_device_buffer:
+            buffers = [buffer_to_device(buffer, trainer.device) for trainer, buffer in zip(self.trainers, buffers)]
+        advantages = [trainer.compute_advantages(buffer) for trainer, buffer in zip(self.trainers, buffers)]
+
+        metrics = [TrainMetrics() for _ in self.trainers]
+        for _ in range(self.ppo_epoch):
+            # the minibatches of the agents are drawn in turn, one minibatch per agent per update
+            generators = [trainer.data_generator(buffer, *adv)
+                          for trainer, buffer, adv in zip(self.trainers, buffers, advantages)]
+            for samples in zip(*generators):
+                compute_diagnostics = self.trainers[0]._num_updates % self.trainers[0].diagnostics_interval == 0
+                for trainer in self.trainers:
+                    trainer._num_updates += 1
+                for trainer, agent_metrics, losses in zip(self.trainers, metrics, self.ppo_update(
+                        samples, episode, update_actor, compute_diagnostics)):
+                    trainer.log_update(agent_metrics, losses)
+
+        return [trainer.finish_train(agent_metrics, *adv)
+                for trainer, agent_metrics, adv in zip(self.trainers, metrics, advantages)]
@@ -3,9 +3,10 @@ import torch
 import torch.nn as nn
 from irat_code.utils.util import get_gard_norm, huber_loss, mse_loss
 from irat_code.utils.valuenorm import ValueNorm
-from irat_code.algorithms.utils.util import check
+from irat_code.algorithms.utils.util import check, masked_mean, TrainMetrics
 from torch.distributions import kl_divergence
 from irat_code.algorithms.utils.distributions import FixedCategorical, FixedNormal, FixedBernoulli
+from irat_code.utils.timer import PhaseTimer
 import copy
 
 
@@ -24,6 +25,7 @@ class RMappoTrSynRnd:
 
         self.device = device
         self.tpdv = dict(dtype=torch.float32, device=device)
+        self.timer = PhaseTimer()
         # self.idv_policy = idv_policy
         self.policy = policy
 
@@ -64,6 +66,9 @@ class RMappoTrSynRnd:
         self.ep_adv_surgery = args.ep_adv_surgery
         self.ep_adv_use_ratio = args.ep_adv_use_ratio
 
+        self.diagnostics_interval = args.diagnostics_interval
+        self._num_updates = 0
+
         assert (self._use_popart and self._use_valuenorm) == False, (
             "self._use_popart and self._use_valuenorm can not be set True simultaneously")
 
@@ -114,7 +119,6 @@ class RMappoTrSynRnd:
         value_pred_clipped = value_preds_batch + (values - value_preds_batch).clamp(-self.clip_param,
                                                                                     self.clip_param)
         if self._use_popart or self._use_valuenorm:
-            value_normalizer.update(return_batch)
             error_clipped = value_normalizer.normalize(return_batch) - value_pred_clipped
             error_original = value_normalizer.normalize(return_batch) - values
         else:
@@ -140,11 +144,12 @@ class RMappoTrSynRnd:
 
         return value_loss
 
-    def ppo_update(self, sample, episode, update_actor=True):
+    def ppo_update(self, sample, episode, update_actor=True, compute_diagnostics=True):
         """
         Update actor and critic networks.
         :param sample: (Tuple) contains data batch with which to update networks.
         :update_actor: (bool) whether to update actor network.
+        :param compute_diagnostics: (bool) whether to compute the clip and surrogate diagnostics.
 
         :return value_loss: (torch.Tensor) value function loss.
         :return critic_grad_norm: (torch.Tensor) gradient norm from critic up9date.
@@ -152,6 +157,7 @@ class RMappoTrSynRnd:
         :return dist_entropy: (torch.Tensor) action entropies.
         :return actor_grad_norm: (torch.Tensor) gradient norm from actor update.
         :return imp_weights: (torch.Tensor) importance sampling weights.
+        :return tcr, ..., tsl: (torch.Tensor) clip and surrogate diagnostics, None if compute_diagnostics is False.
         """
         idv_share_obs_batch, team_share_obs_batch, obs_batch, \
         idv_rnn_states_batch, team_rnn_states_batch, idv_rnn_states_critic_batch, team_rnn_states_critic_batch,\
@@ -174,7 +180,13 @@ class RMappoTrSynRnd:
 
         active_masks_batch = check(active_masks_batch).to(**self.tpdv)
 
+        # update the normalizers before the forward pass, popart rescales the weights of the critics in place
+        if self._use_popart or self._use_valuenorm:
+            self.idv_value_normalizer.update(idv_return_batch)
+            self.team_value_normalizer.update(team_return_batch)
+
         # Reshape to do in a single forward pass for all steps
+        self.timer.start("ppo_forward")
         idv_new_values, team_new_values, idv_new_action_log_probs, idv_new_dist_entropy, idv_new_act_dists = \
             self.policy.evaluate_actions(idv_share_obs_batch,
                                          team_share_obs_batch,
@@ -186,6 +198,8 @@ class RMappoTrSynRnd:
                                          masks_batch,
                                          available_actions_batch,
                                          active_masks_batch)
+        self.timer.stop("ppo_forward")
+        self.timer.start("ppo_losses")
 
         # individual actor update
         imp_weights = torch.exp(idv_new_action_log_probs - idv_action_log_probs_batch)
@@ -210,13 +224,16 @@ class RMappoTrSynRnd:
         # print(so_weights.shape, imp_weights.shape, idv_adv_targ.shape)
         # print(surr1.shape, surr2.shape, surr3.shape)
 
-        tn = imp_weights.clone().view(-1, 1).shape[0]
-        tg = imp_weights >= (1.0 - self.clip_param)
-        tl = imp_weights <= (1.0 + self.clip_param)
-        tcr = (tl & tg).float().sum() / tn
-        ts = surr1 <= surr2
-        tsr = ts.float().sum() / tn
-        tsl = surr1.clone()[ts].mean()
+        if compute_diagnostics:
+            tn = imp_weights.numel()
+            tg = imp_weights >= (1.0 - self.clip_param)
+            tl = imp_weights <= (1.0 + self.clip_param)
+            tcr = (tl & tg).float().sum() / tn
+            ts = surr1 <= surr2
+            tsr = ts.float().sum() / tn
+            tsl = masked_mean(surr1.detach(), ts)
+        else:
+            tcr = tsr = tsl = None
 
         idv_min = torch.min(surr1, surr2)
 
@@ -260,9 +277,11 @@ class RMappoTrSynRnd:
         # team critic loss
         team_value_loss = self.cal_value_loss(team_new_values, team_value_preds_batch, team_return_batch,
                                               active_masks_batch, self.team_value_normalizer)
+        self.timer.stop("ppo_losses")
 
         # update actor
         if self.gradient_use_surgery:
+            self.timer.start("ppo_backward")
             actor_params = list(self.policy.actor.parameters())
             self.policy.actor_optimizer.zero_grad()
             idv_cur_loss.backward(retain_graph=True)
@@ -295,39 +314,54 @@ class RMappoTrSynRnd:
                 if actor_params[pi].grad is not None:
                     actor_params[pi].grad += idv_grads[gi] + team_grads[gi]
                     gi += 1
+            self.timer.stop("ppo_backward")
+            self.timer.start("ppo_step")
             if self._use_max_grad_norm:
                 idv_actor_grad_norm = nn.utils.clip_grad_norm_(self.policy.actor.parameters(), self.max_grad_norm)
             else:
                 idv_actor_grad_norm = get_gard_norm(self.policy.actor.parameters())
             self.policy.actor_optimizer.step()
+            self.timer.stop("ppo_step")
 
         else:
             self.policy.actor_optimizer.zero_grad()
+            self.timer.start("ppo_backward")
             if update_actor:
                 idv_loss.backward()
+            self.timer.stop("ppo_backward")
+            self.timer.start("ppo_step")
             if self._use_max_grad_norm:
                 idv_actor_grad_norm = nn.utils.clip_grad_norm_(self.policy.actor.parameters(), self.max_grad_norm)
             else:
                 idv_actor_grad_norm = get_gard_norm(self.policy.actor.parameters())
             self.policy.actor_optimizer.step()
+            self.timer.stop("ppo_step")
 
         # update individual critic
         self.policy.idv_critic_optimizer.zero_grad()
+        self.timer.start("ppo_backward")
         (idv_value_loss * self.value_loss_coef).backward()
+        self.timer.stop("ppo_backward")
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             idv_critic_grad_norm = nn.utils.clip_grad_norm_(self.policy.idv_critic.parameters(), self.max_grad_norm)
         else:
             idv_critic_grad_norm = get_gard_norm(self.policy.idv_critic.parameters())
         self.policy.idv_critic_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # update team critic
         self.policy.team_critic_optimizer.zero_grad()
+        self.timer.start("ppo_backward")
         (team_value_loss * self.team_value_loss_coef).backward()
+        self.timer.stop("ppo_backward")
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             team_critic_grad_norm = nn.utils.clip_grad_norm_(self.policy.team_critic.parameters(), self.max_grad_norm)
         else:
             team_critic_grad_norm = get_gard_norm(self.policy.team_critic.parameters())
         self.policy.team_critic_optimizer.step()
+        self.timer.stop("ppo_step")
 
         return idv_value_loss, team_value_loss, idv_critic_grad_norm, team_critic_grad_norm,\
                idv_policy_loss, idv_new_dist_entropy, idv_actor_grad_norm, \
@@ -394,36 +428,7 @@ class RMappoTrSynRnd:
             team_advantages = np.array(tmp_team_adv).transpose(1, 0, 2, 3)
             # print(idv_advantages.shape, team_advantages.shape)
 
-        train_info = {}
-
-        train_info['Aa_idv_actor_loss'] = 0
-
-        train_info['Ab_policy_loss'] = 0
-        train_info['Ac_idv_ppo_loss_abs'] = 0
-        train_info['Ad_idv_ppo_prop'] = 0
-
-        train_info['Ae_eta'] = 0
-        train_info['Af_noclip_proportion'] = 0
-        train_info['Ag_update_proportion'] = 0
-        train_info['Ah_update_loss'] = 0
-
-        train_info['Ao_idv_entropy_prop'] = 0
-        train_info['Ap_dist_entropy'] = 0
-
-        train_info['Au_value_loss'] = 0
-        train_info['Av_advantages'] = 0
-        train_info['Aw_idv_actor_norm'] = 0
-        train_info['Ax_idv_critic_norm'] = 0
-
-        train_info['Va_update_advantages'] = 0
-        train_info['Vb_idv_adv_scale'] = 0
-        train_info['Vc_idv_adv_surgery'] = 0
-        train_info['Vd_team_adv_scale'] = 0
-        train_info['Ve_team_adv_surgery'] = 0
-
-        train_info['Tq_team_value_loss'] = 0
-        train_info['Tr_team_advantages'] = 0
-        train_info['Tt_team_critic_norm'] = 0
+        metrics = TrainMetrics()
 
         for _ in range(self.ppo_epoch):
             if self._use_recurrent_policy:
@@ -441,47 +446,41 @@ class RMappoTrSynRnd:
                                                                self.num_mini_batch)
 
             for sample in data_generator:
+                compute_diagnostics = self._num_updates % self.diagnostics_interval == 0
+                self._num_updates += 1
                 idv_value_loss, team_value_loss, idv_critic_grad_norm, team_critic_grad_norm, \
                 idv_policy_loss, idv_new_dist_entropy, idv_actor_grad_norm, \
                 imp_weights, tcr, tsr, tsl, idv_loss, idv_ppo_abs, policy_loss_prop, entropy_prop, adv_targ, \
                 idv_adv_scale, idv_adv_surgery, team_adv_scale, team_adv_surgery \
-                    = self.ppo_update(sample, episode, update_actor)
-
-                train_info['Aa_idv_actor_loss'] += idv_loss.item()
-                train_info['Ab_policy_loss'] += idv_policy_loss.item()
-                train_info['Ac_idv_ppo_loss_abs'] += idv_ppo_abs.item()
-                train_info['Ad_idv_ppo_prop'] += policy_loss_prop.item()
-                train_info['Ae_eta'] += imp_weights.mean()
-                train_info['Af_noclip_proportion'] += tcr
-                train_info['Ag_update_proportion'] += tsr
-                train_info['Ah_update_loss'] += tsl
-                # train_info['Aj_idv_sigma'] += so_weights.mean()
-                # train_info['Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')'] += clp.mean()
-                # train_info['Al_idv_noclip_proportion'] += tcrs
-                # train_info['Am_idv_(sigma*A)update_proportion'] += ts3
-                # train_info['An_idv_(sigma*A)update_loss'] += tsl3
-                train_info['Ao_idv_entropy_prop'] += entropy_prop.item()
-                train_info['Ap_dist_entropy'] += idv_new_dist_entropy.item()
-                # train_info['Aq_idv_kl_prop'] += idv_kl_prop.item()
-                # train_info['As_idv_kl_loss'] += idv_kl_loss.item()
-                # train_info['At_idv_cross_entropy'] += idv_cross_entropy.item()
-                train_info['Au_value_loss'] += idv_value_loss.item()
-                train_info['Aw_idv_actor_norm'] += idv_actor_grad_norm
-                train_info['Ax_idv_critic_norm'] += idv_critic_grad_norm
-
-                train_info['Va_update_advantages'] += adv_targ.mean()
-                train_info['Vb_idv_adv_scale'] += idv_adv_scale.item()
-                train_info['Vc_idv_adv_surgery'] += idv_adv_surgery.mean()
-                train_info['Vd_team_adv_scale'] += team_adv_scale.item()
-                train_info['Ve_team_adv_surgery'] += team_adv_surgery.mean()
-
-                train_info['Tq_team_value_loss'] += team_value_loss.item()
-                train_info['Tt_team_critic_norm'] += team_critic_grad_norm
-
-        num_updates = self.ppo_epoch * self.num_mini_batch
-
-        for k in train_info.keys():
-            train_info[k] /= num_updates
+                    = self.ppo_update(sample, episode, update_actor, compute_diagnostics)
+
+                metrics.add({
+                    'Aa_idv_actor_loss': idv_loss,
+                    'Ab_policy_loss': idv_policy_loss,
+                    'Ac_idv_ppo_loss_abs': idv_ppo_abs,
+                    'Ad_idv_ppo_prop': policy_loss_prop,
+                    'Ae_eta': imp_weights.mean(),
+                    'Af_noclip_proportion': tcr,
+                    'Ag_update_proportion': tsr,
+                    'Ah_update_loss': tsl,
+                    'Ao_idv_entropy_prop': entropy_prop,
+                    'Ap_dist_entropy': idv_new_dist_entropy,
+                    'Au_value_loss': idv_value_loss,
+                    'Aw_idv_actor_norm': idv_actor_grad_norm,
+                    'Ax_idv_critic_norm': idv_critic_grad_norm,
+
+                    'Va_update_advantages': adv_targ.mean(),
+                    'Vb_idv_adv_scale': idv_adv_scale,
+                    'Vc_idv_adv_surgery': idv_adv_surgery.mean(),
+                    'Vd_team_adv_scale': team_adv_scale,
+                    'Ve_team_adv_surgery': team_adv_surgery.mean(),
+
+                    'Tq_team_value_loss': team_value_loss,
+                    'Tt_team_critic_norm': team_critic_grad_norm,
+                })
+
+        # the diagnostics of this call are copied to the host here, once
+        train_info = metrics.reduce()
 
         train_info['Av_advantages'] = np.nanmean(idv_advantages)
 
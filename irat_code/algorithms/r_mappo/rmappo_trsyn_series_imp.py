@@ -5,9 +5,10 @@ import torch
 import torch.nn as nn
 from irat_code.utils.util import get_gard_norm, huber_loss, mse_loss
 from irat_code.utils.valuenorm import ValueNorm
-from irat_code.algorithms.utils.util import check
+from irat_code.algorithms.utils.util import check, masked_mean, warn_nonfinite, TrainMetrics
 from torch.distributions import kl_divergence
-from irat_code.algorithms.utils.distributions import FixedCategorical, FixedNormal, FixedBernoulli
+from irat_code.algorithms.utils.distributions import FixedCategorical, FixedNormal, FixedBernoulli, params_to_dists
+from irat_code.utils.timer import PhaseTimer
 # torch.autograd.set_detect_anomaly(True)
 
 
@@ -27,6 +28,7 @@ class RMappoTrSynSeriesImprovement:
 
         self.device = device
         self.tpdv = dict(dtype=torch.float32, device=device)
+        self.timer = PhaseTimer()
         self.idv_policy = idv_policy
         self.team_policy = team_policy
 
@@ -94,6 +96,8 @@ class RMappoTrSynSeriesImprovement:
         self.team_use_cross_entropy = args.team_use_cross_entropy
 
         self.team_use_entropy = args.team_use_entropy
+        self.diagnostics_interval = args.diagnostics_interval
+        self._num_updates = 0
 
         self.change_reward = args.change_reward
         self.change_reward_episode = args.change_reward_episode
@@ -192,7 +196,6 @@ class RMappoTrSynSeriesImprovement:
         value_pred_clipped = value_preds_batch + (values - value_preds_batch).clamp(-self.clip_param,
                                                                                     self.clip_param)
         if self._use_popart or self._use_valuenorm:
-            value_normalizer.update(return_batch)
             error_clipped = value_normalizer.normalize(return_batch) - value_pred_clipped
             error_original = value_normalizer.normalize(return_batch) - values
         else:
@@ -218,11 +221,12 @@ class RMappoTrSynSeriesImprovement:
 
         return value_loss
 
-    def ppo_update(self, sample, episode, update_actor=True):
+    def ppo_update(self, sample, episode, update_actor=True, compute_diagnostics=True):
         """
         Update actor and critic networks.
         :param sample: (Tuple) contains data batch with which to update networks.
         :update_actor: (bool) whether to update actor network.
+        :param compute_diagnostics: (bool) whether to compute the clip and surrogate diagnostics.
 
         :return value_loss: (torch.Tensor) value function loss.
         :return critic_grad_norm: (torch.Tensor) gradient norm from critic up9date.
@@ -230,6 +234,8 @@ class RMappoTrSynSeriesImprovement:
         :return dist_entropy: (torch.Tensor) action entropies.
         :return actor_grad_norm: (torch.Tensor) gradient norm from actor update.
         :return imp_weights: (torch.Tensor) importance sampling weights.
+        :return tcr, ..., tsl3, ttcr, tsr, tsl: (torch.Tensor) clip and surrogate diagnostics, None if
+                                                 compute_diagnostics is False.
         """
         idv_share_obs_batch, team_share_obs_batch, obs_batch, \
         idv_rnn_states_batch, team_rnn_states_batch, idv_rnn_states_critic_batch, team_rnn_states_critic_batch,\
@@ -256,7 +262,13 @@ class RMappoTrSynSeriesImprovement:
         idv_action_log_probs_batch_clone[idv_action_log_probs_batch_clone < -50.] = -50.
         team_action_log_probs_batch[team_action_log_probs_batch < -50.] = -50.
 
+        # update the normalizers before the forward pass, popart rescales the weights of the critics in place
+        if self._use_popart or self._use_valuenorm:
+            self.idv_value_normalizer.update(idv_return_batch)
+            self.team_value_normalizer.update(team_return_batch)
+
         # Reshape to do in a single forward pass for all steps
+        self.timer.start("ppo_forward")
         idv_new_values, idv_new_action_log_probs, idv_new_dist_entropy, idv_new_act_dists = \
             self.idv_policy.evaluate_actions(idv_share_obs_batch,
                                              obs_batch,
@@ -276,10 +288,13 @@ class RMappoTrSynSeriesImprovement:
                                               masks_batch,
                                               available_actions_batch,
                                               active_masks_batch)
+        self.timer.stop("ppo_forward")
+        self.timer.start("ppo_losses")
+
+        # action distributions of both policies at rollout time, one batched distribution per action head
+        idv_old_act_dists = params_to_dists(check(idv_act_dists_batch).to(**self.tpdv), idv_new_act_dists)
+        team_old_act_dists = params_to_dists(check(team_act_dists_batch).to(**self.tpdv), team_new_act_dists)
 
-        # print(idv_act_dists_batch.shape, len(idv_new_act_dists))
-        # print(idv_new_act_dists)
-        # print(idv_act_dists_batch)
         idv_kl_loss = 0
         idv_cross_entropy = torch.zeros(1).to(**self.tpdv)
         team_entropy = 0
@@ -288,25 +303,15 @@ class RMappoTrSynSeriesImprovement:
                 if self.idv_kl_loss_use_present:
                     tmp_probs = team_new_act_dists[ai].probs.clone().detach()
                 else:
-                    tmp_other_dists = team_act_dists_batch[:, ai]
-                    tmp_probs = []
-                    for tp in tmp_other_dists:
-                        tmp_probs.append(tp.probs.clone().detach())
-                    # print(tmp_probs)
-                    tmp_probs = torch.stack(tmp_probs).to(**self.tpdv)
+                    tmp_probs = team_old_act_dists[ai].probs
                 other_dists = type(idv_new_act_dists[ai])(probs=tmp_probs)
             elif type(idv_new_act_dists[ai]) == FixedNormal:
                 if self.idv_kl_loss_use_present:
                     tmp_mu = team_new_act_dists[ai].loc.clone().detach()
                     tmp_sigma = team_new_act_dists[ai].scale.clone().detach()
                 else:
-                    tmp_other_dists = team_act_dists_batch[:, ai]
-                    tmp_mu, tmp_sigma = [], []
-                    for tp in tmp_other_dists:
-                        tmp_mu.append(tp.loc.clone().detach())
-                        tmp_sigma.append(tp.scale.clone().detach())
-                    tmp_mu = torch.stack(tmp_mu).to(**self.tpdv)
-                    tmp_sigma = torch.stack(tmp_sigma).to(**self.tpdv)
+                    tmp_mu = team_old_act_dists[ai].loc
+                    tmp_sigma = team_old_act_dists[ai].scale
                 other_dists = type(idv_new_act_dists[ai])(loc=tmp_mu, scale=tmp_sigma)
                 # print(ai, other_dists)
             else:
@@ -324,25 +329,15 @@ class RMappoTrSynSeriesImprovement:
                 if self.team_kl_loss_use_present:
                     tmp_probs = idv_new_act_dists[ai].probs.clone().detach()
                 else:
-                    tmp_other_dists = idv_act_dists_batch[:, ai]
-                    tmp_probs = []
-                    for tp in tmp_other_dists:
-                        tmp_probs.append(tp.probs.clone().detach())
-                    # print(tmp_probs)
-                    tmp_probs = torch.stack(tmp_probs).to(**self.tpdv)
+                    tmp_probs = idv_old_act_dists[ai].probs
                 other_dists = type(team_new_act_dists[ai])(probs=tmp_probs)
             elif type(team_new_act_dists[ai]) == FixedNormal:
                 if self.team_kl_loss_use_present:
                     tmp_mu = idv_new_act_dists[ai].loc.clone().detach()
                     tmp_sigma = idv_new_act_dists[ai].scale.clone().detach()
                 else:
-                    tmp_other_dists = idv_act_dists_batch[:, ai]
-                    tmp_mu, tmp_sigma = [], []
-                    for tp in tmp_other_dists:
-                        tmp_mu.append(tp.loc.clone().detach())
-                        tmp_sigma.append(tp.scale.clone().detach())
-                    tmp_mu = torch.stack(tmp_mu).to(**self.tpdv)
-                    tmp_sigma = torch.stack(tmp_sigma).to(**self.tpdv)
+                    tmp_mu = idv_old_act_dists[ai].loc
+                    tmp_sigma = idv_old_act_dists[ai].scale
                 other_dists = type(team_new_act_dists[ai])(loc=tmp_mu, scale=tmp_sigma)
             else:
                 raise NotImplementedError
@@ -361,12 +356,7 @@ class RMappoTrSynSeriesImprovement:
                 if self.idv_clip_use_present:
                     tmp_probs = team_new_act_dists[ai].probs.clone().detach()
                 else:
-                    tmp_other_dists = team_act_dists_batch[:, ai]
-                    tmp_probs = []
-                    for tp in tmp_other_dists:
-                        tmp_probs.append(tp.probs.clone().detach())
-                    # print(tmp_probs)
-                    tmp_probs = torch.stack(tmp_probs).to(**self.tpdv)
+                    tmp_probs = team_old_act_dists[ai].probs
                 other_dists = type(idv_new_act_dists[ai])(probs=tmp_probs)
                 idv_other_dists = type(idv_new_act_dists[ai])(probs=idv_new_act_dists[ai].probs.clone().detach())
                 team_dists_std = torch.std(other_dists.probs.clone().detach(), dim=-1, keepdim=True)
@@ -378,13 +368,8 @@ class RMappoTrSynSeriesImprovement:
                     tmp_mu = team_new_act_dists[ai].loc.clone().detach()
                     tmp_sigma = team_new_act_dists[ai].scale.clone().detach()
                 else:
-                    tmp_other_dists = team_act_dists_batch[:, ai]
-                    tmp_mu, tmp_sigma = [], []
-                    for tp in tmp_other_dists:
-                        tmp_mu.append(tp.loc.clone().detach())
-                        tmp_sigma.append(tp.scale.clone().detach())
-                    tmp_mu = torch.stack(tmp_mu).to(**self.tpdv)
-                    tmp_sigma = torch.stack(tmp_sigma).to(**self.tpdv)
+                    tmp_mu = team_old_act_dists[ai].loc
+                    tmp_sigma = team_old_act_dists[ai].scale
                 other_dists = type(idv_new_act_dists[ai])(loc=tmp_mu, scale=tmp_sigma)
                 idv_other_dists = type(idv_new_act_dists[ai])(loc=idv_new_act_dists[ai].loc.clone().detach(),
                                                               scale=idv_new_act_dists[ai].scale.clone().detach())
@@ -484,30 +469,33 @@ class RMappoTrSynSeriesImprovement:
         tc_flag_max = tc_flag_max.detach()
         tc_flag_org = tc_flag_org.detach()
 
-        tn = imp_weights.clone().detach().view(-1, 1).shape[0]
-        tg = imp_weights >= (1.0 - self.clip_param)
-        tl = imp_weights <= (1.0 + self.clip_param)
-        tcr = (tl & tg).float().sum() / tn
-        tgs = so_weights >= (1.0 - self.idv_clip_ratio)
-        tls = so_weights <= (1.0 + self.idv_clip_ratio)
-        tcrs = (tgs & tls).float().sum() / tn
-
-        ts12 = surr1 <= surr2
-        ts13 = surr1 <= surr3
-        ts1_flag = ts12 & ((tc_flag_min & ts13) | (tc_flag_max & ~ts13) | tc_flag_org)
-        ts1 = ts1_flag.float().sum() / tn
-        ts1_min = (ts12 & (tc_flag_min & ts13)).float().sum() / tn
-        ts1_max = (ts12 & (tc_flag_max & ~ts13)).float().sum() / tn
-        ts1_org = (ts12 & tc_flag_org).float().sum() / tn
-        tsl1 = surr1.clone().detach()[ts1_flag].mean()
-
         idv_min = torch.min(surr1, surr2)
-        ts31 = surr3 <= idv_min
-        t3_flag = tgs & tls & ((tc_flag_min & ts31) | (tc_flag_max & ~ts31))
-        ts3 = t3_flag.float().sum() / tn
-        ts3_min = (tgs & tls & (tc_flag_min & ts31)).float().sum() / tn
-        ts3_max = (tgs & tls & (tc_flag_max & ~ts31)).float().sum() / tn
-        tsl3 = surr3.clone().detach()[t3_flag].mean()
+        if compute_diagnostics:
+            tn = imp_weights.numel()
+            tg = imp_weights >= (1.0 - self.clip_param)
+            tl = imp_weights <= (1.0 + self.clip_param)
+            tcr = (tl & tg).float().sum() / tn
+            tgs = so_weights >= (1.0 - self.idv_clip_ratio)
+            tls = so_weights <= (1.0 + self.idv_clip_ratio)
+            tcrs = (tgs & tls).float().sum() / tn
+
+            ts12 = surr1 <= surr2
+            ts13 = surr1 <= surr3
+            ts1_flag = ts12 & ((tc_flag_min & ts13) | (tc_flag_max & ~ts13) | tc_flag_org)
+            ts1 = ts1_flag.float().sum() / tn
+            ts1_min = (ts12 & (tc_flag_min & ts13)).float().sum() / tn
+            ts1_max = (ts12 & (tc_flag_max & ~ts13)).float().sum() / tn
+            ts1_org = (ts12 & tc_flag_org).float().sum() / tn
+            tsl1 = masked_mean(surr1.detach(), ts1_flag)
+
+            ts31 = surr3 <= idv_min
+            t3_flag = tgs & tls & ((tc_flag_min & ts31) | (tc_flag_max & ~ts31))
+            ts3 = t3_flag.float().sum() / tn
+            ts3_min = (tgs & tls & (tc_flag_min & ts31)).float().sum() / tn
+            ts3_max = (tgs & tls & (tc_flag_max & ~ts31)).float().sum() / tn
+            tsl3 = masked_mean(surr3.detach(), t3_flag)
+        else:
+            tcr = tcrs = ts1 = ts1_min = ts1_max = ts1_org = tsl1 = ts3 = ts3_min = ts3_max = tsl3 = None
 
         if self.idv_use_two_clip and episode >= self.idv_clip_use_time:
             tc_min = torch.min(idv_min, surr3)
@@ -569,44 +557,42 @@ class RMappoTrSynSeriesImprovement:
         idv_ppo_prop = idv_ppo_abs / idv_loss_abs
         idv_entropy_prop = idv_entropy_abs / idv_loss_abs
         idv_kl_prop = idv_kl_abs / idv_loss_abs
+        self.timer.stop("ppo_losses")
 
         # update individual actor
-        if torch.isnan(idv_loss).any():
-            print("idv loss has nan")
-        if torch.isinf(idv_loss).any():
-            print("idv loss has inf")
-        if torch.isnan(so_weights).any():
-            print("so_weights has nan")
-        if torch.isinf(so_weights).any():
-            print("so_weights has inf")
-        if torch.isnan(imp_weights).any():
-            print("imp_weights has nan")
-        if torch.isinf(imp_weights).any():
-            print("imp_weights has inf")
         self.idv_policy.actor_optimizer.zero_grad()
+        self.timer.start("ppo_backward")
         if update_actor:
             # with torch.autograd.detect_anomaly():
             idv_loss.backward()
             # if torch.isinf(so_weights).any():
             #     for p in list(self.idv_policy.actor.parameters()):
             #         print(p.grad)
+        self.timer.stop("ppo_backward")
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             idv_actor_grad_norm = nn.utils.clip_grad_norm_(self.idv_policy.actor.parameters(), self.max_grad_norm)
         else:
             idv_actor_grad_norm = get_gard_norm(self.idv_policy.actor.parameters())
         self.idv_policy.actor_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # update individual critic
         self.idv_policy.critic_optimizer.zero_grad()
+        self.timer.start("ppo_backward")
         # with torch.autograd.detect_anomaly():
         (idv_value_loss * self.value_loss_coef).backward()
+        self.timer.stop("ppo_backward")
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             idv_critic_grad_norm = nn.utils.clip_grad_norm_(self.idv_policy.critic.parameters(), self.max_grad_norm)
         else:
             idv_critic_grad_norm = get_gard_norm(self.idv_policy.critic.parameters())
         self.idv_policy.critic_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # team actor update
+        self.timer.start("ppo_losses")
         if self.team_clip_use_present:
             team_imp_weights = torch.exp(team_new_action_log_probs - idv_new_action_log_probs.clone().detach())
         else:
@@ -619,13 +605,16 @@ class RMappoTrSynSeriesImprovement:
         tclp = torch.clamp(team_imp_weights, 1.0 - self.team_clip_ratio, 1.0 + self.team_clip_ratio)
         team_surr2 = tclp * team_adv_targ
 
-        ttn = team_imp_weights.clone().detach().view(-1, 1).shape[0]
-        ttg = team_imp_weights >= (1.0 - self.team_clip_ratio)
-        ttl = team_imp_weights <= (1.0 + self.team_clip_ratio)
-        ttcr = (ttl & ttg).float().sum() / ttn
-        tts = team_surr1 <= team_surr2
-        tsr = tts.float().sum() / ttn
-        tsl = team_surr1.clone().detach()[tts].mean()
+        if compute_diagnostics:
+            ttn = team_imp_weights.numel()
+            ttg = team_imp_weights >= (1.0 - self.team_clip_ratio)
+            ttl = team_imp_weights <= (1.0 + self.team_clip_ratio)
+            ttcr = (ttl & ttg).float().sum() / ttn
+            tts = team_surr1 <= team_surr2
+            tsr = tts.float().sum() / ttn
+            tsl = masked_mean(team_surr1.detach(), tts)
+        else:
+            ttcr = tsr = tsl = None
 
         team_min = team_surr1
         if self.team_use_clip:
@@ -695,34 +684,39 @@ class RMappoTrSynSeriesImprovement:
         team_entropy_prop = team_entropy_abs / team_loss_abs
         team_kl_prop = team_kl_abs / team_loss_abs
 
+        if compute_diagnostics:
+            warn_nonfinite({"idv loss": idv_loss, "so_weights": so_weights, "imp_weights": imp_weights,
+                            "team loss": team_loss, "team": team_imp_weights})
+        self.timer.stop("ppo_losses")
+
         # update team actor
-        if torch.isnan(team_loss).any():
-            print("team loss has nan")
-        if torch.isinf(team_loss).any():
-            print("team loss has inf")
-        if torch.isnan(team_imp_weights).any():
-            print("team has nan")
-        if torch.isinf(team_imp_weights).any():
-            print("team has inf")
         self.team_policy.actor_optimizer.zero_grad()
+        self.timer.start("ppo_backward")
         if update_actor:
             # with torch.autograd.detect_anomaly():
             team_loss.backward()
+        self.timer.stop("ppo_backward")
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             team_actor_grad_norm = nn.utils.clip_grad_norm_(self.team_policy.actor.parameters(), self.max_grad_norm)
         else:
             team_actor_grad_norm = get_gard_norm(self.team_policy.actor.parameters())
         self.team_policy.actor_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # update team critic
         self.team_policy.critic_optimizer.zero_grad()
+        self.timer.start("ppo_backward")
         # with torch.autograd.detect_anomaly():
         (team_value_loss * self.value_loss_coef).backward()
+        self.timer.stop("ppo_backward")
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             team_critic_grad_norm = nn.utils.clip_grad_norm_(self.team_policy.critic.parameters(), self.max_grad_norm)
         else:
             team_critic_grad_norm = get_gard_norm(self.team_policy.critic.parameters())
         self.team_policy.critic_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # if torch.isnan(idv_loss).any():
         #     print("idv_loss has nan")
@@ -765,70 +759,7 @@ class RMappoTrSynSeriesImprovement:
         team_std_advantages = np.nanstd(team_advantages_copy)
         team_advantages = (team_advantages - team_mean_advantages) / (team_std_advantages + 1e-5)
 
-        train_info = {}
-
-        train_info['Aa_idv_actor_loss'] = 0
-
-        train_info['Ab_policy_loss'] = 0
-        train_info['Ac_idv_ppo_loss_abs'] = 0
-        train_info['Ad_idv_ppo_prop'] = 0
-
-        train_info['Ae_eta'] = 0
-        train_info['Af_noclip_proportion'] = 0
-        train_info['Ag_update_proportion'] = 0
-        train_info['Ah_update_loss'] = 0
-
-        train_info['Ai_idv_epsilon\''] = 0
-        train_info['Aj_idv_sigma'] = 0
-        train_info['Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')'] = 0
-        train_info['Al_idv_noclip_proportion'] = 0
-        train_info['Am_idv_(sigma*A)update_proportion'] = 0
-        train_info['An_idv_(sigma*A)update_loss'] = 0
-
-        train_info['Ao_idv_entropy_prop'] = 0
-        train_info['Ap_dist_entropy'] = 0
-
-        train_info['Aq_idv_kl_prop'] = 0
-        train_info['Ar_idv_kl_coef'] = 0
-        train_info['As_idv_kl_loss'] = 0
-        train_info['At_idv_cross_entropy'] = 0
-
-        train_info['Au_value_loss'] = 0
-        train_info['Av_advantages'] = 0
-        train_info['Aw_idv_actor_norm'] = 0
-        train_info['Ax_idv_critic_norm'] = 0
-
-        train_info['Ba_idv_org_min_prop'] = 0
-        train_info['Bb_idv_org_max_prop'] = 0
-        train_info['Bc_idv_org_org_prop'] = 0
-        train_info['Bd_idv_new_min_prop'] = 0
-        train_info['Be_idv_new_max_prop'] = 0
-
-        train_info['Ta_team_actor_loss'] = 0
-
-        train_info['Tb_team_policy_loss'] = 0
-        train_info['Tc_team_ppo_loss_abs'] = 0
-        train_info['Td_team_ppo_prop'] = 0
-
-        train_info['Te_team_epsilon^'] = 0
-        train_info['Tf_team_sigma^'] = 0
-        train_info['Tg_team_clip(sigma^, 1-epislon^\', 1+epislon^\')'] = 0
-        train_info['Th_team_noclip_proportion'] = 0
-        train_info['Ti_team_(sigma^*A)update_proportion'] = 0
-        train_info['Tj_team_(sigma^*A)update_loss'] = 0
-
-        train_info['Tk_team_entropy_prop'] = 0
-        train_info['Tl_team_dist_entropy'] = 0
-
-        train_info['Tm_team_kl_prop'] = 0
-        train_info['Tn_team_kl_coef'] = 0
-        train_info['To_team_kl_loss'] = 0
-        train_info['Tp_team_cross_entropy'] = 0
-
-        train_info['Tq_team_value_loss'] = 0
-        train_info['Tr_team_advantages'] = 0
-        train_info['Ts_team_actor_norm'] = 0
-        train_info['Tt_team_critic_norm'] = 0
+        metrics = TrainMetrics()
 
         for _ in range(self.ppo_epoch):
             if self._use_recurrent_policy:
@@ -846,7 +777,8 @@ class RMappoTrSynSeriesImprovement:
                                                                self.num_mini_batch)
 
             for sample in data_generator:
-                # print("in", ppi)
+                compute_diagnostics = self._num_updates % self.diagnostics_interval == 0
+                self._num_updates += 1
                 idv_value_loss, team_value_loss, idv_critic_grad_norm, team_critic_grad_norm, \
                 idv_policy_loss, team_policy_loss, idv_new_dist_entropy, team_new_dist_entropy, \
                 idv_kl_loss, team_kl_loss, idv_cross_entropy, team_cross_entropy, idv_actor_grad_norm, team_actor_grad_norm, \
@@ -854,58 +786,58 @@ class RMappoTrSynSeriesImprovement:
                 idv_loss, idv_ppo_abs, idv_ppo_prop, idv_entropy_prop, idv_kl_prop,\
                 team_loss, team_ppo_abs, team_ppo_prop, team_entropy_prop, team_kl_prop, ts1_min, ts1_max, ts1_org,\
                 ts3_min, ts3_max \
-                    = self.ppo_update(sample, episode, update_actor)
-
-                train_info['Aa_idv_actor_loss'] += idv_loss.item()
-                train_info['Ab_policy_loss'] += idv_policy_loss.item()
-                train_info['Ac_idv_ppo_loss_abs'] += idv_ppo_abs.item()
-                train_info['Ad_idv_ppo_prop'] += idv_ppo_prop.item()
-                train_info['Ae_eta'] += imp_weights.mean()
-                train_info['Af_noclip_proportion'] += tcr
-                train_info['Ag_update_proportion'] += ts1
-                train_info['Ah_update_loss'] += tsl1
-                train_info['Aj_idv_sigma'] += so_weights.mean()
-                train_info['Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')'] += clp.mean()
-                train_info['Al_idv_noclip_proportion'] += tcrs
-                train_info['Am_idv_(sigma*A)update_proportion'] += ts3
-                train_info['An_idv_(sigma*A)update_loss'] += tsl3
-                train_info['Ao_idv_entropy_prop'] += idv_entropy_prop.item()
-                train_info['Ap_dist_entropy'] += idv_new_dist_entropy.item()
-                train_info['Aq_idv_kl_prop'] += idv_kl_prop.item()
-                train_info['As_idv_kl_loss'] += idv_kl_loss.item()
-                train_info['At_idv_cross_entropy'] += idv_cross_entropy.item()
-                train_info['Au_value_loss'] += idv_value_loss.item()
-                train_info['Aw_idv_actor_norm'] += idv_actor_grad_norm
-                train_info['Ax_idv_critic_norm'] += idv_critic_grad_norm
-
-                train_info['Ba_idv_org_min_prop'] += ts1_min
-                train_info['Bb_idv_org_max_prop'] += ts1_max
-                train_info['Bc_idv_org_org_prop'] += ts1_org
-                train_info['Bd_idv_new_min_prop'] += ts3_min
-                train_info['Be_idv_new_max_prop'] += ts3_max
-
-                train_info['Ta_team_actor_loss'] += team_loss.item()
-                train_info['Tb_team_policy_loss'] += team_policy_loss.item()
-                train_info['Tc_team_ppo_loss_abs'] += team_ppo_abs.item()
-                train_info['Td_team_ppo_prop'] += team_ppo_prop.item()
-                train_info['Tf_team_sigma^'] += team_imp_weights.mean()
-                train_info['Tg_team_clip(sigma^, 1-epislon^\', 1+epislon^\')'] += tclp.mean()
-                train_info['Th_team_noclip_proportion'] += ttcr
-                train_info['Ti_team_(sigma^*A)update_proportion'] += tsr
-                train_info['Tj_team_(sigma^*A)update_loss'] += tsl
-                train_info['Tk_team_entropy_prop'] += team_entropy_prop.item()
-                train_info['Tl_team_dist_entropy'] += team_new_dist_entropy.item()
-                train_info['Tm_team_kl_prop'] += team_kl_prop.item()
-                train_info['To_team_kl_loss'] += team_kl_loss.item()
-                train_info['Tp_team_cross_entropy'] += team_cross_entropy.item()
-                train_info['Tq_team_value_loss'] += team_value_loss.item()
-                train_info['Ts_team_actor_norm'] += team_actor_grad_norm
-                train_info['Tt_team_critic_norm'] += team_critic_grad_norm
-
-        num_updates = self.ppo_epoch * self.num_mini_batch
-
-        for k in train_info.keys():
-            train_info[k] /= num_updates
+                    = self.ppo_update(sample, episode, update_actor, compute_diagnostics)
+
+                metrics.add({
+                    'Aa_idv_actor_loss': idv_loss,
+                    'Ab_policy_loss': idv_policy_loss,
+                    'Ac_idv_ppo_loss_abs': idv_ppo_abs,
+                    'Ad_idv_ppo_prop': idv_ppo_prop,
+                    'Ae_eta': imp_weights.mean(),
+                    'Af_noclip_proportion': tcr,
+                    'Ag_update_proportion': ts1,
+                    'Ah_update_loss': tsl1,
+                    'Aj_idv_sigma': so_weights.mean(),
+                    'Ak_idv_clip(sigma, 1-epislon\', 1+epislon\')': clp.mean(),
+                    'Al_idv_noclip_proportion': tcrs,
+                    'Am_idv_(sigma*A)update_proportion': ts3,
+                    'An_idv_(sigma*A)update_loss': tsl3,
+                    'Ao_idv_entropy_prop': idv_entropy_prop,
+                    'Ap_dist_entropy': idv_new_dist_entropy,
+                    'Aq_idv_kl_prop': idv_kl_prop,
+                    'As_idv_kl_loss': idv_kl_loss,
+                    'At_idv_cross_entropy': idv_cross_entropy,
+                    'Au_value_loss': idv_value_loss,
+                    'Aw_idv_actor_norm': idv_actor_grad_norm,
+                    'Ax_idv_critic_norm': idv_critic_grad_norm,
+
+                    'Ba_idv_org_min_prop': ts1_min,
+                    'Bb_idv_org_max_prop': ts1_max,
+                    'Bc_idv_org_org_prop': ts1_org,
+                    'Bd_idv_new_min_prop': ts3_min,
+                    'Be_idv_new_max_prop': ts3_max,
+
+                    'Ta_team_actor_loss': team_loss,
+                    'Tb_team_policy_loss': team_policy_loss,
+                    'Tc_team_ppo_loss_abs': team_ppo_abs,
+                    'Td_team_ppo_prop': team_ppo_prop,
+                    'Tf_team_sigma^': team_imp_weights.mean(),
+                    'Tg_team_clip(sigma^, 1-epislon^\', 1+epislon^\')': tclp.mean(),
+                    'Th_team_noclip_proportion': ttcr,
+                    'Ti_team_(sigma^*A)update_proportion': tsr,
+                    'Tj_team_(sigma^*A)update_loss': tsl,
+                    'Tk_team_entropy_prop': team_entropy_prop,
+                    'Tl_team_dist_entropy': team_new_dist_entropy,
+                    'Tm_team_kl_prop': team_kl_prop,
+                    'To_team_kl_loss': team_kl_loss,
+                    'Tp_team_cross_entropy': team_cross_entropy,
+                    'Tq_team_value_loss': team_value_loss,
+                    'Ts_team_actor_norm': team_actor_grad_norm,
+                    'Tt_team_critic_norm': team_critic_grad_norm,
+                })
+
+        # the diagnostics of this call are copied to the host here, once
+        train_info = metrics.reduce()
 
         train_info['Ai_idv_epsilon\''] = self.idv_clip_ratio
         train_info['Ar_idv_kl_coef'] = self.ikl_coef
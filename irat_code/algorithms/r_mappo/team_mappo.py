@@ -5,6 +5,7 @@ from irat_code.utils.util import get_gard_norm, huber_loss, mse_loss
 from irat_code.utils.valuenorm import ValueNorm
 from irat_code.algorithms.utils.util import check
 from torch.distributions import kl_divergence
+from irat_code.utils.timer import PhaseTimer
 
 
 class Team_RMAPPO():
@@ -22,6 +23,7 @@ class Team_RMAPPO():
 
         self.device = device
         self.tpdv = dict(dtype=torch.float32, device=device)
+        self.timer = PhaseTimer()
         self.policy = policy
 
         self.clip_param = args.clip_param
@@ -83,7 +85,6 @@ class Team_RMAPPO():
         value_pred_clipped = value_preds_batch + (values - value_preds_batch).clamp(-self.clip_param,
                                                                                     self.clip_param)
         if self._use_popart or self._use_valuenorm:
-            self.value_normalizer.update(return_batch)
             error_clipped = self.value_normalizer.normalize(return_batch) - value_pred_clipped
             error_original = self.value_normalizer.normalize(return_batch) - values
         else:
@@ -133,7 +134,12 @@ class Team_RMAPPO():
         return_batch = check(return_batch).to(**self.tpdv)
         active_masks_batch = check(active_masks_batch).to(**self.tpdv)
 
+        # update the normalizer before the forward pass, popart rescales the weights of the critic in place
+        if self._use_popart or self._use_valuenorm:
+            self.value_normalizer.update(return_batch)
+
         # Reshape to do in a single forward pass for all steps
+        self.timer.start("ppo_forward")
         values, action_log_probs, dist_entropy, act_dists = self.policy.evaluate_actions(share_obs_batch,
                                                                                          obs_batch,
                                                                                          rnn_states_batch,
@@ -142,6 +148,8 @@ class Team_RMAPPO():
                                                                                          masks_batch,
                                                                                          available_actions_batch,
                                                                                          active_masks_batch)
+        self.timer.stop("ppo_forward")
+        self.timer.start("ppo_losses")
         # print("team", other_act_dists_batch.shape, len(act_dists))
         kl_loss = 0
         for ai in range(len(act_dists)):
@@ -177,35 +185,46 @@ class Team_RMAPPO():
             policy_action_loss = -torch.sum(torch.min(surr1, surr2), dim=-1, keepdim=True).mean()
 
         policy_loss = policy_action_loss
+        self.timer.stop("ppo_losses")
 
         self.policy.actor_optimizer.zero_grad()
 
+        self.timer.start("ppo_backward")
         if update_actor:
             loss = policy_loss - dist_entropy * self.entropy_coef
             if self.team_use_kl_loss:
                 loss += self.kl_coef * kl_loss
             loss.backward()
+        self.timer.stop("ppo_backward")
 
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             actor_grad_norm = nn.utils.clip_grad_norm_(self.policy.actor.parameters(), self.max_grad_norm)
         else:
             actor_grad_norm = get_gard_norm(self.policy.actor.parameters())
 
         self.policy.actor_optimizer.step()
+        self.timer.stop("ppo_step")
 
         # critic update
+        self.timer.start("ppo_losses")
         value_loss = self.cal_value_loss(values, value_preds_batch, return_batch, active_masks_batch)
+        self.timer.stop("ppo_losses")
 
         self.policy.critic_optimizer.zero_grad()
 
+        self.timer.start("ppo_backward")
         (value_loss * self.value_loss_coef).backward()
+        self.timer.stop("ppo_backward")
 
+        self.timer.start("ppo_step")
         if self._use_max_grad_norm:
             critic_grad_norm = nn.utils.clip_grad_norm_(self.policy.critic.parameters(), self.max_grad_norm)
         else:
             critic_grad_norm = get_gard_norm(self.policy.critic.parameters())
 
         self.policy.critic_optimizer.step()
+        self.timer.stop("ppo_step")
 
         return value_loss, critic_grad_norm, policy_loss, dist_entropy, actor_grad_norm, imp_weights, tclp, tcr, tsr, tsl, kl_loss
 
@@ -94,6 +94,28 @@ class ACTLayer(nn.Module):
         # print("x", x.requires_grad)
         return act_dists, actions, action_log_probs
 
+    def log_probs(self, act_dists, action):
+        """
+        Compute log probability of given actions under action distributions returned by forward.
+        :param act_dists: (list) action distributions, one per action head.
+        :param action: (torch.Tensor) actions whose log probability to evaluate.
+
+        :return action_log_probs: (torch.Tensor) log probabilities of the input actions.
+        """
+        if self.mixed_action:
+            a, b = action.split((2, 1), -1)
+            action = [a, b.long()]
+            action_log_probs = [act_dist.log_probs(act) for act_dist, act in zip(act_dists, action)]
+            action_log_probs = torch.sum(torch.cat(action_log_probs, -1), -1, keepdim=True)
+        elif self.multi_discrete:
+            action = torch.transpose(action, 0, 1)
+            action_log_probs = [act_dist.log_probs(act) for act_dist, act in zip(act_dists, action)]
+            action_log_probs = torch.cat(action_log_probs, -1)
+        else:
+            action_log_probs = act_dists[0].log_probs(action)
+
+        return action_log_probs
+
     def get_probs(self, x, available_actions=None):
         """
         Compute action probabilities from inputs.
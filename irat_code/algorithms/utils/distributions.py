@@ -28,6 +28,15 @@ class FixedCategorical(torch.distributions.Categorical):
         return self.probs.argmax(dim=-1, keepdim=True)
 
 
+@torch.distributions.kl.register_kl(FixedCategorical, FixedCategorical)
+def _kl_fixed_categorical(p, q):
+    # same as torch's categorical kl, with torch.where instead of boolean indexing so it also runs under vmap
+    t = p.probs * (p.logits - q.logits)
+    t = torch.where((q.probs == 0).expand_as(t), t.new_tensor(float("inf")), t)
+    t = torch.where((p.probs == 0).expand_as(t), t.new_tensor(0.), t)
+    return t.sum(-1)
+
+
 # Normal
 class FixedNormal(torch.distributions.Normal):
     def log_probs(self, actions):
@@ -52,6 +61,52 @@ class FixedBernoulli(torch.distributions.Bernoulli):
         return torch.gt(self.probs, 0.5).float()
 
 
+def dists_to_params(act_dists):
+    """
+    Pack the action distributions of all action heads into one dense tensor, so they can be stored in a
+    float buffer instead of an object array of Distribution instances.
+    :param act_dists: (list) distributions returned by ACTLayer, one per action head.
+
+    :return params: (torch.Tensor) probs of Categorical/Bernoulli heads and [loc, scale] of Normal heads,
+                    concatenated along the last dimension.
+    """
+    params = []
+    for dist in act_dists:
+        if type(dist) == FixedNormal:
+            params.append(dist.loc)
+            params.append(dist.scale.expand_as(dist.loc))
+        elif type(dist) in (FixedCategorical, FixedBernoulli):
+            params.append(dist.probs)
+        else:
+            raise NotImplementedError
+    return torch.cat(params, -1).detach()
+
+
+def params_to_dists(params, act_dists):
+    """
+    Rebuild batched action distributions from parameters packed by dists_to_params.
+    :param params: (torch.Tensor) packed distribution parameters, (batch, dist_shape).
+    :param act_dists: (list) distributions whose types and head sizes are used as template.
+
+    :return dists: (list) one batched distribution per action head.
+    """
+    dists = []
+    start = 0
+    for dist in act_dists:
+        if type(dist) == FixedNormal:
+            dim = dist.loc.shape[-1]
+            dists.append(FixedNormal(loc=params[..., start:start + dim],
+                                     scale=params[..., start + dim:start + 2 * dim]))
+            start += 2 * dim
+        elif type(dist) in (FixedCategorical, FixedBernoulli):
+            dim = dist.probs.shape[-1]
+            dists.append(type(dist)(probs=params[..., start:start + dim]))
+            start += dim
+        else:
+            raise NotImplementedError
+    return dists
+
+
 class Categorical(nn.Module):
     def __init__(self, num_inputs, num_outputs, use_orthogonal=True, gain=0.01):
         super(Categorical, self).__init__()
@@ -64,7 +119,7 @@ class Categorical(nn.Module):
     def forward(self, x, available_actions=None):
         x = self.linear(x)
         if available_actions is not None:
-            x[available_actions == 0] = -1e10
+            x = torch.where(available_actions == 0, x.new_tensor(-1e10), x)
         # print("fx", x.requires_grad)
         return FixedCategorical(logits=x)
 
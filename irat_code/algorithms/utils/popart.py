@@ -27,6 +27,8 @@ class PopArt(torch.nn.Module):
         self.mean_sq = nn.Parameter(torch.zeros(output_shape), requires_grad=False)
         self.debiasing_term = nn.Parameter(torch.tensor(0.0), requires_grad=False)
 
+        self.optimizer = None
+
         self.reset_parameters()
 
     def reset_parameters(self):
@@ -54,13 +56,20 @@ class PopArt(torch.nn.Module):
 
         return F.linear(input_vector, self.weight, self.bias)
 
+    def set_optimizer(self, optimizer):
+        """
+        Keep the moments of the weight and the bias in this optimizer consistent with the rescaling in update().
+        :param optimizer: (torch.optim.Optimizer) optimizer of the critic this layer belongs to.
+        """
+        self.optimizer = optimizer
+
     @torch.no_grad()
     def update(self, input_vector):
         if type(input_vector) == np.ndarray:
             input_vector = torch.from_numpy(input_vector)
         input_vector = input_vector.to(**self.tpdv)
 
-        old_mean, old_stddev = self.mean, self.stddev
+        old_mean, old_stddev = self.mean.clone(), self.stddev.clone()
 
         batch_mean = input_vector.mean(dim=tuple(range(self.norm_axes)))
         batch_sq_mean = (input_vector ** 2).mean(dim=tuple(range(self.norm_axes)))
@@ -69,11 +78,22 @@ class PopArt(torch.nn.Module):
         self.mean_sq.mul_(self.beta).add_(batch_sq_mean * (1.0 - self.beta))
         self.debiasing_term.mul_(self.beta).add_(1.0 * (1.0 - self.beta))
 
-        self.stddev = nn.Parameter((self.mean_sq - self.mean ** 2).sqrt().clamp(min=1e-4), requires_grad=False).to(
-            **self.tpdv)
+        self.stddev.copy_((self.mean_sq - self.mean ** 2).sqrt().clamp(min=1e-4))
+
+        # rescale in place so that the unnormalized outputs are preserved and the optimizer keeps the same tensors
+        scale = old_stddev / self.stddev
+        self.weight.mul_(scale[:, None])
+        self.bias.mul_(old_stddev).add_(old_mean - self.mean).div_(self.stddev)
 
-        self.weight = nn.Parameter(self.weight * old_stddev / self.stddev).to(**self.tpdv)
-        self.bias = nn.Parameter((old_stddev * self.bias + old_mean - self.mean) / self.stddev).to(**self.tpdv)
+        # the gradients of the rescaled weight and bias are scaled by the same factor
+        if self.optimizer is not None:
+            for param, param_scale in ((self.weight, scale[:, None]), (self.bias, scale)):
+                state = self.optimizer.state.get(param, {})
+                if "exp_avg" in state:
+                    state["exp_avg"].mul_(param_scale)
+                for key in ("exp_avg_sq", "max_exp_avg_sq"):
+                    if key in state:
+                        state[key].mul_(param_scale ** 2)
 
     def debiased_mean_var(self):
         debiased_mean = self.mean / self.debiasing_term.clamp(min=self.epsilon)
@@ -91,7 +111,7 @@ class PopArt(torch.nn.Module):
 
         return out
 
-    def denormalize(self, input_vector):
+    def denormalize(self, input_vector, to_numpy=True):
         if type(input_vector) == np.ndarray:
             input_vector = torch.from_numpy(input_vector)
         input_vector = input_vector.to(**self.tpdv)
@@ -99,6 +119,7 @@ class PopArt(torch.nn.Module):
         mean, var = self.debiased_mean_var()
         out = input_vector * torch.sqrt(var)[(None,) * self.norm_axes] + mean[(None,) * self.norm_axes]
 
-        out = out.cpu().numpy()
+        if to_numpy:
+            out = out.cpu().numpy()
 
         return out
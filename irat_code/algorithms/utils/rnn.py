@@ -1,14 +1,16 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 """RNN modules."""
 
 
 class RNNLayer(nn.Module):
-    def __init__(self, inputs_dim, outputs_dim, recurrent_N, use_orthogonal):
+    def __init__(self, inputs_dim, outputs_dim, recurrent_N, use_orthogonal, use_masked_scan=False):
         super(RNNLayer, self).__init__()
         self._recurrent_N = recurrent_N
         self._use_orthogonal = use_orthogonal
+        self._use_masked_scan = use_masked_scan
 
         self.rnn = nn.GRU(inputs_dim, outputs_dim, num_layers=self._recurrent_N)
         for name, param in self.rnn.named_parameters():
@@ -20,6 +22,9 @@ class RNNLayer(nn.Module):
                 else:
                     nn.init.xavier_uniform_(param)
         self.norm = nn.LayerNorm(outputs_dim)
+        # run the sequences one step at a time instead of in segments between the episode starts, which keeps the
+        # control flow independent of the masks so that the layer can run under torch.func.vmap
+        self.step_by_step = False
 
     def forward(self, x, hxs, masks):
         if x.size(0) == hxs.size(0):
@@ -40,23 +45,32 @@ class RNNLayer(nn.Module):
             # Same deal with masks
             masks = masks.view(T, N)
 
-            # Let's figure out which steps in the sequence have a zero for any agent
-            # We will always assume t=0 has a zero in it as that makes the logic cleaner
-            has_zeros = ((masks[1:] == 0.0)
-                         .any(dim=-1)
-                         .nonzero()
-                         .squeeze()
-                         .cpu())
-
-            # +1 to correct the masks[1:]
-            if has_zeros.dim() == 0:
-                # Deal with scalar
-                has_zeros = [has_zeros.item() + 1]
+            if self._use_masked_scan and not self.step_by_step:
+                x, hxs = self._masked_scan(x, hxs.transpose(0, 1), masks)
+                x = self.norm(x.reshape(T * N, -1))
+                return x, hxs.transpose(0, 1)
+
+            if self.step_by_step:
+                # masking the hidden states at every step is exact where the masks are one
+                has_zeros = list(range(T + 1))
             else:
-                has_zeros = (has_zeros + 1).numpy().tolist()
+                # Let's figure out which steps in the sequence have a zero for any agent
+                # We will always assume t=0 has a zero in it as that makes the logic cleaner
+                has_zeros = ((masks[1:] == 0.0)
+                             .any(dim=-1)
+                             .nonzero()
+                             .squeeze()
+                             .cpu())
+
+                # +1 to correct the masks[1:]
+                if has_zeros.dim() == 0:
+                    # Deal with scalar
+                    has_zeros = [has_zeros.item() + 1]
+                else:
+                    has_zeros = (has_zeros + 1).numpy().tolist()
 
-            # add t=0 and t=T to the list
-            has_zeros = [0] + has_zeros + [T]
+                # add t=0 and t=T to the list
+                has_zeros = [0] + has_zeros + [T]
 
             hxs = hxs.transpose(0, 1)
 
@@ -82,3 +96,37 @@ class RNNLayer(nn.Module):
 
         x = self.norm(x)
         return x, hxs
+
+    def _masked_scan(self, x, hxs, masks):
+        """
+        Run the chunks one step at a time with the gru cell math of the cpu kernel, resetting the hidden state of
+        every sequence at its own episode starts instead of splitting all of them at the episode starts of any. The
+        input projections of a layer are computed for all steps at once. The outputs equal those of the segments on
+        the cpu, the weight gradients are accumulated in another order.
+        :param x: (torch.Tensor) inputs, (T, N, inputs_dim).
+        :param hxs: (torch.Tensor) hidden states at the start of the chunks, (recurrent_N, N, outputs_dim).
+        :param masks: (torch.Tensor) 0 where a sequence starts an episode, (T, N).
+
+        :return x: (torch.Tensor) outputs of the last layer, (T, N, outputs_dim).
+        :return hxs: (torch.Tensor) hidden states at the end of the chunks, (recurrent_N, N, outputs_dim).
+        """
+        masks = masks.unsqueeze(-1)
+        last_hxs = []
+        for layer in range(self._recurrent_N):
+            input_gates = F.linear(x, getattr(self.rnn, "weight_ih_l%d" % layer),
+                                   getattr(self.rnn, "bias_ih_l%d" % layer))
+            weight_hh, bias_hh = getattr(self.rnn, "weight_hh_l%d" % layer), getattr(self.rnn, "bias_hh_l%d" % layer)
+            h = hxs[layer]
+            outputs = []
+            for t in range(x.size(0)):
+                h = h * masks[t]
+                i_r, i_z, i_n = input_gates[t].chunk(3, 1)
+                h_r, h_z, h_n = F.linear(h, weight_hh, bias_hh).chunk(3, 1)
+                r = torch.sigmoid(i_r + h_r)
+                z = torch.sigmoid(i_z + h_z)
+                n = torch.tanh(i_n + h_n * r)
+                h = (h - n) * z + n
+                outputs.append(h)
+            x = torch.stack(outputs)
+            last_hxs.append(h)
+        return x, torch.stack(last_hxs)
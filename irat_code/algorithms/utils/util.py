@@ -15,3 +15,85 @@ def get_clones(module, N):
 def check(input):
     output = torch.from_numpy(input) if type(input) == np.ndarray else input
     return output
+
+def normalize_advantages(advantages, active_masks):
+    """
+    Normalize advantages with the mean and std of the steps where the agents are active.
+    :param advantages: (np.ndarray / torch.Tensor) advantage estimates.
+    :param active_masks: (np.ndarray / torch.Tensor) 0 where an agent is dead, same shape as advantages.
+
+    :return advantages: (np.ndarray / torch.Tensor) normalized advantages, same type as the inputs.
+    """
+    if isinstance(advantages, torch.Tensor):
+        active_advantages = advantages[active_masks != 0.0]
+        return (advantages - active_advantages.mean()) / (active_advantages.std(unbiased=False) + 1e-5)
+    advantages_copy = advantages.copy()
+    advantages_copy[active_masks == 0.0] = np.nan
+    mean_advantages = np.nanmean(advantages_copy)
+    std_advantages = np.nanstd(advantages_copy)
+    return (advantages - mean_advantages) / (std_advantages + 1e-5)
+
+def masked_mean(x, mask):
+    """
+    Mean of the entries of x where mask is True, without the host sync of boolean indexing.
+    :param x: (torch.Tensor) values.
+    :param mask: (torch.Tensor) bool tensor with the same shape as x.
+
+    :return mean: (torch.Tensor) scalar mean, nan if mask is empty.
+    """
+    return torch.where(mask, x, torch.zeros_like(x)).sum() / mask.sum()
+
+def warn_nonfinite(tensors):
+    """
+    Print which of the given tensors hold nan or inf values, checking all of them with a single host sync.
+    :param tensors: (dict) name -> torch.Tensor.
+    """
+    names = list(tensors)
+    device = tensors[names[0]].device
+    flags = torch.stack([torch.stack([torch.isnan(t).any(), torch.isinf(t).any()]).to(device)
+                         for t in tensors.values()]).tolist()
+    for name, (has_nan, has_inf) in zip(names, flags):
+        if has_nan:
+            print(name + " has nan")
+        if has_inf:
+            print(name + " has inf")
+
+
+class TrainMetrics(object):
+    """
+    Running means of the scalar diagnostics of one train() call. Tensor values stay on the device they were
+    computed on until reduce(), which copies all of them to the host at once.
+    """
+
+    def __init__(self):
+        self._tensors = {}
+        self._floats = {}
+        self._counts = {}
+
+    def add(self, values):
+        """
+        Record the values of one update.
+        :param values: (dict) name -> scalar value (torch.Tensor / float). None values are not recorded.
+        """
+        for name, value in values.items():
+            if value is None:
+                continue
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if isinstance(value, torch.Tensor):
+                self._tensors.setdefault(name, []).append(value.detach().reshape(()))
+            else:
+                self._floats[name] = self._floats.get(name, 0.) + float(value)
+
+    def reduce(self):
+        """
+        :return means: (dict) name -> mean (float) of the value over the updates it was recorded in.
+        """
+        sums = dict(self._floats)
+        if self._tensors:
+            names = list(self._tensors)
+            device = self._tensors[names[0]][0].device
+            totals = torch.stack([torch.stack([v.to(device, torch.float64) for v in self._tensors[name]]).sum()
+                                  for name in names]).tolist()
+            for name, total in zip(names, totals):
+                sums[name] = sums.get(name, 0.) + total
+        return {name: sums[name] / count for name, count in self._counts.items()}
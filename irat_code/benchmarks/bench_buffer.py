@@ -0,0 +1,88 @@
+import numpy as np
+
+from irat_code.utils.shared_buffer_trsyn import SharedReplayBuffer
+from irat_code.benchmarks.common import measure, synthetic_args, synthetic_spaces
+
+
+def make_buffer(args):
+    obs_space, share_obs_space, act_space = synthetic_spaces(args.num_agents)
+    return SharedReplayBuffer(args, args.num_agents, obs_space, share_obs_space, share_obs_space, act_space)
+
+
+def random_step(buffer, rng):
+    """
+    Random data of one step of all rollout threads, in the shapes SharedReplayBuffer.insert takes.
+    :param buffer: (SharedReplayBuffer) buffer the data is inserted into.
+    :param rng: (np.random.RandomState) random number generator.
+
+    :return data: (list) positional arguments of buffer.insert.
+    """
+    def rand(x):
+        return rng.standard_normal(x.shape[1:]).astype(np.float32)
+
+    n_actions = buffer.idv_actions_dists.shape[-1]
+    probs = rng.dirichlet(np.ones(n_actions), size=buffer.idv_actions_dists.shape[1:3]).astype(np.float32)
+    actions = rng.randint(n_actions, size=buffer.actions.shape[1:]).astype(np.float32)
+    masks = (rng.uniform(size=buffer.masks.shape[1:]) > 0.02).astype(np.float32)
+    return [rand(buffer.idv_share_obs), rand(buffer.team_share_obs), rand(buffer.obs),
+            rand(buffer.idv_rnn_states), rand(buffer.team_rnn_states),
+            rand(buffer.idv_rnn_states_critic), rand(buffer.team_rnn_states_critic),
+            actions, probs, probs, np.log(probs.max(-1, keepdims=True)), np.log(probs.min(-1, keepdims=True)),
+            rand(buffer.idv_value_preds), rand(buffer.team_value_preds),
+            rand(buffer.idv_rewards), rand(buffer.team_rewards), masks]
+
+
+def fill(buffer, rng):
+    """Insert one episode of random data, the buffer is full afterwards."""
+    data = random_step(buffer, rng)
+    for _ in range(buffer.episode_length):
+        buffer.insert(*data)
+
+
+def bench_scale(results, scale, repeat, seed, include):
+    for recurrent in (False, True):
+        policy = "rnn" if recurrent else "mlp"
+        # --use_recurrent_policy is on by default and the flag turns it off
+        args = synthetic_args(scale, [] if recurrent else ["--use_recurrent_policy"], seed)
+        buffer = make_buffer(args)
+        rng = np.random.RandomState(seed)
+        params = dict(scale=scale, **{k: getattr(args, k) for k in ("n_rollout_threads", "episode_length",
+                                                                     "num_agents")})
+        env_steps = args.n_rollout_threads * args.episode_length
+
+        name = "buffer/insert/{}/{}".format(policy, scale)
+        if include(name):
+            results.add_time(name, measure(lambda: fill(buffer, rng), repeat), env_steps, **params)
+        else:
+            fill(buffer, rng)
+
+        if not recurrent:
+            next_values = [rng.standard_normal(buffer.idv_value_preds.shape[1:]).astype(np.float32)
+                           for _ in range(2)]
+            for use_torch_returns in (False, True):
+                name = "buffer/compute_returns/{}/{}".format("torch" if use_torch_returns else "numpy", scale)
+                if include(name):
+                    buffer._use_torch_returns = use_torch_returns
+                    results.add_latency(name, measure(lambda: buffer.compute_returns(*next_values), repeat),
+                                        **params)
+            buffer._use_torch_returns = args.use_torch_returns
+        buffer.compute_returns(*[rng.standard_normal(buffer.idv_value_preds.shape[1:]).astype(np.float32)
+                                 for _ in range(2)])
+
+        advantages = [buffer.idv_returns[:-1] - buffer.idv_value_preds[:-1],
+                      buffer.team_returns[:-1] - buffer.team_value_preds[:-1]]
+        if recurrent:
+            name = "buffer/recurrent_generator/{}".format(scale)
+            generator = lambda: buffer.recurrent_generator(*advantages, args.num_mini_batch, args.data_chunk_length)
+        else:
+            name = "buffer/feed_forward_generator/{}".format(scale)
+            generator = lambda: buffer.feed_forward_generator(*advantages, args.num_mini_batch)
+        if include(name):
+            # one ppo epoch of minibatches
+            results.add_latency(name, measure(lambda: list(generator()), repeat), num_mini_batch=args.num_mini_batch,
+                                **params)
+
+
+def run(results, scales, repeat, seed, include):
+    for scale in scales:
+        bench_scale(results, scale, repeat, seed, include)
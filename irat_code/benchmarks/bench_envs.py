@@ -0,0 +1,179 @@
+import numpy as np
+from gym import spaces
+
+from irat_code.config import get_config
+from irat_code.benchmarks.common import measure
+
+# (scenario, extra arguments), the arguments are the ones the scenarios are trained with
+MPE_SCENARIOS = [
+    ("simple_spread", []),
+    ("simple_adversary", []),
+    ("simple_crypto", []),
+    ("simple_tag", []),
+    ("simple_push", ["--num_agents", "2", "--num_adversaries", "1", "--num_landmarks", "2"]),
+    ("simple_speaker_listener", ["--num_agents", "2", "--num_landmarks", "3"]),
+    ("simple_spread_tr", ["--scenario_has_diff_rewards"]),
+    ("simple_spread_attach", ["--scenario_has_diff_rewards"]),
+    ("simple_spread_refine", ["--scenario_has_diff_rewards"]),
+    ("simple_spread_ctr", ["--num_agents", "4", "--num_landmarks", "2", "--scenario_has_diff_rewards"]),
+    ("simple_spread_ctrop", ["--num_agents", "4", "--num_landmarks", "2", "--scenario_has_diff_rewards"]),
+    ("simple_tag_tr", ["--num_good_agents", "2", "--num_agents", "5", "--num_adversaries", "5", "--num_landmarks", "2",
+                       "--agent_policy", "random", "--scenario_has_diff_rewards", "--sparse_reward"]),
+    ("simple_tag_trop", ["--num_good_agents", "2", "--num_agents", "5", "--num_adversaries", "5", "--num_landmarks",
+                         "2", "--agent_policy", "random", "--scenario_has_diff_rewards", "--sparse_reward"]),
+    ("simple_attach", ["--num_agents", "3", "--num_adversaries", "3", "--num_landmarks", "1",
+                       "--scenario_has_diff_rewards", "--sparse_reward"]),
+    ("simple_attach_trop", ["--num_agents", "3", "--num_adversaries", "3", "--num_landmarks", "1",
+                            "--scenario_has_diff_rewards", "--sparse_reward"]),
+]
+
+# scenarios the vectorized envs are measured on, both have a batched version for MPEBatchEnv
+VEC_SCENARIOS = ["simple_spread_tr", "simple_tag_tr"]
+
+
+def mpe_args(scenario, extra, seed=1):
+    from irat_code.scripts.train.train_mpe_trsyn import parse_args
+    args = ["--env_name", "MPE", "--scenario_name", scenario, "--num_agents", "3", "--seed", str(seed)]
+    return parse_args(args + list(extra), get_config())
+
+
+def random_actions(action_spaces, n_steps, rng, one_hot):
+    """
+    Draw the actions of every step up front, so that sampling them is not timed with the env.
+    :param action_spaces: (list) action space of every agent.
+    :param n_steps: (int) number of steps to draw actions for.
+    :param rng: (np.random.RandomState) random number generator.
+    :param one_hot: (bool) whether to encode discrete actions as one-hot vectors, like the MPE runners do.
+
+    :return actions: (list) list of the actions of all agents for every step.
+    """
+    per_agent = []
+    for space in action_spaces:
+        if isinstance(space, spaces.Discrete):
+            a = rng.randint(space.n, size=n_steps)
+            per_agent.append(np.eye(space.n, dtype=np.float32)[a] if one_hot else a)
+        elif isinstance(space, spaces.Box):
+            per_agent.append(rng.uniform(space.low, space.high, size=(n_steps, *space.shape)).astype(np.float32))
+        else:
+            # MultiDiscrete heads are one-hot encoded and concatenated
+            a = [np.eye(int(high - low + 1), dtype=np.float32)[rng.randint(int(high - low + 1), size=n_steps)]
+                 for low, high in zip(space.low, space.high)]
+            per_agent.append(np.concatenate(a, axis=-1))
+    return [[agent[t] for agent in per_agent] for t in range(n_steps)]
+
+
+def step_env(env, actions, is_done):
+    """Return a function stepping env through the actions, resetting it when is_done(dones) says so."""
+    env.reset()
+
+    def run():
+        for a in actions:
+            dones = env.step(a)[2]
+            if is_done(dones):
+                env.reset()
+    return run
+
+
+def bench_mpe(results, repeat, n_steps, seed, include):
+    from irat_code.envs.mpe.MPE_env import MPEEnv
+    for scenario, extra in MPE_SCENARIOS:
+        for array_world in (False, True):
+            name = "env/mpe/{}{}".format(scenario, "/array_world" if array_world else "")
+            if not include(name):
+                continue
+            args = mpe_args(scenario, extra + (["--use_array_world"] if array_world else []), seed)
+            env = MPEEnv(args)
+            env.seed(seed)
+            actions = random_actions(env.action_space, n_steps, np.random.RandomState(seed), one_hot=True)
+            samples = measure(step_env(env, actions, lambda d: np.all(d)), repeat)
+            results.add_time(name, samples, n_steps, num_agents=args.num_agents)
+            env.close()
+
+
+def make_sisl_envs():
+    """
+    Constructors of the SISL envs in the settings of their configs. Their modules are imported here, the SISL package
+    needs Box2D and the gym.monitoring module of old gym versions, which may be missing.
+    """
+    def multiwalker():
+        from irat_code.envs.sisl.walker.multi_walker import MultiWalkerEnv
+        return MultiWalkerEnv(n_walkers=3)
+
+    def pursuit():
+        from irat_code.envs.sisl.pursuit.pursuit_evade import PursuitEvade
+        return PursuitEvade(16, 16, n_pursuers=8, n_evaders=30, obs_range=7, n_catch=2)
+
+    def waterworld():
+        from irat_code.envs.sisl.pursuit.waterworld import MAWaterWorld
+        return MAWaterWorld(n_pursuers=5, n_evaders=5, n_coop=2, n_poison=10, max_cycles=500)
+
+    return [("MultiWalkerEnv", multiwalker), ("PursuitEvade", pursuit), ("MAWaterWorld", waterworld)]
+
+
+def bench_sisl(results, repeat, n_steps, seed, include):
+    for env_name, make_env in make_sisl_envs():
+        name = "env/sisl/" + env_name
+        if not include(name):
+            continue
+        try:
+            env = make_env()
+        except ImportError as e:
+            results.skip(name, "{}: {}".format(type(e).__name__, e))
+            continue
+        env.seed(seed)
+        actions = random_actions([agent.action_space for agent in env.agents], n_steps,
+                                 np.random.RandomState(seed), one_hot=False)
+        samples = measure(step_env(env, actions, lambda d: np.all(d)), repeat)
+        results.add_time(name, samples, n_steps, num_agents=len(env.agents))
+
+
+def make_vec_env(kind, args, n_envs):
+    from irat_code.envs.mpe.MPE_env import MPEEnv, MPEBatchEnv
+    from irat_code.envs.env_wrappers import DummyVecEnv, SubprocVecEnv, ShmSubprocVecEnv
+
+    def get_env_fn(rank):
+        def init_env():
+            env = MPEEnv(args)
+            env.seed(args.seed + rank * 1000)
+            return env
+        return init_env
+
+    env_fns = [get_env_fn(i) for i in range(n_envs)]
+    if kind == "dummy":
+        return DummyVecEnv(env_fns)
+    if kind == "subproc":
+        return SubprocVecEnv(env_fns)
+    if kind == "subproc_x4":
+        return SubprocVecEnv(env_fns, envs_per_worker=4)
+    if kind == "shm_subproc":
+        return ShmSubprocVecEnv(env_fns, info_keys=("individual_reward", "team_reward"))
+    if kind == "shm_subproc_x4":
+        return ShmSubprocVecEnv(env_fns, info_keys=("individual_reward", "team_reward"), envs_per_worker=4)
+    if kind == "batch":
+        return MPEBatchEnv(args, n_envs)
+    raise NotImplementedError(kind)
+
+
+def bench_vec_envs(results, repeat, n_steps, seed, include, n_envs=(8, 32)):
+    extras = dict(MPE_SCENARIOS)
+    for scenario in VEC_SCENARIOS:
+        args = mpe_args(scenario, extras[scenario], seed)
+        for n in n_envs:
+            for kind in ("dummy", "subproc", "subproc_x4", "shm_subproc", "shm_subproc_x4", "batch"):
+                name = "vec_env/{}/{}/n{}".format(scenario, kind, n)
+                if not include(name):
+                    continue
+                envs = make_vec_env(kind, args, n)
+                actions = random_actions(envs.action_space, n_steps, np.random.RandomState(seed), one_hot=True)
+                # the same actions in every env, stacked to (n_envs, num_agents, action_dim)
+                actions = [np.stack([np.stack(a)] * n) for a in actions]
+                # the vectorized envs reset the finished envs themselves
+                samples = measure(step_env(envs, actions, lambda d: False), repeat)
+                results.add_time(name, samples, n_steps * n, num_envs=n, num_agents=args.num_agents)
+                envs.close()
+
+
+def run(results, n_steps, repeat, seed, include):
+    bench_mpe(results, repeat, n_steps, seed, include)
+    bench_sisl(results, repeat, n_steps, seed, include)
+    bench_vec_envs(results, repeat, max(n_steps // 10, 25), seed, include)
@@ -0,0 +1,181 @@
+import numpy as np
+import torch
+
+from irat_code.algorithms.r_mappo.algorithm.rMAPPOPolicy import R_MAPPOPolicy
+from irat_code.algorithms.r_mappo.rmappo_trsyn import RMappoTrSyn
+from irat_code.algorithms.r_mappo.rmappo_trsyn_batched import RMappoTrSynBatched
+from irat_code.algorithms.utils.distributions import dists_to_params
+from irat_code.algorithms.utils.rnn import RNNLayer
+from irat_code.benchmarks.common import measure, synthetic_args, synthetic_spaces
+from irat_code.benchmarks.bench_buffer import make_buffer
+from irat_code.utils.separated_buffer_trsyn import SeparatedReplayBuffer
+
+
+def _t2n(x):
+    return x.detach().cpu().numpy()
+
+
+@torch.no_grad()
+def rollout(trainer, buffer, rng):
+    """
+    Fill the buffer with an episode of the policies of the trainer on random observations, like the collect of the
+    trsyn runners: the individual policy samples the actions, which are evaluated under the greedy team policy.
+    :param trainer: (RMappoTrSyn) trainer whose policies act.
+    :param buffer: (SharedReplayBuffer) buffer to fill.
+    :param rng: (np.random.RandomState) random number generator of the observations and rewards.
+    """
+    trainer.idv_prep_rollout()
+    trainer.team_prep_rollout()
+    n_threads, num_agents = buffer.obs.shape[1:3]
+
+    def flat(x):
+        return np.concatenate(x)
+
+    def split(x):
+        return _t2n(x).reshape(n_threads, num_agents, *x.shape[1:])
+
+    for step in range(buffer.episode_length):
+        values, actions, log_probs, rnn_states, rnn_states_critic, act_dists = trainer.idv_policy.get_actions(
+            flat(buffer.idv_share_obs[step]), flat(buffer.obs[step]), flat(buffer.idv_rnn_states[step]),
+            flat(buffer.idv_rnn_states_critic[step]), flat(buffer.masks[step]))
+        team_values, _, _, team_rnn, team_rnn_critic, team_act_dists = trainer.team_policy.get_actions(
+            flat(buffer.team_share_obs[step]), flat(buffer.obs[step]), flat(buffer.team_rnn_states[step]),
+            flat(buffer.team_rnn_states_critic[step]), flat(buffer.masks[step]), deterministic=True)
+        team_log_probs = trainer.team_policy.log_probs(team_act_dists, actions)
+
+        obs = rng.standard_normal(buffer.obs.shape[1:]).astype(np.float32)
+        share_obs = np.expand_dims(obs.reshape(n_threads, -1), 1).repeat(num_agents, axis=1)
+        rewards = rng.standard_normal(buffer.idv_rewards.shape[1:]).astype(np.float32)
+        buffer.insert(share_obs, share_obs, obs, split(rnn_states), split(team_rnn), split(rnn_states_critic),
+                      split(team_rnn_critic), split(actions), split(dists_to_params(act_dists)),
+                      split(dists_to_params(team_act_dists)), split(log_probs), split(team_log_probs), split(values),
+                      split(team_values), rewards, -rewards, np.ones_like(buffer.masks[0]))
+
+    next_values = [split(policy.get_values(flat(share_obs), flat(rnn_states_critic[-1]), flat(buffer.masks[-1])))
+                   for policy, share_obs, rnn_states_critic in (
+                       (trainer.idv_policy, buffer.idv_share_obs[-1], buffer.idv_rnn_states_critic),
+                       (trainer.team_policy, buffer.team_share_obs[-1], buffer.team_rnn_states_critic))]
+    buffer.compute_returns(*next_values, trainer.idv_value_normalizer, trainer.team_value_normalizer)
+
+
+def bench_scale(results, scale, repeat, seed, include):
+    for recurrent in (False, True):
+        name = "train/rmappotrsyn/{}/{}".format("rnn" if recurrent else "mlp", scale)
+        if not include(name):
+            continue
+        args = synthetic_args(scale, [] if recurrent else ["--use_recurrent_policy"], seed)
+        torch.manual_seed(seed)
+        obs_space, share_obs_space, act_space = synthetic_spaces(args.num_agents)
+        idv_policy = R_MAPPOPolicy(args, obs_space, share_obs_space, act_space)
+        team_policy = R_MAPPOPolicy(args, obs_space, share_obs_space, act_space)
+        trainer = RMappoTrSyn(args, idv_policy, team_policy)
+        buffer = make_buffer(args)
+        rollout(trainer, buffer, np.random.RandomState(seed))
+
+        def train():
+            trainer.idv_prep_training()
+            trainer.team_prep_training()
+            trainer.train(buffer, 0)
+
+        results.add_latency(name, measure(train, repeat), scale=scale, ppo_epoch=args.ppo_epoch,
+                            num_mini_batch=args.num_mini_batch,
+                            **{k: getattr(args, k) for k in ("n_rollout_threads", "episode_length", "num_agents")})
+
+
+def bench_rnn(results, scale, repeat, seed, include, reset_prob=0.05):
+    """
+    Forward and backward pass of the recurrent layer on the chunks of a minibatch, with random episode starts in
+    every sequence, split at the episode starts of any sequence or run as a masked scan.
+    """
+    args = synthetic_args(scale, seed=seed)
+    T = args.data_chunk_length
+    N = args.n_rollout_threads * args.episode_length * args.num_agents // T // args.num_mini_batch
+    rng = np.random.RandomState(seed)
+    x = torch.from_numpy(rng.standard_normal((T * N, args.hidden_size)).astype(np.float32)).requires_grad_()
+    hxs = torch.from_numpy(rng.standard_normal((N, args.recurrent_N, args.hidden_size)).astype(np.float32))
+    masks = torch.from_numpy((rng.uniform(size=(T * N, 1)) > reset_prob).astype(np.float32))
+    for masked_scan in (False, True):
+        name = "train/rnn/{}/{}".format("scan" if masked_scan else "segments", scale)
+        if not include(name):
+            continue
+        torch.manual_seed(seed)
+        layer = RNNLayer(args.hidden_size, args.hidden_size, args.recurrent_N, args.use_orthogonal, masked_scan)
+
+        def step():
+            out, h = layer(x, hxs, masks)
+            (out.sum() + h.sum()).backward()
+
+        results.add_latency(name, measure(step, repeat), scale=scale, chunk_length=T, n_chunks=N,
+                            reset_prob=reset_prob)
+
+
+def fill_separated_buffer(trainer, buffer, rng):
+    """
+    Fill the buffer of an agent with random data of an episode and compute its returns.
+    :param trainer: (RMappoTrSyn) trainer of the agent, whose value normalizers are updated.
+    :param buffer: (SeparatedReplayBuffer) buffer to fill.
+    :param rng: (np.random.RandomState) random number generator.
+    """
+    def rand(x):
+        return rng.standard_normal(x.shape[1:]).astype(np.float32)
+
+    for step in range(buffer.episode_length):
+        probs = rng.dirichlet(np.ones(buffer.idv_actions_dists.shape[-1]), size=buffer.n_rollout_threads)
+        probs = probs.astype(np.float32)
+        actions = rng.randint(probs.shape[-1], size=buffer.actions.shape[1:]).astype(np.float32)
+        masks = (rng.uniform(size=buffer.masks.shape[1:]) > 0.02).astype(np.float32)
+        buffer.insert(rand(buffer.idv_share_obs), rand(buffer.team_share_obs), rand(buffer.obs),
+                      rand(buffer.idv_rnn_states), rand(buffer.team_rnn_states),
+                      rand(buffer.idv_rnn_states_critic), rand(buffer.team_rnn_states_critic),
+                      actions, probs, probs, np.log(probs.max(-1, keepdims=True)),
+                      np.log(probs.min(-1, keepdims=True)), rand(buffer.idv_value_preds),
+                      rand(buffer.team_value_preds), rand(buffer.idv_rewards), rand(buffer.team_rewards), masks)
+    buffer.compute_returns(rand(buffer.idv_value_preds), rand(buffer.team_value_preds),
+                           trainer.idv_value_normalizer, trainer.team_value_normalizer)
+
+
+def bench_agents(results, scale, repeat, seed, include):
+    """
+    Training update of the separated policies of all agents, one agent after the other or with
+    RMappoTrSynBatched.
+    """
+    for recurrent in (False, True):
+        for batched in (False, True):
+            name = "train/agents/{}/{}/{}".format("batched" if batched else "loop", "rnn" if recurrent else "mlp",
+                                                  scale)
+            if not include(name):
+                continue
+            args = synthetic_args(scale, [] if recurrent else ["--use_recurrent_policy"], seed)
+            torch.manual_seed(seed)
+            rng = np.random.RandomState(seed)
+            obs_space, share_obs_space, act_space = synthetic_spaces(args.num_agents)
+            trainers, buffers = [], []
+            for _ in range(args.num_agents):
+                trainer = RMappoTrSyn(args, R_MAPPOPolicy(args, obs_space, share_obs_space, act_space),
+                                      R_MAPPOPolicy(args, obs_space, share_obs_space, act_space))
+                buffer = SeparatedReplayBuffer(args, obs_space, share_obs_space, share_obs_space, act_space)
+                fill_separated_buffer(trainer, buffer, rng)
+                trainers.append(trainer)
+                buffers.append(buffer)
+            batched_trainer = RMappoTrSynBatched(args, trainers) if batched else None
+
+            def train():
+                for trainer in trainers:
+                    trainer.idv_prep_training()
+                    trainer.team_prep_training()
+                if batched:
+                    batched_trainer.train(buffers, 0)
+                else:
+                    for trainer, buffer in zip(trainers, buffers):
+                        trainer.train(buffer, 0)
+
+            results.add_latency(name, measure(train, repeat), scale=scale, ppo_epoch=args.ppo_epoch,
+                                num_mini_batch=args.num_mini_batch,
+                                **{k: getattr(args, k) for k in ("n_rollout_threads", "episode_length", "num_agents")})
+
+
+def run(results, scales, repeat, seed, include):
+    for scale in scales:
+        bench_scale(results, scale, repeat, seed, include)
+        bench_rnn(results, scale, repeat, seed, include)
+        bench_agents(results, scale, repeat, seed, include)
@@ -0,0 +1,176 @@
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+from gym import spaces
+
+from irat_code.config import get_config
+
+# rollout sizes of the buffer and training benchmarks, the obs size grows with the agents like in simple_spread
+SCALES = {
+    "small": dict(n_rollout_threads=8, episode_length=25, num_agents=3),
+    "medium": dict(n_rollout_threads=32, episode_length=25, num_agents=5),
+    "large": dict(n_rollout_threads=64, episode_length=50, num_agents=8),
+}
+
+
+def machine_info():
+    """Describe the machine and the library versions the benchmarks ran with, to tell apart comparable runs."""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"host": socket.gethostname(), "platform": platform.platform(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count(), "torch_threads": torch.get_num_threads(),
+            "python": sys.version.split()[0], "numpy": np.__version__, "torch": torch.__version__,
+            "commit": commit, "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def synthetic_args(scale, extra=(), seed=1):
+    """
+    Arguments of an MPE training run of the given scale, for benchmarks on synthetic data.
+    :param scale: (str) key of SCALES.
+    :param extra: (list) further command line arguments.
+    :param seed: (int) random seed.
+
+    :return all_args: (argparse.Namespace) parsed arguments.
+    """
+    from irat_code.scripts.train.train_mpe_trsyn import parse_args
+    args = ["--env_name", "MPE", "--algorithm_name", "rmappotrsyn", "--seed", str(seed)]
+    for key, value in SCALES[scale].items():
+        args += ["--" + key, str(value)]
+    return parse_args(args + list(extra), get_config())
+
+
+def synthetic_spaces(num_agents, n_actions=5):
+    """
+    Spaces of an agent of a simple_spread like env with num_agents agents.
+
+    :return obs_space: (gym.spaces.Box) observation space of an agent.
+    :return share_obs_space: (gym.spaces.Box) centralized observation space.
+    :return act_space: (gym.spaces.Discrete) action space of an agent.
+    """
+    obs_dim = 6 * num_agents
+    obs_space = spaces.Box(low=-np.inf, high=np.inf, shape=(obs_dim,), dtype=np.float32)
+    share_obs_space = spaces.Box(low=-np.inf, high=np.inf, shape=(obs_dim * num_agents,), dtype=np.float32)
+    return obs_space, share_obs_space, spaces.Discrete(n_actions)
+
+
+def measure(fn, repeat=5, number=1, warmup=1):
+    """
+    Time a function.
+    :param fn: (callable) function to time, called without arguments.
+    :param repeat: (int) number of timed samples.
+    :param number: (int) calls of fn per sample.
+    :param warmup: (int) untimed calls of fn before the samples.
+
+    :return samples: (list) seconds per call of every sample.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+class BenchmarkResults(object):
+    """
+    Results of a benchmark run, one entry per benchmark name. Every entry keeps the median of its samples as value,
+    so that a single slow sample does not decide the comparison against a baseline.
+    """
+
+    def __init__(self, meta=None, results=None, skipped=None):
+        self.meta = machine_info() if meta is None else meta
+        self.results = {} if results is None else results
+        self.skipped = {} if skipped is None else skipped
+
+    def add_time(self, name, samples, work=1, unit="steps/s", **params):
+        """
+        Record a throughput from timed samples.
+        :param name: (str) name of the benchmark.
+        :param samples: (list) seconds per call, as returned by measure.
+        :param work: (int) amount of work done per call, e.g. the env steps of one call.
+        :param unit: (str) unit of work per second.
+        :param params: parameters of the benchmark, saved with the result.
+        """
+        rates = [work / s for s in samples]
+        self.results[name] = {"value": float(np.median(rates)), "unit": unit, "higher_is_better": True,
+                              "samples": [float(r) for r in rates], "params": params}
+        print("{:<60} {:>14.2f} {}".format(name, self.results[name]["value"], unit))
+
+    def add_latency(self, name, samples, **params):
+        """
+        Record the time per call from timed samples, in milliseconds.
+        :param name: (str) name of the benchmark.
+        :param samples: (list) seconds per call, as returned by measure.
+        :param params: parameters of the benchmark, saved with the result.
+        """
+        ms = [s * 1e3 for s in samples]
+        self.results[name] = {"value": float(np.median(ms)), "unit": "ms", "higher_is_better": False,
+                              "samples": [float(t) for t in ms], "params": params}
+        print("{:<60} {:>14.3f} ms".format(name, self.results[name]["value"]))
+
+    def skip(self, name, reason):
+        """
+        Record a benchmark that could not run, e.g. because an optional dependency of the env is missing.
+        :param name: (str) name of the benchmark.
+        :param reason: (str) why it was skipped.
+        """
+        self.skipped[name] = reason
+        print("{:<60} skipped: {}".format(name, reason))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"meta": self.meta, "results": self.results, "skipped": self.skipped}, f, indent=2,
+                      sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["meta"], data["results"], data.get("skipped", {}))
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Print the change of every benchmark against a baseline run.
+    :param baseline: (BenchmarkResults) results to compare against.
+    :param current: (BenchmarkResults) new results.
+    :param tolerance: (float) relative change that counts as a regression or an improvement, smaller changes are
+                      reported as noise.
+
+    :return regressions: (list) names of the benchmarks that got slower by more than the tolerance.
+    """
+    for key in ("commit", "host", "torch_threads"):
+        if baseline.meta.get(key) != current.meta.get(key):
+            print("note: {} differs, baseline {} vs current {}".format(key, baseline.meta.get(key),
+                                                                       current.meta.get(key)))
+    print("{:<60} {:>14} {:>14} {:>9}".format("benchmark", "baseline", "current", "speedup"))
+    regressions = []
+    for name in sorted(set(baseline.results) | set(current.results)):
+        if name not in current.results or name not in baseline.results:
+            print("{:<60} {}".format(name, "only in baseline" if name in baseline.results else "new"))
+            continue
+        old, new = baseline.results[name], current.results[name]
+        # speedup > 1 is always an improvement, whether the unit is a rate or a latency
+        speedup = new["value"] / old["value"] if new["higher_is_better"] else old["value"] / new["value"]
+        if speedup < 1. - tolerance:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif speedup > 1. + tolerance:
+            verdict = "improved"
+        else:
+            verdict = ""
+        print("{:<60} {:>14.3f} {:>14.3f} {:>8.2f}x {}".format(name, old["value"], new["value"], speedup, verdict))
+    return regressions
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import argparse
+import fnmatch
+import sys
+import warnings
+
+import numpy as np
+import torch
+
+from irat_code.benchmarks.common import SCALES, BenchmarkResults, compare
+
+"""
+Benchmarks of the envs, the replay buffer and the training update, on the cpu and without network access.
+
+    python -m irat_code.benchmarks.run_benchmarks --out base.json
+    python -m irat_code.benchmarks.run_benchmarks --baseline base.json --out new.json
+    python -m irat_code.benchmarks.run_benchmarks --results new.json --baseline base.json
+"""
+
+SUITES = ["envs", "buffer", "train"]
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="irat_code benchmarks", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--suites", type=str, nargs="+", default=SUITES, choices=SUITES,
+                        help="benchmark suites to run")
+    parser.add_argument("--scales", type=str, nargs="+", default=["small", "medium"], choices=list(SCALES),
+                        help="rollout sizes of the buffer and train suites")
+    parser.add_argument("--env_steps", type=int, default=200, help="env steps per sample of the envs suite")
+    parser.add_argument("--repeat", type=int, default=5, help="timed samples per benchmark, the median is reported")
+    parser.add_argument("--filter", type=str, default="*",
+                        help="only run the benchmarks whose name matches this glob pattern, e.g. 'env/mpe/*'")
+    parser.add_argument("--threads", type=int, default=1, help="number of torch threads")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the synthetic data")
+    parser.add_argument("--out", type=str, default=None, help="json file to save the results to")
+    parser.add_argument("--baseline", type=str, default=None, help="json file of results to compare against")
+    parser.add_argument("--results", type=str, default=None,
+                        help="compare these saved results against the baseline instead of running the benchmarks")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown against the baseline that counts as a regression")
+    return parser.parse_args(args)
+
+
+def main(args):
+    all_args = parse_args(args)
+
+    if all_args.results is not None:
+        results = BenchmarkResults.load(all_args.results)
+    else:
+        warnings.filterwarnings("ignore")
+        torch.set_num_threads(all_args.threads)
+        np.random.seed(all_args.seed)
+        torch.manual_seed(all_args.seed)
+
+        def include(name):
+            return fnmatch.fnmatch(name, all_args.filter)
+
+        results = BenchmarkResults()
+        results.meta["args"] = vars(all_args)
+        if "envs" in all_args.suites:
+            from irat_code.benchmarks import bench_envs
+            bench_envs.run(results, all_args.env_steps, all_args.repeat, all_args.seed, include)
+        if "buffer" in all_args.suites:
+            from irat_code.benchmarks import bench_buffer
+            bench_buffer.run(results, all_args.scales, all_args.repeat, all_args.seed, include)
+        if "train" in all_args.suites:
+            from irat_code.benchmarks import bench_train
+            bench_train.run(results, all_args.scales, all_args.repeat, all_args.seed, include)
+        if all_args.out is not None:
+            results.save(all_args.out)
+
+    if all_args.baseline is not None:
+        regressions = compare(BenchmarkResults.load(all_args.baseline), results, all_args.tolerance)
+        if regressions:
+            print("{} regression(s): {}".format(len(regressions), ", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -26,6 +26,14 @@ def get_config():
             number of parallel envs for evaluating rollout. by default 1
         --n_render_rollout_threads <int>
             number of parallel envs for rendering, could only be set as 1 for some environments.
+        --envs_per_worker <int>
+            number of envs stepped in a loop by each env subprocess. by default 1
+        --use_shared_memory_env
+            by default False. If set, training envs running in subprocesses write their results into shared memory
+            and only return the numeric infos the runners need.
+        --use_reward_array
+            by default False. If set, the MPE and SISL training envs return the individual and team rewards of a step
+            as a numeric (n_agents, 2) array instead of info dicts, and the vec envs stack these arrays.
         --num_env_steps <int>
             number of env steps to train (default: 10e6)
         --user_name <str>
@@ -74,6 +82,9 @@ def get_config():
             The number of recurrent layers ( default 1).
         --data_chunk_length <int>
             Time length of chunks used to train a recurrent_policy, default 10.
+        --use_masked_rnn_scan
+            by default False, split the chunks at the episode starts of any of them. If set, run them one step at a
+            time and reset every chunk at its own episode starts.
     
     Optimizer parameters:
         --lr <float>
@@ -108,6 +119,12 @@ def get_config():
             gae lambda parameter (default: 0.95)
         --use_proper_time_limits
             by default, the return value does consider limits of time. If set, compute returns with considering time limits factor.
+        --use_torch_returns
+            by default, compute returns with numpy. If set, compute returns with torch on the training device.
+        --use_device_buffer
+            by default, every minibatch is copied from the numpy buffer. If set, copy the buffer to the training device once per update and sample the minibatches there.
+        --use_batched_agents
+            by default, the separated policies of the agents are trained one after the other. If set, stack the networks of the agents and run their forward and backward passes as one batch. Warns and trains the agents one after the other with popart, change_reward or networks of different shapes, and warns for recurrent policies, which run one step at a time.
         --use_huber_loss
             by default, use huber loss. If set, do not use huber loss.
         --use_value_active_masks
@@ -128,8 +145,22 @@ def get_config():
     Save & Log parameters:
         --save_interval <int>
             time duration between contiunous twice models saving.
+        --checkpoint_keep <int>
+            number of the newest checkpoints kept in the models directory, 0 to keep all of them. (default: 3)
+        --use_async_checkpoint
+            by default True, the checkpoints are copied to the cpu and written from a background thread. If set, write them in the training loop.
         --log_interval <int>
             time duration between contiunous twice log printing.
+        --metrics_file_format <str>
+            "jsonl" or "csv" to also write the logged scalars to metrics.<format> in the log directory, "none" not to. (default: none)
+        --diagnostics_interval <int>
+            compute the clip and surrogate diagnostics of the trainer every this many ppo updates. (default: 1)
+        --use_phase_timer
+            by default False. If set, record the wall time of every phase of the training loop (env step, inference, insert, compute, train and the parts of a ppo update) and log it as timing/<phase> every log_interval episodes.
+        --profiler_start_episode <int>
+            first episode of a torch.profiler trace written to <run_dir>/profiler, -1 to not capture one. (default: -1)
+        --profiler_episodes <int>
+            number of episodes of the torch.profiler trace. (default: 1)
     
     Eval parameters:
         --use_eval
@@ -138,6 +169,10 @@ def get_config():
             time duration between contiunous twice evaluation progress.
         --eval_episodes <int>
             number of episodes of a single evaluation.
+        --use_async_eval
+            by default False. If set, the shared MPE runner sends snapshots of the actors to eval worker processes with their own eval envs instead of evaluating in the training loop.
+        --n_eval_workers <int>
+            number of eval worker processes of --use_async_eval. (default: 1)
     
     Render parameters:
         --save_gifs
@@ -172,6 +207,12 @@ def get_config():
                         help="Number of parallel envs for evaluating rollouts")
     parser.add_argument("--n_render_rollout_threads", type=int, default=1,
                         help="Number of parallel envs for rendering rollouts")
+    parser.add_argument("--envs_per_worker", type=int, default=1,
+                        help="Number of envs stepped by each env subprocess")
+    parser.add_argument("--use_shared_memory_env", action='store_true', default=False,
+                        help="Whether training envs in subprocesses return their results through shared memory")
+    parser.add_argument("--use_reward_array", action='store_true', default=False,
+                        help="Whether the MPE and SISL training envs return their rewards as arrays instead of infos")
     parser.add_argument("--num_env_steps", type=int, default=10e6,
                         help='Number of environment steps to train (default: 10e6)')
     parser.add_argument("--user_name", type=str, default='marl',help="[for wandb usage], to specify user's name for simply collecting training data.")
@@ -218,6 +259,8 @@ def get_config():
     parser.add_argument("--recurrent_N", type=int, default=1, help="The number of recurrent layers.")
     parser.add_argument("--data_chunk_length", type=int, default=10,
                         help="Time length of chunks used to train a recurrent_policy")
+    parser.add_argument("--use_masked_rnn_scan", action='store_true', default=False,
+                        help="Whether to run the chunks step by step with per-chunk resets instead of in segments")
 
     # optimizer parameters
     parser.add_argument("--lr", type=float, default=5e-4,
@@ -253,6 +296,12 @@ def get_config():
                         help='gae lambda parameter (default: 0.95)')
     parser.add_argument("--use_proper_time_limits", action='store_true',
                         default=False, help='compute returns taking into account time limits')
+    parser.add_argument("--use_torch_returns", action='store_true',
+                        default=False, help='compute returns with torch on the training device instead of numpy')
+    parser.add_argument("--use_device_buffer", action='store_true', default=False,
+                        help='copy the buffer to the training device once per update instead of once per minibatch')
+    parser.add_argument("--use_batched_agents", action='store_true', default=False,
+                        help='train the separated policies of all agents as one batched computation')
     parser.add_argument("--use_huber_loss", action='store_false', default=True, help="by default, use huber loss. If set, do not use huber loss.")
     parser.add_argument("--use_value_active_masks",
                         action='store_false', default=True, help="by default True, whether to mask useless data in value loss.")
@@ -265,14 +314,31 @@ def get_config():
                         default=False, help='use a linear schedule on the learning rate')
     # save parameters
     parser.add_argument("--save_interval", type=int, default=1, help="time duration between contiunous twice models saving.")
+    parser.add_argument("--checkpoint_keep", type=int, default=3,
+                        help="number of the newest checkpoints kept in the models directory, 0 to keep all of them.")
+    parser.add_argument("--use_async_checkpoint", action='store_false', default=True,
+                        help="by default True, write the checkpoints from a background thread. If set, write them in the training loop.")
 
     # log parameters
     parser.add_argument("--log_interval", type=int, default=5, help="time duration between contiunous twice log printing.")
+    parser.add_argument("--metrics_file_format", type=str, default="none", choices=["none", "jsonl", "csv"],
+                        help="also write the logged scalars to metrics.<format> in the log directory.")
+    parser.add_argument("--diagnostics_interval", type=int, default=1,
+                        help="compute the clip and surrogate diagnostics of the trainer every this many ppo updates.")
+    parser.add_argument("--use_phase_timer", action='store_true', default=False,
+                        help="record the wall time of every phase of the training loop and log it.")
+    parser.add_argument("--profiler_start_episode", type=int, default=-1,
+                        help="first episode of a torch.profiler trace, -1 to not capture one.")
+    parser.add_argument("--profiler_episodes", type=int, default=1,
+                        help="number of episodes of the torch.profiler trace.")
 
     # eval parameters
     parser.add_argument("--use_eval", action='store_true', default=False, help="by default, do not start evaluation. If set`, start evaluation alongside with training.")
     parser.add_argument("--eval_interval", type=int, default=25, help="time duration between contiunous twice evaluation progress.")
     parser.add_argument("--eval_episodes", type=int, default=32, help="number of episodes of a single evaluation.")
+    parser.add_argument("--use_async_eval", action='store_true', default=False,
+                        help="evaluate snapshots of the actors in worker processes instead of in the training loop.")
+    parser.add_argument("--n_eval_workers", type=int, default=1, help="number of eval worker processes.")
 
     # render parameters
     parser.add_argument("--save_gifs", action='store_true', default=False, help="by default, do not save render video. If set, save video.")
@@ -137,6 +137,132 @@ class ShareVecEnv(ABC):
         return self.viewer
 
 
+def groupworker(remote, parent_remote, env_fn_wrapper, auto_reset=True):
+    """
+    Worker owning a slice of envs: every command is applied to all of them in a loop and the results are sent
+    back as one batch (per-field stacked arrays, infos as a list unless the envs return them as arrays).
+    auto_reset: reset an env as soon as it is done, like worker / shareworker do (the choose workers do not).
+    """
+    parent_remote.close()
+    envs = [env_fn() for env_fn in env_fn_wrapper.x]
+
+    def stack(results):
+        if isinstance(results[0], tuple):
+            # infos are the 4th field of (ob, reward, done, info) and the 5th one of the share envs results
+            info_index = 3 if len(results[0]) == 4 else 4
+            return tuple(list(field) if i == info_index and not isinstance(field[0], np.ndarray) else np.stack(field)
+                         for i, field in enumerate(zip(*results)))
+        return np.stack(results)
+
+    while True:
+        cmd, data = remote.recv()
+        if cmd == 'step':
+            results = []
+            for env, action in zip(envs, data):
+                result = list(env.step(action))
+                done = result[-3] if len(result) == 6 else result[2]
+                if 'bool' in done.__class__.__name__:
+                    reset = done
+                else:
+                    reset = np.all(done)
+                if auto_reset and reset:
+                    if len(result) == 6:
+                        result[0], result[1], result[5] = env.reset()
+                    else:
+                        result[0] = env.reset()
+                results.append(tuple(result))
+            remote.send(stack(results))
+        elif cmd == 'reset':
+            if data is None:
+                remote.send(stack([env.reset() for env in envs]))
+            else:
+                remote.send(stack([env.reset(choose) for env, choose in zip(envs, data)]))
+        elif cmd == 'reset_task':
+            remote.send(np.stack([env.reset_task() for env in envs]))
+        elif cmd == 'render':
+            if data == "rgb_array":
+                remote.send(np.stack([env.render(mode=data) for env in envs]))
+            elif data == "human":
+                for env in envs:
+                    env.render(mode=data)
+        elif cmd == 'close':
+            for env in envs:
+                env.close()
+            remote.close()
+            break
+        elif cmd == 'get_spaces':
+            remote.send((envs[0].observation_space, envs[0].share_observation_space, envs[0].action_space))
+        else:
+            raise NotImplementedError
+
+
+class SubprocWorkers(object):
+    """
+    Process and pipe handling shared by the subprocess vec envs. With envs_per_worker > 1 every process runs a
+    slice of envs with groupworker and returns one batch per command, so the number of rollout threads can grow
+    past the number of cores without one process per env.
+    """
+
+    def _start_workers(self, env_fns, worker_fn, envs_per_worker=1, daemon=True, auto_reset=True, grouped=False,
+                       **kwargs):
+        """
+        grouped: worker_fn runs a slice of envs itself, it gets a list of env fns even with envs_per_worker == 1
+        kwargs: further keyword arguments of worker_fn
+        """
+        self.envs_per_worker = envs_per_worker
+        self.grouped = grouped or envs_per_worker > 1
+        if self.grouped:
+            env_fns = [env_fns[i:i + envs_per_worker] for i in range(0, len(env_fns), envs_per_worker)]
+        if not grouped and envs_per_worker > 1:
+            worker_fn = groupworker
+            kwargs = dict(kwargs, auto_reset=auto_reset)
+        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(len(env_fns))])
+        self.ps = [Process(target=worker_fn, args=(work_remote, remote, CloudpickleWrapper(env_fn)), kwargs=kwargs)
+                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
+        for p in self.ps:
+            p.daemon = daemon
+            p.start()
+        for remote in self.work_remotes:
+            remote.close()
+
+    def _send(self, cmd, data=None):
+        """Send the same command to every worker."""
+        for remote in self.remotes:
+            remote.send((cmd, data))
+
+    def _send_split(self, cmd, data):
+        """Send a command with per-env data (e.g. actions), every worker gets the entries of its envs."""
+        if self.grouped:
+            data = [data[i:i + self.envs_per_worker] for i in range(0, len(data), self.envs_per_worker)]
+        for remote, d in zip(self.remotes, data):
+            remote.send((cmd, d))
+
+    def _join(self, field):
+        if self.grouped:
+            return np.concatenate(field)
+        return np.stack(field)
+
+    def _recv(self, fields=1, info_index=None):
+        """
+        Receive the results of all workers and join them along the env dimension.
+        :param fields: (int) number of fields of a result, 1 if the workers send a single array.
+        :param info_index: (int) index of the infos field, which are returned as a tuple of per-env infos, or joined
+                           like the other fields if the envs return them as arrays.
+        """
+        results = [remote.recv() for remote in self.remotes]
+        if fields == 1:
+            return self._join(results)
+        joined = []
+        for i, field in enumerate(zip(*results)):
+            if i != info_index or isinstance(field[0], np.ndarray):
+                joined.append(self._join(field))
+            elif self.grouped:
+                joined.append(tuple(info for infos in field for info in infos))
+            else:
+                joined.append(field)
+        return tuple(joined)
+
+
 def worker(remote, parent_remote, env_fn_wrapper):
     parent_remote.close()
     env = env_fn_wrapper.x()
@@ -176,22 +302,16 @@ def worker(remote, parent_remote, env_fn_wrapper):
             raise NotImplementedError
 
 
-class GuardSubprocVecEnv(ShareVecEnv):
-    def __init__(self, env_fns, spaces=None):
+class GuardSubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of envs stepped in a loop by each subprocess
         """
         self.waiting = False
         self.closed = False
-        nenvs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = False  # could cause zombie process
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        # could cause zombie process
+        self._start_workers(env_fns, worker, envs_per_worker, daemon=False)
 
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv()
@@ -200,26 +320,21 @@ class GuardSubprocVecEnv(ShareVecEnv):
 
     def step_async(self, actions):
 
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        self._send_split('step', actions)
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        obs, rews, dones, infos = self._recv(fields=4, info_index=3)
         self.waiting = False
-        obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        return obs, rews, dones, infos
 
     def reset(self):
-        for remote in self.remotes:
-            remote.send(('reset', None))
-        obs = [remote.recv() for remote in self.remotes]
-        return np.stack(obs)
+        self._send('reset')
+        return self._recv()
 
     def reset_task(self):
-        for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        self._send('reset_task')
+        return self._recv()
 
     def close(self):
         if self.closed:
@@ -234,22 +349,16 @@ class GuardSubprocVecEnv(ShareVecEnv):
         self.closed = True
 
 
-class SubprocVecEnv(ShareVecEnv):
-    def __init__(self, env_fns, spaces=None):
+class SubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of envs stepped in a loop by each subprocess
         """
         self.waiting = False
         self.closed = False
-        nenvs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = True  # if the main process crashes, we should not cause things to hang
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        # if the main process crashes, we should not cause things to hang
+        self._start_workers(env_fns, worker, envs_per_worker, daemon=True)
 
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv()
@@ -257,27 +366,22 @@ class SubprocVecEnv(ShareVecEnv):
                              share_observation_space, action_space)
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        self._send_split('step', actions)
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        obs, rews, dones, infos = self._recv(fields=4, info_index=3)
         self.waiting = False
-        obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        return obs, rews, dones, infos
 
     def reset(self):
-        for remote in self.remotes:
-            remote.send(('reset', None))
-        obs = [remote.recv() for remote in self.remotes]
-        return np.stack(obs)
+        self._send('reset')
+        return self._recv()
 
 
     def reset_task(self):
-        for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        self._send('reset_task')
+        return self._recv()
 
     def close(self):
         if self.closed:
@@ -292,11 +396,9 @@ class SubprocVecEnv(ShareVecEnv):
         self.closed = True
 
     def render(self, mode="rgb_array"):
-        for remote in self.remotes:
-            remote.send(('render', mode))
-        if mode == "rgb_array":   
-            frame = [remote.recv() for remote in self.remotes]
-            return np.stack(frame) 
+        self._send('render', mode)
+        if mode == "rgb_array":
+            return self._recv()
 
 
 def shareworker(remote, parent_remote, env_fn_wrapper):
@@ -340,22 +442,16 @@ def shareworker(remote, parent_remote, env_fn_wrapper):
             raise NotImplementedError
 
 
-class ShareSubprocVecEnv(ShareVecEnv):
-    def __init__(self, env_fns, spaces=None):
+class ShareSubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of envs stepped in a loop by each subprocess
         """
         self.waiting = False
         self.closed = False
-        nenvs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=shareworker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = True  # if the main process crashes, we should not cause things to hang
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        # if the main process crashes, we should not cause things to hang
+        self._start_workers(env_fns, shareworker, envs_per_worker, daemon=True)
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv(
         )
@@ -363,27 +459,213 @@ class ShareSubprocVecEnv(ShareVecEnv):
                              share_observation_space, action_space)
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        self._send_split('step', actions)
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        obs, share_obs, rews, dones, infos, available_actions = self._recv(fields=6, info_index=4)
         self.waiting = False
-        obs, share_obs, rews, dones, infos, available_actions = zip(*results)
-        return np.stack(obs), np.stack(share_obs), np.stack(rews), np.stack(dones), infos, np.stack(available_actions)
+        return obs, share_obs, rews, dones, infos, available_actions
 
     def reset(self):
+        self._send('reset')
+        return self._recv(fields=3)
+
+    def reset_task(self):
+        self._send('reset_task')
+        return self._recv()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for p in self.ps:
+            p.join()
+        self.closed = True
+
+
+def _shm_layout(num_envs, observation_space, share_observation_space, action_space, share=False):
+    """Shapes and dtypes of the per-step results written into shared memory, one row per env."""
+    def shape(space):
+        # starcraft spaces are plain [dim] lists
+        return tuple(getattr(space, 'shape', space))
+
+    num_agents = len(observation_space)
+    layout = {'obs': ((num_envs, num_agents) + shape(observation_space[0]), np.float32),
+              'rews': ((num_envs, num_agents, 1), np.float32),
+              'dones': ((num_envs, num_agents), np.bool_)}
+    if share:
+        layout['share_obs'] = ((num_envs, num_agents) + shape(share_observation_space[0]), np.float32)
+        layout['available_actions'] = ((num_envs, num_agents, action_space[0].n), np.float32)
+    return layout
+
+
+def _attach_shm(layout, names):
+    """Map the shared memory blocks of a layout to numpy arrays."""
+    from multiprocessing import shared_memory
+    blocks, arrays = {}, {}
+    for key, (shape, dtype) in layout.items():
+        # the worker registers the block with the resource tracker of the parent, which unlinks it once
+        blocks[key] = shared_memory.SharedMemory(name=names[key])
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=blocks[key].buf)
+    return blocks, arrays
+
+
+def shmworker(remote, parent_remote, env_fn_wrapper, share=False):
+    """
+    Same commands as groupworker, but the step and reset results of its slice of envs are written into their rows
+    of the shared memory arrays (from the row `start` sent with 'attach' on), and only an acknowledgement (or the
+    infos) is sent back through the pipe.
+    """
+    parent_remote.close()
+    envs = [env_fn() for env_fn in env_fn_wrapper.x]
+    blocks, arrays, info_keys, start = None, None, None, None
+
+    def write(index, ob, s_ob=None, available_actions=None):
+        arrays['obs'][index] = ob
+        if share:
+            arrays['share_obs'][index] = s_ob
+            arrays['available_actions'][index] = available_actions
+
+    while True:
+        cmd, data = remote.recv()
+        if cmd == 'step':
+            infos = []
+            for index, (env, action) in enumerate(zip(envs, data), start):
+                if share:
+                    ob, s_ob, reward, done, info, available_actions = env.step(action)
+                else:
+                    ob, reward, done, info = env.step(action)
+                    s_ob, available_actions = None, None
+                # the step results are written before resetting, ob / s_ob / available_actions afterwards
+                arrays['rews'][index] = reward
+                arrays['dones'][index] = done
+                if 'bool' in done.__class__.__name__:
+                    reset = done
+                else:
+                    reset = np.all(done)
+                if reset:
+                    if share:
+                        ob, s_ob, available_actions = env.reset()
+                    else:
+                        ob = env.reset()
+                write(index, ob, s_ob, available_actions)
+                if info_keys is None:
+                    infos.append(info)
+                elif isinstance(info, np.ndarray):
+                    # the env already returns its infos as the numeric fields
+                    arrays['infos'][index] = info
+                else:
+                    # infos are summarized into fixed numeric fields
+                    arrays['infos'][index] = [[agent_info.get(key, 0) for key in info_keys] for agent_info in info]
+            remote.send(infos if info_keys is None else None)
+        elif cmd == 'reset':
+            for index, env in enumerate(envs, start):
+                if share:
+                    write(index, *env.reset())
+                else:
+                    write(index, env.reset())
+            remote.send(None)
+        elif cmd == 'attach':
+            layout, names, info_keys, start = data
+            blocks, arrays = _attach_shm(layout, names)
+            remote.send(None)
+        elif cmd == 'render':
+            if data == "rgb_array":
+                remote.send(np.stack([env.render(mode=data) for env in envs]))
+            elif data == "human":
+                for env in envs:
+                    env.render(mode=data)
+        elif cmd == 'close':
+            for env in envs:
+                env.close()
+            if blocks is not None:
+                arrays = None
+                for block in blocks.values():
+                    block.close()
+            remote.close()
+            break
+        elif cmd == 'get_spaces':
+            remote.send((envs[0].observation_space, envs[0].share_observation_space, envs[0].action_space))
+        else:
+            raise NotImplementedError
+
+
+class ShmSubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    """
+    SubprocVecEnv variant where the workers write their results into preallocated shared memory arrays
+    instead of pickling them through the pipes, so step_wait needs neither unpickling nor np.stack.
+    """
+    share = False
+
+    def __init__(self, env_fns, info_keys=None, info_arrays=False, envs_per_worker=1):
+        """
+        envs: list of gym environments to run in subprocesses
+        info_keys: if not None, infos are only returned as these numeric fields (0 where an agent info misses them)
+        info_arrays: return the infos as a (nenvs, n_agents, len(info_keys)) array instead of dicts, info_keys
+            defaults to the individual and team rewards, the column order of envs returning their infos as arrays
+        envs_per_worker: number of envs stepped in a loop by each subprocess
+        """
+        from multiprocessing import shared_memory, resource_tracker
+        self.waiting = False
+        self.closed = False
+        if info_arrays and info_keys is None:
+            info_keys = ('individual_reward', 'team_reward')
+        self.info_keys = None if info_keys is None else tuple(info_keys)
+        self.info_arrays = info_arrays
+        nenvs = len(env_fns)
+        # the workers have to share the resource tracker of this process, a tracker of their own would unlink the
+        # blocks when they exit
+        resource_tracker.ensure_running()
+        self._start_workers(env_fns, shmworker, envs_per_worker, daemon=True, grouped=True, share=self.share)
+
+        self.remotes[0].send(('get_spaces', None))
+        observation_space, share_observation_space, action_space = self.remotes[0].recv()
+        ShareVecEnv.__init__(self, len(env_fns), observation_space,
+                             share_observation_space, action_space)
+
+        # allocate the shared arrays and let every worker map them
+        layout = _shm_layout(nenvs, observation_space, share_observation_space, action_space, self.share)
+        if self.info_keys is not None:
+            layout['infos'] = ((nenvs, len(observation_space), len(self.info_keys)), np.float64)
+        self.blocks = {key: shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) *
+                                                                             np.dtype(dtype).itemsize, 1))
+                       for key, (shape, dtype) in layout.items()}
+        self.arrays = {key: np.ndarray(shape, dtype=dtype, buffer=self.blocks[key].buf)
+                       for key, (shape, dtype) in layout.items()}
+        names = {key: block.name for key, block in self.blocks.items()}
+        for i, remote in enumerate(self.remotes):
+            remote.send(('attach', (layout, names, self.info_keys, i * envs_per_worker)))
         for remote in self.remotes:
-            remote.send(('reset', None))
+            remote.recv()
+
+    def step_async(self, actions):
+        self._send_split('step', actions)
+        self.waiting = True
+
+    def _infos(self, results):
+        if self.info_keys is None:
+            return tuple(info for infos in results for info in infos)
+        if self.info_arrays:
+            return self.arrays['infos'].copy()
+        return [[dict(zip(self.info_keys, agent_info)) for agent_info in env_info]
+                for env_info in self.arrays['infos'].tolist()]
+
+    def step_wait(self):
         results = [remote.recv() for remote in self.remotes]
-        obs, share_obs, available_actions = zip(*results)
-        return np.stack(obs), np.stack(share_obs), np.stack(available_actions)
+        self.waiting = False
+        return self.arrays['obs'].copy(), self.arrays['rews'].copy(), self.arrays['dones'].copy(), \
+            self._infos(results)
 
-    def reset_task(self):
+    def reset(self):
+        self._send('reset')
         for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+            remote.recv()
+        return self.arrays['obs'].copy()
 
     def close(self):
         if self.closed:
@@ -395,6 +677,81 @@ class ShareSubprocVecEnv(ShareVecEnv):
             remote.send(('close', None))
         for p in self.ps:
             p.join()
+        self.arrays = None
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.closed = True
+
+    def render(self, mode="rgb_array"):
+        self._send('render', mode)
+        if mode == "rgb_array":
+            return self._recv()
+
+
+class ShareShmSubprocVecEnv(ShmSubprocVecEnv):
+    """ShareSubprocVecEnv variant writing obs, share_obs, rewards, dones and available_actions into shared memory."""
+    share = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        return self.arrays['obs'].copy(), self.arrays['share_obs'].copy(), self.arrays['rews'].copy(), \
+            self.arrays['dones'].copy(), self._infos(results), self.arrays['available_actions'].copy()
+
+    def reset(self):
+        self._send('reset')
+        for remote in self.remotes:
+            remote.recv()
+        return self.arrays['obs'].copy(), self.arrays['share_obs'].copy(), self.arrays['available_actions'].copy()
+
+
+class SplitVecEnv(ShareVecEnv):
+    """
+    Vec env made of several vec envs (parts) along the env dimension. It steps like a single vec env, but the parts
+    can also be stepped on their own through venvs, e.g. to run the policy on one part while the others step.
+    """
+
+    def __init__(self, venvs):
+        """
+        venvs: list of vec envs of the same environment, the envs of venvs[i] take the rows slices[i]
+        """
+        self.venvs = venvs
+        self.slices = []
+        start = 0
+        for venv in venvs:
+            self.slices.append(slice(start, start + venv.num_envs))
+            start += venv.num_envs
+        ShareVecEnv.__init__(self, start, venvs[0].observation_space,
+                             venvs[0].share_observation_space, venvs[0].action_space)
+
+    @staticmethod
+    def _concat(results):
+        def concat(field):
+            if isinstance(field[0], np.ndarray):
+                return np.concatenate(field)
+            # infos
+            return tuple(info for infos in field for info in infos)
+
+        if isinstance(results[0], tuple):
+            return tuple(concat(field) for field in zip(*results))
+        return concat(results)
+
+    def step_async(self, actions):
+        for venv, threads in zip(self.venvs, self.slices):
+            venv.step_async(actions[threads])
+
+    def step_wait(self):
+        return self._concat([venv.step_wait() for venv in self.venvs])
+
+    def reset(self):
+        return self._concat([venv.reset() for venv in self.venvs])
+
+    def close(self):
+        if self.closed:
+            return
+        for venv in self.venvs:
+            venv.close()
         self.closed = True
 
 
@@ -429,55 +786,42 @@ def choosesimpleworker(remote, parent_remote, env_fn_wrapper):
             raise NotImplementedError
 
 
-class ChooseSimpleSubprocVecEnv(ShareVecEnv):
-    def __init__(self, env_fns, spaces=None):
+class ChooseSimpleSubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of envs stepped in a loop by each subprocess
         """
         self.waiting = False
         self.closed = False
-        nenvs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=choosesimpleworker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = True  # if the main process crashes, we should not cause things to hang
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        # if the main process crashes, we should not cause things to hang
+        self._start_workers(env_fns, choosesimpleworker, envs_per_worker, daemon=True, auto_reset=False)
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv()
         ShareVecEnv.__init__(self, len(env_fns), observation_space,
                              share_observation_space, action_space)
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        self._send_split('step', actions)
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        obs, rews, dones, infos = self._recv(fields=4, info_index=3)
         self.waiting = False
-        obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        return obs, rews, dones, infos
 
     def reset(self, reset_choose):
-        for remote, choose in zip(self.remotes, reset_choose):
-            remote.send(('reset', choose))
-        obs = [remote.recv() for remote in self.remotes]
-        return np.stack(obs)
+        self._send_split('reset', reset_choose)
+        return self._recv()
 
     def render(self, mode="rgb_array"):
-        for remote in self.remotes:
-            remote.send(('render', mode))
-        if mode == "rgb_array":   
-            frame = [remote.recv() for remote in self.remotes]
-            return np.stack(frame)
+        self._send('render', mode)
+        if mode == "rgb_array":
+            return self._recv()
 
     def reset_task(self):
-        for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        self._send('reset_task')
+        return self._recv()
 
     def close(self):
         if self.closed:
@@ -519,22 +863,16 @@ def chooseworker(remote, parent_remote, env_fn_wrapper):
             raise NotImplementedError
 
 
-class ChooseSubprocVecEnv(ShareVecEnv):
-    def __init__(self, env_fns, spaces=None):
+class ChooseSubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of envs stepped in a loop by each subprocess
         """
         self.waiting = False
         self.closed = False
-        nenvs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=chooseworker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = True  # if the main process crashes, we should not cause things to hang
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        # if the main process crashes, we should not cause things to hang
+        self._start_workers(env_fns, chooseworker, envs_per_worker, daemon=True, auto_reset=False)
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv(
         )
@@ -542,27 +880,21 @@ class ChooseSubprocVecEnv(ShareVecEnv):
                              share_observation_space, action_space)
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        self._send_split('step', actions)
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        obs, share_obs, rews, dones, infos, available_actions = self._recv(fields=6, info_index=4)
         self.waiting = False
-        obs, share_obs, rews, dones, infos, available_actions = zip(*results)
-        return np.stack(obs), np.stack(share_obs), np.stack(rews), np.stack(dones), infos, np.stack(available_actions)
+        return obs, share_obs, rews, dones, infos, available_actions
 
     def reset(self, reset_choose):
-        for remote, choose in zip(self.remotes, reset_choose):
-            remote.send(('reset', choose))
-        results = [remote.recv() for remote in self.remotes]
-        obs, share_obs, available_actions = zip(*results)
-        return np.stack(obs), np.stack(share_obs), np.stack(available_actions)
+        self._send_split('reset', reset_choose)
+        return self._recv(fields=3)
 
     def reset_task(self):
-        for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        self._send('reset_task')
+        return self._recv()
 
     def close(self):
         if self.closed:
@@ -602,22 +934,16 @@ def chooseguardworker(remote, parent_remote, env_fn_wrapper):
             raise NotImplementedError
 
 
-class ChooseGuardSubprocVecEnv(ShareVecEnv):
-    def __init__(self, env_fns, spaces=None):
+class ChooseGuardSubprocVecEnv(SubprocWorkers, ShareVecEnv):
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of envs stepped in a loop by each subprocess
         """
         self.waiting = False
         self.closed = False
-        nenvs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=chooseguardworker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = False  # if the main process crashes, we should not cause things to hang
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        # if the main process crashes, we should not cause things to hang
+        self._start_workers(env_fns, chooseguardworker, envs_per_worker, daemon=False, auto_reset=False)
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv(
         )
@@ -625,26 +951,21 @@ class ChooseGuardSubprocVecEnv(ShareVecEnv):
                              share_observation_space, action_space)
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        self._send_split('step', actions)
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        obs, rews, dones, infos = self._recv(fields=4, info_index=3)
         self.waiting = False
-        obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        return obs, rews, dones, infos
 
     def reset(self, reset_choose):
-        for remote, choose in zip(self.remotes, reset_choose):
-            remote.send(('reset', choose))
-        obs = [remote.recv() for remote in self.remotes]
-        return np.stack(obs)
+        self._send_split('reset', reset_choose)
+        return self._recv()
 
     def reset_task(self):
-        for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        self._send('reset_task')
+        return self._recv()
 
     def close(self):
         if self.closed:
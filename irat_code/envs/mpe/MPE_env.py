@@ -1,8 +1,10 @@
 from .environment import MultiAgentEnv
+from .core import ArrayWorld
+from .batch_environment import MultiAgentBatchEnv
 from .scenarios import load
 
 
-def MPEEnv(args):
+def MPEEnv(args, info_dicts=True):
     '''
     Creates a MultiAgentEnv object as env. This can be used similar to a gym
     environment by calling env.reset() and env.step().
@@ -18,12 +20,20 @@ def MPEEnv(args):
         .observation_space  :   Returns the observation space for each agent
         .action_space       :   Returns the action space for each agent
         .n                  :   Returns the number of Agents
+
+    With info_dicts=False the infos of a step are a (n, 2) array of the individual and team rewards of the agents.
     '''
 
     # load scenario from script
     scenario = load(args.scenario_name + ".py").Scenario()
     # create world
     world = scenario.make_world(args)
+    if getattr(args, "use_array_world", False):
+        world = ArrayWorld.from_world(world)
+    return _make_env(scenario, world, args, info_dicts)
+
+
+def _make_env(scenario, world, args, info_dicts=True):
     if args.use_partial_obs:
         obs_callback = scenario.partial_observation
     else:
@@ -39,11 +49,29 @@ def MPEEnv(args):
                             scenario.individual_reward, obs_callback, scenario.info,
                             team_reward_callback=scenario.team_reward, sparse_reward=args.sparse_reward,
                             reward_shaping=args.reward_shaping, discrete_action=args.discrete_action,
-                            done_callback=done_call)
+                            done_callback=done_call, info_dicts=info_dicts)
     else:
         env = MultiAgentEnv(world, scenario.reset_world,
                             scenario.reward, obs_callback, scenario.info,
                             discrete_action=args.discrete_action,
-                            done_callback=done_call)
+                            done_callback=done_call, info_dicts=info_dicts)
 
     return env
+
+
+def MPEBatchEnv(args, num_worlds, info_dicts=True):
+    '''
+    Creates a MultiAgentBatchEnv object stepping num_worlds worlds of the scenario at once in this process.
+    It can be used like the vectorized envs of env_wrappers, the scenario has to provide the batched callbacks
+    (make_batch_world, reset_batch_world, batch_observation, batch_reward, ...).
+    '''
+    scenario = load(args.scenario_name + ".py").Scenario()
+    if not hasattr(scenario, 'make_batch_world'):
+        raise NotImplementedError("scenario %s has no batched version" % args.scenario_name)
+    if hasattr(scenario, 'done_callback'):
+        raise NotImplementedError("batched MPE envs do not support done callbacks")
+
+    # a single env of the scenario provides the spaces
+    env = _make_env(scenario, scenario.make_world(args), args)
+    world = scenario.make_batch_world(args, num_worlds)
+    return MultiAgentBatchEnv(scenario, world, env, use_partial_obs=args.use_partial_obs, info_dicts=info_dicts)
@@ -0,0 +1,114 @@
+import numpy as np
+from irat_code.envs.env_wrappers import ShareVecEnv
+
+
+# vectorized environment stepping a batch of K worlds of one scenario in a single process
+# the scenario has to provide the batched callbacks (make_batch_world, reset_batch_world, batch_observation, ...)
+class MultiAgentBatchEnv(ShareVecEnv):
+    def __init__(self, scenario, world, env, use_partial_obs=False, info_dicts=True):
+        """
+        :param scenario: (BaseScenario) scenario providing the batched callbacks.
+        :param world: (BatchWorld) batch of worlds built by scenario.make_batch_world.
+        :param env: (MultiAgentEnv) single environment of the scenario, only used for its spaces and reward settings.
+        :param use_partial_obs: (bool) whether agents use the partial observation of the scenario.
+        :param info_dicts: (bool) whether the infos are dicts like in MultiAgentEnv, or a (K, n, 2) array of the
+                           individual and team rewards of the agents.
+        """
+        self.scenario = scenario
+        self.world = world
+        self.n = len(world.policy_agents)
+        self.world_length = world.world_length
+        self.current_step = np.zeros(world.num_worlds, dtype=np.int64)
+
+        # individual and team rewards are combined like in MultiAgentEnv
+        self.scenario_has_diff_rewards = env.team_reward_callback is not None
+        self.sparse_reward = env.sparse_reward
+        self.reward_shaping = env.reward_shaping
+        self.shared_reward = env.shared_reward
+        self.info_dicts = info_dicts
+        if use_partial_obs:
+            self.observation_callback = scenario.batch_partial_observation
+        else:
+            self.observation_callback = scenario.batch_observation
+
+        if any(not agent.silent for agent in world.policy_agents):
+            raise NotImplementedError("batched MPE envs only support silent agents")
+        self.discrete_action_space = env.discrete_action_space
+        self.force_discrete_action = env.force_discrete_action
+        # sensitivity of the physical action of every policy agent
+        self.sensitivity = np.array([5.0 if agent.accel is None else agent.accel for agent in world.policy_agents])
+
+        ShareVecEnv.__init__(self, world.num_worlds, env.observation_space,
+                             env.share_observation_space, env.action_space)
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        self.current_step += 1
+        # set action for each agent
+        actions = np.asarray(self.actions, dtype=np.float64)
+        if self.discrete_action_space:
+            u = np.stack([actions[..., 1] - actions[..., 2], actions[..., 3] - actions[..., 4]], -1)
+        else:
+            u = actions[..., :self.world.dim_p].copy()
+            if self.force_discrete_action:
+                u = np.eye(self.world.dim_p)[np.argmax(u, -1)]
+        self.world.action_u[:, self.world.policy_idx] = u * self.sensitivity[:, None]
+        self.actions = None
+
+        # advance world state
+        self.world.step()
+
+        # record observation and rewards for each agent
+        obs = self.observation_callback(self.world)
+        if self.scenario_has_diff_rewards:
+            idv_rew = self.scenario.batch_individual_reward(self.world)
+            team_rew = self.scenario.batch_team_reward(self.world, self.sparse_reward)
+        else:
+            idv_rew = self.scenario.batch_reward(self.world)
+            team_rew = np.sum(idv_rew, axis=1)
+
+        rewards = idv_rew
+        if self.shared_reward:
+            rewards = np.repeat(team_rew[:, None], self.n, axis=1)
+        if self.reward_shaping:
+            rewards = team_rew[:, None] + rewards
+
+        infos = self._get_infos(idv_rew, team_rew)
+
+        # all agents of a world are done together once the episode reaches its length
+        dones = np.repeat((self.current_step >= self.world_length)[:, None], self.n, axis=1)
+        done_worlds = np.flatnonzero(np.all(dones, axis=1))
+        if len(done_worlds) > 0:
+            obs[done_worlds] = self._reset_worlds(done_worlds)[done_worlds]
+
+        return obs, rewards[..., None], dones, infos
+
+    def _get_infos(self, idv_rew, team_rew):
+        if not self.info_dicts:
+            return np.stack([idv_rew, np.broadcast_to(team_rew[:, None], idv_rew.shape)], -1).astype(np.float64)
+        idv_rew = idv_rew.tolist()
+        team_rew = team_rew.tolist()
+        infos = [[{'individual_reward': irw, 'team_reward': trw} for irw in irws]
+                 for irws, trw in zip(idv_rew, team_rew)]
+        if hasattr(self.scenario, 'batch_catch_infos'):
+            catch_infos = self.scenario.batch_catch_infos(self.world).tolist()
+            for world_infos, world_catch_infos in zip(infos, catch_infos):
+                for info, catch_info in zip(world_infos, world_catch_infos):
+                    info['catch_infos'] = catch_info
+        return infos
+
+    def _reset_worlds(self, index):
+        self.scenario.reset_batch_world(self.world, index)
+        self.current_step[index] = 0
+        return self.observation_callback(self.world)
+
+    def reset(self):
+        return self._reset_worlds(np.arange(self.num_envs))
+
+    def close(self):
+        self.closed = True
+
+    def render(self, mode="human"):
+        raise NotImplementedError("batched MPE envs can not be rendered")
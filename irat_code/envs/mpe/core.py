@@ -129,10 +129,12 @@ class World(object):
         # contact response parameters
         self.contact_force = 1e+2
         self.contact_margin = 1e-3
-        # cache distances between all agents (not calculated by default)
+        # cache distances between all entities after every step (not calculated by default), scenarios that read
+        # them in their reward, observation and info functions turn it on, see calculate_distances
         self.cache_dists = False
         self.cached_dist_vect = None
         self.cached_dist_mag = None
+        self.cached_collisions = None
         # zoe 20200420
         self.world_length = 25
         self.world_step = 0
@@ -154,31 +156,18 @@ class World(object):
     def scripted_agents(self):
         return [agent for agent in self.agents if agent.action_callback is not None]
 
+    # distances between all entities (agents first, then landmarks) at their current positions:
+    # cached_dist_vect[a, b] is the position of a relative to b, cached_dist_mag[a, b] their distance and
+    # cached_collisions[a, b] whether it is smaller than the sum of their sizes, like in the is_collision functions of
+    # the scenarios (an entity collides with itself)
     def calculate_distances(self):
-        if self.cached_dist_vect is None:
-            # initialize distance data structure
-            self.cached_dist_vect = np.zeros((len(self.entities),
-                                              len(self.entities),
-                                              self.dim_p))
-            # calculate minimum distance for a collision between all entities （size相加�?
-            self.min_dists = np.zeros((len(self.entities), len(self.entities)))
-            for ia, entity_a in enumerate(self.entities):
-                for ib in range(ia + 1, len(self.entities)):
-                    entity_b = self.entities[ib]
-                    min_dist = entity_a.size + entity_b.size
-                    self.min_dists[ia, ib] = min_dist
-                    self.min_dists[ib, ia] = min_dist
-
-        for ia, entity_a in enumerate(self.entities):
-            for ib in range(ia + 1, len(self.entities)):
-                entity_b = self.entities[ib]
-                delta_pos = entity_a.state.p_pos - entity_b.state.p_pos
-                self.cached_dist_vect[ia, ib, :] = delta_pos
-                self.cached_dist_vect[ib, ia, :] = -delta_pos
-
-        self.cached_dist_mag = np.linalg.norm(self.cached_dist_vect, axis=2)
-
-        self.cached_collisions = (self.cached_dist_mag <= self.min_dists)
+        entities = self.entities
+        p_pos = np.array([entity.state.p_pos for entity in entities])
+        size = np.array([entity.size for entity in entities])
+        self.min_dists = size[:, None] + size[None, :]
+        self.cached_dist_vect = p_pos[:, None, :] - p_pos[None, :, :]
+        self.cached_dist_mag = np.sqrt(np.sum(np.square(self.cached_dist_vect), axis=-1))
+        self.cached_collisions = self.cached_dist_mag < self.min_dists
 
     def assign_agent_colors(self):
         n_dummies = 0
@@ -359,3 +348,256 @@ class World(object):
         force[perp_dim] = np.cos(theta) * force_mag
         force[prll_dim] = np.sin(theta) * np.abs(force_mag)
         return force
+
+
+# state of an entity bound to an ArrayWorld: position and velocity are views into the world arrays
+class ArrayEntityState(object):
+    def __init__(self, world, index, state):
+        # keep the remaining (internal/mental) state, e.g. the communication utterance c
+        for key, value in vars(state).items():
+            if key not in ('p_pos', 'p_vel'):
+                setattr(self, key, value)
+        self._world = world
+        self._index = index
+        if state.p_pos is not None:
+            self.p_pos = state.p_pos
+        if state.p_vel is not None:
+            self.p_vel = state.p_vel
+
+    # assignments are copied into the world arrays, so scenarios can keep writing e.g. `state.p_pos = ...`
+    @property
+    def p_pos(self):
+        return self._world.p_pos[self._index]
+
+    @p_pos.setter
+    def p_pos(self, value):
+        self._world.p_pos[self._index] = value
+
+    @property
+    def p_vel(self):
+        return self._world.p_vel[self._index]
+
+    @p_vel.setter
+    def p_vel(self, value):
+        self._world.p_vel[self._index] = value
+
+
+# multi-agent world keeping the physical state of all entities in contiguous (N, dim_p) arrays
+# and stepping the physics for all entities at once
+class ArrayWorld(World):
+    def __init__(self):
+        super(ArrayWorld, self).__init__()
+        self._entities = None
+
+    # convert a world built by a scenario, Agent / Landmark objects are kept and their states become array views
+    @classmethod
+    def from_world(cls, world):
+        array_world = cls.__new__(cls)
+        array_world.__dict__.update(vars(world))
+        array_world.bind()
+        return array_world
+
+    # allocate the state arrays for the current agents and landmarks (assumed fixed from now on)
+    def bind(self):
+        entities = self.agents + self.landmarks
+        self._entities = entities
+        self.p_pos = np.zeros((len(entities), self.dim_p))
+        self.p_vel = np.zeros((len(entities), self.dim_p))
+        for i, entity in enumerate(entities):
+            entity.state = ArrayEntityState(self, i, entity.state)
+        self._policy_agents = [agent for agent in self.agents if agent.action_callback is None]
+        self._scripted_agents = [agent for agent in self.agents if agent.action_callback is not None]
+        self.update_properties()
+
+    # gather the physical properties of all entities, has to be called again if a scenario changes them
+    def update_properties(self):
+        entities = self._entities
+        self.size = np.array([entity.size for entity in entities], dtype=np.float64)
+        self.mass = np.array([entity.mass for entity in entities], dtype=np.float64)
+        self.movable = np.array([entity.movable for entity in entities], dtype=bool)
+        self.collide = np.array([entity.collide for entity in entities], dtype=bool)
+        self.ghost = np.array([entity.ghost for entity in entities], dtype=bool)
+        self.max_speed = np.array([np.nan if entity.max_speed is None else entity.max_speed
+                                   for entity in entities], dtype=np.float64)
+        self._movable_idx = np.flatnonzero(self.movable)
+        self._clip_idx = np.flatnonzero(self.movable & ~np.isnan(self.max_speed))
+
+        # action forces: force = mass * accel * action
+        self._actor_idx = np.array([i for i, agent in enumerate(self.agents) if agent.movable], dtype=np.int64)
+        self._action_scale = np.array([agent.mass * agent.accel if agent.accel is not None else agent.mass
+                                       for agent in self.agents], dtype=np.float64)
+
+        # collision forces: weight of the force of pair (a, b) applied to a, 0 if the pair does not interact
+        self.min_dists = self.size[:, None] + self.size[None, :]
+        pairs = self.collide[:, None] & self.collide[None, :] & ~np.eye(len(entities), dtype=bool)
+        both_movable = self.movable[:, None] & self.movable[None, :]
+        self._collision_weights = np.where(both_movable, self.mass[None, :] / self.mass[:, None], 1.0) \
+            * (pairs & self.movable[:, None])
+        self._collision_pairs = self._collision_weights != 0
+
+    @property
+    def entities(self):
+        return self._entities
+
+    @property
+    def policy_agents(self):
+        return self._policy_agents
+
+    @property
+    def scripted_agents(self):
+        return self._scripted_agents
+
+    def calculate_distances(self):
+        self.cached_dist_vect = self.p_pos[..., :, None, :] - self.p_pos[..., None, :, :]
+        self.cached_dist_mag = np.sqrt(np.sum(np.square(self.cached_dist_vect), axis=-1))
+        self.cached_collisions = self.cached_dist_mag < self.min_dists
+
+    def step(self):
+        self.world_step += 1
+        # set actions for scripted agents
+        for agent in self.scripted_agents:
+            agent.action = agent.action_callback(agent, self)
+        p_force = np.zeros_like(self.p_pos)
+        p_force = self.apply_action_force(p_force)
+        p_force = self.apply_environment_force(p_force)
+        self.integrate_state(p_force)
+        for agent in self.agents:
+            self.update_agent_state(agent)
+        if self.cache_dists:
+            self.calculate_distances()
+
+    def apply_action_force(self, p_force):
+        if len(self._actor_idx) == 0:
+            return p_force
+        u = np.array([self.agents[i].action.u for i in self._actor_idx], dtype=np.float64)
+        p_force[self._actor_idx] = self._action_scale[self._actor_idx, None] * u
+        # noise is drawn agent by agent to keep the random stream of World
+        for i in self._actor_idx:
+            agent = self.agents[i]
+            if agent.u_noise:
+                p_force[i] += np.random.randn(*agent.action.u.shape) * agent.u_noise
+        return p_force
+
+    def apply_environment_force(self, p_force):
+        if self._collision_pairs.any():
+            if self.cache_dists and self.cached_dist_vect is not None:
+                delta_pos, dist = self.cached_dist_vect, self.cached_dist_mag
+            else:
+                delta_pos = self.p_pos[..., :, None, :] - self.p_pos[..., None, :, :]
+                dist = np.sqrt(np.sum(np.square(delta_pos), axis=-1))
+            # softmax penetration, pairs not interacting (including the diagonal) get a zero weight
+            dist = np.where(self._collision_pairs, dist, 1.0)
+            k = self.contact_margin
+            penetration = np.logaddexp(0, -(dist - self.min_dists) / k) * k
+            scale = self.contact_force * penetration / dist * self._collision_weights
+            p_force += np.einsum('...ab,...abd->...ad', scale, delta_pos)
+        for wall in self.walls:
+            p_force += self.get_wall_collision_forces(wall)
+        return p_force
+
+    def integrate_state(self, p_force):
+        idx = self._movable_idx
+        self.p_vel[..., idx, :] = self.p_vel[..., idx, :] * (1 - self.damping) + \
+            (p_force[..., idx, :] / self.mass[idx, None]) * self.dt
+        idx = self._clip_idx
+        if len(idx) > 0:
+            vel = self.p_vel[..., idx, :]
+            speed = np.sqrt(np.square(vel[..., 0]) + np.square(vel[..., 1]))[..., None]
+            max_speed = self.max_speed[idx, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.p_vel[..., idx, :] = np.where(speed > max_speed, vel / speed * max_speed, vel)
+        idx = self._movable_idx
+        self.p_pos[..., idx, :] += self.p_vel[..., idx, :] * self.dt
+
+    # get collision forces between all movable entities and a wall
+    def get_wall_collision_forces(self, wall):
+        if wall.orient == 'H':
+            prll_dim = 0
+            perp_dim = 1
+        else:
+            prll_dim = 1
+            perp_dim = 0
+        ent_pos = self.p_pos[..., prll_dim]
+        low, high = wall.endpoints[0], wall.endpoints[1]
+        # entities beyond the endpoints of the wall and ghosts at soft walls are not affected
+        affected = self.movable & ~(self.ghost & (not wall.hard)) & \
+            (ent_pos >= low - self.size) & (ent_pos <= high + self.size)
+        # part of entity is beyond wall
+        partial = (ent_pos < low) | (ent_pos > high)
+        dist_past_end = np.where(ent_pos < low, ent_pos - low, ent_pos - high)
+        with np.errstate(invalid='ignore'):
+            theta = np.where(partial, np.arcsin(np.where(partial, dist_past_end / self.size, 0.0)), 0.0)
+        dist_min = np.where(partial, np.cos(theta) * self.size, self.size) + 0.5 * wall.width
+
+        # only need to calculate distance in relevant dim
+        delta_pos = self.p_pos[..., perp_dim] - wall.axis_pos
+        dist = np.abs(delta_pos)
+        # softmax penetration
+        k = self.contact_margin
+        penetration = np.logaddexp(0, -(dist - dist_min) / k) * k
+        force_mag = self.contact_force * delta_pos / dist * penetration
+        force = np.zeros_like(self.p_pos)
+        force[..., perp_dim] = np.cos(theta) * force_mag
+        force[..., prll_dim] = np.sin(theta) * np.abs(force_mag)
+        return np.where(affected[..., None], force, 0.0)
+
+
+# a batch of K independent copies of a world, stepped together on (K, N, dim_p) arrays
+# the Agent / Landmark objects only describe the entities, their per-world state lives in the batch arrays
+class BatchWorld(ArrayWorld):
+    def __init__(self, num_worlds=1):
+        super(BatchWorld, self).__init__()
+        self.num_worlds = num_worlds
+        # sets the actions of the scripted agents of all worlds, called at the beginning of step
+        self.scripted_callback = None
+
+    # create a batch of copies of a world built by a scenario
+    @classmethod
+    def from_world(cls, world, num_worlds=1):
+        batch_world = cls.__new__(cls)
+        batch_world.__dict__.update(vars(world))
+        batch_world.num_worlds = num_worlds
+        batch_world.scripted_callback = None
+        # the batched scenario functions compute the distances they need themselves
+        batch_world.cache_dists = False
+        batch_world.bind()
+        return batch_world
+
+    def bind(self):
+        entities = self.agents + self.landmarks
+        self._entities = entities
+        self.p_pos = np.zeros((self.num_worlds, len(entities), self.dim_p))
+        self.p_vel = np.zeros((self.num_worlds, len(entities), self.dim_p))
+        # physical action and communication state of every agent in every world
+        self.action_u = np.zeros((self.num_worlds, len(self.agents), self.dim_p))
+        self.c = np.zeros((self.num_worlds, len(self.agents), self.dim_c))
+        self._policy_agents = [agent for agent in self.agents if agent.action_callback is None]
+        self._scripted_agents = [agent for agent in self.agents if agent.action_callback is not None]
+        self.policy_idx = np.array([i for i, agent in enumerate(self.agents) if agent.action_callback is None],
+                                   dtype=np.int64)
+        self.scripted_idx = np.array([i for i, agent in enumerate(self.agents) if agent.action_callback is not None],
+                                     dtype=np.int64)
+        self.update_properties()
+
+    def step(self):
+        self.world_step += 1
+        # set actions for scripted agents
+        if len(self.scripted_idx) > 0 and self.scripted_callback is not None:
+            self.scripted_callback(self)
+        p_force = np.zeros_like(self.p_pos)
+        p_force = self.apply_action_force(p_force)
+        p_force = self.apply_environment_force(p_force)
+        self.integrate_state(p_force)
+        if self.cache_dists:
+            self.calculate_distances()
+
+    def apply_action_force(self, p_force):
+        idx = self._actor_idx
+        if len(idx) == 0:
+            return p_force
+        p_force[:, idx] = self._action_scale[idx, None] * self.action_u[:, idx]
+        for i in idx:
+            agent = self.agents[i]
+            if agent.u_noise:
+                p_force[:, i] += np.random.randn(self.num_worlds, self.dim_p) * agent.u_noise
+        return p_force
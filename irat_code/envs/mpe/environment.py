@@ -19,7 +19,7 @@ class MultiAgentEnv(gym.Env):
                  done_callback=None, post_step_callback=None,
                  shared_viewer=True, discrete_action=True,
                  team_reward_callback=None, sparse_reward=False,
-                 reward_shaping=False):
+                 reward_shaping=False, info_dicts=True):
 
         self.world = world
         self.world_length = self.world.world_length
@@ -36,8 +36,14 @@ class MultiAgentEnv(gym.Env):
         self.team_reward_callback = team_reward_callback
         self.sparse_reward = sparse_reward
         self.reward_shaping = reward_shaping
+        # if false, the infos of a step are a (n, 2) array of the individual and team rewards of the agents, and the
+        # info callback is not called
+        self.info_dicts = info_dicts
 
         self.post_step_callback = post_step_callback
+        # the observations of the spaces below may read the distances of the initial state
+        if self.world.cache_dists:
+            self.world.calculate_distances()
 
         # environment parameters
         # self.discrete_action_space = True
@@ -138,6 +144,8 @@ class MultiAgentEnv(gym.Env):
             idv_rew = self._get_reward(agent)
             reward_n.append([idv_rew])
             done_n.append(self._get_done(agent))
+            if not self.info_dicts:
+                continue
             info = {'individual_reward': idv_rew}
             env_info = self._get_info(agent)
             if 'fail' in env_info.keys():
@@ -157,14 +165,20 @@ class MultiAgentEnv(gym.Env):
         else:
             team_rew = np.sum(reward_n)
 
+        if not self.info_dicts:
+            info_n = np.empty((self.n, 2))
+            info_n[:, 0] = [irw[0] for irw in reward_n]
+            info_n[:, 1] = team_rew
+
         if self.shared_reward:
             reward_n = [[team_rew]] * self.n
 
         if self.reward_shaping:
             reward_n = [[team_rew + irw[0]] for irw in reward_n]
 
-        for i in range(len(info_n)):
-            info_n[i]["team_reward"] = team_rew
+        if self.info_dicts:
+            for i in range(len(info_n)):
+                info_n[i]["team_reward"] = team_rew
 
         if self.post_step_callback is not None:
             self.post_step_callback(self.world)
@@ -175,6 +189,8 @@ class MultiAgentEnv(gym.Env):
         self.current_step = 0
         # reset world
         self.reset_callback(self.world)
+        if self.world.cache_dists:
+            self.world.calculate_distances()
         # reset renderer
         self._reset_render()
         # record observations for each agent
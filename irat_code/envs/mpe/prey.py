@@ -0,0 +1,135 @@
+import numpy as np
+
+
+class PreyPolicy(object):
+    """
+    Scripted policy of the prey of the tag scenarios. Every prey samples target positions in the unit circle around
+    itself and moves to the one that is reachable and farthest from the other agents: with score function "sum" a
+    target is reachable if none of the evenly spaced waypoints on the way to it collides with another agent or leaves
+    the map, and scores the sum of the distances of the target to the other agents; with score function "min" only
+    the target itself is checked against the adversaries, and scores its distance to the nearest adversary.
+    An unreachable target is reset to -9999999 whenever an agent blocks it, and the distances of the agents that are
+    checked after the last one blocking it are still added, as in a loop over the agents.
+    All prey of a batch of worlds are handled at once.
+    :param n_samples: (int) number of target positions sampled per prey and step.
+    :param score_function: (str) "sum" or "min".
+    :param cached_samples: (bool) whether to use a fixed spiral pattern of targets, randomly rotated every step,
+                           instead of sampling new targets every step.
+    :param n_waypoints: (int) number of waypoints checked on the way to a target.
+    """
+
+    def __init__(self, n_samples=1000, score_function="sum", cached_samples=False, n_waypoints=5):
+        if score_function not in ("sum", "min"):
+            raise Exception("Unknown score function {}".format(score_function))
+        self.n_samples = n_samples
+        self.score_function = score_function
+        self.n_waypoints = n_waypoints
+        self.pattern = None
+        if cached_samples:
+            # the targets of a sunflower spiral cover the circle with uniform density like the sampled ones
+            k = np.arange(n_samples)
+            angle = k * np.pi * (3. - np.sqrt(5.))
+            self.pattern = np.sqrt((k + 0.5) / n_samples), np.stack([np.cos(angle), np.sin(angle)], -1)
+
+    def act(self, agent, world):
+        """
+        Action callback of a prey agent of a single world. The actions of all prey are computed when the first one is
+        asked for its action, they all act on the same state of the world.
+        :param agent: (Agent) prey agent.
+        :param world: (World) world of the agent.
+
+        :return action: (Action) action of the agent.
+        """
+        prey = world.scripted_agents
+        if agent is prey[0]:
+            agents = world.agents
+            self.actions = self(np.array([a.state.p_pos for a in agents])[None],
+                                [i for i, a in enumerate(agents) if a.action_callback is not None],
+                                np.array([a.size for a in agents]), np.array([a.movable for a in agents]),
+                                np.array([a.adversary for a in agents]))[0]
+        agent.action.u = self.actions[prey.index(agent)] * (5.0 if agent.accel is None else agent.accel)
+        agent.action.c = np.zeros(world.dim_c)
+        return agent.action
+
+    def sample_targets(self, n_worlds, n_prey):
+        """
+        :return length: (np.ndarray) distances of the targets to the prey, (K, G, n).
+        :return direction: (np.ndarray) unit vectors from the prey to the targets, (K, G, n, 2).
+        """
+        if self.pattern is None:
+            length = np.sqrt(np.random.uniform(0, 1, (n_worlds, n_prey, self.n_samples)))
+            angle = np.pi * np.random.uniform(0, 2, (n_worlds, n_prey, self.n_samples))
+            return length, np.stack([np.cos(angle), np.sin(angle)], -1)
+        length, direction = self.pattern
+        theta = np.pi * np.random.uniform(0, 2, (n_worlds, n_prey))
+        cos, sin = np.cos(theta)[..., None, None], np.sin(theta)[..., None, None]
+        # rotated by theta, (x cos - y sin, x sin + y cos)
+        direction = direction * cos + direction[:, ::-1] * np.array([-1., 1.]) * sin
+        return np.broadcast_to(length, direction.shape[:-1]), direction
+
+    def __call__(self, p_pos, prey_idx, size, movable, adversary):
+        """
+        Compute the actions of the prey agents.
+        :param p_pos: (np.ndarray) positions of all entities, the agents first, (K, N, 2).
+        :param prey_idx: (np.ndarray) indices of the G prey agents.
+        :param size: (np.ndarray) sizes of the entities, (N,).
+        :param movable: (np.ndarray) whether the entities are movable, (N,).
+        :param adversary: (np.ndarray) whether the agents are adversaries, (n_agents,).
+
+        :return chosen_action: (np.ndarray) float32 physical actions of the prey before sensitivity, (K, G, 2).
+        """
+        prey_idx = np.asarray(prey_idx)
+        n_worlds, n_prey, n_agents = p_pos.shape[0], len(prey_idx), len(adversary)
+        agent_pos = p_pos[:, prey_idx]
+        length, direction = self.sample_targets(n_worlds, n_prey)
+        target = length[..., None] * direction
+        dist_min = size[:n_agents][None, :] + size[prey_idx][:, None]
+
+        # early: (K, G, n) whether a target is unreachable before the last checked position
+        early = np.zeros(length.shape, dtype=bool)
+        if self.score_function == "sum":
+            # every other agent, checked at the waypoints s = 1 / W, 2 / W, ..., 1
+            others = np.arange(n_agents)[None, :] != prey_idx[:, None]
+            weight = np.broadcast_to(others & movable[:n_agents], (n_worlds, n_prey, n_agents))
+            last = ((length / float(self.n_waypoints)) * self.n_waypoints)[..., None] * direction
+            if self.n_waypoints > 1:
+                # (K, G, A, 2) positions of the agents relative to the prey, the squared distance to the points
+                # s * target, |delta - s * target|^2 = delta2 - 2 s cross + s^2 length^2, is a parabola in s and is
+                # smallest at the waypoint nearest to its vertex
+                delta = p_pos[:, None, :n_agents] - agent_pos[:, :, None]
+                delta2 = np.sum(np.square(delta), axis=-1)[..., None]
+                cross = np.matmul(delta, np.swapaxes(target, -1, -2))
+                square_length = np.square(length)[:, :, None]
+                s = np.round(cross / np.maximum(square_length, 1e-12) * self.n_waypoints)
+                s = np.clip(s, 1, self.n_waypoints - 1) / float(self.n_waypoints)
+                closest2 = delta2 - 2. * s * cross + np.square(s) * square_length
+                # the coordinates are linear in s, they are largest at the first or the last of these waypoints
+                ends = np.stack([target, target * (self.n_waypoints - 1)], 2) / float(self.n_waypoints)
+                early = np.any((closest2 < np.square(dist_min)[..., None]) & others[..., None], axis=2) | \
+                    np.any(np.abs(agent_pos[:, :, None, None] + ends) > 1.75, axis=(2, -1))
+        else:
+            # the adversaries, checked at the target only, and the distance to the nearest one is scored
+            others = np.broadcast_to(adversary, (n_prey, n_agents))
+            nearest_dist = np.where(others, np.sqrt(np.sum(np.square(p_pos[:, None, :n_agents] -
+                                                                     agent_pos[:, :, None]), axis=-1)), np.inf)
+            weight = np.argmin(nearest_dist, axis=-1)[..., None] == np.arange(n_agents)
+            last = target
+
+        # an unreachable target is reset when an agent is checked at the last position, the distances of the agents
+        # checked after it are still added to its score
+        proj_pos = agent_pos[:, :, None] + last
+        outside = np.any(np.abs(proj_pos) > 1.75, axis=-1)
+        scores = np.where(early, -9999999, 0).astype(np.float32)
+        for j in np.flatnonzero(np.any(others, axis=0)):
+            dist = np.sqrt(np.sum(np.square(p_pos[:, None, j, None] - proj_pos), axis=-1))
+            invalid = ((dist < dist_min[:, j, None]) | outside) & others[:, j, None]
+            scores = np.where(invalid, np.float32(-9999999), scores)
+            scores += dist * weight[..., j, None]
+
+        # move to best position
+        best_idx = np.argmax(scores, axis=-1)[..., None]
+        chosen_action = np.take_along_axis(target, best_idx[..., None], -2)[..., 0, :].astype(np.float32)
+        stuck = np.take_along_axis(scores, best_idx, -1)[..., 0] < 0
+        if stuck.any():
+            chosen_action[stuck] *= np.random.uniform(-1, 1, (int(stuck.sum()), 2))    # cannot go anywhere
+        return chosen_action
@@ -1,5 +1,5 @@
 import numpy as np
-from irat_code.envs.mpe.core import World, Agent, Landmark
+from irat_code.envs.mpe.core import World, BatchWorld, Agent, Landmark
 from irat_code.envs.mpe.scenario import BaseScenario
 
 
@@ -25,6 +25,8 @@ class Scenario(BaseScenario):
             landmark.name = 'landmark %d' % i
             landmark.collide = False
             landmark.movable = False
+        # the rewards and observations read the distances of the world
+        world.cache_dists = True
         # make initial conditions
         self.reset_world(world)
         return world
@@ -45,23 +47,22 @@ class Scenario(BaseScenario):
             landmark.state.p_pos = 0.8 * np.random.uniform(-1, +1, world.dim_p)
             landmark.state.p_vel = np.zeros(world.dim_p)
 
+    def _landmark_dists(self, world):
+        # (n_agents, n_landmarks) agent-landmark distances
+        return world.cached_dist_mag[:world.num_agents, world.num_agents:]
+
+    def _collisions(self, agent, world):
+        # number of agents the agent collides with (itself included)
+        if not agent.collide:
+            return 0
+        return int(np.sum(world.cached_collisions[world.agents.index(agent), :world.num_agents]))
+
     def benchmark_data(self, agent, world):
-        rew = 0
-        collisions = 0
-        occupied_landmarks = 0
-        min_dists = 0
-        for l in world.landmarks:
-            dists = [np.sqrt(np.sum(np.square(a.state.p_pos - l.state.p_pos)))
-                     for a in world.agents]
-            min_dists += min(dists)
-            rew -= min(dists)
-            if min(dists) < 0.1:
-                occupied_landmarks += 1
-        if agent.collide:
-            for a in world.agents:
-                if self.is_collision(a, agent):
-                    rew -= 1
-                    collisions += 1
+        dists = np.min(self._landmark_dists(world), axis=0)
+        min_dists = np.sum(dists)
+        occupied_landmarks = int(np.sum(dists < 0.1))
+        collisions = self._collisions(agent, world)
+        rew = -min_dists - collisions
         return (rew, collisions, min_dists, occupied_landmarks)
 
     def is_collision(self, agent1, agent2):
@@ -72,34 +73,16 @@ class Scenario(BaseScenario):
 
     def reward(self, agent, world):
         # Agents are rewarded based on minimum agent distance to each landmark, penalized for collisions
-        rew = 0
-        for l in world.landmarks:
-            dists = [np.sqrt(np.sum(np.square(a.state.p_pos - l.state.p_pos)))
-                     for a in world.agents]
-            rew -= min(dists)
-
-        if agent.collide:
-            for a in world.agents:
-                if self.is_collision(a, agent):
-                    rew -= 1
-        return rew
+        rew = -np.sum(np.min(self._landmark_dists(world), axis=0))
+        return rew - self._collisions(agent, world)
 
     def individual_reward(self, agent, world):
-        rew = 0
-        dists = [np.sqrt(np.sum(np.square(agent.state.p_pos - l.state.p_pos)))
-                 for l in world.landmarks]
-        rew -= min(dists)
-
-        if agent.collide:
-            for a in world.agents:
-                if self.is_collision(a, agent):
-                    rew -= 1
-        return rew
+        rew = -np.min(self._landmark_dists(world)[world.agents.index(agent)])
+        return rew - self._collisions(agent, world)
 
     def team_reward(self, world, sparse_reward=False):
-        dists = [np.sqrt(np.sum(np.square(a.state.p_pos - a.goal.state.p_pos)))
-                 for a in world.agents]
-        dists = np.array(dists)
+        goal_idx = [world.num_agents + world.landmarks.index(a.goal) for a in world.agents]
+        dists = world.cached_dist_mag[np.arange(world.num_agents), goal_idx]
         if sparse_reward:
             flag = (dists < 0.5).all()
             rew = 10 if flag else -1
@@ -109,19 +92,68 @@ class Scenario(BaseScenario):
 
     def observation(self, agent, world):
         # get positions of all entities in this agent's reference frame
-        entity_pos = []
-        for entity in world.landmarks:  # world.entities:
-            entity_pos.append(entity.state.p_pos - agent.state.p_pos)
-        # entity colors
-        entity_color = []
-        for entity in world.landmarks:  # world.entities:
-            entity_color.append(entity.color)
+        i = world.agents.index(agent)
+        others = [j for j in range(world.num_agents) if j != i]
+        entity_pos = world.cached_dist_vect[world.num_agents:, i].reshape(-1)
+        other_pos = world.cached_dist_vect[others, i].reshape(-1)
         # communication of all other agents
-        comm = []
-        other_pos = []
-        for other in world.agents:
-            if other is agent:
-                continue
-            comm.append(other.state.c)
-            other_pos.append(other.state.p_pos - agent.state.p_pos)
-        return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + comm)
+        comm = [world.agents[j].state.c for j in others]
+        return np.concatenate([agent.state.p_vel, agent.state.p_pos, entity_pos, other_pos] + comm)
+
+    # batched version of the scenario, all functions work on a BatchWorld holding K copies of the world
+    def make_batch_world(self, args, num_worlds):
+        world = BatchWorld.from_world(self.make_world(args), num_worlds)
+        # index of the goal landmark of every agent
+        world.goal_idx = np.zeros((num_worlds, world.num_agents), dtype=np.int64)
+        self.reset_batch_world(world, np.arange(num_worlds))
+        return world
+
+    def reset_batch_world(self, world, index):
+        # set random initial states of the worlds in index
+        n = len(index)
+        world.goal_idx[index] = np.random.randint(world.num_landmarks, size=(n, world.num_agents))
+        world.p_pos[index, :world.num_agents] = np.random.uniform(-1, +1, (n, world.num_agents, world.dim_p))
+        world.p_pos[index, world.num_agents:] = 0.8 * np.random.uniform(-1, +1, (n, world.num_landmarks, world.dim_p))
+        world.p_vel[index] = 0.
+        world.c[index] = 0.
+
+    def _batch_dists(self, world):
+        agent_pos = world.p_pos[:, :world.num_agents]
+        landmark_pos = world.p_pos[:, world.num_agents:]
+        # (K, n_agents, n_landmarks) agent-landmark distances
+        landmark_dists = np.sqrt(np.sum(np.square(agent_pos[:, :, None] - landmark_pos[:, None]), axis=-1))
+        # (K, n_agents) number of agents each agent collides with (itself included)
+        agent_dists = np.sqrt(np.sum(np.square(agent_pos[:, :, None] - agent_pos[:, None]), axis=-1))
+        min_dists = world.min_dists[:world.num_agents, :world.num_agents]
+        collisions = np.sum(agent_dists < min_dists, axis=1) * world.collide[:world.num_agents]
+        return landmark_dists, collisions
+
+    def batch_reward(self, world):
+        landmark_dists, collisions = self._batch_dists(world)
+        rew = -np.sum(np.min(landmark_dists, axis=1), axis=1)
+        return rew[:, None] - collisions
+
+    def batch_individual_reward(self, world):
+        landmark_dists, collisions = self._batch_dists(world)
+        return -np.min(landmark_dists, axis=2) - collisions
+
+    def batch_team_reward(self, world, sparse_reward=False):
+        agent_pos = world.p_pos[:, :world.num_agents]
+        goal_pos = np.take_along_axis(world.p_pos[:, world.num_agents:], world.goal_idx[..., None], axis=1)
+        dists = np.sqrt(np.sum(np.square(agent_pos - goal_pos), axis=-1))
+        if sparse_reward:
+            return np.where(np.all(dists < 0.5, axis=1), 10., -1.)
+        return -np.sum(dists, axis=1)
+
+    def batch_observation(self, world):
+        n_worlds, n_agents = world.num_worlds, world.num_agents
+        agent_pos = world.p_pos[:, :n_agents]
+        entity_pos = world.p_pos[:, n_agents:][:, None] - agent_pos[:, :, None]
+        # positions and communication of all other agents, in agent order
+        others = np.array([[j for j in range(n_agents) if j != i] for i in range(n_agents)]).reshape(n_agents, -1)
+        other_pos = agent_pos[:, others] - agent_pos[:, :, None]
+        comm = world.c[:, others]
+        return np.concatenate([world.p_vel[:, :n_agents], agent_pos,
+                               entity_pos.reshape(n_worlds, n_agents, -1),
+                               other_pos.reshape(n_worlds, n_agents, -1),
+                               comm.reshape(n_worlds, n_agents, -1)], axis=-1)
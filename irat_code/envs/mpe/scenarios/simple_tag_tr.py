@@ -1,6 +1,7 @@
 import numpy as np
-from irat_code.envs.mpe.core import World, Agent, Landmark
+from irat_code.envs.mpe.core import World, BatchWorld, Agent, Landmark
 from irat_code.envs.mpe.scenario import BaseScenario
+from irat_code.envs.mpe.prey import PreyPolicy
 
 
 class Scenario(BaseScenario):
@@ -46,9 +47,18 @@ class Scenario(BaseScenario):
             landmark.movable = False
             landmark.size = 0.2
             landmark.boundary = False
+        # indices of the agents and of the observed landmarks among the entities of the world
+        world.adversary_idx = np.array([i for i, agent in enumerate(world.agents) if agent.adversary], dtype=np.int64)
+        world.good_idx = np.array([i for i, agent in enumerate(world.agents) if not agent.adversary], dtype=np.int64)
+        world.landmark_idx = np.array([num_agents + i for i, landmark in enumerate(world.landmarks)
+                                       if not landmark.boundary], dtype=np.int64)
+        # the rewards, observations and infos read the distances of the world
+        world.cache_dists = True
+        self.score_function = getattr(args, "score_function", "sum")
+        self.prey = PreyPolicy(getattr(args, "prey_samples", 1000), self.score_function,
+                               getattr(args, "prey_cached_samples", False))
         # make initial conditions
         self.reset_world(world)
-        self.score_function = getattr(args, "score_function", "sum")
         return world
 
     def random_policy(self, agent, world):
@@ -63,73 +73,7 @@ class Scenario(BaseScenario):
         return agent.action
 
     def prey_policy(self, agent, world):
-        action = None
-        n = 1000         # number of positions sampled
-        # sample actions randomly from a target circle
-        length = np.sqrt(np.random.uniform(0, 1, n))
-        angle = np.pi * np.random.uniform(0, 2, n)
-        x = length * np.cos(angle)
-        y = length * np.sin(angle)
-
-        # evaluate score for each position
-        # check whether positions are reachable
-        # sample a few evenly spaced points on the way and see if they collide with anything
-        scores = np.zeros(n, dtype=np.float32)
-        n_iter = 5
-
-        if self.score_function == "sum":
-            for i in range(n_iter):
-                waypoints_length = (length / float(n_iter)) * (i + 1)
-                x_wp = waypoints_length * np.cos(angle)
-                y_wp = waypoints_length * np.sin(angle)
-                proj_pos = np.vstack((x_wp, y_wp)).transpose() + agent.state.p_pos
-                idx = ((proj_pos[:, 0] > 1.75).astype(int) + (proj_pos[:, 1] > 1.75).astype(int) + (
-                            proj_pos[:, 0] < -1.75).astype(int) +
-                       (proj_pos[:, 1] < -1.75).astype(int)) > 0
-                for _agent in world.agents:
-                    if _agent.name != agent.name:
-                        delta_pos = _agent.state.p_pos - proj_pos
-                        dist = np.sqrt(np.sum(np.square(delta_pos), axis=1))
-                        dist_min = _agent.size + agent.size
-                        scores[dist < dist_min] = -9999999
-                        scores[idx] = -9999999
-                        if i == n_iter - 1 and _agent.movable:
-                            scores += dist
-        elif self.score_function == "min":
-            rel_dis = []
-            adv_names = []
-            adversaries = self.adversaries(world)
-            proj_pos = np.vstack((x, y)).transpose() + agent.state.p_pos # the position of the 100 sampled points.
-            idx = ((proj_pos[:, 0] > 1.75).astype(int) + (proj_pos[:, 1] > 1.75).astype(int) + (proj_pos[:, 0] < -1.75).astype(int) +
-                   (proj_pos[:, 1] < -1.75).astype(int)) > 0
-            for adv in adversaries:
-                rel_dis.append(np.sqrt(np.sum(np.square(agent.state.p_pos - adv.state.p_pos))))
-                adv_names.append(adv.name)
-            min_dis_adv_name = adv_names[np.argmin(rel_dis)]
-            for adv in adversaries:
-                delta_pos = adv.state.p_pos - proj_pos
-                dist = np.sqrt(np.sum(np.square(delta_pos), axis=1))
-                dist_min = adv.size + agent.size
-                scores[dist < dist_min] = -9999999
-                scores[idx] = -9999999
-                if adv.name == min_dis_adv_name:
-                    scores += dist
-        else:
-            raise Exception("Unknown score function {}".format(self.score_function))
-
-        # move to best position
-        best_idx = np.argmax(scores)
-        chosen_action = np.array([x[best_idx], y[best_idx]], dtype=np.float32)
-        if scores[best_idx] < 0:
-            chosen_action *= np.random.uniform(-1, 1, 2)    # cannot go anywhere
-        agent.action.u = chosen_action
-        sensitivity = 5.0
-        if agent.accel is not None:
-            sensitivity = agent.accel
-        agent.action.u *= sensitivity
-        # print(agent.action.u)
-        agent.action.c = np.zeros(world.dim_c)
-        return agent.action
+        return self.prey.act(agent, world)
 
     def reset_world(self, world):
         # random properties for agents
@@ -151,11 +95,7 @@ class Scenario(BaseScenario):
     def benchmark_data(self, agent, world):
         # returns data for benchmarking purposes
         if agent.adversary:
-            collisions = 0
-            for a in self.good_agents(world):
-                if self.is_collision(a, agent):
-                    collisions += 1
-            return collisions
+            return int(np.sum(world.cached_collisions[world.good_idx, world.agents.index(agent)]))
         else:
             return 0
 
@@ -173,6 +113,10 @@ class Scenario(BaseScenario):
     def adversaries(self, world):
         return [agent for agent in world.agents if agent.adversary]
 
+    def _catches(self, world):
+        # (n_good, n_adversaries) whether good agents collide with adversaries
+        return world.cached_collisions[world.good_idx[:, None], world.adversary_idx]
+
     def reward(self, agent, world):
         # Agents are rewarded based on minimum agent distance to each landmark
         main_reward = self.adversary_reward(agent, world) if agent.adversary else self.agent_reward(agent, world)
@@ -180,16 +124,13 @@ class Scenario(BaseScenario):
 
     def agent_reward(self, agent, world):
         # Agents are negatively rewarded if caught by adversaries
+        i = world.agents.index(agent)
         rew = 0
         shape = False
-        adversaries = self.adversaries(world)
         if shape:  # reward can optionally be shaped (increased reward for increased distance from adversary)
-            for adv in adversaries:
-                rew += 0.1 * np.sqrt(np.sum(np.square(agent.state.p_pos - adv.state.p_pos)))
+            rew += 0.1 * np.sum(world.cached_dist_mag[world.adversary_idx, i])
         if agent.collide:
-            for a in adversaries:
-                if self.is_collision(a, agent):
-                    rew -= 10
+            rew -= 10 * np.sum(world.cached_collisions[world.adversary_idx, i])
 
         # agents are penalized for exiting the screen, so that they can be caught by the adversaries
         def bound(x):
@@ -208,26 +149,19 @@ class Scenario(BaseScenario):
         # Adversaries are rewarded for collisions with agents
         rew = 0
         shape = False
-        agents = self.good_agents(world)
-        adversaries = self.adversaries(world)
         if shape:  # reward can optionally be shaped (decreased reward for increased distance from agents)
-            for adv in adversaries:
-                rew -= 0.1 * min([np.sqrt(np.sum(np.square(a.state.p_pos - adv.state.p_pos))) for a in agents])
+            dists = world.cached_dist_mag[world.good_idx[:, None], world.adversary_idx]
+            rew -= 0.1 * np.sum(np.min(dists, axis=0))
         if agent.collide:
-            for ag in agents:
-                for adv in adversaries:
-                    if self.is_collision(ag, adv):
-                        rew += 10
+            rew += 10 * np.sum(self._catches(world))
         return rew
 
     def individual_reward(self, adv, world):
+        i = world.agents.index(adv)
         rew = 0
-        agents = self.good_agents(world)
-        rew -= 0.1 * min([np.sqrt(np.sum(np.square(a.state.p_pos - adv.state.p_pos))) for a in agents])
+        rew -= 0.1 * np.min(world.cached_dist_mag[world.good_idx, i])
         if adv.collide:
-            for a in agents:
-                if self.is_collision(a, adv):
-                    rew += 5
+            rew += 5 * np.sum(world.cached_collisions[world.good_idx, i])
 
         def bound(x):
             if x < 1.75:
@@ -242,83 +176,142 @@ class Scenario(BaseScenario):
         return rew
 
     def team_reward(self, world, sparse_reward=False):
-        agents = self.good_agents(world)
-        adversaries = self.adversaries(world)
-
-        rew = 0
-        for a in agents:
-            n = 0
-            for adv in adversaries:
-                if self.is_collision(a, adv):
-                    n += 1
-            if n >= 2:
-                rew += 20
-        return rew
+        # good agents caught by at least two adversaries
+        return 20 * np.sum(np.sum(self._catches(world), axis=1) >= 2)
 
     def info(self, agent, world):
-        agents = self.good_agents(world)
-        adversaries = self.adversaries(world)
+        catches = self._catches(world)
 
         catch_infos = ""
         total_infos = ""
-        catch_n = [0, 0]
-        for ai, a in enumerate(agents):
-            n = 0
-            for di, adv in enumerate(adversaries):
-                if self.is_collision(a, adv):
-                    catch_infos += "adversary%i catch good_agent%i\n" % (di, ai)
-                    n += 1
-            total_infos += "There are %i adversaries caught good_agent%i\n" % (n, ai)
-            if n >= 2:
-                catch_n[1] += 1
-
-        for a in agents:
-            if self.is_collision(a, agent):
-                catch_n[0] += 1
+        for ai in range(len(world.good_idx)):
+            for di in np.flatnonzero(catches[ai]):
+                catch_infos += "adversary%i catch good_agent%i\n" % (di, ai)
+            total_infos += "There are %i adversaries caught good_agent%i\n" % (np.sum(catches[ai]), ai)
+        catch_n = [int(np.sum(world.cached_collisions[world.good_idx, world.agents.index(agent)])),
+                   int(np.sum(np.sum(catches, axis=1) >= 2))]
         infos = {'detail_infos': catch_infos, "additional_infos": total_infos, 'catch_infos': catch_n}
         return infos
 
     def partial_observation(self, agent, world):
-        # get positions of all entities in this agent's reference frame
-        entity_pos = []
-        for entity in world.landmarks:
-            dist = np.sqrt(np.sum(np.square(entity.state.p_pos - agent.state.p_pos)))
-            if not entity.boundary and (agent.view_radius >= 0) and dist <= agent.view_radius:
-                entity_pos.append(entity.state.p_pos - agent.state.p_pos)
-            else:
-                entity_pos.append(np.array([0., 0.]))
-        # communication of all other agents
-        comm = []
-        other_pos = []
-        other_vel = []
-        for other in world.agents:
-            if other is agent: continue
-            dist = np.sqrt(np.sum(np.square(other.state.p_pos - agent.state.p_pos)))
-            if agent.view_radius >= 0 and dist <= agent.view_radius:
-                comm.append(other.state.c)
-                other_pos.append(other.state.p_pos - agent.state.p_pos)
-                if not other.adversary:
-                    other_vel.append(other.state.p_vel)
-            else:
-                other_pos.append(np.array([0., 0.]))
-                if not other.adversary:
-                    other_vel.append(np.array([0., 0.]))
-        return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + other_vel)
+        # get positions of all entities in this agent's reference frame, the ones out of view are zeroed
+        i = world.agents.index(agent)
+        entity_pos = world.cached_dist_vect[:, i]
+        in_view = (agent.view_radius >= 0) & (world.cached_dist_mag[:, i] <= agent.view_radius)
+        landmarks = len(world.agents) + np.arange(len(world.landmarks))
+        landmark_in_view = in_view[landmarks] & ~np.array([entity.boundary for entity in world.landmarks], dtype=bool)
+        landmark_pos = np.where(landmark_in_view[:, None], entity_pos[landmarks], 0.)
+        others = [j for j in range(len(world.agents)) if j != i]
+        other_pos = np.where(in_view[others, None], entity_pos[others], 0.)
+        other_vel = [world.agents[j].state.p_vel if in_view[j] else np.array([0., 0.])
+                     for j in others if not world.agents[j].adversary]
+        return np.concatenate([agent.state.p_vel, agent.state.p_pos, landmark_pos.reshape(-1),
+                               other_pos.reshape(-1)] + other_vel)
 
     def observation(self, agent, world):
         # get positions of all entities in this agent's reference frame
-        entity_pos = []
-        for entity in world.landmarks:
-            if not entity.boundary:
-                entity_pos.append(entity.state.p_pos - agent.state.p_pos)
-        # communication of all other agents
-        comm = []
-        other_pos = []
-        other_vel = []
-        for other in world.agents:
-            if other is agent: continue
-            comm.append(other.state.c)
-            other_pos.append(other.state.p_pos - agent.state.p_pos)
-            if not other.adversary:
-                other_vel.append(other.state.p_vel)
-        return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + other_vel)
\ No newline at end of file
+        i = world.agents.index(agent)
+        entity_pos = world.cached_dist_vect[world.landmark_idx, i].reshape(-1)
+        others = [j for j in range(len(world.agents)) if j != i]
+        other_pos = world.cached_dist_vect[others, i].reshape(-1)
+        # velocities of the other good agents
+        other_vel = [world.agents[j].state.p_vel for j in others if not world.agents[j].adversary]
+        return np.concatenate([agent.state.p_vel, agent.state.p_pos, entity_pos, other_pos] + other_vel)
+
+    # batched version of the scenario, all functions work on a BatchWorld holding K copies of the world
+    # the policy agents are the adversaries, the good agents are scripted
+    def make_batch_world(self, args, num_worlds):
+        world = BatchWorld.from_world(self.make_world(args), num_worlds)
+        world.adversary_idx = np.array([i for i, agent in enumerate(world.agents) if agent.adversary], dtype=np.int64)
+        world.good_idx = np.array([i for i, agent in enumerate(world.agents) if not agent.adversary], dtype=np.int64)
+        world.landmark_idx = np.array([len(world.agents) + i for i, landmark in enumerate(world.landmarks)
+                                       if not landmark.boundary], dtype=np.int64)
+        if args.agent_policy == "prey":
+            world.scripted_callback = self.batch_prey_policy
+        else:
+            world.scripted_callback = self.batch_random_policy
+        self.reset_batch_world(world, np.arange(num_worlds))
+        return world
+
+    def reset_batch_world(self, world, index):
+        # set random initial states of the worlds in index
+        n = len(index)
+        world.p_pos[index, :len(world.agents)] = np.random.uniform(-1, +1, (n, len(world.agents), world.dim_p))
+        world.p_vel[index, :len(world.agents)] = 0.
+        world.p_pos[index[:, None], world.landmark_idx] = \
+            np.random.uniform(-0.9, +0.9, (n, len(world.landmark_idx), world.dim_p))
+        world.p_vel[index[:, None], world.landmark_idx] = 0.
+        world.c[index] = 0.
+
+    def _sensitivity(self, world, idx):
+        return np.array([5.0 if world.agents[i].accel is None else world.agents[i].accel for i in idx])
+
+    def batch_random_policy(self, world):
+        u = np.random.random((world.num_worlds, len(world.scripted_idx), world.dim_p)) * 2 - 1
+        world.action_u[:, world.scripted_idx] = u * self._sensitivity(world, world.scripted_idx)[:, None]
+
+    def batch_prey_policy(self, world):
+        u = self.prey(world.p_pos, world.scripted_idx, world.size, world.movable,
+                      np.array([agent.adversary for agent in world.agents]))
+        u *= self._sensitivity(world, world.scripted_idx)[:, None].astype(np.float32)
+        world.action_u[:, world.scripted_idx] = u
+
+    def _batch_collisions(self, world):
+        # (K, n_good, n_adversaries) whether good agents collide with adversaries, and their distances
+        delta_pos = world.p_pos[:, world.good_idx, None] - world.p_pos[:, None, world.adversary_idx]
+        dist = np.sqrt(np.sum(np.square(delta_pos), axis=-1))
+        return dist < world.min_dists[world.good_idx[:, None], world.adversary_idx], dist
+
+    def batch_reward(self, world):
+        # adversaries are rewarded for all collisions with agents
+        collisions, _ = self._batch_collisions(world)
+        rew = 10. * np.sum(collisions, axis=(1, 2))
+        return rew[:, None] * world.collide[world.adversary_idx]
+
+    def batch_individual_reward(self, world):
+        collisions, dist = self._batch_collisions(world)
+        rew = -0.1 * np.min(dist, axis=1) + 5. * np.sum(collisions, axis=1) * world.collide[world.adversary_idx]
+        if world.rew_bound:
+            x = np.abs(world.p_pos[:, world.adversary_idx])
+            rew -= np.sum(np.where(x < 1.75, 0., np.minimum(np.exp(x - 1.75), 3)), axis=-1)
+        return rew
+
+    def batch_team_reward(self, world, sparse_reward=False):
+        collisions, _ = self._batch_collisions(world)
+        return 20. * np.sum(np.sum(collisions, axis=2) >= 2, axis=1)
+
+    def batch_catch_infos(self, world):
+        collisions, _ = self._batch_collisions(world)
+        team_catch = np.sum(np.sum(collisions, axis=2) >= 2, axis=1)
+        return np.stack([np.sum(collisions, axis=1),
+                         np.repeat(team_catch[:, None], len(world.adversary_idx), axis=1)], -1)
+
+    def _batch_observation(self, world, view_radius=None):
+        n_worlds, adv_idx, good_idx = world.num_worlds, world.adversary_idx, world.good_idx
+        agent_pos = world.p_pos[:, adv_idx, None]
+        entity_pos = world.p_pos[:, None, world.landmark_idx] - agent_pos
+        # positions of all other agents and velocities of the other good agents, in agent order
+        others = np.array([[j for j in range(len(world.agents)) if j != i] for i in adv_idx])
+        others = others.reshape(len(adv_idx), -1)
+        other_pos = world.p_pos[:, others] - agent_pos
+        other_vel = world.p_vel[:, None, good_idx].repeat(len(adv_idx), axis=1)
+        if view_radius is not None:
+            # entities out of the view radius of an agent are zeroed
+            in_view = (view_radius >= 0)[:, None]
+            entity_pos = entity_pos * \
+                (in_view & (np.sqrt(np.sum(np.square(entity_pos), axis=-1)) <= view_radius[:, None]))[..., None]
+            other_in_view = in_view & (np.sqrt(np.sum(np.square(other_pos), axis=-1)) <= view_radius[:, None])
+            other_pos = other_pos * other_in_view[..., None]
+            good_cols = np.array([np.flatnonzero(np.isin(row, good_idx)) for row in others])
+            other_vel = other_vel * other_in_view[:, np.arange(len(adv_idx))[:, None], good_cols][..., None]
+        return np.concatenate([world.p_vel[:, adv_idx], world.p_pos[:, adv_idx],
+                               entity_pos.reshape(n_worlds, len(adv_idx), -1),
+                               other_pos.reshape(n_worlds, len(adv_idx), -1),
+                               other_vel.reshape(n_worlds, len(adv_idx), -1)], axis=-1)
+
+    def batch_observation(self, world):
+        return self._batch_observation(world)
+
+    def batch_partial_observation(self, world):
+        view_radius = np.array([world.agents[i].view_radius for i in world.adversary_idx], dtype=np.float64)
+        return self._batch_observation(world, view_radius)
\ No newline at end of file
@@ -4,16 +4,16 @@ from irat_code.envs.sisl.pursuit_config import convert_puisuit
 from irat_code.envs.sisl.pursuit.waterworld import MAWaterWorld
 
 
-def get_sisl_envs(config):
+def get_sisl_envs(config, info_dicts=True):
     if config.env_name == "MultiWalker":
         env = MultiWalkerEnv(n_walkers=config.n_walkers, position_noise=config.position_noise,
                              angle_noise=config.angle_noise, reward_mech=config.reward_mech,
                              forward_reward=config.forward_reward, fall_reward=config.fall_reward,
                              drop_reward=config.drop_reward, terminate_on_fall=config.terminate_on_fall,
-                             ir_use_pos=config.ir_use_pos, one_hot=config.one_hot)
+                             ir_use_pos=config.ir_use_pos, one_hot=config.one_hot, info_dicts=info_dicts)
     elif config.env_name == "Pursuit":
         config_dict = convert_puisuit(config)
-        env = PursuitEvade(x_size=config.x_size, y_size=config.y_size, **config_dict)
+        env = PursuitEvade(x_size=config.x_size, y_size=config.y_size, info_dicts=info_dicts, **config_dict)
     elif config.env_name == "WaterWorld":
         env = MAWaterWorld(n_pursuers=config.n_pursuers, n_evaders=config.n_evaders, n_coop=config.n_coop,
                            n_poison=config.n_poison, radius=config.radius, obstacle_radius=config.obstacle_radius,
@@ -22,7 +22,8 @@ def get_sisl_envs(config):
                            poison_reward=config.poison_reward, food_reward=config.food_reward,
                            encounter_reward=config.encounter_reward, control_penalty=config.control_penalty,
                            reward_mech=config.reward_mech, addid=config.addid, speed_features=config.speed_features,
-                           max_cycles=config.max_cycles, idv_use_caught_food=config.idv_use_caught_food)
+                           max_cycles=config.max_cycles, idv_use_caught_food=config.idv_use_caught_food,
+                           info_dicts=info_dicts)
     else:
         print("Can not support the " +
               config.env_name + "environment.")
@@ -13,7 +13,7 @@ from matplotlib.patches import Rectangle
 from irat_code.envs.sisl import AbstractMAEnv
 from six.moves import xrange
 from .utils import agent_utils
-from .utils.AgentLayer import AgentLayer
+from .utils.AgentLayer import AgentLayer, ArrayAgentLayer
 from .utils.Controllers import RandomPolicy
 
 from irat_code.envs.sisl.utils import EzPickle
@@ -96,8 +96,10 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
         self.evaders = agent_utils.create_agents(self.n_evaders, self.map_matrix, self.obs_range,
                                                  flatten=self.flatten)
 
-        self.pursuer_layer = kwargs.pop('ally_layer', AgentLayer(self.xs, self.ys, self.pursuers))
-        self.evader_layer = kwargs.pop('opponent_layer', AgentLayer(self.xs, self.ys, self.evaders))
+        self.pursuer_layer = kwargs.pop('ally_layer',
+                                        ArrayAgentLayer(self.xs, self.ys, self.pursuers, self.map_matrix))
+        self.evader_layer = kwargs.pop('opponent_layer',
+                                       ArrayAgentLayer(self.xs, self.ys, self.evaders, self.map_matrix))
 
         self.layer_norm = kwargs.pop('layer_norm', 10)
 
@@ -191,6 +193,9 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
         self.curriculum_constrain_rate = kwargs.pop('curriculum_constrain_rate', 0.0)
         self.curriculum_turn_off_shaping = kwargs.pop('curriculum_turn_off_shaping', np.inf)
 
+        # if false, the infos of a step are a (n_pursuers, 2) array of the individual and team rewards
+        self.info_dicts = kwargs.pop('info_dicts', True)
+
         self.surround_mask = np.array([[-1, 0], [1, 0], [0, 1], [0, -1]])
 
         self.model_state = np.zeros((4,) + self.map_matrix.shape, dtype=np.float32)
@@ -240,11 +245,11 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
 
         self.pursuers = agent_utils.create_agents(self.n_pursuers, self.map_matrix, self.obs_range,
                                                   randinit=True, constraints=constraints)
-        self.pursuer_layer = AgentLayer(self.xs, self.ys, self.pursuers)
+        self.pursuer_layer = ArrayAgentLayer(self.xs, self.ys, self.pursuers, self.map_matrix)
 
         self.evaders = agent_utils.create_agents(self.n_evaders, self.map_matrix, self.obs_range,
                                                  randinit=True, constraints=constraints)
-        self.evader_layer = AgentLayer(self.xs, self.ys, self.evaders)
+        self.evader_layer = ArrayAgentLayer(self.xs, self.ys, self.evaders, self.map_matrix)
 
         self.model_state[0] = self.map_matrix
         self.model_state[1] = self.pursuer_layer.get_state_matrix()
@@ -273,21 +278,18 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
             gone_flags = self.evaders_gone
 
         # move allies
-        if isinstance(actions, list) or isinstance(actions, np.ndarray):
-            # move all agents
-            for i, a in enumerate(actions):
-                agent_layer.move_agent(i, a)
-        else:
+        if not (isinstance(actions, list) or isinstance(actions, np.ndarray)):
             # ravel it up
-            act_idxs = np.unravel_index(actions, self.act_dims)
-            for i, a in enumerate(act_idxs):
-                agent_layer.move_agent(i, a)
+            actions = np.unravel_index(actions, self.act_dims)
+        self.move_agents(agent_layer, actions)
 
         # move opponents
-        for i in range(opponent_layer.n_agents()):
-            # controller input should be an observation, but doesn't matter right now
-            action = opponent_controller.act(self.model_state)
-            opponent_layer.move_agent(i, action)
+        # controller input should be an observation, but doesn't matter right now
+        if hasattr(opponent_controller, 'act_batch'):
+            actions = opponent_controller.act_batch(self.model_state, opponent_layer.n_agents())
+        else:
+            actions = [opponent_controller.act(self.model_state) for _ in range(opponent_layer.n_agents())]
+        self.move_agents(opponent_layer, actions)
 
         # model state always has form: map, purusers, opponents, current agent id
         self.model_state[0] = self.map_matrix
@@ -321,10 +323,11 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
         else:
             rewards = [[ir] for ir in idv_rewards]
 
-        info_n = [{'individual_reward': 0., 'team_reward': 0.} for _ in range(self.n_pursuers)]
-        for i in range(self.n_pursuers):
-            info_n[i]["individual_reward"] = idv_rewards[i]
-            info_n[i]["team_reward"] = team_rewards[i]
+        if self.info_dicts:
+            info_n = [{'individual_reward': idv_rewards[i], 'team_reward': team_rewards[i]}
+                      for i in range(self.n_pursuers)]
+        else:
+            info_n = np.stack([idv_rewards, team_rewards], -1).astype(np.float64)
 
         done = self.is_terminal
         self.cur_step += 1
@@ -445,14 +448,10 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
         #    for i in xrange(self.n_pursuers)
         #]
         # proximity reward
-        rewards = [
-            self.catchr * np.sum(es[np.clip(
-                self.pursuer_layer.get_position(i)[0] + self.surround_mask[:, 0], 0, self.xs - 1
-            ), np.clip(
-                self.pursuer_layer.get_position(i)[1] + self.surround_mask[:, 1], 0, self.ys - 1)])
-            for i in range(self.n_pursuers)
-        ]
-        return np.array(rewards)
+        pos = self.layer_positions(self.pursuer_layer)[:self.n_pursuers]
+        xn = np.clip(pos[:, 0, None] + self.surround_mask[:, 0], 0, self.xs - 1)
+        yn = np.clip(pos[:, 1, None] + self.surround_mask[:, 1], 0, self.ys - 1)
+        return self.catchr * np.sum(es[xn, yn], axis=1)
 
     @property
     def is_terminal(self):
@@ -489,16 +488,57 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
     def n_agents(self):
         return self.pursuer_layer.n_agents()
 
+    @staticmethod
+    def layer_positions(agent_layer):
+        """
+        Positions of all agents of a layer as an (n_agents, 2) int array
+        """
+        if isinstance(agent_layer, ArrayAgentLayer):
+            return agent_layer.positions
+        return np.array([agent_layer.get_position(i) for i in range(agent_layer.n_agents())],
+                        dtype=np.int32).reshape(-1, 2)
+
+    @staticmethod
+    def move_agents(agent_layer, actions):
+        if isinstance(agent_layer, ArrayAgentLayer):
+            agent_layer.move_agents(actions)
+        else:
+            for i, a in enumerate(actions):
+                agent_layer.move_agent(i, a)
+
     def collect_obs(self, agent_layer, gone_flags):
-        obs = []
-        nage = 0
-        for i in range(self.n_agents()):
-            if gone_flags[i]:
-                obs.append(None)
-            else:
-                o = self.collect_obs_by_idx(agent_layer, nage)
-                obs.append(o)
-                nage += 1
+        """
+        Observation windows of all agents that are not gone, cut in one pass from the model state padded with
+        the values of cells outside the map (wall channel 1 / layer_norm, agent channels 0)
+        """
+        n = self.n_agents()
+        alive = [i for i in range(n) if not gone_flags[i]]
+        pos = self.layer_positions(agent_layer)[:len(alive)]
+
+        r = self.obs_range
+        padded = np.zeros((3, self.xs + r - 1, self.ys + r - 1))
+        padded[0].fill(1.0 / self.layer_norm)
+        padded[:, self.obs_offset:self.obs_offset + self.xs, self.obs_offset:self.obs_offset + self.ys] = np.abs(
+            self.model_state[0:3]) / self.layer_norm
+        xw = pos[:, 0, None] + np.arange(r)
+        yw = pos[:, 1, None] + np.arange(r)
+        windows = padded[:, xw[:, :, None], yw[:, None, :]].transpose(1, 0, 2, 3)  # Nagents X 3 X r X r
+        ids = np.arange(len(alive)) / n
+
+        if self.flatten:
+            o = windows.reshape(len(alive), -1)
+            if self.include_id:
+                o = np.concatenate((o, ids[:, None]), axis=1)
+        else:
+            # reshape output from (C, H, W) to (H, W, C)
+            o = np.zeros((len(alive), 4, r, r))
+            o[:, 0:3] = windows
+            o[:, 3, r // 2, r // 2] = ids
+            o = np.moveaxis(o, 1, 3)
+
+        obs = [None] * n
+        for k, i in enumerate(alive):
+            obs[i] = o[k]
         return obs
 
     def collect_obs_by_idx(self, agent_layer, agent_idx):
@@ -547,26 +587,23 @@ class PursuitEvade(AbstractMAEnv, EzPickle):
         ai = 0
         rems = 0
         xpur, ypur = np.nonzero(self.model_state[1])
-        purs_sur = np.zeros(self.n_pursuers, dtype=np.bool)
+        pur_cells = np.stack((xpur, ypur), axis=1)
+        pur_pos = self.layer_positions(self.pursuer_layer)[:self.n_pursuers]
+        purs_sur = np.zeros(self.n_pursuers, dtype=bool)
         for i in range(self.n_evaders):
             if self.evaders_gone[i]:
                 continue
             x, y = self.evader_layer.get_position(ai)
             if self.surround:
                 pos_that_catch = self.surround_mask + self.evader_layer.get_position(ai)
-                truths = np.array(
-                    [np.equal([xi, yi], pos_that_catch).all(axis=1) for xi, yi in zip(xpur, ypur)])
+                # truths[k, m]: the k-th occupied pursuer cell is the m-th cell around the evader
+                truths = (pur_cells[:, None, :] == pos_that_catch[None, :, :]).all(axis=2)
                 if np.sum(truths.any(axis=0)) == self.need_to_surround(x, y):
                     removed_evade.append(ai - rems)
                     self.evaders_gone[i] = True
                     rems += 1
                     tt = truths.any(axis=1)
-                    for j in range(self.n_pursuers):
-                        xpp, ypp = self.pursuer_layer.get_position(j)
-                        tes = np.concatenate((xpur[tt], ypur[tt])).reshape(2, len(xpur[tt]))
-                        tem = tes.T == np.array([xpp, ypp])
-                        if np.any(np.all(tem, axis=1)):
-                            purs_sur[j] = True
+                    purs_sur |= (pur_pos[:, None, :] == pur_cells[tt][None, :, :]).all(axis=2).any(axis=1)
                 ai += 1
             else:
                 if self.model_state[1, x, y] >= self.n_catch:
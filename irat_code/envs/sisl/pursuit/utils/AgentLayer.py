@@ -71,3 +71,69 @@ class AgentLayer():
             idx += 2
         return pos
 
+
+
+#################################################################
+# Agent Layer keeping all positions in one array
+#################################################################
+
+class ArrayAgentLayer(AgentLayer):
+
+    motion_range = np.array([[-1, 0],
+                             [1, 0],
+                             [0, 1],
+                             [0, -1],
+                             [0, 0]], dtype=np.int32)
+
+    def __init__(self, xs, ys, allies, map_matrix):
+        """
+        Same dynamics as AgentLayer with DiscreteAgent allies, but the positions of all agents are kept in
+        an (nagents, 2) int array and moved together.
+        The allies only provide the initial positions and the number of actions.
+        """
+        AgentLayer.__init__(self, xs, ys, allies)
+        self.xs = xs
+        self.ys = ys
+        self.map_matrix = map_matrix
+        self.positions = np.array([ally.current_position() for ally in allies], dtype=np.int32).reshape(-1, 2)
+        self.terminal = np.zeros(self.nagents, dtype=bool)
+
+    def move_agents(self, actions):
+        """
+        Move every agent by its action, moves out of the map or into buildings are not taken.
+        """
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        pos = self.positions
+        # agents in a building are dead and stay there
+        self.terminal |= self.map_matrix[pos[:, 0], pos[:, 1]] == -1
+        new_pos = pos + self.motion_range[actions]
+        inbounds = (new_pos[:, 0] >= 0) & (new_pos[:, 0] < self.xs) & (new_pos[:, 1] >= 0) & (new_pos[:, 1] < self.ys)
+        valid = inbounds & ~self.terminal
+        valid[valid] = self.map_matrix[new_pos[valid, 0], new_pos[valid, 1]] != -1
+        pos[valid] = new_pos[valid]
+        return pos
+
+    def move_agent(self, agent_idx, action):
+        actions = np.full(self.nagents, 4, dtype=np.int64)
+        actions[agent_idx] = action
+        return self.move_agents(actions)[agent_idx]
+
+    def set_position(self, agent_idx, x, y):
+        self.positions[agent_idx] = x, y
+
+    def get_position(self, agent_idx):
+        return self.positions[agent_idx]
+
+    def remove_agent(self, agent_idx):
+        AgentLayer.remove_agent(self, agent_idx)
+        self.positions = np.delete(self.positions, agent_idx, axis=0)
+        self.terminal = np.delete(self.terminal, agent_idx)
+
+    def get_state_matrix(self):
+        gs = self.global_state
+        gs.fill(0)
+        np.add.at(gs, (self.positions[:, 0], self.positions[:, 1]), 1)
+        return gs
+
+    def get_state(self):
+        return self.positions.reshape(-1).astype(np.float64)
@@ -16,6 +16,10 @@ class RandomPolicy(object):
         return np.random.choice(list(range(self.n_actions)))
         # return self.rng.randint(self.n_actions)
 
+    def act_batch(self, state, n):
+        # same draws as n calls of act
+        return np.random.choice(self.n_actions, size=n)
+
 
 class SingleActionPolicy(object):
 
@@ -25,3 +29,6 @@ class SingleActionPolicy(object):
 
     def act(self, state):
         return self.action
+
+    def act_batch(self, state, n):
+        return np.full(n, self.action)
@@ -2,7 +2,7 @@
 Multi-agent utilities
 """
 
-from .AgentLayer import AgentLayer
+from .AgentLayer import AgentLayer, ArrayAgentLayer
 from .Controllers import *
 from .DiscreteAgent import DiscreteAgent
 from .TwoDMaps import *
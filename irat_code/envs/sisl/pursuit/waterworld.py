@@ -79,7 +79,7 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
                  poison_speed=0.01, n_sensors=30, sensor_range=0.2, action_scale=0.01,
                  poison_reward=-1., food_reward=1., encounter_reward=.05, control_penalty=-.5,
                  reward_mech='local', addid=True, speed_features=True, max_cycles=1000, idv_use_caught_food=False,
-                 **kwargs):
+                 info_dicts=True, **kwargs):
         EzPickle.__init__(self, n_pursuers, n_evaders, n_coop, n_poison, radius, obstacle_radius,
                           obstacle_loc, ev_speed, poison_speed, n_sensors, sensor_range,
                           action_scale, poison_reward, food_reward, encounter_reward,
@@ -92,6 +92,8 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
         self.obstacle_loc = np.array(obstacle_loc)
         self.poison_speed = poison_speed
         self.radius = radius
+        self.ev_radius = radius * 2
+        self.po_radius = radius * 3 / 4
         self.ev_speed = ev_speed
         self.n_sensors = n_sensors
         self.sensor_range = np.ones(self.n_pursuers) * sensor_range
@@ -102,6 +104,8 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
         self.encounter_reward = encounter_reward
         self.max_cycles = max_cycles
         self.idv_use_caught_food = idv_use_caught_food
+        # if false, the infos of a step are a (n_pursuers, 2) array of the individual and team rewards
+        self.info_dicts = info_dicts
 
         self.n_obstacles = 1
         self._reward_mech = reward_mech
@@ -113,12 +117,14 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
                    speed_features=self._speed_features) for npu in range(self.n_pursuers)
         ]
         self._evaders = [
-            Archea(nev + 1, self.radius * 2, self.n_pursuers, self.sensor_range.mean() / 2)
+            Archea(nev + 1, self.ev_radius, self.n_pursuers, self.sensor_range.mean() / 2)
             for nev in range(self.n_evaders)
         ]
         self._poisons = [
-            Archea(npo + 1, self.radius * 3 / 4, self.n_poison, 0) for npo in range(self.n_poison)
+            Archea(npo + 1, self.po_radius, self.n_poison, 0) for npo in range(self.n_poison)
         ]
+        # the pursuers all have the same sensors
+        self._sensors_K_2 = self._pursuers[0].sensors
         self.observation_space = []
         self.share_observation_space = []
         self.action_space = []
@@ -167,24 +173,35 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
             self.obstaclesx_No_2 = self.obstacle_loc[None, :]
         self.obstaclesv_No_2 = np.zeros((self.n_obstacles, 2))
 
-        # Initialize pursuers
-        for pursuer in self._pursuers:
-            pursuer.set_position(self.np_random.rand(2))
-            # Avoid spawning where the obstacles lie
-            pursuer.set_position(self._respawn(pursuer.position, pursuer._radius))
-            pursuer.set_velocity(np.zeros(2))
+        # Positions and velocities of all objects, the Archea objects hold views of their rows, so all updates of
+        # the arrays are in place
+        self._pursuersx_Np_2 = np.zeros((self.n_pursuers, 2))
+        self._pursuersv_Np_2 = np.zeros((self.n_pursuers, 2))
+        self._evadersx_Ne_2 = np.zeros((self.n_evaders, 2))
+        self._evadersv_Ne_2 = np.zeros((self.n_evaders, 2))
+        self._poisonx_Npo_2 = np.zeros((self.n_poison, 2))
+        self._poisonv_Npo_2 = np.zeros((self.n_poison, 2))
+
+        # Initialize pursuers, avoid spawning where the obstacles lie
+        for npu in range(self.n_pursuers):
+            self._pursuersx_Np_2[npu] = self._respawn(self.np_random.rand(2), self.radius)
 
         # Initialize evaders
-        for evader in self._evaders:
-            evader.set_position(self.np_random.rand(2))
-            evader.set_position(self._respawn(evader.position, evader._radius))
-            evader.set_velocity((self.np_random.rand(2) - 0.5) * self.ev_speed)  # TODO policies
+        for nev in range(self.n_evaders):
+            self._evadersx_Ne_2[nev] = self._respawn(self.np_random.rand(2), self.ev_radius)
+            self._evadersv_Ne_2[nev] = (self.np_random.rand(2) - 0.5) * self.ev_speed  # TODO policies
 
         # Initialize poisons
-        for poison in self._poisons:
-            poison.set_position(self.np_random.rand(2))
-            poison.set_position(self._respawn(poison.position, poison._radius))
-            poison.set_velocity((self.np_random.rand(2) - 0.5) * self.ev_speed)
+        for npo in range(self.n_poison):
+            self._poisonx_Npo_2[npo] = self._respawn(self.np_random.rand(2), self.po_radius)
+            self._poisonv_Npo_2[npo] = (self.np_random.rand(2) - 0.5) * self.ev_speed
+
+        for objs, x_N_2, v_N_2 in ((self._pursuers, self._pursuersx_Np_2, self._pursuersv_Np_2),
+                                   (self._evaders, self._evadersx_Ne_2, self._evadersv_Ne_2),
+                                   (self._poisons, self._poisonx_Npo_2, self._poisonv_Npo_2)):
+            for obj, x_2, v_2 in zip(objs, x_N_2, v_N_2):
+                obj.set_position(x_2)
+                obj.set_velocity(v_2)
 
         obs = self.step(np.zeros((self.n_pursuers, 2)))[0]
         # print(len(obs))
@@ -212,30 +229,34 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
 
         return is_caught_cN2, who_caught_cN1
 
-    def _closest_dist(self, closest_obj_idx_Np_K, sensorvals_Np_K_N):
-        """Closest distances according to `idx`"""
-        sensorvals = []
-        for inp in range(self.n_pursuers):
-            sensorvals.append(sensorvals_Np_K_N[inp, ...][np.arange(self.n_sensors),
-                                                          closest_obj_idx_Np_K[inp, ...]])
-        return np.c_[sensorvals]
-
-    def _extract_speed_features(self, objv_N_2, closest_obj_idx_N_K, sensedmask_obj_Np_K):
-        sensorvals = []
-        for pursuer in self._pursuers:
-            sensorvals.append(
-                pursuer.sensors.dot((objv_N_2 - np.expand_dims(pursuer.velocity, 0)).T))
-        sensed_objspeed_Np_K_N = np.c_[sensorvals]
-
-        sensed_objspeedfeatures_Np_K = np.zeros((self.n_pursuers, self.n_sensors))
-
-        sensorvals = []
-        for inp in range(self.n_pursuers):
-            sensorvals.append(sensed_objspeed_Np_K_N[inp, :, :][np.arange(self.n_sensors),
-                                                                closest_obj_idx_N_K[inp, :]])
-        sensed_objspeedfeatures_Np_K[sensedmask_obj_Np_K] = np.c_[sensorvals][sensedmask_obj_Np_K]
-
-        return sensed_objspeedfeatures_Np_K
+    def _obstacle_collided(self, objx_N_2, radius):
+        """Whether the objects collide with any obstacle"""
+        distfromobst_N_No = ssd.cdist(objx_N_2, self.obstaclesx_No_2)
+        return (distfromobst_N_No <= radius + self.obstacle_radius).sum(axis=1) > 0
+
+    def _sensed(self, objx_N_2, same=False):
+        """Sensor readings of all pursuers of the objects, inf where an object is not sensed"""
+        relpos_Np_N_2 = objx_N_2[None, :, :] - self._pursuersx_Np_2[:, None, :]
+        sensorvals_Np_K_N = np.matmul(self._sensors_K_2, relpos_Np_N_2.transpose(0, 2, 1))
+        sensorvals_Np_K_N[(sensorvals_Np_K_N < 0) | (sensorvals_Np_K_N > self.sensor_range[:, None, None]) | (
+            (relpos_Np_N_2**2).sum(axis=2)[:, None, :] - sensorvals_Np_K_N**2 > self.radius**2)] = np.inf
+        if same:
+            sensorvals_Np_K_N[np.arange(self.n_pursuers), :, np.arange(self.n_pursuers)] = np.inf
+        return sensorvals_Np_K_N
+
+    def _closest(self, sensorvals_Np_K_N):
+        """Closest sensed object of every sensor, its distance and whether any object is sensed"""
+        closest_idx_Np_K = np.argmin(sensorvals_Np_K_N, axis=2)
+        closest_dist_Np_K = np.take_along_axis(sensorvals_Np_K_N, closest_idx_Np_K[..., None], axis=2)[..., 0]
+        sensedmask_Np_K = np.isfinite(closest_dist_Np_K)
+        return closest_idx_Np_K, np.where(sensedmask_Np_K, closest_dist_Np_K, 0.), sensedmask_Np_K
+
+    def _extract_speed_features(self, objv_N_2, closest_obj_idx_Np_K, sensedmask_obj_Np_K):
+        relvel_Np_N_2 = objv_N_2[None, :, :] - self._pursuersv_Np_2[:, None, :]
+        sensed_objspeed_Np_K_N = np.matmul(self._sensors_K_2, relvel_Np_N_2.transpose(0, 2, 1))
+        sensed_objspeed_Np_K = np.take_along_axis(sensed_objspeed_Np_K_N, closest_obj_idx_Np_K[..., None],
+                                                  axis=2)[..., 0]
+        return np.where(sensedmask_obj_Np_K, sensed_objspeed_Np_K, 0.)
 
     def step(self, action_Np2):
         action_Np2 = np.asarray(action_Np2)
@@ -244,12 +265,14 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
         actions_Np_2 = action_Np_2 * self.action_scale
 
         idv_rewards = np.zeros((self.n_pursuers,))
-        info_n = [{'individual_reward': 0., 'team_reward': 0.} for _ in range(self.n_pursuers)]
         assert action_Np_2.shape == (self.n_pursuers, 2)
 
-        for npu, pursuer in enumerate(self._pursuers):
-            pursuer.set_velocity(pursuer.velocity + actions_Np_2[npu])
-            pursuer.set_position(pursuer.position + pursuer.velocity)
+        pursuersx_Np_2, pursuersv_Np_2 = self._pursuersx_Np_2, self._pursuersv_Np_2
+        evadersx_Ne_2, evadersv_Ne_2 = self._evadersx_Ne_2, self._evadersv_Ne_2
+        poisonx_Npo_2, poisonv_Npo_2 = self._poisonx_Npo_2, self._poisonv_Npo_2
+
+        pursuersv_Np_2 += actions_Np_2
+        pursuersx_Np_2 += pursuersv_Np_2
 
         # Penalize large actions
         # if self.reward_mech == 'global':
@@ -259,109 +282,40 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
         idv_rewards += self.control_penalty * (actions_Np_2**2).sum(axis=1)
 
         # Players stop on hitting a wall
-        for npu, pursuer in enumerate(self._pursuers):
-            clippedx_2 = np.clip(pursuer.position, 0, 1)
-            vel_2 = pursuer.velocity
-            vel_2[pursuer.position != clippedx_2] = 0
-            pursuer.set_velocity(vel_2)
-            pursuer.set_position(clippedx_2)
-
-        obstacle_coll_Np = np.zeros(self.n_pursuers)
+        clippedx_Np_2 = np.clip(pursuersx_Np_2, 0, 1)
+        pursuersv_Np_2[pursuersx_Np_2 != clippedx_Np_2] = 0
+        pursuersx_Np_2[...] = clippedx_Np_2
+
         # Particles rebound on hitting an obstacle
-        for npu, pursuer in enumerate(self._pursuers):
-            distfromobst_No = ssd.cdist(np.expand_dims(pursuer.position, 0), self.obstaclesx_No_2)
-            is_colliding_No = distfromobst_No <= pursuer._radius + self.obstacle_radius
-            obstacle_coll_Np[npu] = is_colliding_No.sum()
-            if obstacle_coll_Np[npu] > 0:
-                pursuer.set_velocity(-1 / 2 * pursuer.velocity)
-
-        obstacle_coll_Ne = np.zeros(self.n_evaders)
-        for nev, evader in enumerate(self._evaders):
-            distfromobst_No = ssd.cdist(np.expand_dims(evader.position, 0), self.obstaclesx_No_2)
-            is_colliding_No = distfromobst_No <= evader._radius + self.obstacle_radius
-            obstacle_coll_Ne[nev] = is_colliding_No.sum()
-            if obstacle_coll_Ne[nev] > 0:
-                evader.set_velocity(-1 / 2 * evader.velocity)
-
-        obstacle_coll_Npo = np.zeros(self.n_poison)
-        for npo, poison in enumerate(self._poisons):
-            distfromobst_No = ssd.cdist(np.expand_dims(poison.position, 0), self.obstaclesx_No_2)
-            is_colliding_No = distfromobst_No <= poison._radius + self.obstacle_radius
-            obstacle_coll_Npo[npo] = is_colliding_No.sum()
-            if obstacle_coll_Npo[npo] > 0:
-                poison.set_velocity(-1 * poison.velocity)
+        pursuersv_Np_2[self._obstacle_collided(pursuersx_Np_2, self.radius)] *= -1 / 2
+        evadersv_Ne_2[self._obstacle_collided(evadersx_Ne_2, self.ev_radius)] *= -1 / 2
+        poisonv_Npo_2[self._obstacle_collided(poisonx_Npo_2, self.po_radius)] *= -1
 
         # Find collisions
-        pursuersx_Np_2 = np.array([pursuer.position for pursuer in self._pursuers])
-        evadersx_Ne_2 = np.array([evader.position for evader in self._evaders])
-        poisonx_Npo_2 = np.array([poison.position for poison in self._poisons])
-
         # Evaders
         evdists_Np_Ne = ssd.cdist(pursuersx_Np_2, evadersx_Ne_2)
-        is_colliding_ev_Np_Ne = evdists_Np_Ne <= np.asarray([
-            pursuer._radius + evader._radius for pursuer in self._pursuers
-            for evader in self._evaders
-        ]).reshape(self.n_pursuers, self.n_evaders)
+        is_colliding_ev_Np_Ne = evdists_Np_Ne <= self.radius + self.ev_radius
 
         # num_collisions depends on how many needed to catch an evader
         ev_caught, which_pursuer_caught_ev = self._caught(is_colliding_ev_Np_Ne, self.n_coop)
 
         # Poisons
         podists_Np_Npo = ssd.cdist(pursuersx_Np_2, poisonx_Npo_2)
-        is_colliding_po_Np_Npo = podists_Np_Npo <= np.asarray([
-            pursuer._radius + poison._radius for pursuer in self._pursuers
-            for poison in self._poisons
-        ]).reshape(self.n_pursuers, self.n_poison)
+        is_colliding_po_Np_Npo = podists_Np_Npo <= self.radius + self.po_radius
         po_caught, which_pursuer_caught_po = self._caught(is_colliding_po_Np_Npo, 1)
 
-        # Find sensed objects
-        # Obstacles
-        sensorvals_Np_K_No = np.array(
-            [pursuer.sensed(self.obstaclesx_No_2) for pursuer in self._pursuers])
-
-        # Evaders
-        sensorvals_Np_K_Ne = np.array([pursuer.sensed(evadersx_Ne_2) for pursuer in self._pursuers])
-
-        # Poison
-        sensorvals_Np_K_Npo = np.array(
-            [pursuer.sensed(poisonx_Npo_2) for pursuer in self._pursuers])
-
-        # Allies
-        sensorvals_Np_K_Np = np.array(
-            [pursuer.sensed(pursuersx_Np_2, same=True) for pursuer in self._pursuers])
-
-        # dist features
-        closest_ob_idx_Np_K = np.argmin(sensorvals_Np_K_No, axis=2)
-        closest_ob_dist_Np_K = self._closest_dist(closest_ob_idx_Np_K, sensorvals_Np_K_No)
-        sensedmask_ob_Np_K = np.isfinite(closest_ob_dist_Np_K)
-        sensed_obdistfeatures_Np_K = np.zeros((self.n_pursuers, self.n_sensors))
-        sensed_obdistfeatures_Np_K[sensedmask_ob_Np_K] = closest_ob_dist_Np_K[sensedmask_ob_Np_K]
-        # Evaders
-        closest_ev_idx_Np_K = np.argmin(sensorvals_Np_K_Ne, axis=2)
-        closest_ev_dist_Np_K = self._closest_dist(closest_ev_idx_Np_K, sensorvals_Np_K_Ne)
-        sensedmask_ev_Np_K = np.isfinite(closest_ev_dist_Np_K)
-        sensed_evdistfeatures_Np_K = np.zeros((self.n_pursuers, self.n_sensors))
-        sensed_evdistfeatures_Np_K[sensedmask_ev_Np_K] = closest_ev_dist_Np_K[sensedmask_ev_Np_K]
-        # Poison
-        closest_po_idx_Np_K = np.argmin(sensorvals_Np_K_Npo, axis=2)
-        closest_po_dist_Np_K = self._closest_dist(closest_po_idx_Np_K, sensorvals_Np_K_Npo)
-        sensedmask_po_Np_K = np.isfinite(closest_po_dist_Np_K)
-        sensed_podistfeatures_Np_K = np.zeros((self.n_pursuers, self.n_sensors))
-        sensed_podistfeatures_Np_K[sensedmask_po_Np_K] = closest_po_dist_Np_K[sensedmask_po_Np_K]
-        # Allies
-        closest_pu_idx_Np_K = np.argmin(sensorvals_Np_K_Np, axis=2)
-        closest_pu_dist_Np_K = self._closest_dist(closest_pu_idx_Np_K, sensorvals_Np_K_Np)
-        sensedmask_pu_Np_K = np.isfinite(closest_pu_dist_Np_K)
-        sensed_pudistfeatures_Np_K = np.zeros((self.n_pursuers, self.n_sensors))
-        sensed_pudistfeatures_Np_K[sensedmask_pu_Np_K] = closest_pu_dist_Np_K[sensedmask_pu_Np_K]
+        # Find sensed objects, the distance features of the closest obstacles, evaders, poison and allies
+        closest_ob_idx_Np_K, sensed_obdistfeatures_Np_K, sensedmask_ob_Np_K = self._closest(
+            self._sensed(self.obstaclesx_No_2))
+        closest_ev_idx_Np_K, sensed_evdistfeatures_Np_K, sensedmask_ev_Np_K = self._closest(
+            self._sensed(evadersx_Ne_2))
+        closest_po_idx_Np_K, sensed_podistfeatures_Np_K, sensedmask_po_Np_K = self._closest(
+            self._sensed(poisonx_Npo_2))
+        closest_pu_idx_Np_K, sensed_pudistfeatures_Np_K, sensedmask_pu_Np_K = self._closest(
+            self._sensed(pursuersx_Np_2, same=True))
 
         # speed features
-        pursuersv_Np_2 = np.array([pursuer.velocity for pursuer in self._pursuers])
-        evadersv_Ne_2 = np.array([evader.velocity for evader in self._evaders])
-        poisonv_Npo_2 = np.array([poison.velocity for poison in self._poisons])
-
         # Evaders
-
         sensed_evspeedfeatures_Np_K = self._extract_speed_features(evadersv_Ne_2,
                                                                    closest_ev_idx_Np_K,
                                                                    sensedmask_ev_Np_K)
@@ -377,23 +331,13 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
         # Process collisions
         # If object collided with required number of players, reset its position and velocity
         # Effectively the same as removing it and adding it back
-        if ev_caught.size:
-            for evcaught in ev_caught:
-                self._evaders[evcaught].set_position(self.np_random.rand(2))
-                self._evaders[evcaught].set_position(
-                    self._respawn(self._evaders[evcaught].position, self._evaders[evcaught]
-                                  ._radius))
-                self._evaders[evcaught].set_velocity(
-                    (self.np_random.rand(2,) - 0.5) * self.ev_speed)
-
-        if po_caught.size:
-            for pocaught in po_caught:
-                self._poisons[pocaught].set_position(self.np_random.rand(2))
-                self._poisons[pocaught].set_position(
-                    self._respawn(self._poisons[pocaught].position, self._poisons[pocaught]
-                                  ._radius))
-                self._poisons[pocaught].set_velocity(
-                    (self.np_random.rand(2,) - 0.5) * self.poison_speed)
+        for evcaught in ev_caught:
+            evadersx_Ne_2[evcaught] = self._respawn(self.np_random.rand(2), self.ev_radius)
+            evadersv_Ne_2[evcaught] = (self.np_random.rand(2,) - 0.5) * self.ev_speed
+
+        for pocaught in po_caught:
+            poisonx_Npo_2[pocaught] = self._respawn(self.np_random.rand(2), self.po_radius)
+            poisonv_Npo_2[pocaught] = (self.np_random.rand(2,) - 0.5) * self.poison_speed
 
         ev_encounters, which_pursuer_encounterd_ev = self._caught(is_colliding_ev_Np_Ne, 1)
         # Update reward based on these collisions
@@ -417,56 +361,35 @@ class MAWaterWorld(AbstractMAEnv, EzPickle):
             rewards = [[team_rewards] for _ in range(self.n_pursuers)]
         else:
             rewards = [[ir] for ir in idv_rewards]
-        for i in range(self.n_pursuers):
-            info_n[i]["individual_reward"] = idv_rewards[i]
-            info_n[i]["team_reward"] = team_rewards
+        if self.info_dicts:
+            info_n = [{'individual_reward': idv_rewards[i], 'team_reward': team_rewards}
+                      for i in range(self.n_pursuers)]
+        else:
+            info_n = np.stack([idv_rewards, np.full(self.n_pursuers, float(team_rewards))], -1)
 
         # Add features together
         if self._speed_features:
-            sensorfeatures_Np_K_O = np.c_[sensed_obdistfeatures_Np_K, sensed_evdistfeatures_Np_K,
-                                          sensed_evspeedfeatures_Np_K, sensed_podistfeatures_Np_K,
-                                          sensed_pospeedfeatures_Np_K, sensed_pudistfeatures_Np_K,
-                                          sensed_puspeedfeatures_Np_K]
+            sensorfeatures_Np_K_O = [sensed_obdistfeatures_Np_K, sensed_evdistfeatures_Np_K,
+                                     sensed_evspeedfeatures_Np_K, sensed_podistfeatures_Np_K,
+                                     sensed_pospeedfeatures_Np_K, sensed_pudistfeatures_Np_K,
+                                     sensed_puspeedfeatures_Np_K]
         else:
-            sensorfeatures_Np_K_O = np.c_[sensed_obdistfeatures_Np_K, sensed_evdistfeatures_Np_K,
-                                          sensed_podistfeatures_Np_K, sensed_pudistfeatures_Np_K]
-
-        for evader in self._evaders:
-            # Move objects
-            evader.set_position(evader.position + evader.velocity)
-            # Bounce object if it hits a wall
-            if all(evader.position != np.clip(evader.position, 0, 1)):
-                evader.set_velocity(-1 * evader.velocity)
-
-        for poison in self._poisons:
-            # Move objects
-            poison.set_position(poison.position + poison.velocity)
-            # Bounce object if it hits a wall
-            if all(poison.position != np.clip(poison.position, 0, 1)):
-                poison.set_velocity(-1 * poison.velocity)
-
-        obslist = []
-        for inp in range(self.n_pursuers):
-            if self._addid:
-                obslist.append(
-                    np.concatenate([
-                        sensorfeatures_Np_K_O[inp, ...].ravel(), [
-                            float((is_colliding_ev_Np_Ne[inp, :]).sum() > 0), float((
-                                is_colliding_po_Np_Npo[inp, :]).sum() > 0)
-                        ], [inp + 1]
-                    ]))
-            else:
-                obslist.append(
-                    np.concatenate([
-                        sensorfeatures_Np_K_O[inp, ...].ravel(), [
-                            float((is_colliding_ev_Np_Ne[inp, :]).sum() > 0), float((
-                                is_colliding_po_Np_Npo[inp, :]).sum() > 0)
-                        ]
-                    ]))
-
-        assert all([
-            obs.shape == agent.observation_space.shape for obs, agent in zip(obslist, self.agents)
-        ])
+            sensorfeatures_Np_K_O = [sensed_obdistfeatures_Np_K, sensed_evdistfeatures_Np_K,
+                                     sensed_podistfeatures_Np_K, sensed_pudistfeatures_Np_K]
+
+        # Move objects and bounce them if they hit a wall
+        for objx_N_2, objv_N_2 in ((evadersx_Ne_2, evadersv_Ne_2), (poisonx_Npo_2, poisonv_Npo_2)):
+            objx_N_2 += objv_N_2
+            objv_N_2[np.all(objx_N_2 != np.clip(objx_N_2, 0, 1), axis=1)] *= -1
+
+        # the observations of all pursuers, one per row
+        collided_Np_2 = np.c_[is_colliding_ev_Np_Ne.sum(axis=1) > 0, is_colliding_po_Np_Npo.sum(axis=1) > 0]
+        obslist = [*sensorfeatures_Np_K_O, collided_Np_2.astype(np.float64)]
+        if self._addid:
+            obslist.append(np.arange(1., self.n_pursuers + 1.)[:, None])
+        obslist = np.concatenate(obslist, axis=1)
+
+        assert obslist.shape == (self.n_pursuers,) + self.agents[0].observation_space.shape
         self._timesteps += 1
         done = self.is_terminal
         info = dict(evcatches=len(ev_caught), pocatches=len(po_caught))
@@ -257,7 +257,7 @@ class MultiWalkerEnv(AbstractMAEnv, EzPickle):
 
     def __init__(self, n_walkers=2, position_noise=1e-3, angle_noise=1e-3, reward_mech='local',
                  forward_reward=1.0, fall_reward=-100.0, drop_reward=-100.0, ir_use_pos=False, terminate_on_fall=False,
-                 one_hot=False):
+                 one_hot=False, info_dicts=True):
         EzPickle.__init__(self, n_walkers, position_noise, angle_noise, reward_mech, forward_reward,
                           fall_reward, drop_reward, terminate_on_fall, one_hot)
 
@@ -271,6 +271,8 @@ class MultiWalkerEnv(AbstractMAEnv, EzPickle):
         self.ir_use_pos = ir_use_pos
         self.terminate_on_fall = terminate_on_fall
         self.one_hot = one_hot
+        # if false, the infos of a step are a (n_walkers, 2) array of the individual and team rewards
+        self.info_dicts = info_dicts
         self.setup()
         self.seed()
 
@@ -385,56 +387,43 @@ class MultiWalkerEnv(AbstractMAEnv, EzPickle):
 
         self.world.Step(1.0 / FPS, 6 * 30, 2 * 30)
 
-        obs = [walker.get_observation() for walker in self.walkers]
-
-        xpos = np.zeros(self.n_walkers)
-        obs = []
-        done = False
-        # rewards = np.zeros(self.n_walkers)
-        rewards = []
-        info_n = [{'individual_reward': 0., 'team_reward': 0.} for _ in range(self.n_walkers)]
-
-        for i in range(self.n_walkers):
-            pos = self.walkers[i].hull.position
-            x, y = pos.x, pos.y
-            xpos[i] = x
-
-            wobs = self.walkers[i].get_observation()
-            nobs = []
-            for j in [i - 1, i + 1]:
-                # if no neighbor (for edge walkers)
-                if j < 0 or j == self.n_walkers:
-                    nobs.append(0.0)
-                    nobs.append(0.0)
-                else:
-                    xm = (self.walkers[j].hull.position.x - x) / self.package_length
-                    ym = (self.walkers[j].hull.position.y - y) / self.package_length
-                    nobs.append(np.random.normal(xm, self.position_noise))
-                    nobs.append(np.random.normal(ym, self.position_noise))
-            xd = (self.package.position.x - x) / self.package_length
-            yd = (self.package.position.y - y) / self.package_length
-            nobs.append(np.random.normal(xd, self.position_noise))
-            nobs.append(np.random.normal(yd, self.position_noise))
-            nobs.append(np.random.normal(self.package.angle, self.angle_noise))
-            # ID
-            if self.one_hot:
-                nobs.extend(np.eye(MAX_AGENTS)[i])
-            else:
-                nobs.append(float(i) / self.n_walkers)
-            obs.append(np.array(wobs + nobs))
-
-            #shaping = 130 * pos[0] / SCALE
-            shaping = 0.0
-            shaping -= 5.0 * abs(wobs[0])
-            idv_reward = (shaping - self.prev_shaping[i]) + (self.fall_reward * self.fallen_walkers[i])
-            # rewards[i] = shaping - self.prev_shaping[i]
-            # info_n[i]['individual_reward'] += (shaping - self.prev_shaping[i])
-            if self.ir_use_pos:
-                idv_reward += 5.0 * (x - self.prev_pos[i])
-            self.prev_pos[i] = x
-            self.prev_shaping[i] = shaping
-            info_n[i]['individual_reward'] += idv_reward
-            rewards.append([idv_reward])
+        # lidar raycasts and joint states, once per walker
+        wobs = np.array([walker.get_observation() for walker in self.walkers])
+        wpos = np.array([[walker.hull.position.x, walker.hull.position.y] for walker in self.walkers])
+        xpos = wpos[:, 0]
+
+        # displacement of the left and right neighbors (0 for edge walkers) and of the package, package angle
+        nobs = np.zeros((self.n_walkers, 7))
+        noisy = np.zeros((self.n_walkers, 7), dtype=bool)
+        nobs[1:, 0:2] = (wpos[:-1] - wpos[1:]) / self.package_length
+        noisy[1:, 0:2] = True
+        nobs[:-1, 2:4] = (wpos[1:] - wpos[:-1]) / self.package_length
+        noisy[:-1, 2:4] = True
+        nobs[:, 4:6] = (np.array([self.package.position.x, self.package.position.y]) - wpos) / self.package_length
+        nobs[:, 6] = self.package.angle
+        noisy[:, 4:] = True
+        # one draw for all walkers, in the same order as drawing them walker by walker
+        noise_scale = np.broadcast_to([self.position_noise] * 6 + [self.angle_noise], nobs.shape)
+        nobs[noisy] = np.random.normal(nobs[noisy], noise_scale[noisy])
+
+        obs = np.zeros((self.n_walkers, self.observation_space[0].shape[0]))
+        obs[:, :24] = wobs
+        obs[:, 24:31] = nobs
+        # ID
+        if self.one_hot:
+            obs[:, 31:] = np.eye(MAX_AGENTS)[:self.n_walkers]
+        else:
+            obs[:, 31] = np.arange(self.n_walkers) / self.n_walkers
+
+        #shaping = 130 * pos[0] / SCALE
+        shaping = -5.0 * np.abs(wobs[:, 0])
+        idv_rewards = (shaping - self.prev_shaping) + (self.fall_reward * self.fallen_walkers)
+        if self.ir_use_pos:
+            idv_rewards += 5.0 * (xpos - self.prev_pos)
+        self.prev_pos = xpos
+        self.prev_shaping = shaping
+        rewards = [[idv_reward] for idv_reward in idv_rewards.tolist()]
+        pos = wpos[-1]
 
         package_shaping = self.forward_reward * 130 * self.package.position.x / SCALE
         # rewards += (package_shaping - self.prev_package_shaping)
@@ -455,8 +444,10 @@ class MultiWalkerEnv(AbstractMAEnv, EzPickle):
         if self.terminate_on_fall and np.sum(self.fallen_walkers) > 0:
             done = True
 
-        for i in range(self.n_walkers):
-            info_n[i]['team_reward'] = team_reward
+        if self.info_dicts:
+            info_n = [{'individual_reward': idv_r[0], 'team_reward': team_reward} for idv_r in rewards]
+        else:
+            info_n = np.stack([idv_rewards, np.full(self.n_walkers, team_reward)], -1)
 
         if self.reward_mech == 'rs':
             rewards = [[team_reward + idv_r[0]] for idv_r in rewards]
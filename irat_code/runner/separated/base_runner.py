@@ -5,10 +5,11 @@ import os
 import numpy as np
 from itertools import chain
 import torch
-from tensorboardX import SummaryWriter
 
 from irat_code.utils.separated_buffer import SeparatedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
 from irat_code.utils.util import update_linear_schedule
+from irat_code.utils.timer import PhaseTimer
 
 def _t2n(x):
     return x.detach().cpu().numpy()
@@ -57,12 +58,14 @@ class Runner(object):
             if self.use_wandb:
                 self.run_dir = config["run_dir"]
                 self.save_dir = str(wandb.run.dir)
+                self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                           file_format=self.all_args.metrics_file_format)
             else:
                 self.run_dir = config["run_dir"]
                 self.log_dir = str(self.run_dir / 'logs')
                 if not os.path.exists(self.log_dir):
                     os.makedirs(self.log_dir)
-                self.writter = SummaryWriter(self.log_dir)
+                self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
                 self.save_dir = str(self.run_dir / 'models')
                 if not os.path.exists(self.save_dir):
                     os.makedirs(self.save_dir)
@@ -88,11 +91,14 @@ class Runner(object):
         if self.model_dir is not None:
             self.restore()
 
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
         self.trainer = []
         self.buffer = []
         for agent_id in range(self.num_agents):
             # algorithm
             tr = TrainAlgo(self.all_args, self.policy[agent_id], device = self.device)
+            tr.timer = self.timer
             # buffer
             share_observation_space = self.envs.share_observation_space[agent_id] if self.use_centralized_V else self.envs.observation_space[agent_id]
             bu = SeparatedReplayBuffer(self.all_args,
@@ -153,15 +159,9 @@ class Runner(object):
         for agent_id in range(self.num_agents):
             for k, v in train_infos[agent_id].items():
                 agent_k = "agent%i/" % agent_id + k
-                if self.use_wandb:
-                    wandb.log({agent_k: v}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(agent_k, {agent_k: v}, total_num_steps)
+                self.writter.add_scalar(agent_k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         for k, v in env_infos.items():
             if len(v) > 0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
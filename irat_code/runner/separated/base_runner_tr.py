@@ -4,11 +4,12 @@ import os
 import numpy as np
 from itertools import chain
 import torch
-from tensorboardX import SummaryWriter
 import copy
 
 from irat_code.utils.separated_buffer_tr import SeparatedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
 from irat_code.utils.util import update_linear_schedule
+from irat_code.utils.timer import PhaseTimer
 
 
 def _t2n(x):
@@ -59,13 +60,15 @@ class Runner(object):
         else:
             if self.use_wandb:
                 self.save_dir = str(wandb.run.dir)
+                self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                           file_format=self.all_args.metrics_file_format)
                 self.run_dir = config["run_dir"]
             else:
                 self.run_dir = config["run_dir"]
                 self.log_dir = str(self.run_dir / 'logs')
                 if not os.path.exists(self.log_dir):
                     os.makedirs(self.log_dir)
-                self.writter = SummaryWriter(self.log_dir)
+                self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
                 self.save_dir = str(self.run_dir / 'models')
                 if not os.path.exists(self.save_dir):
                     os.makedirs(self.save_dir)
@@ -104,6 +107,8 @@ class Runner(object):
 
         from irat_code.algorithms.r_mappo.idv_mappo import Idv_RMAPPO as IdvTrainAlgo
         from irat_code.algorithms.r_mappo.team_mappo import Team_RMAPPO as TeamTrainAlgo
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
         self.idv_trainer = []
         self.team_trainer = []
         self.idv_buffer = []
@@ -111,6 +116,7 @@ class Runner(object):
         for agent_id in range(self.num_agents):
             # Individual Trainer
             itr = IdvTrainAlgo(self.all_args, self.idv_policy[agent_id], device=self.device)
+            itr.timer = self.timer
             self.idv_trainer.append(itr)
 
             # Individual Buffer
@@ -124,6 +130,7 @@ class Runner(object):
 
             # Team Trainer
             ttr = TeamTrainAlgo(self.all_args, self.team_policy[agent_id], device=self.device)
+            ttr.timer = self.timer
             self.team_trainer.append(ttr)
 
             # Team Buffer
@@ -236,15 +243,9 @@ class Runner(object):
         for agent_id in range(self.num_agents):
             for k, v in train_infos[agent_id].items():
                 agent_k = "agent%i/" % agent_id + k
-                if self.use_wandb:
-                    wandb.log({agent_k: v}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(agent_k, {agent_k: v}, total_num_steps)
+                self.writter.add_scalar(agent_k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         for k, v in env_infos.items():
             if len(v) > 0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
@@ -4,11 +4,14 @@ import os
 import numpy as np
 from itertools import chain
 import torch
-from tensorboardX import SummaryWriter
 import copy
 
 from irat_code.utils.separated_buffer_trsyn import SeparatedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
 from irat_code.utils.util import update_linear_schedule
+from irat_code.utils.timer import PhaseTimer
+from irat_code.utils.checkpoint import CheckpointWriter, latest_checkpoint, load_checkpoint, policy_state_dict, \
+    load_policy_state_dict, trainer_state_dict, load_trainer_state_dict, rng_state, set_rng_state
 
 
 def _t2n(x):
@@ -59,13 +62,15 @@ class Runner(object):
         else:
             if self.use_wandb:
                 self.save_dir = str(wandb.run.dir)
+                self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                           file_format=self.all_args.metrics_file_format)
                 self.run_dir = config["run_dir"]
             else:
                 self.run_dir = config["run_dir"]
                 self.log_dir = str(self.run_dir / 'logs')
                 if not os.path.exists(self.log_dir):
                     os.makedirs(self.log_dir)
-                self.writter = SummaryWriter(self.log_dir)
+                self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
                 self.save_dir = str(self.run_dir / 'models')
                 if not os.path.exists(self.save_dir):
                     os.makedirs(self.save_dir)
@@ -101,16 +106,16 @@ class Runner(object):
             self.team_policy.append(po)
         # print(list(self.idv_policy[1].actor.base.parameters()))
 
-        if self.model_dir is not None:
-            self.restore()
-
         from irat_code.algorithms.r_mappo.rmappo_trsyn import RMappoTrSyn as TrainAlgo
 
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
         self.trainer = []
         self.buffer = []
         for agent_id in range(self.num_agents):
             # Trainer
             tr = TrainAlgo(self.all_args, self.idv_policy[agent_id], self.team_policy[agent_id], device=self.device)
+            tr.timer = self.timer
             self.trainer.append(tr)
 
             # Buffer
@@ -122,9 +127,23 @@ class Runner(object):
                                        self.envs.observation_space[agent_id],
                                        idv_share_obs_space,
                                        team_share_obs_space,
-                                       self.envs.action_space[agent_id])
+                                       self.envs.action_space[agent_id],
+                                       device=self.device)
             self.buffer.append(bu)
 
+        if self.all_args.use_batched_agents:
+            from irat_code.algorithms.r_mappo.rmappo_trsyn_batched import RMappoTrSynBatched
+            self.batched_trainer = RMappoTrSynBatched(self.all_args, self.trainer)
+            self.batched_trainer.timer = self.timer
+
+        # first episode of the run loop, later than 0 when resuming from a checkpoint
+        self.start_episode = 0
+        if self.model_dir is not None:
+            self.restore()
+        if not self.use_render:
+            self.checkpointer = CheckpointWriter(self.save_dir, self.all_args.checkpoint_keep,
+                                                 self.all_args.use_async_checkpoint)
+
         # print(list(self.trainer[0].team_policy.actor.base.parameters()))
         # print(list(self.trainer[0].idv_policy.actor.base.parameters()))
 
@@ -159,23 +178,28 @@ class Runner(object):
                                                                           self.buffer[agent_id].idv_rnn_states_critic[-1],
                                                                           self.buffer[agent_id].masks[-1])
             idv_next_value = _t2n(idv_next_value)
-            self.buffer[agent_id].idv_compute_returns(idv_next_value, self.trainer[agent_id].idv_value_normalizer)
 
             self.trainer[agent_id].team_prep_rollout()
             team_next_value = self.trainer[agent_id].team_policy.get_values(self.buffer[agent_id].team_share_obs[-1],
                                                                             self.buffer[agent_id].team_rnn_states_critic[-1],
                                                                             self.buffer[agent_id].masks[-1])
             team_next_value = _t2n(team_next_value)
-            self.buffer[agent_id].team_compute_returns(team_next_value, self.trainer[agent_id].team_value_normalizer)
+            self.buffer[agent_id].compute_returns(idv_next_value, team_next_value,
+                                                  self.trainer[agent_id].idv_value_normalizer,
+                                                  self.trainer[agent_id].team_value_normalizer)
 
     def train(self, episode):
-        train_infos = []
         for agent_id in range(self.num_agents):
             self.trainer[agent_id].idv_prep_training()
             self.trainer[agent_id].team_prep_training()
 
-            train_info = self.trainer[agent_id].train(self.buffer[agent_id], episode)
+        if self.all_args.use_batched_agents:
+            train_infos = self.batched_trainer.train(self.buffer, episode)
+        else:
+            train_infos = [self.trainer[agent_id].train(self.buffer[agent_id], episode)
+                           for agent_id in range(self.num_agents)]
 
+        for agent_id in range(self.num_agents):
             if self.all_args.idv_use_two_clip:
                 self.trainer[agent_id].update_idv_clip_ratio()
             if self.all_args.idv_use_kl_loss:
@@ -187,8 +211,6 @@ class Runner(object):
                 self.trainer[agent_id].update_team_kl_coef()
 
             self.buffer[agent_id].after_update()
-
-            train_infos.append(train_info)
         # print(train_infos)
         # print("policy_loss", train_infos[0]["policy_loss"])
         # print("team_policy_loss", train_infos[0]["team_policy_loss"])
@@ -202,23 +224,30 @@ class Runner(object):
 
         return train_infos
 
-    def save(self):
-        for agent_id in range(self.num_agents):
-            policy_actor = self.trainer[agent_id].idv_policy.actor
-            torch.save(policy_actor.state_dict(),
-                       str(self.save_dir) + "/individual_actor_agent" + str(agent_id) + ".pt")
-            policy_critic = self.trainer[agent_id].idv_policy.critic
-            torch.save(policy_critic.state_dict(),
-                       str(self.save_dir) + "/individual_critic_agent" + str(agent_id) + ".pt")
-
-            policy_actor = self.trainer[agent_id].team_policy.actor
-            torch.save(policy_actor.state_dict(),
-                       str(self.save_dir) + "/team_actor_agent" + str(agent_id) + ".pt")
-            policy_critic = self.trainer[agent_id].team_policy.critic
-            torch.save(policy_critic.state_dict(),
-                       str(self.save_dir) + "/team_critic_agent" + str(agent_id) + ".pt")
+    def save(self, episode):
+        """Hand a checkpoint of the policies, optimizers, trainers and random generators to the checkpoint writer."""
+        self.checkpointer.save(episode, {"episode": episode,
+                                         "idv_policy": [policy_state_dict(po) for po in self.idv_policy],
+                                         "team_policy": [policy_state_dict(po) for po in self.team_policy],
+                                         "trainer": [trainer_state_dict(tr) for tr in self.trainer],
+                                         "rng": rng_state()})
 
     def restore(self):
+        """
+        Resume from the newest checkpoint in model_dir (or from model_dir itself if it is a checkpoint file). Falls
+        back to the separate actor and critic files of the older runs, which only hold the networks.
+        """
+        path = latest_checkpoint(self.model_dir)
+        if path is not None:
+            checkpoint = load_checkpoint(path)
+            for agent_id in range(self.num_agents):
+                load_policy_state_dict(self.idv_policy[agent_id], checkpoint["idv_policy"][agent_id])
+                load_policy_state_dict(self.team_policy[agent_id], checkpoint["team_policy"][agent_id])
+                load_trainer_state_dict(self.trainer[agent_id], checkpoint["trainer"][agent_id])
+            set_rng_state(checkpoint["rng"])
+            self.start_episode = checkpoint["episode"] + 1
+            return
+
         for agent_id in range(self.num_agents):
             policy_actor_state_dict = torch.load(
                 str(self.model_dir) + '/individual_actor_agent' + str(agent_id) + '.pt')
@@ -241,15 +270,9 @@ class Runner(object):
         for agent_id in range(self.num_agents):
             for k, v in train_infos[agent_id].items():
                 agent_k = "agent%i/" % agent_id + k
-                if self.use_wandb:
-                    wandb.log({agent_k: v}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(agent_k, {agent_k: v}, total_num_steps)
+                self.writter.add_scalar(agent_k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         for k, v in env_infos.items():
             if len(v) > 0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
@@ -120,7 +120,8 @@ class Runner(object):
                                        self.envs.observation_space[agent_id],
                                        idv_share_obs_space,
                                        team_share_obs_space,
-                                       self.envs.action_space[agent_id])
+                                       self.envs.action_space[agent_id],
+                                       device=self.device)
             self.buffer.append(bu)
 
         # self.eval_obs = self.eval_envs.reset()
@@ -154,14 +155,15 @@ class Runner(object):
                                                                           self.buffer[agent_id].idv_rnn_states_critic[-1],
                                                                           self.buffer[agent_id].masks[-1])
             idv_next_value = _t2n(idv_next_value)
-            self.buffer[agent_id].idv_compute_returns(idv_next_value, self.trainer[agent_id].idv_value_normalizer)
 
             self.trainer[agent_id].team_prep_rollout()
             team_next_value = self.trainer[agent_id].team_policy.get_values(self.buffer[agent_id].team_share_obs[-1],
                                                                             self.buffer[agent_id].team_rnn_states_critic[-1],
                                                                             self.buffer[agent_id].masks[-1])
             team_next_value = _t2n(team_next_value)
-            self.buffer[agent_id].team_compute_returns(team_next_value, self.trainer[agent_id].team_value_normalizer)
+            self.buffer[agent_id].compute_returns(idv_next_value, team_next_value,
+                                                  self.trainer[agent_id].idv_value_normalizer,
+                                                  self.trainer[agent_id].team_value_normalizer)
 
     def train(self):
         train_infos = []
@@ -27,6 +27,7 @@ class MPERunner(Runner):
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 for agent_id in range(self.num_agents):
                     self.idv_trainer[agent_id].policy.lr_decay(episode, episodes)
@@ -36,12 +37,14 @@ class MPERunner(Runner):
                 # print(episode, step, "start")
                 # 返回 n个环境的一个step数据
                 # Sample actions 直接从buffer里面取了obv
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
-                    self.idv_collect(step)
+                with self.timer.phase("idv_collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
+                        self.idv_collect(step)
 
                 # Get data using Team Policy
-                team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_act_dists \
-                    = self.team_collect(step, actions)
+                with self.timer.phase("team_collect"):
+                    team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_act_dists \
+                        = self.team_collect(step, actions)
                 # print(len(act_dists[0]), act_dists[0])
                 # t = kld(act_dists[0][0], team_act_dists[0][0])
                 # t.requires_grad_(True)
@@ -49,19 +52,24 @@ class MPERunner(Runner):
                 # print(episode, step, "end")
 
                 # Observe reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
                 # insert data into individual buffer
                 data = obs, rewards, dones, infos, values, actions, action_log_probs, team_log_probs, rnn_states, rnn_states_critic, team_act_dists
-                self.idv_insert(data)
+                with self.timer.phase("insert"):
+                    self.idv_insert(data)
 
                 # insert data into team buffer
                 data = obs, rewards, dones, infos, team_values, team_actions, team_log_probs, action_log_probs, team_rnn, team_rnn_critic, act_dists
-                self.team_insert(data)
+                with self.timer.phase("insert"):
+                    self.team_insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train()
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train()
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
@@ -95,12 +103,15 @@ class MPERunner(Runner):
                         train_infos[agent_id].update(
                             {"average_episode_team_rewards": np.mean(self.team_buffer[agent_id].rewards) * self.episode_length})
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, self.team_trainer, "team_policy")
                 self.eval(total_num_steps, self.idv_trainer, "idv_policy")
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -5,8 +5,9 @@ import numpy as np
 from itertools import chain
 import torch
 
-from irat_code.utils.util import update_linear_schedule
+from irat_code.utils.util import update_linear_schedule, get_info_rewards
 from irat_code.runner.separated.base_runner_trsyn import Runner
+from irat_code.algorithms.utils.distributions import dists_to_params
 import imageio
 from torch.distributions import kl_divergence as kld
 
@@ -23,9 +24,12 @@ class MPERunner(Runner):
         self.warmup()
 
         start = time.time()
+        # steps of the episodes before a resume, which do not count towards the FPS
+        start_num_steps = self.start_episode * self.episode_length * self.n_rollout_threads
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
-        for episode in range(episodes):
+        for episode in range(self.start_episode, episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 for agent_id in range(self.num_agents):
                     self.trainer[agent_id].idv_policy.lr_decay(episode, episodes)
@@ -33,20 +37,24 @@ class MPERunner(Runner):
 
             for step in range(self.episode_length):
                 # Sample actions
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
-                    self.idv_collect(step)
+                with self.timer.phase("idv_collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
+                        self.idv_collect(step)
 
                 # Get data using Team Policy
-                team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_actions_env, team_act_dists = \
-                    self.team_collect(step)
+                with self.timer.phase("team_collect"):
+                    team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_actions_env, team_act_dists = \
+                        self.team_collect(step)
 
                 if self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
                         self.all_args.change_use_policy == "team":
                     actions, actions_env = team_actions, team_actions_env
-                    values, action_log_probs = self.evaluate_actions("idv", step, actions)
+                    with self.timer.phase("evaluate_actions"):
+                        values, action_log_probs = self.evaluate_actions("idv", step, actions)
                     # print("team actions")
                 else:
-                    team_values, team_log_probs = self.evaluate_actions("team", step, actions)
+                    with self.timer.phase("evaluate_actions"):
+                        team_values, team_log_probs = self.evaluate_actions("team", step, actions)
                     # if step == 0:
                     #     print(list(self.trainer[0].team_policy.actor.base.parameters()))
                     #     print(list(self.trainer[1].idv_policy.actor.base.parameters()))
@@ -57,24 +65,28 @@ class MPERunner(Runner):
                     #     raise NotImplementedError
 
                 # Observe reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
                 # insert data into buffer
                 data = obs, rewards, dones, infos, \
                        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train(episode)
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train(episode)
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
 
             # save model
             if episode % self.save_interval == 0 or episode == episodes - 1:
-                self.save()
+                self.save(episode)
 
             # log information
             if episode % self.log_interval == 0:
@@ -87,7 +99,7 @@ class MPERunner(Runner):
                               episodes,
                               total_num_steps,
                               self.num_env_steps,
-                              int(total_num_steps / (end - start))))
+                              int((total_num_steps - start_num_steps) / (end - start))))
 
                 if self.env_name == "MPE":
                     for agent_id in range(self.num_agents):
@@ -97,12 +109,16 @@ class MPERunner(Runner):
                             {"average_episode_team_rewards": np.mean(
                                 self.buffer[agent_id].team_rewards) * self.episode_length})
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+        self.checkpointer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -146,15 +162,7 @@ class MPERunner(Runner):
                                                                 self.buffer[agent_id].idv_rnn_states_critic[step],
                                                                 self.buffer[agent_id].masks[step])
 
-            # print(act_dist[0].probs)
-            tmp_act_dist = []
-            for dist in act_dist:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-                tmp_act_dist.append(tps)
-            act_dists.append(tmp_act_dist)
+            act_dists.append(_t2n(dists_to_params(act_dist)))
 
             # [agents, envs, dim]
             values.append(_t2n(value))
@@ -191,11 +199,7 @@ class MPERunner(Runner):
         action_log_probs = np.array(action_log_probs).transpose((1, 0, 2))
         rnn_states = np.array(rnn_states).transpose((1, 0, 2, 3))
         rnn_states_critic = np.array(rnn_states_critic).transpose((1, 0, 2, 3))
-        # print(act_dists[0][0][0].probs, act_dists[1][0][2].probs)
-        # print(np.array(act_dists), np.array(act_dists).shape)        # 2, 1, 4 n_agents, n_actions, n_threads
-        act_dists = np.array(act_dists).transpose((2, 0, 1))
-        # print(act_dists[0][0][0].probs, act_dists[2][1][0].probs)
-        # print(act_dists, act_dists.shape)
+        act_dists = np.array(act_dists).transpose((1, 0, 2))
 
         return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
 
@@ -226,15 +230,7 @@ class MPERunner(Runner):
             #                                                           idv_actions[:, agent_id],
             #                                                           self.buffer[agent_id].masks[step])
             # act_dists.append(act_dist)
-            tmp_act_dist = []
-            for dist in act_dist:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-                tmp_act_dist.append(tps)
-
-            act_dists.append(tmp_act_dist)
+            act_dists.append(_t2n(dists_to_params(act_dist)))
 
             # [agents, envs, dim]
             values.append(_t2n(value))
@@ -271,7 +267,7 @@ class MPERunner(Runner):
         action_log_probs = np.array(action_log_probs).transpose((1, 0, 2))
         rnn_states = np.array(rnn_states).transpose((1, 0, 2, 3))
         rnn_states_critic = np.array(rnn_states_critic).transpose((1, 0, 2, 3))
-        act_dists = np.array(act_dists).transpose((2, 0, 1))
+        act_dists = np.array(act_dists).transpose((1, 0, 2))
         # print(act_dists.shape)
 
         return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
@@ -341,16 +337,7 @@ class MPERunner(Runner):
             team_share_obs.append(list(chain(*o)))
         team_share_obs = np.array(team_share_obs)
 
-        idv_rewards, team_rewards = [], []
-        for info in infos:
-            irw, trw = [], []
-            for i in range(self.num_agents):
-                irw.append([info[i]["individual_reward"]])
-                trw.append([info[i]["team_reward"]])
-            idv_rewards.append(irw)
-            team_rewards.append(trw)
-        idv_rewards = np.array(idv_rewards)
-        team_rewards = np.array(team_rewards)
+        idv_rewards, team_rewards = get_info_rewards(infos, self.num_agents)  # n_rollout_thread, n_agent, 1
 
         for agent_id in range(self.num_agents):
             if not self.idv_use_shared_obs:
@@ -7,6 +7,7 @@ import torch
 
 from irat_code.utils.util import update_linear_schedule
 from irat_code.runner.separated.base_runner_trsyn_old import Runner
+from irat_code.algorithms.utils.distributions import dists_to_params
 import imageio
 from torch.distributions import kl_divergence as kld
 
@@ -136,15 +137,7 @@ class MPERunner(Runner):
                                                                 self.buffer[agent_id].idv_rnn_states_critic[step],
                                                                 self.buffer[agent_id].masks[step])
 
-            # print(act_dist[0].probs)
-            tmp_act_dist = []
-            for dist in act_dist:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-                tmp_act_dist.append(tps)
-            act_dists.append(tmp_act_dist)
+            act_dists.append(_t2n(dists_to_params(act_dist)))
 
             # [agents, envs, dim]
             values.append(_t2n(value))
@@ -181,11 +174,7 @@ class MPERunner(Runner):
         action_log_probs = np.array(action_log_probs).transpose((1, 0, 2))
         rnn_states = np.array(rnn_states).transpose((1, 0, 2, 3))
         rnn_states_critic = np.array(rnn_states_critic).transpose((1, 0, 2, 3))
-        # print(act_dists[0][0][0].probs, act_dists[1][0][2].probs)
-        # print(np.array(act_dists), np.array(act_dists).shape)        # 2, 1, 4 n_agents, n_actions, n_threads
-        act_dists = np.array(act_dists).transpose((2, 0, 1))
-        # print(act_dists[0][0][0].probs, act_dists[2][1][0].probs)
-        # print(act_dists, act_dists.shape)
+        act_dists = np.array(act_dists).transpose((1, 0, 2))
 
         return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
 
@@ -215,15 +204,7 @@ class MPERunner(Runner):
                                                                       idv_actions[:, agent_id],
                                                                       self.buffer[agent_id].masks[step])
             # act_dists.append(act_dist)
-            tmp_act_dist = []
-            for dist in act_dist:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-                tmp_act_dist.append(tps)
-
-            act_dists.append(tmp_act_dist)
+            act_dists.append(_t2n(dists_to_params(act_dist)))
 
             # [agents, envs, dim]
             values.append(_t2n(value))
@@ -239,7 +220,7 @@ class MPERunner(Runner):
         action_log_probs = np.array(action_log_probs).transpose((1, 0, 2))
         rnn_states = np.array(rnn_states).transpose((1, 0, 2, 3))
         rnn_states_critic = np.array(rnn_states_critic).transpose((1, 0, 2, 3))
-        act_dists = np.array(act_dists).transpose((2, 0, 1))
+        act_dists = np.array(act_dists).transpose((1, 0, 2))
         # print(act_dists.shape)
 
         return values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists
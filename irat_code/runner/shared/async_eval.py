@@ -0,0 +1,200 @@
+import multiprocessing as mp
+import queue
+
+import numpy as np
+import torch
+
+from irat_code.envs.env_wrappers import CloudpickleWrapper
+from irat_code.utils.checkpoint import to_cpu
+
+
+def _t2n(x):
+    return x.detach().cpu().numpy()
+
+
+def actions_to_env(actions, action_space):
+    """Convert the actions of the policy to the one-hot or continuous actions the MPE envs take."""
+    if action_space.__class__.__name__ == 'MultiDiscrete':
+        for i in range(action_space.shape):
+            uc_actions_env = np.eye(action_space.high[i] + 1)[actions[:, :, i]]
+            if i == 0:
+                actions_env = uc_actions_env
+            else:
+                actions_env = np.concatenate((actions_env, uc_actions_env), axis=2)
+    elif action_space.__class__.__name__ == 'Discrete':
+        actions_env = np.squeeze(np.eye(action_space.n)[actions], 2)
+    elif action_space.__class__.__name__ == 'Box':
+        actions_env = actions
+    else:
+        raise NotImplementedError
+    return actions_env
+
+
+@torch.no_grad()
+def run_eval_episode(policy, eval_envs, all_args, num_agents):
+    """
+    Run one deterministic episode of the policy on every eval env.
+    :param policy: (R_MAPPOPolicy) policy to evaluate, in eval mode.
+    :param eval_envs: (ShareVecEnv) MPE eval envs.
+    :param all_args: (argparse.Namespace) arguments of the run.
+    :param num_agents: (int) number of agents.
+
+    :return idv_episode_rewards: (np.ndarray) individual rewards, (episode_length, n_eval_threads, num_agents).
+    :return team_episode_rewards: (np.ndarray) team rewards, (episode_length, n_eval_threads, num_agents).
+    :return catch_infos: (np.ndarray) catch counts of the tag scenarios, (steps, n_eval_threads, num_agents, 2), or
+                         None if the scenario reports none.
+    :return print_eval_infos: (list) detail and additional infos of every eval thread.
+    """
+    n_threads = all_args.n_eval_rollout_threads
+    idv_episode_rewards, team_episode_rewards = [], []
+    eval_obs = eval_envs.reset()
+
+    eval_rnn_states = np.zeros((n_threads, num_agents, all_args.recurrent_N, all_args.hidden_size), dtype=np.float32)
+    eval_masks = np.ones((n_threads, num_agents, 1), dtype=np.float32)
+
+    print_eval_infos = [[] for _ in range(n_threads)]
+    catch_infos = []
+
+    for eval_step in range(all_args.episode_length):
+        eval_action, eval_rnn_states = policy.act(np.concatenate(eval_obs),
+                                                  np.concatenate(eval_rnn_states),
+                                                  np.concatenate(eval_masks),
+                                                  deterministic=True)
+
+        eval_actions = np.array(np.split(_t2n(eval_action), n_threads))
+        eval_rnn_states = np.array(np.split(_t2n(eval_rnn_states), n_threads))
+        eval_actions_env = actions_to_env(eval_actions, eval_envs.action_space[0])
+
+        # Obser reward and next obs
+        eval_obs, eval_rewards, eval_dones, eval_infos = eval_envs.step(eval_actions_env)
+
+        eval_rnn_states[eval_dones == True] = np.zeros(
+            ((eval_dones == True).sum(), all_args.recurrent_N, all_args.hidden_size), dtype=np.float32)
+        eval_masks = np.ones((n_threads, num_agents, 1), dtype=np.float32)
+        eval_masks[eval_dones == True] = np.zeros(((eval_dones == True).sum(), 1), dtype=np.float32)
+
+        team_rewards, idv_rewards, tmp_catch = [], [], []
+        for ti, info in enumerate(eval_infos):
+            tinfo = ""
+            if "detail_infos" in info[0].keys():
+                tinfo += info[0]["detail_infos"]
+            if "additional_infos" in info[0].keys():
+                tinfo += info[0]["additional_infos"]
+            if tinfo != "":
+                print_eval_infos[ti].append(tinfo)
+
+            trw, irw, tc = [], [], []
+            for i in range(num_agents):
+                trw.append(info[i]["team_reward"])
+                irw.append(info[i]["individual_reward"])
+                if "catch_infos" in info[i].keys():
+                    tc.append(info[i]["catch_infos"])
+            team_rewards.append(trw)
+            idv_rewards.append(irw)
+            if len(tc) > 0:
+                tmp_catch.append(tc)
+        idv_episode_rewards.append(idv_rewards)  # episode_length, n_threads, n_agents
+        team_episode_rewards.append(team_rewards)
+        if len(tmp_catch) > 0:
+            catch_infos.append(tmp_catch)
+
+    catch_infos = np.array(catch_infos) if len(catch_infos) > 0 else None
+    return np.array(idv_episode_rewards), np.array(team_episode_rewards), catch_infos, print_eval_infos
+
+
+def _eval_worker(tasks, results, all_args, num_agents, obs_space, act_space, env_fn_wrapper):
+    torch.set_num_threads(1)
+    from irat_code.algorithms.r_mappo.algorithm.rMAPPOPolicy import R_MAPPOPolicy as Policy
+    # only the actor is used, the critic gets the local observation space
+    policy = Policy(all_args, obs_space, obs_space, act_space, device=torch.device("cpu"))
+    policy.actor.eval()
+    eval_envs = env_fn_wrapper.x(all_args)
+    parent = mp.parent_process()
+    try:
+        while True:
+            try:
+                task = tasks.get(timeout=1.0)
+            except queue.Empty:
+                if not parent.is_alive():
+                    break
+                continue
+            if task is None:
+                break
+            total_num_steps, snapshots = task
+            for title, actor_state in snapshots.items():
+                policy.actor.load_state_dict(actor_state)
+                results.put((total_num_steps, title, run_eval_episode(policy, eval_envs, all_args, num_agents)))
+    finally:
+        eval_envs.close()
+
+
+class AsyncEvaluator(object):
+    """
+    Evaluates snapshots of the actors out of the training loop. The snapshots go into a queue read by n_workers
+    processes, every one with its own policy on the cpu and its own eval envs; the results come back tagged with the
+    training step of the snapshot, in the order they are finished.
+    :param all_args: (argparse.Namespace) arguments of the run.
+    :param num_agents: (int) number of agents.
+    :param obs_space: (gym.Space) observation space of an agent.
+    :param act_space: (gym.Space) action space of an agent.
+    :param make_eval_env: (callable) builds the eval envs from all_args, called in every worker.
+    :param n_workers: (int) number of eval processes.
+    """
+
+    def __init__(self, all_args, num_agents, obs_space, act_space, make_eval_env, n_workers=1):
+        # the workers start their own env processes, which forked torch processes do not do reliably
+        ctx = mp.get_context("spawn")
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.n_pending = 0
+        self.workers = [ctx.Process(target=_eval_worker,
+                                    args=(self.tasks, self.results, all_args, num_agents, obs_space, act_space,
+                                          CloudpickleWrapper(make_eval_env)))
+                        for _ in range(n_workers)]
+        for worker in self.workers:
+            worker.start()
+        self.closed = False
+
+    def submit(self, total_num_steps, actors):
+        """
+        :param total_num_steps: (int) training step of the snapshot.
+        :param actors: (dict) actor network to evaluate of every title, e.g. {"team_policy": actor}.
+        """
+        self.tasks.put((total_num_steps, {title: to_cpu(actor.state_dict()) for title, actor in actors.items()}))
+        self.n_pending += len(actors)
+
+    def poll(self, block=False):
+        """
+        :param block: (bool) whether to wait for all submitted snapshots.
+
+        :return results: (list) (total_num_steps, title, eval results) of the finished evaluations, the eval results
+                          as returned by run_eval_episode.
+        """
+        finished = []
+        while self.n_pending > 0:
+            try:
+                result = self.results.get(timeout=10.0) if block else self.results.get_nowait()
+            except queue.Empty:
+                if block and all(worker.is_alive() for worker in self.workers):
+                    continue
+                if block:
+                    raise RuntimeError("an eval worker exited with {} evaluations left".format(self.n_pending))
+                break
+            finished.append(result)
+            self.n_pending -= 1
+        return finished
+
+    def close(self):
+        """
+        Wait for the submitted snapshots and stop the workers.
+        :return results: (list) results of the evaluations that finished since the last poll.
+        """
+        if self.closed:
+            return []
+        finished = self.poll(block=True)
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.closed = True
+        return finished
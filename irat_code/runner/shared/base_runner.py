@@ -2,8 +2,9 @@ import wandb
 import os
 import numpy as np
 import torch
-from tensorboardX import SummaryWriter
 from irat_code.utils.shared_buffer import SharedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
+from irat_code.utils.timer import PhaseTimer
 
 def _t2n(x):
     """Convert torch tensor to a numpy array."""
@@ -58,6 +59,8 @@ class Runner(object):
         else:
             if self.use_wandb:
                 self.save_dir = str(wandb.run.dir)
+                self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                           file_format=self.all_args.metrics_file_format)
                 # self.run_dir = str(wandb.run.dir)
                 self.run_dir = config["run_dir"]
             else:
@@ -65,7 +68,7 @@ class Runner(object):
                 self.log_dir = str(self.run_dir / 'logs')
                 if not os.path.exists(self.log_dir):
                     os.makedirs(self.log_dir)
-                self.writter = SummaryWriter(self.log_dir)
+                self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
                 self.save_dir = str(self.run_dir / 'models')
                 if not os.path.exists(self.save_dir):
                     os.makedirs(self.save_dir)
@@ -89,13 +92,17 @@ class Runner(object):
 
         # algorithm
         self.trainer = TrainAlgo(self.all_args, self.policy, device = self.device)
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
+        self.trainer.timer = self.timer
         
         # buffer
         self.buffer = SharedReplayBuffer(self.all_args,
                                         self.num_agents,
                                         self.envs.observation_space[0],
                                         share_observation_space,
-                                        self.envs.action_space[0])
+                                        self.envs.action_space[0],
+                                        device=self.device)
 
     def run(self):
         """Collect training data, perform training updates, and evaluate policy."""
@@ -155,19 +162,13 @@ class Runner(object):
         :param total_num_steps: (int) total number of training env steps.
         """
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
 
     def log_agent(self, train_infos, total_num_steps):
         for agent_id in range(self.num_agents):
             for k, v in train_infos[agent_id].items():
                 agent_k = "agent%i/" % agent_id + k
-                if self.use_wandb:
-                    wandb.log({agent_k: v}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(agent_k, {agent_k: v}, total_num_steps)
+                self.writter.add_scalar(agent_k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         """
@@ -177,7 +178,4 @@ class Runner(object):
         """
         for k, v in env_infos.items():
             if len(v)>0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
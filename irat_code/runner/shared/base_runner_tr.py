@@ -2,8 +2,9 @@ import wandb
 import os
 import numpy as np
 import torch
-from tensorboardX import SummaryWriter
 from irat_code.utils.shared_buffer_tr import SharedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
+from irat_code.utils.timer import PhaseTimer
 
 
 def _t2n(x):
@@ -56,13 +57,15 @@ class Runner(object):
 
         if self.use_wandb:
             self.save_dir = str(wandb.run.dir)
+            self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                       file_format=self.all_args.metrics_file_format)
             self.run_dir = str(wandb.run.dir)
         else:
             self.run_dir = config["run_dir"]
             self.log_dir = str(self.run_dir / 'logs')
             if not os.path.exists(self.log_dir):
                 os.makedirs(self.log_dir)
-            self.writter = SummaryWriter(self.log_dir)
+            self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
             self.save_dir = str(self.run_dir / 'models')
             if not os.path.exists(self.save_dir):
                 os.makedirs(self.save_dir)
@@ -99,6 +102,10 @@ class Runner(object):
         # algorithm
         self.team_trainer = TeamTrainAlgo(self.all_args, self.team_policy, device=self.device)
         self.idv_trainer = IdvTrainAlgo(self.all_args, self.idv_policy, device=self.device)
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
+        self.team_trainer.timer = self.timer
+        self.idv_trainer.timer = self.timer
 
         # buffer
         self.team_buffer = SharedReplayBuffer(self.all_args,
@@ -187,10 +194,7 @@ class Runner(object):
         :param total_num_steps: (int) total number of training env steps.
         """
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         """
@@ -200,7 +204,4 @@ class Runner(object):
         """
         for k, v in env_infos.items():
             if len(v) > 0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
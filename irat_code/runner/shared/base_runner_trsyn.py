@@ -2,16 +2,37 @@ import wandb
 import os
 import numpy as np
 import torch
-from tensorboardX import SummaryWriter
 from copy import deepcopy
 
 from irat_code.utils.shared_buffer_trsyn import SharedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
+from irat_code.utils.timer import PhaseTimer
+from irat_code.utils.checkpoint import CheckpointWriter, latest_checkpoint, load_checkpoint, policy_state_dict, \
+    load_policy_state_dict, trainer_state_dict, load_trainer_state_dict, rng_state, set_rng_state
+from irat_code.algorithms.utils.distributions import dists_to_params
 
 
 def _t2n(x):
     return x.detach().cpu().numpy()
 
 
+def _pack(xs):
+    """Flatten (batch, ...) arrays / tensors and concatenate them along the last dimension."""
+    if isinstance(xs[0], torch.Tensor):
+        return torch.cat([x.reshape(x.shape[0], -1).float() for x in xs], -1)
+    return np.concatenate([x.reshape(x.shape[0], -1) for x in xs], -1)
+
+
+def _unpack(packed, shapes):
+    """Split an array / tensor built by _pack back into pieces of the given shapes."""
+    sizes = [int(np.prod(shape[1:])) for shape in shapes]
+    if isinstance(packed, torch.Tensor):
+        pieces = torch.split(packed, sizes, -1)
+    else:
+        pieces = np.split(packed, np.cumsum(sizes)[:-1], -1)
+    return [piece.reshape(shape) for piece, shape in zip(pieces, shapes)]
+
+
 class Runner(object):
     def __init__(self, config):
 
@@ -59,13 +80,15 @@ class Runner(object):
         else:
             if self.use_wandb:
                 self.save_dir = str(wandb.run.dir)
+                self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                           file_format=self.all_args.metrics_file_format)
                 self.run_dir = config["run_dir"]
             else:
                 self.run_dir = config["run_dir"]
                 self.log_dir = str(self.run_dir / 'logs')
                 if not os.path.exists(self.log_dir):
                     os.makedirs(self.log_dir)
-                self.writter = SummaryWriter(self.log_dir)
+                self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
                 self.save_dir = str(self.run_dir / 'models')
                 if not os.path.exists(self.save_dir):
                     os.makedirs(self.save_dir)
@@ -99,9 +122,6 @@ class Runner(object):
                                       self.envs.action_space[0],
                                       device=self.device)
 
-        if self.model_dir is not None:
-            self.restore()
-
         if self.all_args.trsyn_use_imp:
             from irat_code.algorithms.r_mappo.rmappo_trsyn_series_imp import RMappoTrSynSeriesImprovement as TrainAlgo
         elif self.all_args.trsyn_use_refine:
@@ -110,13 +130,25 @@ class Runner(object):
             from irat_code.algorithms.r_mappo.rmappo_trsyn import RMappoTrSyn as TrainAlgo
 
         self.trainer = TrainAlgo(self.all_args, self.idv_policy, self.team_policy, device=self.device)
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
+        self.trainer.timer = self.timer
 
         self.buffer = SharedReplayBuffer(self.all_args,
                                          self.num_agents,
                                          self.envs.observation_space[0],
                                          idv_share_observation_space,
                                          team_share_observation_space,
-                                         self.envs.action_space[0])
+                                         self.envs.action_space[0],
+                                         device=self.device)
+
+        # first episode of the run loop, later than 0 when resuming from a checkpoint
+        self.start_episode = 0
+        if self.model_dir is not None:
+            self.restore()
+        if not self.use_render:
+            self.checkpointer = CheckpointWriter(self.save_dir, self.all_args.checkpoint_keep,
+                                                 self.all_args.use_async_checkpoint)
 
     def run(self):
         raise NotImplementedError
@@ -124,11 +156,69 @@ class Runner(object):
     def warmup(self):
         raise NotImplementedError
 
-    def idv_collect(self, step):
+    def collect(self, step, use_team_policy=False):
         raise NotImplementedError
 
-    def team_collect(self, step):
-        raise NotImplementedError
+    @torch.no_grad()
+    def dual_collect(self, step, use_team_policy=False, use_available_actions=False, clip_range=None,
+                     threads=None):
+        """
+        Fused rollout step of the individual and the team policy. The individual policy samples actions and the team
+        policy takes its greedy actions; the executed actions are then evaluated under both policies, so no second
+        forward pass is needed. Inputs are moved to the device and results back to the host in one copy each.
+        :param step: (int) buffer step to read the inputs from.
+        :param use_team_policy: (bool) whether to execute the team actions instead of the individual ones.
+        :param use_available_actions: (bool) whether to mask the actions with buffer.available_actions.
+        :param clip_range: (tuple) if not None, (low, high) bounds the executed (continuous) actions are clipped to.
+        :param threads: (slice) rollout threads to collect for, None for all of them.
+
+        :return: values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists of the individual policy
+                 and team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists of the team policy,
+                 all as np.ndarrays of shape (n_threads, num_agents, ...).
+        """
+        self.trainer.idv_prep_rollout()
+        self.trainer.team_prep_rollout()
+
+        inputs = [self.buffer.idv_share_obs[step], self.buffer.team_share_obs[step], self.buffer.obs[step],
+                  self.buffer.idv_rnn_states[step], self.buffer.team_rnn_states[step],
+                  self.buffer.idv_rnn_states_critic[step], self.buffer.team_rnn_states_critic[step],
+                  self.buffer.masks[step]]
+        if use_available_actions:
+            inputs.append(self.buffer.available_actions[step])
+        if threads is not None:
+            inputs = [x[threads] for x in inputs]
+        inputs = [x.reshape(-1, *x.shape[2:]) for x in inputs]
+        packed = torch.from_numpy(_pack(inputs)).to(dtype=torch.float32, device=self.device)
+        inputs = _unpack(packed, [x.shape for x in inputs])
+        idv_share_obs, team_share_obs, obs, idv_rnn_states, team_rnn_states, \
+        idv_rnn_states_critic, team_rnn_states_critic, masks = inputs[:8]
+        available_actions = inputs[8] if use_available_actions else None
+
+        with self.timer.phase("idv_inference"):
+            values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists \
+                = self.trainer.idv_policy.get_actions(idv_share_obs, obs, idv_rnn_states, idv_rnn_states_critic,
+                                                      masks, available_actions)
+        with self.timer.phase("team_inference"):
+            team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_act_dists \
+                = self.trainer.team_policy.get_actions(team_share_obs, obs, team_rnn_states, team_rnn_states_critic,
+                                                       masks, available_actions, deterministic=True)
+
+        if use_team_policy:
+            actions = team_actions
+        if clip_range is not None:
+            actions = torch.clamp(actions, *clip_range)
+        with self.timer.phase("evaluate_actions"):
+            action_log_probs = self.trainer.idv_policy.log_probs(act_dists, actions)
+            team_log_probs = self.trainer.team_policy.log_probs(team_act_dists, actions)
+
+        outputs = [values, actions, action_log_probs, rnn_states, rnn_states_critic, dists_to_params(act_dists),
+                   team_values, team_log_probs, team_rnn, team_rnn_critic, dists_to_params(team_act_dists)]
+        outputs = _unpack(_t2n(_pack(outputs)), [x.shape for x in outputs])
+        outputs = [x.reshape(-1, self.num_agents, *x.shape[1:]) for x in outputs]
+        if not torch.is_floating_point(actions):
+            outputs[1] = outputs[1].astype(np.int64)
+
+        return tuple(outputs)
 
     def idv_insert(self, data):
         raise NotImplementedError
@@ -146,14 +236,14 @@ class Runner(object):
                                                              np.concatenate(self.buffer.idv_rnn_states_critic[-1]),
                                                              np.concatenate(self.buffer.masks[-1]))
         idv_next_values = np.array(np.split(_t2n(idv_next_values), self.n_rollout_threads))
-        self.buffer.idv_compute_returns(idv_next_values, self.trainer.idv_value_normalizer)
 
         self.trainer.team_prep_rollout()
         team_next_values = self.trainer.team_policy.get_values(np.concatenate(self.buffer.team_share_obs[-1]),
                                                                np.concatenate(self.buffer.team_rnn_states_critic[-1]),
                                                                np.concatenate(self.buffer.masks[-1]))
         team_next_values = np.array(np.split(_t2n(team_next_values), self.n_rollout_threads))
-        self.buffer.team_compute_returns(team_next_values, self.trainer.team_value_normalizer)
+        self.buffer.compute_returns(idv_next_values, team_next_values,
+                                    self.trainer.idv_value_normalizer, self.trainer.team_value_normalizer)
 
     def train(self, episode):
         self.trainer.idv_prep_training()
@@ -185,18 +275,29 @@ class Runner(object):
 
         return train_infos
 
-    def save(self):
-        idv_policy_actor = self.trainer.idv_policy.actor
-        torch.save(idv_policy_actor.state_dict(), str(self.save_dir) + "/individual_actor_agent.pt")
-        idv_policy_critic = self.trainer.idv_policy.critic
-        torch.save(idv_policy_critic.state_dict(), str(self.save_dir) + "/individual_critic_agent.pt")
-
-        team_policy_actor = self.trainer.team_policy.actor
-        torch.save(team_policy_actor.state_dict(), str(self.save_dir) + "/team_actor_agent.pt")
-        team_policy_critic = self.trainer.team_policy.critic
-        torch.save(team_policy_critic.state_dict(), str(self.save_dir) + "/team_critic_agent.pt")
+    def save(self, episode):
+        """Hand a checkpoint of the policies, optimizers, trainer and random generators to the checkpoint writer."""
+        self.checkpointer.save(episode, {"episode": episode,
+                                         "idv_policy": policy_state_dict(self.trainer.idv_policy),
+                                         "team_policy": policy_state_dict(self.trainer.team_policy),
+                                         "trainer": trainer_state_dict(self.trainer),
+                                         "rng": rng_state()})
 
     def restore(self):
+        """
+        Resume from the newest checkpoint in model_dir (or from model_dir itself if it is a checkpoint file). Falls
+        back to the separate actor and critic files of the older runs, which only hold the networks.
+        """
+        path = latest_checkpoint(self.model_dir)
+        if path is not None:
+            checkpoint = load_checkpoint(path)
+            load_policy_state_dict(self.idv_policy, checkpoint["idv_policy"])
+            load_policy_state_dict(self.team_policy, checkpoint["team_policy"])
+            load_trainer_state_dict(self.trainer, checkpoint["trainer"])
+            set_rng_state(checkpoint["rng"])
+            self.start_episode = checkpoint["episode"] + 1
+            return
+
         idv_policy_actor_state_dict = torch.load(str(self.model_dir) + '/individual_actor_agent.pt')
         self.idv_policy.actor.load_state_dict(idv_policy_actor_state_dict)
         idv_policy_critic_state_dict = torch.load(str(self.model_dir) + '/individual_critic_agent.pt')
@@ -207,14 +308,11 @@ class Runner(object):
         team_policy_critic_state_dict = torch.load(str(self.model_dir) + '/team_critic_agent.pt')
         self.team_policy.critic.load_state_dict(team_policy_critic_state_dict)
 
-    def log_agent(self, train_infos, total_num_steps):
+    def log_agent(self, train_infos, total_num_steps, step_metric=None):
         for agent_id in range(self.num_agents):
             for k, v in train_infos[agent_id].items():
                 agent_k = "agent%i/" % agent_id + k
-                if self.use_wandb:
-                    wandb.log({agent_k: v}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(agent_k, {agent_k: v}, total_num_steps)
+                self.writter.add_scalar(agent_k, v, total_num_steps, step_metric)
 
     def log_train(self, train_infos, total_num_steps):
         """
@@ -223,15 +321,9 @@ class Runner(object):
         :param total_num_steps: (int) total number of training env steps.
         """
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         for k, v in env_infos.items():
             if len(v) > 0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
@@ -2,9 +2,10 @@ import wandb
 import os
 import numpy as np
 import torch
-from tensorboardX import SummaryWriter
 
 from irat_code.utils.shared_buffer_trsyn import SharedReplayBuffer
+from irat_code.utils.metrics import MetricsSink
+from irat_code.utils.timer import PhaseTimer
 
 
 def _t2n(x):
@@ -58,13 +59,15 @@ class Runner(object):
         else:
             if self.use_wandb:
                 self.save_dir = str(wandb.run.dir)
+                self.writter = MetricsSink(self.save_dir, use_wandb=True,
+                                           file_format=self.all_args.metrics_file_format)
                 self.run_dir = config["run_dir"]
             else:
                 self.run_dir = config["run_dir"]
                 self.log_dir = str(self.run_dir / 'logs')
                 if not os.path.exists(self.log_dir):
                     os.makedirs(self.log_dir)
-                self.writter = SummaryWriter(self.log_dir)
+                self.writter = MetricsSink(self.log_dir, file_format=self.all_args.metrics_file_format)
                 self.save_dir = str(self.run_dir / 'models')
                 if not os.path.exists(self.save_dir):
                     os.makedirs(self.save_dir)
@@ -98,13 +101,17 @@ class Runner(object):
         from irat_code.algorithms.r_mappo.rmappo_trsyn_rnd import RMappoTrSynRnd as TrainAlgo
 
         self.trainer = TrainAlgo(self.all_args, self.policy, device=self.device)
+        self.timer = PhaseTimer(self.all_args.use_phase_timer, self.device, self.all_args.profiler_start_episode,
+                                self.all_args.profiler_episodes, os.path.join(self.run_dir, 'profiler'))
+        self.trainer.timer = self.timer
 
         self.buffer = SharedReplayBuffer(self.all_args,
                                          self.num_agents,
                                          self.envs.observation_space[0],
                                          idv_share_observation_space,
                                          team_share_observation_space,
-                                         self.envs.action_space[0])
+                                         self.envs.action_space[0],
+                                         device=self.device)
 
     def run(self):
         raise NotImplementedError
@@ -136,8 +143,8 @@ class Runner(object):
         )
         idv_next_values = np.array(np.split(_t2n(idv_next_values), self.n_rollout_threads))
         team_next_values = np.array(np.split(_t2n(team_next_values), self.n_rollout_threads))
-        self.buffer.idv_compute_returns(idv_next_values, self.trainer.idv_value_normalizer)
-        self.buffer.team_compute_returns(team_next_values, self.trainer.team_value_normalizer)
+        self.buffer.compute_returns(idv_next_values, team_next_values,
+                                    self.trainer.idv_value_normalizer, self.trainer.team_value_normalizer)
 
     def train(self, episode):
         self.trainer.prep_training()
@@ -188,10 +195,7 @@ class Runner(object):
         for agent_id in range(self.num_agents):
             for k, v in train_infos[agent_id].items():
                 agent_k = "agent%i/" % agent_id + k
-                if self.use_wandb:
-                    wandb.log({agent_k: v}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(agent_k, {agent_k: v}, total_num_steps)
+                self.writter.add_scalar(agent_k, v, total_num_steps)
 
     def log_train(self, train_infos, total_num_steps):
         """
@@ -200,15 +204,9 @@ class Runner(object):
         :param total_num_steps: (int) total number of training env steps.
         """
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
 
     def log_env(self, env_infos, total_num_steps):
         for k, v in env_infos.items():
             if len(v) > 0:
-                if self.use_wandb:
-                    wandb.log({k: np.mean(v)}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(k, {k: np.mean(v)}, total_num_steps)
+                self.writter.add_scalar(k, np.mean(v), total_num_steps)
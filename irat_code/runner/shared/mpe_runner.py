@@ -20,6 +20,7 @@ class MPERunner(Runner):
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.policy.lr_decay(episode, episodes)
 
@@ -28,10 +29,12 @@ class MPERunner(Runner):
 
             for step in range(self.episode_length):
                 # Sample actions
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env = self.collect(step)
+                with self.timer.phase("collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env = self.collect(step)
                     
                 # Obser reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
                 tirw, ttrw = [], []
                 for info in infos:
@@ -48,11 +51,14 @@ class MPERunner(Runner):
                        rnn_states, rnn_states_critic, episode
 
                 # insert data into buffer
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train()
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train()
             
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
@@ -114,12 +120,15 @@ class MPERunner(Runner):
                     self.log_agent(agent_infos, total_num_steps)
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -23,35 +23,43 @@ class MPERunner(Runner):
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.team_trainer.policy.lr_decay(episode, episodes)
                 self.idv_trainer.policy.lr_decay(episode, episodes)
 
             for step in range(self.episode_length):
                 # Sample actions
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
-                    self.idv_collect(step)
+                with self.timer.phase("idv_collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
+                        self.idv_collect(step)
 
                 # Get data using Team Policy
-                team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
-                    self.team_collect(step, actions)
+                with self.timer.phase("team_collect"):
+                    team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+                        self.team_collect(step, actions)
 
                 # Observe reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
                 # insert data into individual buffer
                 data = obs, rewards, dones, infos, values, actions, action_log_probs, team_log_probs, rnn_states, \
                        rnn_states_critic, team_act_dists
-                self.idv_insert(data)
+                with self.timer.phase("insert"):
+                    self.idv_insert(data)
 
                 # insert data into team buffer
                 data = obs, rewards, dones, infos, team_values, team_actions, team_log_probs, action_log_probs, \
                        team_rnn, team_rnn_critic, act_dists
-                self.team_insert(data)
+                with self.timer.phase("insert"):
+                    self.team_insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train()
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train()
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
@@ -86,12 +94,15 @@ class MPERunner(Runner):
                 train_infos["average_episode_rewards"] = np.mean(self.buffer.rewards) * self.episode_length
                 print("average episode rewards is {}".format(train_infos["average_episode_rewards"]))
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
                 self.log_env(env_infos, total_num_steps)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps)
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
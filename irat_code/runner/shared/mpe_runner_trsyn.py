@@ -4,7 +4,8 @@ from itertools import chain
 import torch
 
 from irat_code.runner.shared.base_runner_trsyn import Runner
-from irat_code.algorithms.utils.distributions import FixedNormal, FixedCategorical
+from irat_code.runner.shared.async_eval import AsyncEvaluator, run_eval_episode
+from irat_code.utils.util import get_info_rewards
 import imageio
 # torch.autograd.set_detect_anomaly(True)
 
@@ -16,61 +17,63 @@ def _t2n(x):
 class MPERunner(Runner):
     def __init__(self, config):
         super(MPERunner, self).__init__(config)
+        # evaluate snapshots of the policies in separate processes instead of in the training loop
+        self.evaluator = None
+        if self.use_eval and self.all_args.use_async_eval and not self.use_render:
+            self.evaluator = AsyncEvaluator(self.all_args, self.num_agents, self.envs.observation_space[0],
+                                            self.envs.action_space[0], config['make_eval_env'],
+                                            self.all_args.n_eval_workers)
 
     def run(self):
         self.warmup()
 
         start = time.time()
+        # steps of the episodes before a resume, which do not count towards the FPS
+        start_num_steps = self.start_episode * self.episode_length * self.n_rollout_threads
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
-        for episode in range(episodes):
+        for episode in range(self.start_episode, episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.idv_policy.lr_decay(episode, episodes)
                 self.trainer.team_policy.lr_decay(episode, episodes)
 
-            for step in range(self.episode_length):
-                # Sample actions using Individual Policy
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
-                    self.idv_collect(step)
-
-                # Get data using Team Policy
-                team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_actions_env, team_act_dists = \
-                    self.team_collect(step)
-
-                if self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
-                        self.all_args.change_use_policy == "team":
-                    actions, actions_env = team_actions, team_actions_env
-                    values, action_log_probs = self.evaluate_actions("idv", step, actions)
-                else:
-                    team_values, team_log_probs = self.evaluate_actions("team", step, actions)
-                    # if step == 0:
-                    #     print(list(self.trainer[0].team_policy.actor.base.parameters()))
-                    #     print(list(self.trainer[1].idv_policy.actor.base.parameters()))
-                    #     print("individual actions", actions.shape, actions)
-                    #     print(act_dists[0][0][0].probs)
-                    #     print(team_values)
-                    #     print(team_log_probs)
-                    #     raise NotImplementedError
-
-                # Observe reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+            use_team_policy = self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
+                self.all_args.change_use_policy == "team"
 
-                # insert data into buffer
-                data = obs, rewards, dones, infos, \
-                       values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
-                       team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
-                self.insert(data)
+            if self.all_args.use_pipelined_rollout:
+                self.pipelined_rollout(use_team_policy)
+            else:
+                for step in range(self.episode_length):
+                    # Sample actions and evaluate them using both Individual Policy and Team Policy
+                    with self.timer.phase("collect"):
+                        values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists, \
+                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+                            self.collect(step, use_team_policy)
+
+                    # Observe reward and next obs
+                    with self.timer.phase("env_step"):
+                        obs, rewards, dones, infos = self.envs.step(actions_env)
+
+                    # insert data into buffer
+                    data = obs, rewards, dones, infos, \
+                           values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
+                           team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
+                    with self.timer.phase("insert"):
+                        self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train(episode)
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train(episode)
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
 
             # save model
             if episode % self.save_interval == 0 or episode == episodes - 1:
-                self.save()
+                self.save(episode)
 
             # log information
             if episode % self.log_interval == 0:
@@ -83,7 +86,7 @@ class MPERunner(Runner):
                               episodes,
                               total_num_steps,
                               self.num_env_steps,
-                              int(total_num_steps / (end - start))))
+                              int((total_num_steps - start_num_steps) / (end - start))))
 
                 if self.env_name == "MPE":
                     agent_infos = [{} for _ in range(self.num_agents)]
@@ -96,11 +99,51 @@ class MPERunner(Runner):
                     self.log_agent(agent_infos, total_num_steps)
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
-                self.eval(total_num_steps, "team_policy")
-                self.eval(total_num_steps, "idv_policy")
+                if self.evaluator is not None:
+                    self.evaluator.submit(total_num_steps, {"team_policy": self.trainer.team_policy.actor,
+                                                            "idv_policy": self.trainer.idv_policy.actor})
+                else:
+                    self.eval(total_num_steps, "team_policy")
+                    self.eval(total_num_steps, "idv_policy")
+            if self.evaluator is not None:
+                for eval_step, title, eval_results in self.evaluator.poll():
+                    self.log_eval(eval_step, title, eval_results)
+
+        self.timer.close()
+        self.checkpointer.close()
+        if self.evaluator is not None:
+            for eval_step, title, eval_results in self.evaluator.close():
+                self.log_eval(eval_step, title, eval_results)
+
+    def pipelined_rollout(self, use_team_policy=False):
+        """
+        Collect one episode with the parts of a SplitVecEnv stepped in turns: the policy runs on one part while the
+        other parts step, and every part is inserted into its own rows of the buffer.
+        :param use_team_policy: (bool) whether to execute the team actions instead of the individual ones.
+        """
+        pending = [None] * len(self.envs.venvs)
+        for step in range(self.episode_length + 1):
+            for part, (venv, threads) in enumerate(zip(self.envs.venvs, self.envs.slices)):
+                if step > 0:
+                    # the results of the previous step, the buffer moves on once every part is inserted
+                    with self.timer.phase("env_step"):
+                        obs, rewards, dones, infos = venv.step_wait()
+                    with self.timer.phase("insert"):
+                        self.insert((obs, rewards, dones, infos) + pending[part], threads,
+                                    advance=part == len(self.envs.venvs) - 1)
+                if step < self.episode_length:
+                    with self.timer.phase("collect"):
+                        values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists, \
+                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+                            self.collect(step, use_team_policy, threads)
+                    with self.timer.phase("env_step"):
+                        venv.step_async(actions_env)
+                    pending[part] = values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
+                                    team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
 
     def warmup(self):
         # reset env
@@ -123,109 +166,10 @@ class MPERunner(Runner):
         self.buffer.team_share_obs[0] = team_share_obs.copy()
 
     @torch.no_grad()
-    def idv_collect(self, step):
-        self.trainer.idv_prep_rollout()
-        value, action, action_log_prob, rnn_states, rnn_states_critic, act_dist \
-            = self.trainer.idv_policy.get_actions(np.concatenate(self.buffer.idv_share_obs[step]),
-                                                  np.concatenate(self.buffer.obs[step]),
-                                                  np.concatenate(self.buffer.idv_rnn_states[step]),
-                                                  np.concatenate(self.buffer.idv_rnn_states_critic[step]),
-                                                  np.concatenate(self.buffer.masks[step]))
-
-        # [self.envs, agents, dim]
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        actions = np.array(np.split(_t2n(action), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-        rnn_states = np.array(np.split(_t2n(rnn_states), self.n_rollout_threads))
-        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), self.n_rollout_threads))
-
-        # act_dists = []
-        # for dist in act_dist:
-        #     tmp_probs = dist.probs.detach()
-        #     tps = []
-        #     for tp in tmp_probs:
-        #         tps.append(type(dist)(probs=tp))
-        #     act_dists.append(tps)
-        # act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
-        # print(act_dists.shape)
-
-        # rearrange action
-        if self.envs.action_space[0].__class__.__name__ == 'MultiDiscrete':
-            for i in range(self.envs.action_space[0].shape):
-                uc_actions_env = np.eye(self.envs.action_space[0].high[i] + 1)[actions[:, :, i]]
-                if i == 0:
-                    actions_env = uc_actions_env
-                else:
-                    actions_env = np.concatenate((actions_env, uc_actions_env), axis=2)
-        elif self.envs.action_space[0].__class__.__name__ == 'Discrete':
-            actions_env = np.squeeze(np.eye(self.envs.action_space[0].n)[actions], 2)
-        elif self.envs.action_space[0].__class__.__name__ == 'Box':
-            actions_env = actions
-        else:
-            raise NotImplementedError
-
-        return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
-
-    @torch.no_grad()
-    def team_collect(self, step):
-        self.trainer.team_prep_rollout()
-        value, action, action_log_prob, rnn_states, rnn_states_critic, act_dist \
-            = self.trainer.team_policy.get_actions(np.concatenate(self.buffer.team_share_obs[step]),
-                                                   np.concatenate(self.buffer.obs[step]),
-                                                   np.concatenate(self.buffer.team_rnn_states[step]),
-                                                   np.concatenate(self.buffer.team_rnn_states_critic[step]),
-                                                   np.concatenate(self.buffer.masks[step]),
-                                                   deterministic=True)
-
-        # [self.envs, agents, dim]
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        actions = np.array(np.split(_t2n(action), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-        rnn_states = np.array(np.split(_t2n(rnn_states), self.n_rollout_threads))
-        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), self.n_rollout_threads))
-
-        # act_dists = []
-        # for dist in act_dist:
-        #     tmp_probs = dist.probs.detach()
-        #     tps = []
-        #     for tp in tmp_probs:
-        #         tps.append(type(dist)(probs=tp))
-        #     act_dists.append(tps)
-        # act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
+    def collect(self, step, use_team_policy=False, threads=None):
+        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
+        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+            self.dual_collect(step, use_team_policy, threads=threads)
 
         # rearrange action
         if self.envs.action_space[0].__class__.__name__ == 'MultiDiscrete':
@@ -242,38 +186,10 @@ class MPERunner(Runner):
         else:
             raise NotImplementedError
 
-        return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
-
-    @torch.no_grad()
-    def evaluate_actions(self, policy: str, step, actions):
-        if policy == "team":
-            self.trainer.team_prep_rollout()
-            exc_policy = self.trainer.team_policy
-            share_obs = np.concatenate(self.buffer.team_share_obs[step])
-            obs = np.concatenate(self.buffer.obs[step])
-            rnn_states = np.concatenate(self.buffer.team_rnn_states[step])
-            rnn_states_critic = np.concatenate(self.buffer.team_rnn_states_critic[step])
-            masks = np.concatenate(self.buffer.masks[step])
-        else:
-            self.trainer.idv_prep_rollout()
-            exc_policy = self.trainer.idv_policy
-            share_obs = np.concatenate(self.buffer.idv_share_obs[step])
-            obs = np.concatenate(self.buffer.obs[step])
-            rnn_states = np.concatenate(self.buffer.idv_rnn_states[step])
-            rnn_states_critic = np.concatenate(self.buffer.idv_rnn_states_critic[step])
-            masks = np.concatenate(self.buffer.masks[step])
-
-            # print(type(policy), policy.evaluate_actions)
-        value, action_log_prob, _, _ \
-            = exc_policy.evaluate_actions(share_obs, obs, rnn_states, rnn_states_critic,
-                                          np.concatenate(actions), masks)
-
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
+        return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists, \
+               team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
 
-        return values, action_log_probs
-
-    def insert(self, data):
+    def insert(self, data, threads=None, advance=True):
         obs, rewards, dones, infos, \
         values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
         team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = data
@@ -290,123 +206,48 @@ class MPERunner(Runner):
                                                    *self.buffer.team_rnn_states_critic.shape[3:]),
                                                   dtype=np.float32)
 
-        masks = np.ones((self.n_rollout_threads, self.num_agents, 1), dtype=np.float32)
+        masks = np.ones((obs.shape[0], self.num_agents, 1), dtype=np.float32)
         masks[dones == True] = np.zeros(((dones == True).sum(), 1), dtype=np.float32)
 
         if self.idv_use_shared_obs:
-            idv_share_obs = obs.reshape(self.n_rollout_threads, -1)
+            idv_share_obs = obs.reshape(obs.shape[0], -1)
             idv_share_obs = np.expand_dims(idv_share_obs, 1).repeat(self.num_agents, axis=1)
         else:
             idv_share_obs = obs
 
         if self.use_centralized_V:
-            team_share_obs = obs.reshape(self.n_rollout_threads, -1)
+            team_share_obs = obs.reshape(obs.shape[0], -1)
             team_share_obs = np.expand_dims(team_share_obs, 1).repeat(self.num_agents, axis=1)
         else:
             team_share_obs = obs
 
-        idv_rewards, team_rewards = [], []
-        for info in infos:
-            irw, trw = [], []
-            for i in range(self.num_agents):
-                irw.append([info[i]["individual_reward"]])
-                trw.append([info[i]["team_reward"]])
-            idv_rewards.append(irw)
-            team_rewards.append(trw)
-        idv_rewards = np.array(idv_rewards)     # n_rollout_thread, n_agent, 1
-        team_rewards = np.array(team_rewards)
+        idv_rewards, team_rewards = get_info_rewards(infos, self.num_agents)  # n_rollout_thread, n_agent, 1
 
         self.buffer.insert(idv_share_obs, team_share_obs, obs,
                            rnn_states, team_rnn, rnn_states_critic, team_rnn_critic,
                            actions, act_dists, team_act_dists, action_log_probs, team_log_probs,
-                           values, team_values, idv_rewards, team_rewards, masks)
+                           values, team_values, idv_rewards, team_rewards, masks,
+                           threads=threads, advance=advance)
 
     @torch.no_grad()
     def eval(self, total_num_steps, title):
-        idv_episode_rewards, team_episode_rewards = [], []
-        eval_obs = self.eval_envs.reset()
-
         if title == "team_policy":
-            eval_rnn_states = np.zeros((self.n_eval_rollout_threads, *self.buffer.team_rnn_states.shape[2:]),
-                                       dtype=np.float32)
-        else:
-            eval_rnn_states = np.zeros((self.n_eval_rollout_threads, *self.buffer.idv_rnn_states.shape[2:]),
-                                       dtype=np.float32)
-        eval_masks = np.ones((self.n_eval_rollout_threads, self.num_agents, 1), dtype=np.float32)
-
-        print_eval_infos = [[] for _ in range(self.n_eval_rollout_threads)]
-        catch_infos = []
-
-        for eval_step in range(self.all_args.episode_length):
-            if title == "team_policy":
-                self.trainer.team_prep_rollout()
-                policy = self.trainer.team_policy
-            else:
-                self.trainer.idv_prep_rollout()
-                policy = self.trainer.idv_policy
-            eval_action, eval_rnn_states = policy.act(np.concatenate(eval_obs),
-                                                      np.concatenate(eval_rnn_states),
-                                                      np.concatenate(eval_masks),
-                                                      deterministic=True)
-
-            eval_actions = np.array(np.split(_t2n(eval_action), self.n_eval_rollout_threads))
-            eval_rnn_states = np.array(np.split(_t2n(eval_rnn_states), self.n_eval_rollout_threads))
-
-            if self.eval_envs.action_space[0].__class__.__name__ == 'MultiDiscrete':
-                for i in range(self.eval_envs.action_space[0].shape):
-                    eval_uc_actions_env = np.eye(self.eval_envs.action_space[0].high[i] + 1)[eval_actions[:, :, i]]
-                    if i == 0:
-                        eval_actions_env = eval_uc_actions_env
-                    else:
-                        eval_actions_env = np.concatenate((eval_actions_env, eval_uc_actions_env), axis=2)
-            elif self.eval_envs.action_space[0].__class__.__name__ == 'Discrete':
-                eval_actions_env = np.squeeze(np.eye(self.eval_envs.action_space[0].n)[eval_actions], 2)
-            elif self.envs.action_space[0].__class__.__name__ == 'Box':
-                eval_actions_env = eval_actions
-            else:
-                raise NotImplementedError
-
-            # Obser reward and next obs
-            eval_obs, eval_rewards, eval_dones, eval_infos = self.eval_envs.step(eval_actions_env)
-
-            eval_rnn_states[eval_dones == True] = np.zeros(
-                ((eval_dones == True).sum(), self.recurrent_N, self.hidden_size), dtype=np.float32)
-            eval_masks = np.ones((self.n_eval_rollout_threads, self.num_agents, 1), dtype=np.float32)
-            eval_masks[eval_dones == True] = np.zeros(((eval_dones == True).sum(), 1), dtype=np.float32)
-
-            team_rewards, idv_rewards, tmp_catch = [], [], []
-            for ti, info in enumerate(eval_infos):
-                tinfo = ""
-                if "detail_infos" in info[0].keys():
-                    tinfo += info[0]["detail_infos"]
-                if "additional_infos" in info[0].keys():
-                    tinfo += info[0]["additional_infos"]
-                if tinfo != "":
-                    print_eval_infos[ti].append(tinfo)
-
-                trw, irw, tc = [], [], []
-                for i in range(self.num_agents):
-                    trw.append(info[i]["team_reward"])
-                    irw.append(info[i]["individual_reward"])
-                    if "catch_infos" in info[i].keys():
-                        tc.append(info[i]["catch_infos"])
-                team_rewards.append(trw)
-                idv_rewards.append(irw)
-                if len(tc) > 0:
-                    tmp_catch.append(tc)
-            idv_episode_rewards.append(idv_rewards)  # episode_length, n_threads, n_agents
-            team_episode_rewards.append(team_rewards)
-            if len(tmp_catch) > 0:
-                catch_infos.append(tmp_catch)
-
-        # self.eval_obs = eval_obs
-        # eval_episode_rewards = np.array(eval_episode_rewards)
-        idv_episode_rewards = np.array(idv_episode_rewards)
-        team_episode_rewards = np.array(team_episode_rewards)
-        if len(catch_infos) > 0:
-            catch_infos = np.array(catch_infos)
+            self.trainer.team_prep_rollout()
+            policy = self.trainer.team_policy
         else:
-            catch_infos = None
+            self.trainer.idv_prep_rollout()
+            policy = self.trainer.idv_policy
+        self.log_eval(total_num_steps, title,
+                      run_eval_episode(policy, self.eval_envs, self.all_args, self.num_agents))
+
+    def log_eval(self, total_num_steps, title, eval_results):
+        """
+        Log the eval rewards and catch counts of a policy and append its detail infos to the eval log.
+        :param total_num_steps: (int) training step of the evaluated policy.
+        :param title: (str) "team_policy" or "idv_policy".
+        :param eval_results: (tuple) results of run_eval_episode.
+        """
+        idv_episode_rewards, team_episode_rewards, catch_infos, print_eval_infos = eval_results
 
         eval_train_infos = []
         for agent_id in range(self.num_agents):
@@ -426,7 +267,9 @@ class MPERunner(Runner):
                 tinfos[title + "_eval_team_catch_total_num"] = np.sum(catch_infos[:, :, agent_id, 1])
                 print(title + " eval team catch total num: " + str(np.sum(catch_infos[:, :, agent_id, 1])))
             eval_train_infos.append(tinfos)
-        self.log_agent(eval_train_infos, total_num_steps)
+        # the results of the asynchronous evaluation come in after training went on, wandb plots them against the
+        # step of the evaluated snapshot
+        self.log_agent(eval_train_infos, total_num_steps, "eval_total_num_steps")
 
         with open(str(self.eval_log_dir), 'a+') as f:
             for fi, infos in enumerate(print_eval_infos):
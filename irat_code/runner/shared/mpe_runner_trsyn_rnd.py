@@ -6,7 +6,7 @@ from copy import deepcopy
 
 from irat_code.runner.shared.base_runner_trsyn_rnd import Runner
 import imageio
-from irat_code.algorithms.utils.distributions import FixedNormal, FixedCategorical, FixedBernoulli
+from irat_code.algorithms.utils.distributions import dists_to_params
 
 
 def _t2n(x):
@@ -24,15 +24,17 @@ class MPERunner(Runner):
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.policy.lr_decay(episode, episodes)
                 # self.trainer.team_policy.lr_decay(episode, episodes)
 
             for step in range(self.episode_length):
                 # Sample actions using Individual Policy
-                values, team_values, actions, action_log_probs, rnn_states, \
-                rnn_states_critic, team_rnn_critic, actions_env, act_dists = \
-                    self.collect(step)
+                with self.timer.phase("collect"):
+                    values, team_values, actions, action_log_probs, rnn_states, \
+                    rnn_states_critic, team_rnn_critic, actions_env, act_dists = \
+                        self.collect(step)
 
                 # values, team_values, action_log_probs = self.evaluate_actions(step, actions)
                 team_log_probs = deepcopy(action_log_probs)
@@ -51,17 +53,21 @@ class MPERunner(Runner):
                 #     raise NotImplementedError
 
                 # Observe reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
                 # insert data into buffer
                 data = obs, rewards, dones, infos, \
                        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train(episode)
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train(episode)
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
@@ -94,12 +100,15 @@ class MPERunner(Runner):
                 self.log_agent(agent_infos, total_num_steps)
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -144,23 +153,7 @@ class MPERunner(Runner):
         # if self.envs.action_space[0].__class__.__name__ == 'Box':
         #     actions = np.clip(actions, self.envs.action_space[0].low[0], self.envs.action_space[0].high[0])
 
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
+        act_dists = np.array(np.split(_t2n(dists_to_params(act_dist)), self.n_rollout_threads))
 
         # rearrange action
         if self.envs.action_space[0].__class__.__name__ == 'MultiDiscrete':
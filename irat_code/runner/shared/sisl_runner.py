@@ -2,6 +2,7 @@ import time
 import numpy as np
 import torch
 from irat_code.runner.shared.base_runner import Runner
+from irat_code.utils.util import get_info_rewards
 import wandb
 import imageio
 
@@ -23,6 +24,7 @@ class SISLRunner(Runner):
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.policy.lr_decay(episode, episodes)
 
@@ -31,31 +33,29 @@ class SISLRunner(Runner):
 
             for step in range(self.episode_length):
                 # Sample actions
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env = self.collect(step)
+                with self.timer.phase("collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env = self.collect(step)
 
                 # Obser reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
-                tirw, ttrw = [], []
-                for info in infos:
-                    irw, trw = [], []
-                    for i in range(self.num_agents):
-                        irw.append(info[i]["individual_reward"])
-                        trw.append(info[i]["team_reward"])
-                    tirw.append(irw)
-                    ttrw.append(trw)
-                idv_rewards.append(tirw)
-                team_rewards.append(ttrw)
+                tirw, ttrw = get_info_rewards(infos, self.num_agents)
+                idv_rewards.append(tirw[..., 0])
+                team_rewards.append(ttrw[..., 0])
 
                 data = obs, rewards, dones, infos, values, actions, action_log_probs, \
                        rnn_states, rnn_states_critic, episode
 
                 # insert data into buffer
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train()
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train()
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
@@ -116,12 +116,15 @@ class SISLRunner(Runner):
                 self.log_agent(agent_infos, total_num_steps)
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -195,16 +198,7 @@ class SISLRunner(Runner):
         masks = np.ones((self.n_rollout_threads, self.num_agents, 1), dtype=np.float32)
         masks[dones == True] = np.zeros(((dones == True).sum(), 1), dtype=np.float32)
 
-        idv_rewards, team_rewards = [], []
-        for info in infos:
-            trw, irw = [], []
-            for i in range(self.num_agents):
-                irw.append([info[i]["individual_reward"]])
-                trw.append([info[i]["team_reward"]])
-            idv_rewards.append(irw)
-            team_rewards.append(trw)
-        idv_rewards = np.array(idv_rewards)
-        team_rewards = np.array(team_rewards)
+        idv_rewards, team_rewards = get_info_rewards(infos, self.num_agents)  # n_rollout_thread, n_agent, 1
 
         if self.all_args.change_reward:
             if episode > self.all_args.change_reward_episode:
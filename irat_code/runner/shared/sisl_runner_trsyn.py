@@ -4,8 +4,8 @@ from itertools import chain
 import torch
 
 from irat_code.runner.shared.base_runner_trsyn import Runner
+from irat_code.utils.util import get_info_rewards
 import imageio
-from irat_code.algorithms.utils.distributions import FixedNormal, FixedCategorical, FixedBernoulli
 
 
 def _t2n(x):
@@ -20,57 +20,49 @@ class SISLRunner(Runner):
         self.warmup()
 
         start = time.time()
+        # steps of the episodes before a resume, which do not count towards the FPS
+        start_num_steps = self.start_episode * self.episode_length * self.n_rollout_threads
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
-        for episode in range(episodes):
+        for episode in range(self.start_episode, episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.idv_policy.lr_decay(episode, episodes)
                 self.trainer.team_policy.lr_decay(episode, episodes)
 
+            use_team_policy = self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
+                self.all_args.change_use_policy == "team"
+
             for step in range(self.episode_length):
-                # Sample actions using Individual Policy
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists = \
-                    self.idv_collect(step)
-
-                # Get data using Team Policy
-                team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_actions_env, team_act_dists = \
-                    self.team_collect(step)
-
-                if self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
-                        self.all_args.change_use_policy == "team":
-                    actions, actions_env = team_actions, team_actions_env
-                values, action_log_probs = self.evaluate_actions("idv", step, actions)
-                team_values, team_log_probs = self.evaluate_actions("team", step, actions)
-                # else:
-                #     team_values, team_log_probs = self.evaluate_actions("team", step, actions)
-                    # if step == 0:
-                    #     print(list(self.trainer[0].team_policy.actor.base.parameters()))
-                    #     print(list(self.trainer[1].idv_policy.actor.base.parameters()))
-                    #     print("individual actions", actions.shape, actions)
-                    #     print(act_dists[0][0][0].probs)
-                    #     print(team_values)
-                    #     print(team_log_probs)
-                    #     raise NotImplementedError
+                # Sample actions and evaluate them using both Individual Policy and Team Policy
+                with self.timer.phase("collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists, \
+                    team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+                        self.collect(step, use_team_policy)
 
                 # Observe reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions_env)
+                with self.timer.phase("env_step"):
+                    obs, rewards, dones, infos = self.envs.step(actions_env)
 
                 # insert data into buffer
                 data = obs, rewards, dones, infos, \
                        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train(episode)
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train(episode)
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
 
             # save model
             if episode % self.save_interval == 0 or episode == episodes - 1:
-                self.save()
+                self.save(episode)
 
             # log information
             if episode % self.log_interval == 0:
@@ -83,7 +75,7 @@ class SISLRunner(Runner):
                               episodes,
                               total_num_steps,
                               self.num_env_steps,
-                              int(total_num_steps / (end - start))))
+                              int((total_num_steps - start_num_steps) / (end - start))))
 
                 # if self.env_name == "MPE":
                 agent_infos = [{} for _ in range(self.num_agents)]
@@ -96,12 +88,16 @@ class SISLRunner(Runner):
                 self.log_agent(agent_infos, total_num_steps)
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+        self.checkpointer.close()
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -123,153 +119,25 @@ class SISLRunner(Runner):
         self.buffer.team_share_obs[0] = team_share_obs.copy()
 
     @torch.no_grad()
-    def idv_collect(self, step):
-        self.trainer.idv_prep_rollout()
-        value, action, action_log_prob, rnn_states, rnn_states_critic, act_dist \
-            = self.trainer.idv_policy.get_actions(np.concatenate(self.buffer.idv_share_obs[step]),
-                                                  np.concatenate(self.buffer.obs[step]),
-                                                  np.concatenate(self.buffer.idv_rnn_states[step]),
-                                                  np.concatenate(self.buffer.idv_rnn_states_critic[step]),
-                                                  np.concatenate(self.buffer.masks[step]))
-
-        # [self.envs, agents, dim]
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        actions = np.array(np.split(_t2n(action), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-        rnn_states = np.array(np.split(_t2n(rnn_states), self.n_rollout_threads))
-        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), self.n_rollout_threads))
+    def collect(self, step, use_team_policy=False):
+        clip_range = None
         if self.envs.action_space[0].__class__.__name__ == 'Box' and self.all_args.action_use_clip:
-            actions = np.clip(actions, self.envs.action_space[0].low[0], self.envs.action_space[0].high[0])
-
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
-
-        # rearrange action
-        if self.envs.action_space[0].__class__.__name__ == 'Box':
-            actions_env = actions
-        elif self.envs.action_space[0].__class__.__name__ == 'Discrete':
-            actions_env = actions.squeeze(2)
-        else:
-            raise NotImplementedError
-        # if self.envs.action_space[0].__class__.__name__ == 'MultiDiscrete':
-        #     for i in range(self.envs.action_space[0].shape):
-        #         uc_actions_env = np.eye(self.envs.action_space[0].high[i] + 1)[actions[:, :, i]]
-        #         if i == 0:
-        #             actions_env = uc_actions_env
-        #         else:
-        #             actions_env = np.concatenate((actions_env, uc_actions_env), axis=2)
-        # elif self.envs.action_space[0].__class__.__name__ == 'Discrete':
-        #     actions_env = np.squeeze(np.eye(self.envs.action_space[0].n)[actions], 2)
-        # else:
-        #     raise NotImplementedError
-
-        return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
+            clip_range = (float(self.envs.action_space[0].low[0]), float(self.envs.action_space[0].high[0]))
 
-    @torch.no_grad()
-    def team_collect(self, step):
-        self.trainer.team_prep_rollout()
-        value, action, action_log_prob, rnn_states, rnn_states_critic, act_dist \
-            = self.trainer.team_policy.get_actions(np.concatenate(self.buffer.team_share_obs[step]),
-                                                   np.concatenate(self.buffer.obs[step]),
-                                                   np.concatenate(self.buffer.team_rnn_states[step]),
-                                                   np.concatenate(self.buffer.team_rnn_states_critic[step]),
-                                                   np.concatenate(self.buffer.masks[step]),
-                                                   deterministic=True)
-
-        # [self.envs, agents, dim]
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        actions = np.array(np.split(_t2n(action), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-        rnn_states = np.array(np.split(_t2n(rnn_states), self.n_rollout_threads))
-        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), self.n_rollout_threads))
-        if self.envs.action_space[0].__class__.__name__ == 'Box' and self.all_args.action_use_clip:
-            actions = np.clip(actions, self.envs.action_space[0].low[0], self.envs.action_space[0].high[0])
-
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
+        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
+        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+            self.dual_collect(step, use_team_policy, clip_range=clip_range)
 
         # rearrange action
         if self.envs.action_space[0].__class__.__name__ == 'Box':
             actions_env = actions
-            # print(actions_env.shape)
-            # print(actions_env)
-            # raise NotImplementedError
         elif self.envs.action_space[0].__class__.__name__ == 'Discrete':
             actions_env = actions.squeeze(2)
         else:
             raise NotImplementedError
-        # if self.envs.action_space[0].__class__.__name__ == 'MultiDiscrete':
-        #     for i in range(self.envs.action_space[0].shape):
-        #         uc_actions_env = np.eye(self.envs.action_space[0].high[i] + 1)[actions[:, :, i]]
-        #         if i == 0:
-        #             actions_env = uc_actions_env
-        #         else:
-        #             actions_env = np.concatenate((actions_env, uc_actions_env), axis=2)
-        # elif self.envs.action_space[0].__class__.__name__ == 'Discrete':
-        #     actions_env = np.squeeze(np.eye(self.envs.action_space[0].n)[actions], 2)
-        # else:
-        #     raise NotImplementedError
-
-        return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists
-
-    @torch.no_grad()
-    def evaluate_actions(self, policy: str, step, actions):
-        if policy == "team":
-            self.trainer.team_prep_rollout()
-            exc_policy = self.trainer.team_policy
-            share_obs = np.concatenate(self.buffer.team_share_obs[step])
-            obs = np.concatenate(self.buffer.obs[step])
-            rnn_states = np.concatenate(self.buffer.team_rnn_states[step])
-            rnn_states_critic = np.concatenate(self.buffer.team_rnn_states_critic[step])
-            masks = np.concatenate(self.buffer.masks[step])
-        else:
-            self.trainer.idv_prep_rollout()
-            exc_policy = self.trainer.idv_policy
-            share_obs = np.concatenate(self.buffer.idv_share_obs[step])
-            obs = np.concatenate(self.buffer.obs[step])
-            rnn_states = np.concatenate(self.buffer.idv_rnn_states[step])
-            rnn_states_critic = np.concatenate(self.buffer.idv_rnn_states_critic[step])
-            masks = np.concatenate(self.buffer.masks[step])
-
-            # print(type(policy), policy.evaluate_actions)
-        value, action_log_prob, _, _ \
-            = exc_policy.evaluate_actions(share_obs, obs, rnn_states, rnn_states_critic,
-                                          np.concatenate(actions), masks)
-
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
 
-        return values, action_log_probs
+        return values, actions, action_log_probs, rnn_states, rnn_states_critic, actions_env, act_dists, \
+               team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
 
     def insert(self, data):
         obs, rewards, dones, infos, \
@@ -303,16 +171,7 @@ class SISLRunner(Runner):
         else:
             team_share_obs = obs
 
-        idv_rewards, team_rewards = [], []
-        for info in infos:
-            irw, trw = [], []
-            for i in range(self.num_agents):
-                irw.append([info[i]["individual_reward"]])
-                trw.append([info[i]["team_reward"]])
-            idv_rewards.append(irw)
-            team_rewards.append(trw)
-        idv_rewards = np.array(idv_rewards)     # n_rollout_thread, n_agent, 1
-        team_rewards = np.array(team_rewards)
+        idv_rewards, team_rewards = get_info_rewards(infos, self.num_agents)  # n_rollout_thread, n_agent, 1
 
         self.buffer.insert(idv_share_obs, team_share_obs, obs,
                            rnn_states, team_rnn, rnn_states_critic, team_rnn_critic,
@@ -23,6 +23,7 @@ class SMACRunner(Runner):
         last_battles_won = np.zeros(self.n_rollout_threads, dtype=np.float32)
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.policy.lr_decay(episode, episodes)
 
@@ -31,10 +32,12 @@ class SMACRunner(Runner):
 
             for step in range(self.episode_length):
                 # Sample actions
-                values, actions, action_log_probs, rnn_states, rnn_states_critic = self.collect(step)
+                with self.timer.phase("collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic = self.collect(step)
                     
                 # Obser reward and next obs
-                obs, share_obs, rewards, dones, infos, available_actions = self.envs.step(actions)
+                with self.timer.phase("env_step"):
+                    obs, share_obs, rewards, dones, infos, available_actions = self.envs.step(actions)
 
                 tirw, ttrw = [], []
                 for info in infos:
@@ -52,11 +55,14 @@ class SMACRunner(Runner):
                        rnn_states, rnn_states_critic, episode
                 
                 # insert data into buffer
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train()
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train()
             
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads           
@@ -93,10 +99,7 @@ class SMACRunner(Runner):
 
                     incre_win_rate = np.sum(incre_battles_won)/np.sum(incre_battles_game) if np.sum(incre_battles_game)>0 else 0.0
                     print("incre win rate is {}.".format(incre_win_rate))
-                    if self.use_wandb:
-                        wandb.log({"incre_win_rate": incre_win_rate}, step=total_num_steps)
-                    else:
-                        self.writter.add_scalars("incre_win_rate", {"incre_win_rate": incre_win_rate}, total_num_steps)
+                    self.writter.add_scalar("incre_win_rate", incre_win_rate, total_num_steps)
                     
                     last_battles_game = battles_game
                     last_battles_won = battles_won
@@ -105,12 +108,15 @@ class SMACRunner(Runner):
                 train_infos['dead_ratio'] = 1 - self.buffer.active_masks.sum() / reduce(lambda x, y: x*y, list(self.buffer.active_masks.shape))
                 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs, share_obs, available_actions = self.envs.reset()
@@ -192,10 +198,7 @@ class SMACRunner(Runner):
     def log_train(self, train_infos, total_num_steps):
         train_infos["average_step_rewards"] = np.mean(self.buffer.rewards)
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
     
     @torch.no_grad()
     def eval(self, total_num_steps, title):
@@ -265,8 +268,5 @@ class SMACRunner(Runner):
                 self.log_env(eval_env_infos, total_num_steps)
                 eval_win_rate = eval_battles_won/eval_episode
                 print(title + " eval win rate is {}.".format(eval_win_rate))
-                if self.use_wandb:
-                    wandb.log({title + "_eval_win_rate": eval_win_rate}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(title + "_eval_win_rate", {title + "_eval_win_rate": eval_win_rate}, total_num_steps)
+                self.writter.add_scalar(title + "_eval_win_rate", eval_win_rate, total_num_steps)
                 break
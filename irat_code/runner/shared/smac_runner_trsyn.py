@@ -4,7 +4,6 @@ import numpy as np
 from functools import reduce
 import torch
 from irat_code.runner.shared.base_runner_trsyn import Runner
-from irat_code.algorithms.utils.distributions import FixedNormal, FixedCategorical
 
 
 def _t2n(x):
@@ -21,51 +20,52 @@ class SMACRunner(Runner):
         self.warmup()
 
         start = time.time()
+        # steps of the episodes before a resume, which do not count towards the FPS
+        start_num_steps = self.start_episode * self.episode_length * self.n_rollout_threads
         episodes = int(self.num_env_steps) // self.episode_length // self.n_rollout_threads
 
         last_battles_game = np.zeros(self.n_rollout_threads, dtype=np.float32)
         last_battles_won = np.zeros(self.n_rollout_threads, dtype=np.float32)
 
-        for episode in range(episodes):
+        for episode in range(self.start_episode, episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.idv_policy.lr_decay(episode, episodes)
                 self.trainer.team_policy.lr_decay(episode, episodes)
 
-            for step in range(self.episode_length):
-                # Sample actions
-                values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists = \
-                    self.idv_collect(step)
-
-                # Get data using Team Policy
-                team_values, team_actions, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
-                    self.team_collect(step)
+            use_team_policy = self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
+                self.all_args.change_use_policy == "team"
 
-                if self.all_args.change_reward and episode > self.all_args.change_reward_episode and \
-                        self.all_args.change_use_policy == "team":
-                    actions = team_actions
-                    values, action_log_probs = self.evaluate_actions("idv", step, actions)
-                else:
-                    team_values, team_log_probs = self.evaluate_actions("team", step, actions)
+            for step in range(self.episode_length):
+                # Sample actions and evaluate them using both Individual Policy and Team Policy
+                with self.timer.phase("collect"):
+                    values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
+                    team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists = \
+                        self.collect(step, use_team_policy)
 
                 # Obser reward and next obs
-                obs, share_obs, rewards, dones, infos, available_actions = self.envs.step(actions)
+                with self.timer.phase("env_step"):
+                    obs, share_obs, rewards, dones, infos, available_actions = self.envs.step(actions)
 
                 data = obs, share_obs, rewards, dones, infos, available_actions, \
                        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
 
                 # insert data into buffer
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train(episode)
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train(episode)
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
             # save model
             if episode % self.save_interval == 0 or episode == episodes - 1:
-                self.save()
+                self.save(episode)
 
             # log information
             if episode % self.log_interval == 0:
@@ -78,7 +78,7 @@ class SMACRunner(Runner):
                               episodes,
                               total_num_steps,
                               self.num_env_steps,
-                              int(total_num_steps / (end - start))))
+                              int((total_num_steps - start_num_steps) / (end - start))))
 
                 if self.env_name == "StarCraft2":
                     battles_won = []
@@ -97,10 +97,7 @@ class SMACRunner(Runner):
                     incre_win_rate = np.sum(incre_battles_won) / np.sum(incre_battles_game) if np.sum(
                         incre_battles_game) > 0 else 0.0
                     print("incre win rate is {}.".format(incre_win_rate))
-                    if self.use_wandb:
-                        wandb.log({"incre_win_rate": incre_win_rate}, step=total_num_steps)
-                    else:
-                        self.writter.add_scalars("incre_win_rate", {"incre_win_rate": incre_win_rate}, total_num_steps)
+                    self.writter.add_scalar("incre_win_rate", incre_win_rate, total_num_steps)
 
                     last_battles_game = battles_game
                     last_battles_won = battles_won
@@ -109,12 +106,16 @@ class SMACRunner(Runner):
                     self.buffer.active_masks.shape))
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+        self.checkpointer.close()
+
     def warmup(self):
         # reset env
         obs, share_obs, available_actions = self.envs.reset()
@@ -136,114 +137,8 @@ class SMACRunner(Runner):
         self.buffer.available_actions[0] = available_actions.copy()
 
     @torch.no_grad()
-    def idv_collect(self, step):
-        self.trainer.idv_prep_rollout()
-        value, action, action_log_prob, rnn_states, rnn_states_critic, act_dist \
-            = self.trainer.idv_policy.get_actions(np.concatenate(self.buffer.idv_share_obs[step]),
-                                                  np.concatenate(self.buffer.obs[step]),
-                                                  np.concatenate(self.buffer.idv_rnn_states[step]),
-                                                  np.concatenate(self.buffer.idv_rnn_states_critic[step]),
-                                                  np.concatenate(self.buffer.masks[step]),
-                                                  np.concatenate(self.buffer.available_actions[step]))
-
-        # [self.envs, agents, dim]
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        actions = np.array(np.split(_t2n(action), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-        rnn_states = np.array(np.split(_t2n(rnn_states), self.n_rollout_threads))
-        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), self.n_rollout_threads))
-
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
-
-        return values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists
-
-    @torch.no_grad()
-    def team_collect(self, step):
-        self.trainer.team_prep_rollout()
-        value, action, action_log_prob, rnn_states, rnn_states_critic, act_dist \
-            = self.trainer.team_policy.get_actions(np.concatenate(self.buffer.team_share_obs[step]),
-                                                   np.concatenate(self.buffer.obs[step]),
-                                                   np.concatenate(self.buffer.team_rnn_states[step]),
-                                                   np.concatenate(self.buffer.team_rnn_states_critic[step]),
-                                                   np.concatenate(self.buffer.masks[step]),
-                                                   np.concatenate(self.buffer.available_actions[step]),
-                                                   deterministic=True)
-
-        # [self.envs, agents, dim]
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        actions = np.array(np.split(_t2n(action), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-        rnn_states = np.array(np.split(_t2n(rnn_states), self.n_rollout_threads))
-        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), self.n_rollout_threads))
-
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
-
-        return values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists
-
-    @torch.no_grad()
-    def evaluate_actions(self, policy: str, step, actions):
-        if policy == "team":
-            self.trainer.team_prep_rollout()
-            exc_policy = self.trainer.team_policy
-            share_obs = np.concatenate(self.buffer.team_share_obs[step])
-            obs = np.concatenate(self.buffer.obs[step])
-            rnn_states = np.concatenate(self.buffer.team_rnn_states[step])
-            rnn_states_critic = np.concatenate(self.buffer.team_rnn_states_critic[step])
-            masks = np.concatenate(self.buffer.masks[step])
-            available_actions = np.concatenate(self.buffer.available_actions[step])
-            active_masks = np.concatenate(self.buffer.active_masks[step])
-        else:
-            self.trainer.idv_prep_rollout()
-            exc_policy = self.trainer.idv_policy
-            share_obs = np.concatenate(self.buffer.idv_share_obs[step])
-            obs = np.concatenate(self.buffer.obs[step])
-            rnn_states = np.concatenate(self.buffer.idv_rnn_states[step])
-            rnn_states_critic = np.concatenate(self.buffer.idv_rnn_states_critic[step])
-            masks = np.concatenate(self.buffer.masks[step])
-            available_actions = np.concatenate(self.buffer.available_actions[step])
-            active_masks = np.concatenate(self.buffer.active_masks[step])
-
-            # print(type(policy), policy.evaluate_actions)
-        value, action_log_prob, _, _ \
-            = exc_policy.evaluate_actions(share_obs, obs, rnn_states, rnn_states_critic,
-                                          np.concatenate(actions), masks, available_actions, active_masks)
-
-        values = np.array(np.split(_t2n(value), self.n_rollout_threads))
-        action_log_probs = np.array(np.split(_t2n(action_log_prob), self.n_rollout_threads))
-
-        return values, action_log_probs
+    def collect(self, step, use_team_policy=False):
+        return self.dual_collect(step, use_team_policy, use_available_actions=True)
 
     def insert(self, data):
         obs, share_obs, rewards, dones, infos, available_actions, \
@@ -306,10 +201,7 @@ class SMACRunner(Runner):
         train_infos["average_step_team_rewards"] = np.mean(self.buffer.team_rewards)
         train_infos["average_step_rewards"] = np.mean(self.buffer.idv_rewards)
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
 
     @torch.no_grad()
     def eval(self, total_num_steps, title):
@@ -381,9 +273,5 @@ class SMACRunner(Runner):
                 self.log_env(eval_env_infos, total_num_steps)
                 eval_win_rate = eval_battles_won / eval_episode
                 print(title + " eval win rate is {}.".format(eval_win_rate))
-                if self.use_wandb:
-                    wandb.log({title + "_eval_win_rate": eval_win_rate}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(title + "_eval_win_rate", {title + "_eval_win_rate": eval_win_rate},
-                                             total_num_steps)
+                self.writter.add_scalar(title + "_eval_win_rate", eval_win_rate, total_num_steps)
                 break
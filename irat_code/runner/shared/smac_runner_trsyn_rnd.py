@@ -7,7 +7,7 @@ from copy import deepcopy
 
 from irat_code.runner.shared.base_runner_trsyn_rnd import Runner
 import imageio
-from irat_code.algorithms.utils.distributions import FixedNormal, FixedCategorical, FixedBernoulli
+from irat_code.algorithms.utils.distributions import dists_to_params
 
 
 def _t2n(x):
@@ -28,14 +28,16 @@ class SMACRNDRunner(Runner):
         last_battles_won = np.zeros(self.n_rollout_threads, dtype=np.float32)
 
         for episode in range(episodes):
+            self.timer.episode(episode)
             if self.use_linear_lr_decay:
                 self.trainer.policy.lr_decay(episode, episodes)
 
             for step in range(self.episode_length):
                 # Sample actions using Individual Policy
-                values, team_values, actions, action_log_probs, rnn_states, \
-                rnn_states_critic, team_rnn_critic, act_dists = \
-                    self.collect(step)
+                with self.timer.phase("collect"):
+                    values, team_values, actions, action_log_probs, rnn_states, \
+                    rnn_states_critic, team_rnn_critic, act_dists = \
+                        self.collect(step)
 
                 # values, team_values, action_log_probs = self.evaluate_actions(step, actions)
                 team_log_probs = deepcopy(action_log_probs)
@@ -44,17 +46,21 @@ class SMACRNDRunner(Runner):
 
 
                 # Observe reward and next obs
-                obs, share_obs, rewards, dones, infos, available_actions = self.envs.step(actions)
+                with self.timer.phase("env_step"):
+                    obs, share_obs, rewards, dones, infos, available_actions = self.envs.step(actions)
 
                 # insert data into buffer
                 data = obs, share_obs, rewards, dones, infos, available_actions, \
                        values, actions, action_log_probs, rnn_states, rnn_states_critic, act_dists, \
                        team_values, team_log_probs, team_rnn, team_rnn_critic, team_act_dists
-                self.insert(data)
+                with self.timer.phase("insert"):
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train(episode)
+            with self.timer.phase("compute"):
+                self.compute()
+            with self.timer.phase("train"):
+                train_infos = self.train(episode)
 
             # post process
             total_num_steps = (episode + 1) * self.episode_length * self.n_rollout_threads
@@ -93,10 +99,7 @@ class SMACRNDRunner(Runner):
                     incre_win_rate = np.sum(incre_battles_won) / np.sum(incre_battles_game) if np.sum(
                         incre_battles_game) > 0 else 0.0
                     print("incre win rate is {}.".format(incre_win_rate))
-                    if self.use_wandb:
-                        wandb.log({"incre_win_rate": incre_win_rate}, step=total_num_steps)
-                    else:
-                        self.writter.add_scalars("incre_win_rate", {"incre_win_rate": incre_win_rate}, total_num_steps)
+                    self.writter.add_scalar("incre_win_rate", incre_win_rate, total_num_steps)
 
                     last_battles_game = battles_game
                     last_battles_won = battles_won
@@ -105,12 +108,15 @@ class SMACRNDRunner(Runner):
                     self.buffer.active_masks.shape))
 
                 self.log_train(train_infos, total_num_steps)
+                self.timer.log(total_num_steps, self.writter)
 
             # eval
             if episode % self.eval_interval == 0 and self.use_eval:
                 self.eval(total_num_steps, "team_policy")
                 self.eval(total_num_steps, "idv_policy")
 
+        self.timer.close()
+
     def warmup(self):
         # reset env
         obs, share_obs, available_actions = self.envs.reset()
@@ -154,23 +160,7 @@ class SMACRNDRunner(Runner):
         idv_rnn_states_critic = np.array(np.split(_t2n(idv_rnn_states_critic), self.n_rollout_threads))
         team_rnn_states_critic = np.array(np.split(_t2n(team_rnn_states_critic), self.n_rollout_threads))
 
-        act_dists = []
-        for dist in act_dist:
-            if type(dist) == FixedCategorical:
-                tmp_probs = dist.probs.detach()
-                tps = []
-                for tp in tmp_probs:
-                    tps.append(type(dist)(probs=tp))
-            elif type(dist) == FixedNormal:
-                tmp_mu = dist.loc.detach()
-                tmp_sigma = dist.scale.detach()
-                tps = []
-                for tm, ts in zip(tmp_mu, tmp_sigma):
-                    tps.append(type(dist)(loc=tm, scale=ts))
-            else:
-                raise NotImplementedError
-            act_dists.append(tps)
-        act_dists = np.array(np.split(np.array(act_dists).transpose((1, 0)), self.n_rollout_threads))
+        act_dists = np.array(np.split(_t2n(dists_to_params(act_dist)), self.n_rollout_threads))
 
         return idv_values, team_values, actions, action_log_probs, rnn_states, \
                idv_rnn_states_critic, team_rnn_states_critic, act_dists
@@ -237,10 +227,7 @@ class SMACRNDRunner(Runner):
         train_infos["average_step_team_rewards"] = np.mean(self.buffer.team_rewards)
         train_infos["average_step_rewards"] = np.mean(self.buffer.idv_rewards)
         for k, v in train_infos.items():
-            if self.use_wandb:
-                wandb.log({k: v}, step=total_num_steps)
-            else:
-                self.writter.add_scalars(k, {k: v}, total_num_steps)
+            self.writter.add_scalar(k, v, total_num_steps)
 
     @torch.no_grad()
     def eval(self, total_num_steps, title):
@@ -308,9 +295,5 @@ class SMACRNDRunner(Runner):
                 self.log_env(eval_env_infos, total_num_steps)
                 eval_win_rate = eval_battles_won / eval_episode
                 print(title + " eval win rate is {}.".format(eval_win_rate))
-                if self.use_wandb:
-                    wandb.log({title + "_eval_win_rate": eval_win_rate}, step=total_num_steps)
-                else:
-                    self.writter.add_scalars(title + "_eval_win_rate", {title + "_eval_win_rate": eval_win_rate},
-                                             total_num_steps)
+                self.writter.add_scalar(title + "_eval_win_rate", eval_win_rate, total_num_steps)
                 break
@@ -12,8 +12,8 @@ import numpy as np
 from pathlib import Path
 import torch
 from irat_code.config import get_config
-from irat_code.envs.mpe.MPE_env import MPEEnv
-from irat_code.envs.env_wrappers import SubprocVecEnv, DummyVecEnv
+from irat_code.envs.mpe.MPE_env import MPEEnv, MPEBatchEnv
+from irat_code.envs.env_wrappers import SubprocVecEnv, ShmSubprocVecEnv, DummyVecEnv
 
 """Train script for MPEs."""
 
@@ -32,10 +32,17 @@ def make_train_env(all_args):
 
         return init_env
 
+    if all_args.use_batch_env:
+        return MPEBatchEnv(all_args, all_args.n_rollout_threads)
     if all_args.n_rollout_threads == 1:
         return DummyVecEnv([get_env_fn(0)])
+    elif all_args.use_shared_memory_env:
+        return ShmSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                                info_keys=("individual_reward", "team_reward"),
+                                envs_per_worker=all_args.envs_per_worker)
     else:
-        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)])
+        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                             envs_per_worker=all_args.envs_per_worker)
 
 
 def make_eval_env(all_args):
@@ -55,7 +62,8 @@ def make_eval_env(all_args):
     if all_args.n_eval_rollout_threads == 1:
         return DummyVecEnv([get_env_fn(0)])
     else:
-        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)])
+        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)],
+                             envs_per_worker=all_args.envs_per_worker)
 
 
 def parse_args(args, parser):
@@ -71,6 +79,10 @@ def parse_args(args, parser):
     parser.add_argument("--reward_shaping", action='store_true', default=False)
     parser.add_argument("--agent_view_radius", type=float, default=1.0)
     parser.add_argument("--use_partial_obs", action='store_true', default=False)
+    parser.add_argument("--use_array_world", action='store_true', default=False,
+                        help="whether to step the world physics on contiguous arrays of all entities")
+    parser.add_argument("--use_batch_env", action='store_true', default=False,
+                        help="whether to step all training worlds as one batch in the main process")
     parser.add_argument("--rew_bound", action='store_true', default=False)
 
     parser.add_argument("--wandb_group", type=str, default="NotDefined", help="wandb group")
@@ -108,6 +120,10 @@ def parse_args(args, parser):
     parser.add_argument("--scenario_has_diff_rewards", action="store_true", default=False)
     parser.add_argument("--sparse_reward", action="store_true", default=False)
     parser.add_argument("--agent_policy", type=str, default="prey")
+    parser.add_argument("--prey_samples", type=int, default=1000,
+                        help="number of target positions the scripted prey samples per step")
+    parser.add_argument("--prey_cached_samples", action='store_true', default=False,
+                        help="whether the scripted prey rotates a fixed pattern of targets instead of sampling them")
 
     all_args = parser.parse_known_args(args)[0]
 
@@ -211,11 +227,12 @@ def main(args):
     if all_args.use_eval and eval_envs is not envs:
         eval_envs.close()
 
+    # the metrics buffered by the runner are written before the wandb run finishes
+    runner.writter.close()
     if all_args.use_wandb:
         run.finish()
     else:
         runner.writter.export_scalars_to_json(str(runner.log_dir + '/summary.json'))
-        runner.writter.close()
 
 
 if __name__ == "__main__":
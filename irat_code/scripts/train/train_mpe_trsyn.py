@@ -12,8 +12,8 @@ import numpy as np
 from pathlib import Path
 import torch
 from irat_code.config import get_config
-from irat_code.envs.mpe.MPE_env import MPEEnv
-from irat_code.envs.env_wrappers import SubprocVecEnv, DummyVecEnv
+from irat_code.envs.mpe.MPE_env import MPEEnv, MPEBatchEnv
+from irat_code.envs.env_wrappers import SubprocVecEnv, ShmSubprocVecEnv, SplitVecEnv, DummyVecEnv
 
 """Train script for MPEs."""
 
@@ -22,7 +22,7 @@ def make_train_env(all_args):
     def get_env_fn(rank):
         def init_env():
             if all_args.env_name == "MPE":
-                env = MPEEnv(all_args)
+                env = MPEEnv(all_args, info_dicts=not all_args.use_reward_array)
             else:
                 print("Can not support the " +
                       all_args.env_name + "environment.")
@@ -32,10 +32,23 @@ def make_train_env(all_args):
 
         return init_env
 
+    def make_subproc_env(ranks):
+        if all_args.use_shared_memory_env:
+            return ShmSubprocVecEnv([get_env_fn(i) for i in ranks], info_keys=("individual_reward", "team_reward"),
+                                    info_arrays=all_args.use_reward_array, envs_per_worker=all_args.envs_per_worker)
+        return SubprocVecEnv([get_env_fn(i) for i in ranks], envs_per_worker=all_args.envs_per_worker)
+
+    if all_args.use_batch_env:
+        return MPEBatchEnv(all_args, all_args.n_rollout_threads, info_dicts=not all_args.use_reward_array)
+    if all_args.use_pipelined_rollout:
+        # two halves, one steps while the policy runs on the other one
+        assert all_args.n_rollout_threads >= 2, "the pipelined rollout needs at least 2 rollout threads"
+        half = all_args.n_rollout_threads // 2
+        return SplitVecEnv([make_subproc_env(range(half)), make_subproc_env(range(half, all_args.n_rollout_threads))])
     if all_args.n_rollout_threads == 1:
         return DummyVecEnv([get_env_fn(0)])
     else:
-        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)])
+        return make_subproc_env(range(all_args.n_rollout_threads))
 
 
 def make_eval_env(all_args):
@@ -55,7 +68,8 @@ def make_eval_env(all_args):
     if all_args.n_eval_rollout_threads == 1:
         return DummyVecEnv([get_env_fn(0)])
     else:
-        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)])
+        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)],
+                             envs_per_worker=all_args.envs_per_worker)
 
 
 def parse_args(args, parser):
@@ -71,6 +85,12 @@ def parse_args(args, parser):
     parser.add_argument("--reward_shaping", action='store_true', default=False)
     parser.add_argument("--agent_view_radius", type=float, default=1.0)
     parser.add_argument("--use_partial_obs", action='store_true', default=False)
+    parser.add_argument("--use_array_world", action='store_true', default=False,
+                        help="whether to step the world physics on contiguous arrays of all entities")
+    parser.add_argument("--use_batch_env", action='store_true', default=False,
+                        help="whether to step all training worlds as one batch in the main process")
+    parser.add_argument("--use_pipelined_rollout", action='store_true', default=False,
+                        help="whether to step half of the training envs while the policy runs on the other half")
     parser.add_argument("--rew_bound", action='store_true', default=False)
     parser.add_argument("--game_mode", type=str, default="hard")
     parser.add_argument("--discrete_action", action='store_false', default=True)
@@ -120,6 +140,10 @@ def parse_args(args, parser):
     parser.add_argument("--scenario_has_diff_rewards", action="store_true", default=False)
     parser.add_argument("--sparse_reward", action="store_true", default=False)
     parser.add_argument("--agent_policy", type=str, default="prey")
+    parser.add_argument("--prey_samples", type=int, default=1000,
+                        help="number of target positions the scripted prey samples per step")
+    parser.add_argument("--prey_cached_samples", action='store_true', default=False,
+                        help="whether the scripted prey rotates a fixed pattern of targets instead of sampling them")
 
     all_args = parser.parse_known_args(args)[0]
 
@@ -201,13 +225,16 @@ def main(args):
 
     # env init
     envs = make_train_env(all_args)
-    eval_envs = make_eval_env(all_args) if all_args.use_eval else None
+    # the asynchronous evaluation of the shared runner builds the eval envs in its worker processes
+    async_eval = all_args.use_async_eval and all_args.share_policy
+    eval_envs = make_eval_env(all_args) if all_args.use_eval and not async_eval else None
     num_agents = all_args.num_agents
 
     config = {
         "all_args": all_args,
         "envs": envs,
         "eval_envs": eval_envs,
+        "make_eval_env": make_eval_env,
         "num_agents": num_agents,
         "device": device,
         "run_dir": run_dir
@@ -225,14 +252,15 @@ def main(args):
 
     # post process
     envs.close()
-    if all_args.use_eval and eval_envs is not envs:
+    if eval_envs is not None and eval_envs is not envs:
         eval_envs.close()
 
+    # the metrics buffered by the runner are written before the wandb run finishes
+    runner.writter.close()
     if all_args.use_wandb:
         run.finish()
     else:
         runner.writter.export_scalars_to_json(str(runner.log_dir + '/summary.json'))
-        runner.writter.close()
 
 
 if __name__ == "__main__":
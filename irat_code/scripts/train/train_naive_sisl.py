@@ -12,7 +12,7 @@ import numpy as np
 from pathlib import Path
 import torch
 from irat_code.config import get_config
-from irat_code.envs.env_wrappers import SubprocVecEnv, DummyVecEnv
+from irat_code.envs.env_wrappers import SubprocVecEnv, ShmSubprocVecEnv, DummyVecEnv
 from irat_code.envs.sisl.environment import get_sisl_envs
 
 """Train script for SISL."""
@@ -21,7 +21,7 @@ from irat_code.envs.sisl.environment import get_sisl_envs
 def make_train_env(all_args):
     def get_env_fn(rank):
         def init_env():
-            env = get_sisl_envs(all_args)
+            env = get_sisl_envs(all_args, info_dicts=not all_args.use_reward_array)
             env.seed(all_args.seed + rank * 1000)
             return env
 
@@ -29,8 +29,13 @@ def make_train_env(all_args):
 
     if all_args.n_rollout_threads == 1:
         return DummyVecEnv([get_env_fn(0)])
+    elif all_args.use_shared_memory_env:
+        return ShmSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                                info_keys=("individual_reward", "team_reward"), info_arrays=all_args.use_reward_array,
+                                envs_per_worker=all_args.envs_per_worker)
     else:
-        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)])
+        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                             envs_per_worker=all_args.envs_per_worker)
 
 
 def make_eval_env(all_args):
@@ -45,7 +50,8 @@ def make_eval_env(all_args):
     if all_args.n_eval_rollout_threads == 1:
         return DummyVecEnv([get_env_fn(0)])
     else:
-        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)])
+        return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)],
+                             envs_per_worker=all_args.envs_per_worker)
 
 
 def parse_args(args, parser):
@@ -222,11 +228,12 @@ def main(args):
     if all_args.use_eval and eval_envs is not envs:
         eval_envs.close()
 
+    # the metrics buffered by the runner are written before the wandb run finishes
+    runner.writter.close()
     if all_args.use_wandb:
         run.finish()
     else:
         runner.writter.export_scalars_to_json(str(runner.log_dir + '/summary.json'))
-        runner.writter.close()
 
 
 if __name__ == "__main__":
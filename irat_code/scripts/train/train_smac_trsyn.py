@@ -14,7 +14,7 @@ import torch
 from irat_code.config import get_config
 from irat_code.envs.starcraft2.StarCraft2_Env import StarCraft2Env
 from irat_code.envs.starcraft2.smac_maps import get_map_params
-from irat_code.envs.env_wrappers import ShareSubprocVecEnv, ShareDummyVecEnv
+from irat_code.envs.env_wrappers import ShareSubprocVecEnv, ShareShmSubprocVecEnv, ShareDummyVecEnv
 
 """Train script for SMAC."""
 
@@ -33,8 +33,14 @@ def make_train_env(all_args):
 
     if all_args.n_rollout_threads == 1:
         return ShareDummyVecEnv([get_env_fn(0)])
+    elif all_args.use_shared_memory_env:
+        return ShareShmSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                                     info_keys=("individual_reward", "team_reward", "battles_won", "battles_game",
+                                                "bad_transition"),
+                                     envs_per_worker=all_args.envs_per_worker)
     else:
-        return ShareSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)])
+        return ShareSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                                  envs_per_worker=all_args.envs_per_worker)
 
 
 def make_eval_env(all_args):
@@ -53,7 +59,8 @@ def make_eval_env(all_args):
     if all_args.n_eval_rollout_threads == 1:
         return ShareDummyVecEnv([get_env_fn(0)])
     else:
-        return ShareSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)])
+        return ShareSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)],
+                                  envs_per_worker=all_args.envs_per_worker)
 
 
 def parse_args(args, parser):
@@ -226,11 +233,12 @@ def main(args):
     if all_args.use_eval and eval_envs is not envs:
         eval_envs.close()
 
+    # the metrics buffered by the runner are written before the wandb run finishes
+    runner.writter.close()
     if all_args.use_wandb:
         run.finish()
     else:
         runner.writter.export_scalars_to_json(str(runner.log_dir + '/summary.json'))
-        runner.writter.close()
 
 
 if __name__ == "__main__":
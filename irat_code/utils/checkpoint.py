@@ -0,0 +1,221 @@
+import os
+import random
+import re
+import threading
+
+import numpy as np
+import torch
+
+from irat_code.utils.valuenorm import ValueNorm
+
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint_(\d+)\.pt$")
+
+# attributes of the trsyn trainers that change during training
+TRAINER_STATE = ("idv_clip_ratio", "team_clip_ratio", "idv_kl_coef", "team_kl_coef", "entropy_coef", "_num_updates")
+VALUE_NORMALIZERS = ("idv_value_normalizer", "team_value_normalizer")
+VALUENORM_STATE = ("running_mean", "running_mean_sq", "debiasing_term")
+
+
+def to_cpu(state):
+    """Copy the tensors of a nested dict / list / tuple to the cpu, so that training can go on changing them."""
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {k: to_cpu(v) for k, v in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(to_cpu(v) for v in state)
+    return state
+
+
+def checkpoint_path(save_dir, episode):
+    return os.path.join(str(save_dir), "checkpoint_{}.pt".format(episode))
+
+
+def list_checkpoints(save_dir):
+    """
+    :return checkpoints: (list) (episode, path) of the checkpoints in save_dir, oldest first.
+    """
+    if not os.path.isdir(str(save_dir)):
+        return []
+    checkpoints = []
+    for name in os.listdir(str(save_dir)):
+        match = CHECKPOINT_PATTERN.match(name)
+        if match:
+            checkpoints.append((int(match.group(1)), os.path.join(str(save_dir), name)))
+    return sorted(checkpoints)
+
+
+def latest_checkpoint(model_dir):
+    """
+    :param model_dir: (str) a checkpoint file, or a directory of checkpoints.
+
+    :return path: (str) path of the newest checkpoint, None if there is none.
+    """
+    if os.path.isfile(str(model_dir)):
+        return str(model_dir)
+    checkpoints = list_checkpoints(model_dir)
+    return checkpoints[-1][1] if checkpoints else None
+
+
+def load_checkpoint(path):
+    """
+    Load a checkpoint to the cpu: the random generator states have to be restored from cpu tensors, and
+    load_state_dict copies the network and optimizer tensors to the devices of the parameters.
+    """
+    return torch.load(path, map_location="cpu")
+
+
+def policy_state_dict(policy):
+    """State of the networks and optimizers of an R_MAPPOPolicy, popart normalizers are part of the critic."""
+    return {"actor": policy.actor.state_dict(),
+            "critic": policy.critic.state_dict(),
+            "actor_optimizer": policy.actor_optimizer.state_dict(),
+            "critic_optimizer": policy.critic_optimizer.state_dict()}
+
+
+def load_policy_state_dict(policy, state):
+    policy.actor.load_state_dict(state["actor"])
+    policy.critic.load_state_dict(state["critic"])
+    policy.actor_optimizer.load_state_dict(state["actor_optimizer"])
+    policy.critic_optimizer.load_state_dict(state["critic_optimizer"])
+
+
+def trainer_state_dict(trainer):
+    """State of a trsyn trainer: the annealed coefficients, the update counter and the ValueNorm statistics."""
+    state = {name: getattr(trainer, name) for name in TRAINER_STATE}
+    for name in VALUE_NORMALIZERS:
+        normalizer = getattr(trainer, name)
+        if isinstance(normalizer, ValueNorm):
+            state[name] = {k: getattr(normalizer, k) for k in VALUENORM_STATE}
+    return state
+
+
+@torch.no_grad()
+def load_trainer_state_dict(trainer, state):
+    for name in TRAINER_STATE:
+        setattr(trainer, name, state[name])
+    for name in VALUE_NORMALIZERS:
+        normalizer = getattr(trainer, name)
+        if isinstance(normalizer, ValueNorm):
+            for k in VALUENORM_STATE:
+                getattr(normalizer, k).copy_(state[name][k])
+
+
+def rng_state():
+    """State of the python, numpy and torch random generators, in types that torch.load reads with weights_only."""
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {"python": random.getstate(),
+             "numpy": (name, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, cached_gaussian),
+             "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    name, keys, pos, has_gauss, cached_gaussian = state["numpy"]
+    np.random.set_state((name, keys.numpy().astype(np.uint32), pos, has_gauss, cached_gaussian))
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointWriter(object):
+    """
+    Writes training checkpoints to save_dir/checkpoint_<episode>.pt without stalling the training loop. save() copies
+    the state to the cpu and hands it to a background thread, which writes it to a temporary file and renames that
+    over the checkpoint, so that a checkpoint is either complete or absent. If the writer is still busy when the next
+    snapshot comes in, the snapshot waiting for it is replaced by the newer one. Only the newest keep checkpoints are
+    kept. An error of the writer is raised by the next call of save(), wait() or close().
+    :param save_dir: (str) directory of the checkpoints.
+    :param keep: (int) number of checkpoints to keep, 0 to keep all of them.
+    :param use_async: (bool) whether to write from a background thread, or right away in save().
+    """
+
+    def __init__(self, save_dir, keep=3, use_async=True):
+        self.save_dir = str(save_dir)
+        self.keep = keep
+        self.use_async = use_async
+
+        self.pending = None
+        self.busy = False
+        self.error = None
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = None
+        if use_async:
+            self.thread = threading.Thread(target=self._loop, name="checkpoint-writer", daemon=True)
+            self.thread.start()
+
+    def save(self, episode, state):
+        """
+        :param episode: (int) episode of the checkpoint.
+        :param state: (dict) nested dict of tensors and python values, copied before save() returns.
+        """
+        self._raise_error()
+        snapshot = to_cpu(state)
+        if not self.use_async:
+            self._write(episode, snapshot)
+            return
+        with self.cond:
+            self.pending = (episode, snapshot)
+            self.cond.notify_all()
+
+    def wait(self):
+        """Block until every snapshot handed to save() is written."""
+        if self.use_async:
+            with self.cond:
+                while self.pending is not None or self.busy:
+                    self.cond.wait()
+        self._raise_error()
+
+    def close(self):
+        """Write the last snapshot and stop the writer thread."""
+        if self.closed:
+            return
+        self.wait()
+        self.closed = True
+        if self.use_async:
+            with self.cond:
+                self.cond.notify_all()
+            self.thread.join()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("writing a checkpoint to {} failed".format(self.save_dir)) from error
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.pending is None and not self.closed:
+                    self.cond.wait()
+                if self.pending is None:
+                    return
+                episode, snapshot = self.pending
+                self.pending = None
+                self.busy = True
+            try:
+                self._write(episode, snapshot)
+            except Exception as error:
+                self.error = error
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+    def _write(self, episode, snapshot):
+        path = checkpoint_path(self.save_dir, episode)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            torch.save(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        if self.keep > 0:
+            for _, old_path in list_checkpoints(self.save_dir)[:-self.keep]:
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,119 @@
+import numpy as np
+import torch
+
+"""
+Vectorized return computation shared by the replay buffers.
+The recursion over time is kept, but every step updates all threads, agents and reward streams at once,
+and the value predictions are denormalized a single time for the whole rollout.
+"""
+
+
+def denormalize_values(value_preds, value_normalizer=None, device=None):
+    """
+    Denormalize the value predictions of a whole rollout at once.
+    :param value_preds: (np.ndarray) value predictions, (episode_length + 1, ...).
+    :param value_normalizer: (ValueNorm / PopArt) normalizer of the critic, None if values are not normalized.
+    :param device: (torch.device) if not None, return a torch.Tensor on this device instead of a np.ndarray.
+
+    :return values: (np.ndarray / torch.Tensor) denormalized value predictions.
+    """
+    if device is None:
+        if value_normalizer is None:
+            return value_preds
+        return value_normalizer.denormalize(value_preds)
+
+    if value_normalizer is None:
+        return torch.from_numpy(value_preds).to(dtype=torch.float32, device=device)
+    return value_normalizer.denormalize(value_preds, to_numpy=False).to(device)
+
+
+def compute_returns(rewards, values, masks, bad_masks, next_value, gamma, gae_lambda,
+                    use_gae=True, use_proper_time_limits=False):
+    """
+    Compute returns either as discounted sum of rewards, or using GAE.
+    All arguments are either np.ndarrays or torch.Tensors (on the same device), the result has the same type.
+    Several reward streams (e.g. individual and team rewards) can be handled in one pass by concatenating them
+    along the last dimension; masks are broadcast over it.
+    :param rewards: (np.ndarray / torch.Tensor) rewards, (episode_length, ...).
+    :param values: (np.ndarray / torch.Tensor) denormalized value predictions, (episode_length + 1, ...).
+                   values[-1] has to hold the value of the step after the last episode step when use_gae is set.
+    :param masks: (np.ndarray / torch.Tensor) 0 where an episode terminated, (episode_length + 1, ...).
+    :param bad_masks: (np.ndarray / torch.Tensor) 0 where an episode was truncated by a time limit,
+                      (episode_length + 1, ...). Only used with use_proper_time_limits.
+    :param next_value: (np.ndarray / torch.Tensor) bootstrap return of the discounted sum, (...).
+    :param gamma: (float) discount factor.
+    :param gae_lambda: (float) gae lambda parameter.
+    :param use_gae: (bool) whether to use generalized advantage estimation.
+    :param use_proper_time_limits: (bool) whether to cut the recursion at truncated steps.
+
+    :return returns: (np.ndarray / torch.Tensor) returns, (episode_length + 1, ...).
+    """
+    if isinstance(rewards, torch.Tensor):
+        returns = torch.zeros_like(values)
+    else:
+        returns = np.zeros_like(values)
+
+    if use_gae:
+        returns[-1] = values[-1]
+        gae = 0
+        for step in reversed(range(rewards.shape[0])):
+            delta = rewards[step] + gamma * values[step + 1] * masks[step + 1] - values[step]
+            gae = delta + gamma * gae_lambda * masks[step + 1] * gae
+            if use_proper_time_limits:
+                gae = gae * bad_masks[step + 1]
+            returns[step] = gae + values[step]
+    else:
+        returns[-1] = next_value
+        for step in reversed(range(rewards.shape[0])):
+            if use_proper_time_limits:
+                returns[step] = (returns[step + 1] * gamma * masks[step + 1] + rewards[step]) * bad_masks[step + 1] \
+                                + (1 - bad_masks[step + 1]) * values[step]
+            else:
+                returns[step] = returns[step + 1] * gamma * masks[step + 1] + rewards[step]
+    return returns
+
+
+def compute_stream_returns(rewards, value_preds, next_values, masks, bad_masks, gamma, gae_lambda,
+                           use_gae=True, use_proper_time_limits=False, value_normalizers=None, device=None):
+    """
+    Compute the returns of one or several reward streams (e.g. individual and team rewards) in a single pass.
+    :param rewards: (list) rewards of each stream, np.ndarrays of shape (episode_length, ..., dim).
+    :param value_preds: (list) value predictions of each stream, np.ndarrays of shape (episode_length + 1, ..., dim).
+    :param next_values: (list) bootstrap return of each stream for the discounted sum, np.ndarrays of shape (..., dim).
+    :param masks: (np.ndarray) 0 where an episode terminated, (episode_length + 1, ..., 1).
+    :param bad_masks: (np.ndarray) 0 where an episode was truncated by a time limit, (episode_length + 1, ..., 1).
+    :param gamma: (float) discount factor.
+    :param gae_lambda: (float) gae lambda parameter.
+    :param use_gae: (bool) whether to use generalized advantage estimation.
+    :param use_proper_time_limits: (bool) whether to cut the recursion at truncated steps.
+    :param value_normalizers: (list) normalizer of the critic of each stream (None entries if values are not
+                              normalized). None if no stream is normalized.
+    :param device: (torch.device) if not None, run the recursion with torch on this device.
+
+    :return returns: (list) returns of each stream, np.ndarrays of shape (episode_length + 1, ..., dim).
+    """
+    if value_normalizers is None:
+        value_normalizers = [None] * len(rewards)
+    sizes = [reward.shape[-1] for reward in rewards]
+
+    values = [denormalize_values(value_pred, value_normalizer, device)
+              for value_pred, value_normalizer in zip(value_preds, value_normalizers)]
+    rewards = np.concatenate(rewards, -1)
+    next_values = np.concatenate(next_values, -1)
+
+    if device is None:
+        values = np.concatenate(values, -1)
+    else:
+        tpdv = dict(dtype=torch.float32, device=device)
+        values = torch.cat(values, -1)
+        rewards = torch.from_numpy(rewards).to(**tpdv)
+        next_values = torch.from_numpy(next_values).to(**tpdv)
+        masks = torch.from_numpy(masks).to(**tpdv)
+        bad_masks = torch.from_numpy(bad_masks).to(**tpdv)
+
+    returns = compute_returns(rewards, values, masks, bad_masks, next_values, gamma, gae_lambda,
+                              use_gae, use_proper_time_limits)
+    if device is not None:
+        returns = returns.cpu().numpy()
+
+    return np.split(returns, np.cumsum(sizes)[:-1], -1)
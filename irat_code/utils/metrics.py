@@ -0,0 +1,132 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+
+class MetricsSink(object):
+    """
+    Collects the scalars logged by the runners and writes them from a background thread. The scalars of a step are
+    buffered until a scalar of another step comes in, then the whole step goes to the writer thread as one batch: one
+    add_scalar per tag to a single tensorboard event file, or one wandb.log call, and one line of the local metrics
+    file. An error of the writer is raised by the next call of add_scalar or close().
+    Scalars logged with a step_metric, like the results of the asynchronous evaluation that come in after training
+    went on, are plotted by wandb against that metric instead of its own step, which only grows: the step is logged
+    as the value of the step_metric.
+    :param log_dir: (str) directory of the tensorboard events and of the local metrics file.
+    :param use_wandb: (bool) whether to log to the active wandb run instead of tensorboard.
+    :param file_format: (str) "jsonl" or "csv" to also write the scalars to log_dir/metrics.<file_format>, "none" not to.
+    """
+
+    def __init__(self, log_dir, use_wandb=False, file_format="none"):
+        self.log_dir = str(log_dir)
+        self.use_wandb = use_wandb
+        self.file_format = file_format
+        if file_format not in ("none", "jsonl", "csv"):
+            raise Exception("Unknown metrics file format {}".format(file_format))
+
+        self.step = None
+        self.step_metric = None
+        self.scalars = {}
+        # every logged value as [wall time, step, value] per tag, for export_scalars_to_json
+        self.history = defaultdict(list)
+        # tags already bound to their step metric in wandb, only used by the writer thread
+        self.wandb_metrics = set()
+        self.error = None
+        self.closed = False
+
+        if use_wandb:
+            self.tb_writer = None
+        else:
+            from tensorboardX import SummaryWriter
+            self.tb_writer = SummaryWriter(self.log_dir)
+        self.file = None
+        if file_format != "none":
+            self.file = open(os.path.join(self.log_dir, "metrics." + file_format), "a", newline="")
+            if file_format == "csv":
+                self.csv_writer = csv.writer(self.file)
+                if self.file.tell() == 0:
+                    self.csv_writer.writerow(["step", "wall_time", "tag", "value"])
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name="metrics-writer", daemon=True)
+        self.thread.start()
+
+    def add_scalar(self, tag, value, global_step, step_metric=None):
+        """
+        :param tag: (str) name of the scalar.
+        :param value: (float) value, python / numpy number or one element tensor.
+        :param global_step: (int) x value of the scalar.
+        :param step_metric: (str) name of the wandb metric holding global_step, None to use the wandb step.
+        """
+        self._raise_error()
+        if global_step != self.step or step_metric != self.step_metric:
+            self.flush()
+            self.step = global_step
+            self.step_metric = step_metric
+        value = float(value)
+        self.scalars[tag] = value
+        self.history[tag].append([time.time(), global_step, value])
+
+    def flush(self):
+        """Hand the buffered step to the writer thread."""
+        if self.scalars:
+            self.queue.put((self.step, self.step_metric, time.time(), self.scalars))
+        self.scalars = {}
+
+    def close(self):
+        """Write the buffered scalars and close the writers."""
+        if self.closed:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.closed = True
+        if self.tb_writer is not None:
+            self.tb_writer.close()
+        if self.file is not None:
+            self.file.close()
+        self._raise_error()
+
+    def export_scalars_to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.history, f)
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("writing the metrics to {} failed".format(self.log_dir)) from error
+
+    def _loop(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            try:
+                self._write(*batch)
+            except Exception as error:
+                self.error = error
+
+    def _write(self, step, step_metric, wall_time, scalars):
+        if self.use_wandb:
+            import wandb
+            if step_metric is None:
+                wandb.log(scalars, step=step)
+            else:
+                for tag in scalars:
+                    if tag not in self.wandb_metrics:
+                        wandb.define_metric(tag, step_metric=step_metric)
+                        self.wandb_metrics.add(tag)
+                wandb.log(dict(scalars, **{step_metric: step}))
+        else:
+            for tag, value in scalars.items():
+                self.tb_writer.add_scalar(tag, value, step, walltime=wall_time)
+        if self.file_format == "jsonl":
+            self.file.write(json.dumps(dict(step=step, wall_time=wall_time, **scalars)) + "\n")
+            self.file.flush()
+        elif self.file_format == "csv":
+            self.csv_writer.writerows([step, wall_time, tag, value] for tag, value in scalars.items())
+            self.file.flush()
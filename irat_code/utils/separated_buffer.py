@@ -7,8 +7,15 @@ from irat_code.utils.util import check, get_shape_from_obs_space, get_shape_from
 def _flatten(T, N, x):
     return x.reshape(T * N, *x.shape[2:])
 
+def _transpose(x, *axes):
+    return x.permute(*axes) if isinstance(x, torch.Tensor) else x.transpose(*axes)
+
 def _cast(x):
-    return x.transpose(1,0,2).reshape(-1, *x.shape[2:])
+    return _transpose(x, 1, 0, 2).reshape(-1, *x.shape[2:])
+
+def _chunk_index(indices, L):
+    # flat rows of the chunks starting at indices * L, laid out as (L, N) so that they match _flatten(L, N, x)
+    return (np.arange(L)[:, None] + indices[None, :] * L).reshape(-1)
 
 class SeparatedReplayBuffer(object):
     def __init__(self, args, obs_space, share_obs_space, act_space):
@@ -224,68 +231,26 @@ class SeparatedReplayBuffer(object):
         num_envs_per_batch = n_rollout_threads // num_mini_batch
         perm = torch.randperm(n_rollout_threads).numpy()
         for start_ind in range(0, n_rollout_threads, num_envs_per_batch):
-            share_obs_batch = []
-            obs_batch = []
-            rnn_states_batch = []
-            rnn_states_critic_batch = []
-            actions_batch = []
-            available_actions_batch = []
-            value_preds_batch = []
-            return_batch = []
-            masks_batch = []
-            active_masks_batch = []
-            old_action_log_probs_batch = []
-            adv_targ = []
-
-            for offset in range(num_envs_per_batch):
-                ind = perm[start_ind + offset]
-                share_obs_batch.append(self.share_obs[:-1, ind])
-                obs_batch.append(self.obs[:-1, ind])
-                rnn_states_batch.append(self.rnn_states[0:1, ind])
-                rnn_states_critic_batch.append(self.rnn_states_critic[0:1, ind])
-                actions_batch.append(self.actions[:, ind])
-                if self.available_actions is not None:
-                    available_actions_batch.append(self.available_actions[:-1, ind])
-                value_preds_batch.append(self.value_preds[:-1, ind])
-                return_batch.append(self.returns[:-1, ind])
-                masks_batch.append(self.masks[:-1, ind])
-                active_masks_batch.append(self.active_masks[:-1, ind])
-                old_action_log_probs_batch.append(self.action_log_probs[:, ind])
-                adv_targ.append(advantages[:, ind])
-
-            # [N[T, dim]]
+            # [T, N, dim] with the N threads picked by the permutation
             T, N = self.episode_length, num_envs_per_batch
-            # These are all from_numpys of size (T, N, -1)
-            share_obs_batch = np.stack(share_obs_batch, 1)
-            obs_batch = np.stack(obs_batch, 1)
-            actions_batch = np.stack(actions_batch, 1)
+            inds = perm[start_ind:start_ind + num_envs_per_batch]
+            share_obs_batch = _flatten(T, N, self.share_obs[:-1, inds])
+            obs_batch = _flatten(T, N, self.obs[:-1, inds])
+            actions_batch = _flatten(T, N, self.actions[:, inds])
             if self.available_actions is not None:
-                available_actions_batch = np.stack(available_actions_batch, 1)
-            value_preds_batch = np.stack(value_preds_batch, 1)
-            return_batch = np.stack(return_batch, 1)
-            masks_batch = np.stack(masks_batch, 1)
-            active_masks_batch = np.stack(active_masks_batch, 1)
-            old_action_log_probs_batch = np.stack(old_action_log_probs_batch, 1)
-            adv_targ = np.stack(adv_targ, 1)
-
-            # States is just a (N, -1) from_numpy [N[1,dim]]
-            rnn_states_batch = np.stack(rnn_states_batch, 1).reshape(N, *self.rnn_states.shape[2:])
-            rnn_states_critic_batch = np.stack(rnn_states_critic_batch, 1).reshape(N, *self.rnn_states_critic.shape[2:])
-
-            # Flatten the (T, N, ...) from_numpys to (T * N, ...)
-            share_obs_batch = _flatten(T, N, share_obs_batch)
-            obs_batch = _flatten(T, N, obs_batch)
-            actions_batch = _flatten(T, N, actions_batch)
-            if self.available_actions is not None:
-                available_actions_batch = _flatten(T, N, available_actions_batch)
+                available_actions_batch = _flatten(T, N, self.available_actions[:-1, inds])
             else:
                 available_actions_batch = None
-            value_preds_batch = _flatten(T, N, value_preds_batch)
-            return_batch = _flatten(T, N, return_batch)
-            masks_batch = _flatten(T, N, masks_batch)
-            active_masks_batch = _flatten(T, N, active_masks_batch)
-            old_action_log_probs_batch = _flatten(T, N, old_action_log_probs_batch)
-            adv_targ = _flatten(T, N, adv_targ)
+            value_preds_batch = _flatten(T, N, self.value_preds[:-1, inds])
+            return_batch = _flatten(T, N, self.returns[:-1, inds])
+            masks_batch = _flatten(T, N, self.masks[:-1, inds])
+            active_masks_batch = _flatten(T, N, self.active_masks[:-1, inds])
+            old_action_log_probs_batch = _flatten(T, N, self.action_log_probs[:, inds])
+            adv_targ = _flatten(T, N, advantages[:, inds])
+
+            # States is just a (N, dim) array of the first step
+            rnn_states_batch = self.rnn_states[0, inds]
+            rnn_states_critic_batch = self.rnn_states_critic[0, inds]
 
             yield share_obs_batch, obs_batch, rnn_states_batch, rnn_states_critic_batch, actions_batch, value_preds_batch, return_batch, masks_batch, active_masks_batch, old_action_log_probs_batch, adv_targ, available_actions_batch
 
@@ -305,8 +270,8 @@ class SeparatedReplayBuffer(object):
         sampler = [rand[i*mini_batch_size:(i+1)*mini_batch_size] for i in range(num_mini_batch)]
 
         if len(self.share_obs.shape) > 3:
-            share_obs = self.share_obs[:-1].transpose(1, 0, 2, 3, 4).reshape(-1, *self.share_obs.shape[2:])
-            obs = self.obs[:-1].transpose(1, 0, 2, 3, 4).reshape(-1, *self.obs.shape[2:])
+            share_obs = _transpose(self.share_obs[:-1], 1, 0, 2, 3, 4).reshape(-1, *self.share_obs.shape[2:])
+            obs = _transpose(self.obs[:-1], 1, 0, 2, 3, 4).reshape(-1, *self.obs.shape[2:])
         else:
             share_obs = _cast(self.share_obs[:-1])
             obs = _cast(self.obs[:-1])
@@ -320,77 +285,32 @@ class SeparatedReplayBuffer(object):
         active_masks = _cast(self.active_masks[:-1])
         # rnn_states = _cast(self.rnn_states[:-1])
         # rnn_states_critic = _cast(self.rnn_states_critic[:-1])
-        rnn_states = self.rnn_states[:-1].transpose(1, 0, 2, 3).reshape(-1, *self.rnn_states.shape[2:])
-        rnn_states_critic = self.rnn_states_critic[:-1].transpose(1, 0, 2, 3).reshape(-1, *self.rnn_states_critic.shape[2:])
+        rnn_states = _transpose(self.rnn_states[:-1], 1, 0, 2, 3).reshape(-1, *self.rnn_states.shape[2:])
+        rnn_states_critic = _transpose(self.rnn_states_critic[:-1], 1, 0, 2, 3).reshape(-1, *self.rnn_states_critic.shape[2:])
 
         if self.available_actions is not None:
             available_actions = _cast(self.available_actions[:-1])
 
         for indices in sampler:
-            share_obs_batch = []
-            obs_batch = []
-            rnn_states_batch = []
-            rnn_states_critic_batch = []
-            actions_batch = []
-            available_actions_batch = []
-            value_preds_batch = []
-            return_batch = []
-            masks_batch = []
-            active_masks_batch = []
-            old_action_log_probs_batch = []
-            adv_targ = []
-
-            for index in indices:
-                ind = index * data_chunk_length
-                # size [T+1 N M Dim]-->[T N Dim]-->[N T Dim]-->[T*N,Dim]-->[L,Dim]
-                share_obs_batch.append(share_obs[ind:ind+data_chunk_length])
-                obs_batch.append(obs[ind:ind+data_chunk_length])
-                actions_batch.append(actions[ind:ind+data_chunk_length])
-                if self.available_actions is not None:
-                    available_actions_batch.append(available_actions[ind:ind+data_chunk_length])
-                value_preds_batch.append(value_preds[ind:ind+data_chunk_length])
-                return_batch.append(returns[ind:ind+data_chunk_length])
-                masks_batch.append(masks[ind:ind+data_chunk_length])
-                active_masks_batch.append(active_masks[ind:ind+data_chunk_length])
-                old_action_log_probs_batch.append(action_log_probs[ind:ind+data_chunk_length])
-                adv_targ.append(advantages[ind:ind+data_chunk_length])
-                # size [T+1 N Dim]-->[T N Dim]-->[T*N,Dim]-->[1,Dim]
-                rnn_states_batch.append(rnn_states[ind])
-                rnn_states_critic_batch.append(rnn_states_critic[ind])
-
             L, N = data_chunk_length, mini_batch_size
-
-            # These are all from_numpys of size (N, L, Dim)
-            share_obs_batch = np.stack(share_obs_batch)
-            obs_batch = np.stack(obs_batch)
-
-            actions_batch = np.stack(actions_batch)
-            if self.available_actions is not None:
-                available_actions_batch = np.stack(available_actions_batch)
-            value_preds_batch = np.stack(value_preds_batch)
-            return_batch = np.stack(return_batch)
-            masks_batch = np.stack(masks_batch)
-            active_masks_batch = np.stack(active_masks_batch)
-            old_action_log_probs_batch = np.stack(old_action_log_probs_batch)
-            adv_targ = np.stack(adv_targ)
-
-            # States is just a (N, -1) from_numpy
-            rnn_states_batch = np.stack(rnn_states_batch).reshape(N, *self.rnn_states.shape[2:])
-            rnn_states_critic_batch = np.stack(rnn_states_critic_batch).reshape(N, *self.rnn_states_critic.shape[2:])
-
-            # Flatten the (L, N, ...) from_numpys to (L * N, ...)
-            share_obs_batch = _flatten(L, N, share_obs_batch)
-            obs_batch = _flatten(L, N, obs_batch)
-            actions_batch = _flatten(L, N, actions_batch)
+            # gather every chunk at once, size [T*N,Dim]-->[L*N,Dim] in the (L, N) order of _flatten
+            chunk_index = _chunk_index(indices, L)
+            share_obs_batch = share_obs[chunk_index]
+            obs_batch = obs[chunk_index]
+            actions_batch = actions[chunk_index]
             if self.available_actions is not None:
-                available_actions_batch = _flatten(L, N, available_actions_batch)
+                available_actions_batch = available_actions[chunk_index]
             else:
                 available_actions_batch = None
-            value_preds_batch = _flatten(L, N, value_preds_batch)
-            return_batch = _flatten(L, N, return_batch)
-            masks_batch = _flatten(L, N, masks_batch)
-            active_masks_batch = _flatten(L, N, active_masks_batch)
-            old_action_log_probs_batch = _flatten(L, N, old_action_log_probs_batch)
-            adv_targ = _flatten(L, N, adv_targ)
+            value_preds_batch = value_preds[chunk_index]
+            return_batch = returns[chunk_index]
+            masks_batch = masks[chunk_index]
+            active_masks_batch = active_masks[chunk_index]
+            old_action_log_probs_batch = action_log_probs[chunk_index]
+            adv_targ = advantages[chunk_index]
+
+            # States are taken at the first step of every chunk, size [T*N,Dim]-->[N,Dim]
+            rnn_states_batch = rnn_states[indices * L]
+            rnn_states_critic_batch = rnn_states_critic[indices * L]
 
             yield share_obs_batch, obs_batch, rnn_states_batch, rnn_states_critic_batch, actions_batch, value_preds_batch, return_batch, masks_batch, active_masks_batch, old_action_log_probs_batch, adv_targ, available_actions_batch
@@ -2,19 +2,31 @@ import torch
 import numpy as np
 from collections import defaultdict
 
-from irat_code.utils.util import check, get_shape_from_obs_space, get_shape_from_act_space
+from irat_code.utils.util import check, get_shape_from_obs_space, get_shape_from_act_space, \
+    get_dist_shape_from_act_space
+from irat_code.utils.gae import compute_stream_returns
 
 
 def _flatten(T, N, x):
     return x.reshape(T * N, *x.shape[2:])
 
 
+def _transpose(x, *axes):
+    return x.permute(*axes) if isinstance(x, torch.Tensor) else x.transpose(*axes)
+
+
 def _cast(x):
-    return x.transpose(1, 0, 2).reshape(-1, *x.shape[2:])
+    return _transpose(x, 1, 0, 2).reshape(-1, *x.shape[2:])
+
+
+def _chunk_index(indices, L):
+    # flat rows of the chunks starting at indices * L, laid out as (L, N) so that they match _flatten(L, N, x)
+    return (np.arange(L)[:, None] + indices[None, :] * L).reshape(-1)
 
 
 class SeparatedReplayBuffer(object):
-    def __init__(self, args, obs_space, idv_share_obs_space, team_share_obs_space, act_space):
+    def __init__(self, args, obs_space, idv_share_obs_space, team_share_obs_space, act_space,
+                 device=torch.device("cpu")):
         self.episode_length = args.episode_length
         self.n_rollout_threads = args.n_rollout_threads
         self.rnn_hidden_size = args.hidden_size
@@ -25,6 +37,8 @@ class SeparatedReplayBuffer(object):
         self._use_popart = args.use_popart
         self._use_valuenorm = args.use_valuenorm
         self._use_proper_time_limits = args.use_proper_time_limits
+        self._use_torch_returns = args.use_torch_returns
+        self.device = device
 
         obs_shape = get_shape_from_obs_space(obs_space)
         idv_share_obs_shape = get_shape_from_obs_space(idv_share_obs_space)
@@ -68,8 +82,9 @@ class SeparatedReplayBuffer(object):
         # print(act_space, ",", act_shape)
 
         self.actions = np.zeros((self.episode_length, self.n_rollout_threads, act_shape), dtype=np.float32)
-        self.idv_actions_dists = np.zeros((self.episode_length, self.n_rollout_threads, act_shape), dtype=object)
-        self.team_actions_dists = np.zeros((self.episode_length, self.n_rollout_threads, act_shape), dtype=object)
+        dist_shape = get_dist_shape_from_act_space(act_space)
+        self.idv_actions_dists = np.zeros((self.episode_length, self.n_rollout_threads, dist_shape), dtype=np.float32)
+        self.team_actions_dists = np.zeros((self.episode_length, self.n_rollout_threads, dist_shape), dtype=np.float32)
         self.idv_action_log_probs = np.zeros((self.episode_length, self.n_rollout_threads, act_shape), dtype=np.float32)
         self.team_action_log_probs = np.zeros((self.episode_length, self.n_rollout_threads, act_shape), dtype=np.float32)
 
@@ -139,111 +154,38 @@ class SeparatedReplayBuffer(object):
         if self.available_actions is not None:
             self.available_actions[0] = self.available_actions[-1].copy()
 
+    def _compute_returns(self, rewards, value_preds, next_values, value_normalizers):
+        if self._use_gae:
+            for value_pred, next_value in zip(value_preds, next_values):
+                value_pred[-1] = next_value
+        if not (self._use_popart or self._use_valuenorm):
+            value_normalizers = None
+        return compute_stream_returns(rewards, value_preds, next_values, self.masks, self.bad_masks,
+                                      self.gamma, self.gae_lambda, self._use_gae, self._use_proper_time_limits,
+                                      value_normalizers, self.device if self._use_torch_returns else None)
+
+    def compute_returns(self, idv_next_value, team_next_value, idv_value_normalizer=None, team_value_normalizer=None):
+        """
+        Compute individual and team returns in a single pass, either as discounted sum of rewards, or using GAE.
+        :param idv_next_value: (np.ndarray) individual value predictions for the step after the last episode step.
+        :param team_next_value: (np.ndarray) team value predictions for the step after the last episode step.
+        :param idv_value_normalizer: (ValueNorm / PopArt) If not None, value normalizer of the individual critic.
+        :param team_value_normalizer: (ValueNorm / PopArt) If not None, value normalizer of the team critic.
+        """
+        idv_returns, team_returns = self._compute_returns([self.idv_rewards, self.team_rewards],
+                                                          [self.idv_value_preds, self.team_value_preds],
+                                                          [idv_next_value, team_next_value],
+                                                          [idv_value_normalizer, team_value_normalizer])
+        self.idv_returns[:] = idv_returns
+        self.team_returns[:] = team_returns
+
     def idv_compute_returns(self, next_value, value_normalizer=None):
-        if self._use_proper_time_limits:
-            if self._use_gae:
-                self.idv_value_preds[-1] = next_value
-                gae = 0
-                for step in reversed(range(self.idv_rewards.shape[0])):
-                    if self._use_popart or self._use_valuenorm:
-                        delta = self.idv_rewards[step] + self.gamma * \
-                                value_normalizer.denormalize(self.idv_value_preds[step + 1]) * \
-                                self.masks[step + 1] - value_normalizer.denormalize(self.idv_value_preds[step])
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        gae = gae * self.bad_masks[step + 1]
-                        self.idv_returns[step] = gae + value_normalizer.denormalize(self.idv_value_preds[step])
-                    else:
-                        delta = self.idv_rewards[step] + self.gamma * self.idv_value_preds[step + 1] * \
-                                self.masks[step + 1] - self.idv_value_preds[step]
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        gae = gae * self.bad_masks[step + 1]
-                        self.idv_returns[step] = gae + self.idv_value_preds[step]
-            else:
-                self.idv_returns[-1] = next_value
-                for step in reversed(range(self.idv_rewards.shape[0])):
-                    if self._use_popart or self._use_valuenorm:
-                        self.idv_returns[step] = (self.idv_returns[step + 1] * self.gamma * self.masks[step + 1] +
-                                                  self.idv_rewards[step]) * self.bad_masks[step + 1] \
-                                                 + (1 - self.bad_masks[step + 1]) \
-                                                 * value_normalizer.denormalize(self.idv_value_preds[step])
-                    else:
-                        self.idv_returns[step] = (self.idv_returns[step + 1] * self.gamma * self.masks[step + 1]
-                                                  + self.idv_rewards[step]) * self.bad_masks[step + 1] \
-                                                 + (1 - self.bad_masks[step + 1]) * self.idv_value_preds[step]
-        else:
-            if self._use_gae:
-                self.idv_value_preds[-1] = next_value
-                gae = 0
-                for step in reversed(range(self.idv_rewards.shape[0])):
-                    if self._use_popart or self._use_valuenorm:
-                        delta = self.idv_rewards[step] + self.gamma * value_normalizer.denormalize(
-                            self.idv_value_preds[step + 1]) * self.masks[step + 1] - value_normalizer.denormalize(
-                            self.idv_value_preds[step])
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        self.idv_returns[step] = gae + value_normalizer.denormalize(self.idv_value_preds[step])
-                    else:
-                        delta = self.idv_rewards[step] + self.gamma * self.idv_value_preds[step + 1] * \
-                                self.masks[step + 1] - self.idv_value_preds[step]
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        self.idv_returns[step] = gae + self.idv_value_preds[step]
-            else:
-                self.idv_returns[-1] = next_value
-                for step in reversed(range(self.idv_rewards.shape[0])):
-                    self.idv_returns[step] = self.idv_returns[step + 1] * self.gamma * self.masks[step + 1] \
-                                             + self.idv_rewards[step]
-    
+        self.idv_returns[:] = self._compute_returns([self.idv_rewards], [self.idv_value_preds],
+                                                    [next_value], [value_normalizer])[0]
+
     def team_compute_returns(self, next_value, value_normalizer=None):
-        if self._use_proper_time_limits:
-            if self._use_gae:
-                self.team_value_preds[-1] = next_value
-                gae = 0
-                for step in reversed(range(self.team_rewards.shape[0])):
-                    if self._use_popart or self._use_valuenorm:
-                        delta = self.team_rewards[step] + self.gamma * \
-                                value_normalizer.denormalize(self.team_value_preds[step + 1]) * \
-                                self.masks[step + 1] - value_normalizer.denormalize(self.team_value_preds[step])
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        gae = gae * self.bad_masks[step + 1]
-                        self.team_returns[step] = gae + value_normalizer.denormalize(self.team_value_preds[step])
-                    else:
-                        delta = self.team_rewards[step] + self.gamma * self.team_value_preds[step + 1] \
-                                * self.masks[step + 1] - self.team_value_preds[step]
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        gae = gae * self.bad_masks[step + 1]
-                        self.team_returns[step] = gae + self.team_value_preds[step]
-            else:
-                self.team_returns[-1] = next_value
-                for step in reversed(range(self.team_rewards.shape[0])):
-                    if self._use_popart:
-                        self.team_returns[step] = (self.team_returns[step + 1] * self.gamma * self.masks[step + 1] 
-                                                   + self.team_rewards[step]) * self.bad_masks[step + 1] + \
-                                                  (1 - self.bad_masks[step + 1]) * \
-                                                  value_normalizer.denormalize(self.team_value_preds[step])
-                    else:
-                        self.team_returns[step] = (self.team_returns[step + 1] * self.gamma * self.masks[step + 1] 
-                                                   + self.team_rewards[step]) * self.bad_masks[step + 1] \
-                                                  + (1 - self.bad_masks[step + 1]) * self.team_value_preds[step]
-        else:
-            if self._use_gae:
-                self.team_value_preds[-1] = next_value
-                gae = 0
-                for step in reversed(range(self.team_rewards.shape[0])):
-                    if self._use_popart or self._use_valuenorm:
-                        delta = self.team_rewards[step] + self.gamma * value_normalizer.denormalize(
-                            self.team_value_preds[step + 1]) * self.masks[step + 1] - value_normalizer.denormalize(
-                            self.team_value_preds[step])
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        self.team_returns[step] = gae + value_normalizer.denormalize(self.team_value_preds[step])
-                    else:
-                        delta = self.team_rewards[step] + self.gamma * self.team_value_preds[step + 1] * \
-                                self.masks[step + 1] - self.team_value_preds[step]
-                        gae = delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                        self.team_returns[step] = gae + self.team_value_preds[step]
-            else:
-                self.team_returns[-1] = next_value
-                for step in reversed(range(self.team_rewards.shape[0])):
-                    self.team_returns[step] = self.team_returns[step + 1] * self.gamma * \
-                                              self.masks[step + 1] + self.team_rewards[step]
+        self.team_returns[:] = self._compute_returns([self.team_rewards], [self.team_value_preds],
+                                                     [next_value], [value_normalizer])[0]
 
     def feed_forward_generator(self, idv_advantages, team_advantages, num_mini_batch=None, mini_batch_size=None):
         episode_length, n_rollout_threads = self.idv_rewards.shape[0:2]
@@ -351,145 +293,45 @@ class SeparatedReplayBuffer(object):
         perm = torch.randperm(n_rollout_threads).numpy()
 
         for start_ind in range(0, n_rollout_threads, num_envs_per_batch):
-            idv_share_obs_batch = []
-            team_share_obs_batch = []
-
-            obs_batch = []
-
-            idv_rnn_states_batch = []
-            team_rnn_states_batch = []
-
-            idv_rnn_states_critic_batch = []
-            team_rnn_states_critic_batch = []
-
-            actions_batch = []
-
-            idv_actions_dists_batch = []
-            team_actions_dists_batch = []
-
-            available_actions_batch = []
-
-            idv_value_preds_batch = []
-            team_value_preds_batch = []
-
-            idv_return_batch = []
-            team_return_batch = []
-
-            masks_batch = []
-            active_masks_batch = []
-
-            idv_action_log_probs_batch = []
-            team_action_log_probs_batch = []
-
-            idv_adv_targ = []
-            team_adv_targ = []
-
-            for offset in range(num_envs_per_batch):
-                ind = perm[start_ind + offset]
-                idv_share_obs_batch.append(self.idv_share_obs[:-1, ind])
-                team_share_obs_batch.append(self.team_share_obs[:-1, ind])
-
-                obs_batch.append(self.obs[:-1, ind])
-
-                idv_rnn_states_batch.append(self.idv_rnn_states[0:1, ind])
-                team_rnn_states_batch.append(self.team_rnn_states[0:1, ind])
-
-                idv_rnn_states_critic_batch.append(self.idv_rnn_states_critic[0:1, ind])
-                team_rnn_states_critic_batch.append(self.team_rnn_states_critic[0:1, ind])
-
-                actions_batch.append(self.actions[:, ind])
-
-                idv_actions_dists_batch.append(self.idv_actions_dists[:, ind])
-                team_actions_dists_batch.append(self.team_actions_dists[:, ind])
-
-                if self.available_actions is not None:
-                    available_actions_batch.append(self.available_actions[:-1, ind])
-
-                idv_value_preds_batch.append(self.idv_value_preds[:-1, ind])
-                team_value_preds_batch.append(self.team_value_preds[:-1, ind])
-
-                idv_return_batch.append(self.idv_returns[:-1, ind])
-                team_return_batch.append(self.team_returns[:-1, ind])
-
-                masks_batch.append(self.masks[:-1, ind])
-                active_masks_batch.append(self.active_masks[:-1, ind])
-
-                idv_action_log_probs_batch.append(self.idv_action_log_probs[:, ind])
-                team_action_log_probs_batch.append(self.team_action_log_probs[:, ind])
-
-                idv_adv_targ.append(idv_advantages[:, ind])
-                team_adv_targ.append(team_advantages[:, ind])
-
-            # [N[T, dim]]
+            # [T, N, dim] with the N threads picked by the permutation
             T, N = self.episode_length, num_envs_per_batch
-            # These are all from_numpys of size (T, N, -1)
-            idv_share_obs_batch = np.stack(idv_share_obs_batch, 1)
-            team_share_obs_batch = np.stack(team_share_obs_batch, 1)
+            inds = perm[start_ind:start_ind + num_envs_per_batch]
+            idv_share_obs_batch = _flatten(T, N, self.idv_share_obs[:-1, inds])
+            team_share_obs_batch = _flatten(T, N, self.team_share_obs[:-1, inds])
 
-            obs_batch = np.stack(obs_batch, 1)
+            obs_batch = _flatten(T, N, self.obs[:-1, inds])
 
-            actions_batch = np.stack(actions_batch, 1)
+            actions_batch = _flatten(T, N, self.actions[:, inds])
 
-            idv_actions_dists_batch = np.stack(idv_actions_dists_batch, 1)
-            team_actions_dists_batch = np.stack(team_actions_dists_batch, 1)
+            idv_actions_dists_batch = _flatten(T, N, self.idv_actions_dists[:, inds])
+            team_actions_dists_batch = _flatten(T, N, self.team_actions_dists[:, inds])
 
             if self.available_actions is not None:
-                available_actions_batch = np.stack(available_actions_batch, 1)
-
-            idv_value_preds_batch = np.stack(idv_value_preds_batch, 1)
-            team_value_preds_batch = np.stack(team_value_preds_batch, 1)
-
-            idv_return_batch = np.stack(idv_return_batch, 1)
-            team_return_batch = np.stack(team_return_batch, 1)
-
-            masks_batch = np.stack(masks_batch, 1)
-            active_masks_batch = np.stack(active_masks_batch, 1)
-
-            idv_action_log_probs_batch = np.stack(idv_action_log_probs_batch, 1)
-            team_action_log_probs_batch = np.stack(team_action_log_probs_batch, 1)
-
-            idv_adv_targ = np.stack(idv_adv_targ, 1)
-            team_adv_targ = np.stack(team_adv_targ, 1)
-
-            # States is just a (N, -1) from_numpy [N[1,dim]]
-            idv_rnn_states_batch = np.stack(idv_rnn_states_batch, 1).reshape(N, *self.idv_rnn_states.shape[2:])
-            team_rnn_states_batch = np.stack(team_rnn_states_batch, 1).reshape(N, *self.team_rnn_states.shape[2:])
-
-            idv_rnn_states_critic_batch = np.stack(idv_rnn_states_critic_batch, 1).reshape(
-                N, *self.idv_rnn_states_critic.shape[2:])
-            team_rnn_states_critic_batch = np.stack(team_rnn_states_critic_batch, 1).reshape(
-                N, *self.team_rnn_states_critic.shape[2:])
-
-            # Flatten the (T, N, ...) from_numpys to (T * N, ...)
-            idv_share_obs_batch = _flatten(T, N, idv_share_obs_batch)
-            team_share_obs_batch = _flatten(T, N, team_share_obs_batch)
-
-            obs_batch = _flatten(T, N, obs_batch)
-
-            actions_batch = _flatten(T, N, actions_batch)
-
-            idv_actions_dists_batch = _flatten(T, N, idv_actions_dists_batch)
-            team_actions_dists_batch = _flatten(T, N, team_actions_dists_batch)
-
-            if self.available_actions is not None:
-                available_actions_batch = _flatten(T, N, available_actions_batch)
+                available_actions_batch = _flatten(T, N, self.available_actions[:-1, inds])
             else:
                 available_actions_batch = None
 
-            idv_value_preds_batch = _flatten(T, N, idv_value_preds_batch)
-            team_value_preds_batch = _flatten(T, N, team_value_preds_batch)
+            idv_value_preds_batch = _flatten(T, N, self.idv_value_preds[:-1, inds])
+            team_value_preds_batch = _flatten(T, N, self.team_value_preds[:-1, inds])
+
+            idv_return_batch = _flatten(T, N, self.idv_returns[:-1, inds])
+            team_return_batch = _flatten(T, N, self.team_returns[:-1, inds])
 
-            idv_return_batch = _flatten(T, N, idv_return_batch)
-            team_return_batch = _flatten(T, N, team_return_batch)
+            masks_batch = _flatten(T, N, self.masks[:-1, inds])
+            active_masks_batch = _flatten(T, N, self.active_masks[:-1, inds])
 
-            masks_batch = _flatten(T, N, masks_batch)
-            active_masks_batch = _flatten(T, N, active_masks_batch)
+            idv_action_log_probs_batch = _flatten(T, N, self.idv_action_log_probs[:, inds])
+            team_action_log_probs_batch = _flatten(T, N, self.team_action_log_probs[:, inds])
 
-            idv_action_log_probs_batch = _flatten(T, N, idv_action_log_probs_batch)
-            team_action_log_probs_batch = _flatten(T, N, team_action_log_probs_batch)
+            idv_adv_targ = _flatten(T, N, idv_advantages[:, inds])
+            team_adv_targ = _flatten(T, N, team_advantages[:, inds])
 
-            idv_adv_targ = _flatten(T, N, idv_adv_targ)
-            team_adv_targ = _flatten(T, N, team_adv_targ)
+            # States is just a (N, dim) array of the first step
+            idv_rnn_states_batch = self.idv_rnn_states[0, inds]
+            team_rnn_states_batch = self.team_rnn_states[0, inds]
+
+            idv_rnn_states_critic_batch = self.idv_rnn_states_critic[0, inds]
+            team_rnn_states_critic_batch = self.team_rnn_states_critic[0, inds]
 
             yield idv_share_obs_batch, team_share_obs_batch, obs_batch, \
                   idv_rnn_states_batch, team_rnn_states_batch, idv_rnn_states_critic_batch, team_rnn_states_critic_batch,\
@@ -514,9 +356,11 @@ class SeparatedReplayBuffer(object):
         sampler = [rand[i * mini_batch_size:(i + 1) * mini_batch_size] for i in range(num_mini_batch)]
 
         if len(self.idv_share_obs.shape) > 3:
-            idv_share_obs = self.idv_share_obs[:-1].transpose(1, 0, 2, 3, 4).reshape(-1, *self.idv_share_obs.shape[2:])
-            team_share_obs = self.team_share_obs[:-1].transpose(1, 0, 2, 3, 4).reshape(-1, *self.team_share_obs.shape[2:])
-            obs = self.obs[:-1].transpose(1, 0, 2, 3, 4).reshape(-1, *self.obs.shape[2:])
+            idv_share_obs = _transpose(self.idv_share_obs[:-1], 1, 0, 2, 3, 4).reshape(
+                -1, *self.idv_share_obs.shape[2:])
+            team_share_obs = _transpose(self.team_share_obs[:-1], 1, 0, 2, 3, 4).reshape(
+                -1, *self.team_share_obs.shape[2:])
+            obs = _transpose(self.obs[:-1], 1, 0, 2, 3, 4).reshape(-1, *self.obs.shape[2:])
         else:
             idv_share_obs = _cast(self.idv_share_obs[:-1])
             team_share_obs = _cast(self.team_share_obs[:-1])
@@ -544,139 +388,58 @@ class SeparatedReplayBuffer(object):
 
         # rnn_states = _cast(self.rnn_states[:-1])
         # rnn_states_critic = _cast(self.rnn_states_critic[:-1])
-        idv_rnn_states = self.idv_rnn_states[:-1].transpose(1, 0, 2, 3).reshape(-1, *self.idv_rnn_states.shape[2:])
-        team_rnn_states = self.team_rnn_states[:-1].transpose(1, 0, 2, 3).reshape(-1, *self.team_rnn_states.shape[2:])
+        idv_rnn_states = _transpose(self.idv_rnn_states[:-1], 1, 0, 2, 3).reshape(-1, *self.idv_rnn_states.shape[2:])
+        team_rnn_states = _transpose(self.team_rnn_states[:-1], 1, 0, 2, 3).reshape(-1, *self.team_rnn_states.shape[2:])
 
-        idv_rnn_states_critic = self.idv_rnn_states_critic[:-1].transpose(
-            1, 0, 2, 3).reshape(-1, *self.idv_rnn_states_critic.shape[2:])
-        team_rnn_states_critic = self.team_rnn_states_critic[:-1].transpose(
-            1, 0, 2, 3).reshape(-1, *self.team_rnn_states_critic.shape[2:])
+        idv_rnn_states_critic = _transpose(self.idv_rnn_states_critic[:-1], 1, 0, 2, 3).reshape(
+            -1, *self.idv_rnn_states_critic.shape[2:])
+        team_rnn_states_critic = _transpose(self.team_rnn_states_critic[:-1], 1, 0, 2, 3).reshape(
+            -1, *self.team_rnn_states_critic.shape[2:])
 
         if self.available_actions is not None:
             available_actions = _cast(self.available_actions[:-1])
 
         for indices in sampler:
-            idv_share_obs_batch, team_share_obs_batch = [], []
-            obs_batch = []
-            idv_rnn_states_batch, team_rnn_states_batch = [], []
-            idv_rnn_states_critic_batch, team_rnn_states_critic_batch = [], []
-            actions_batch = []
-            idv_actions_dists_batch, team_actions_dists_batch = [], []
-            available_actions_batch = []
-            idv_value_preds_batch, team_value_preds_batch = [], []
-            idv_return_batch, team_return_batch = [], []
-            masks_batch = []
-            active_masks_batch = []
-            idv_action_log_probs_batch, team_action_log_probs_batch = [], []
-            idv_adv_targ, team_adv_targ = [], []
-
-            for index in indices:
-                ind = index * data_chunk_length
-                # size [T+1 N M Dim]-->[T N Dim]-->[N T Dim]-->[T*N,Dim]-->[L,Dim]
-                idv_share_obs_batch.append(idv_share_obs[ind:ind + data_chunk_length])
-                team_share_obs_batch.append(team_share_obs[ind:ind + data_chunk_length])
-
-                obs_batch.append(obs[ind:ind + data_chunk_length])
-
-                actions_batch.append(actions[ind:ind + data_chunk_length])
-
-                idv_actions_dists_batch.append(idv_actions_dists[ind:ind + data_chunk_length])
-                team_actions_dists_batch.append(team_actions_dists[ind:ind + data_chunk_length])
-
-                if self.available_actions is not None:
-                    available_actions_batch.append(available_actions[ind:ind + data_chunk_length])
-
-                idv_value_preds_batch.append(idv_value_preds[ind:ind + data_chunk_length])
-                team_value_preds_batch.append(team_value_preds[ind:ind + data_chunk_length])
-
-                idv_return_batch.append(idv_returns[ind:ind + data_chunk_length])
-                team_return_batch.append(team_returns[ind:ind + data_chunk_length])
-
-                masks_batch.append(masks[ind:ind + data_chunk_length])
-                active_masks_batch.append(active_masks[ind:ind + data_chunk_length])
-
-                idv_action_log_probs_batch.append(idv_action_log_probs[ind:ind + data_chunk_length])
-                team_action_log_probs_batch.append(team_action_log_probs[ind:ind + data_chunk_length])
-
-                idv_adv_targ.append(idv_advantages[ind:ind + data_chunk_length])
-                team_adv_targ.append(team_advantages[ind:ind + data_chunk_length])
-                # size [T+1 N Dim]-->[T N Dim]-->[T*N,Dim]-->[1,Dim]
-                idv_rnn_states_batch.append(idv_rnn_states[ind])
-                team_rnn_states_batch.append(team_rnn_states[ind])
-
-                idv_rnn_states_critic_batch.append(idv_rnn_states_critic[ind])
-                team_rnn_states_critic_batch.append(team_rnn_states_critic[ind])
-
             L, N = data_chunk_length, mini_batch_size
+            # gather every chunk at once, size [T*N,Dim]-->[L*N,Dim] in the (L, N) order of _flatten
+            chunk_index = _chunk_index(indices, L)
+            idv_share_obs_batch = idv_share_obs[chunk_index]
+            team_share_obs_batch = team_share_obs[chunk_index]
 
-            # These are all from_numpys of size (N, L, Dim)
-            idv_share_obs_batch = np.stack(idv_share_obs_batch)
-            team_share_obs_batch = np.stack(team_share_obs_batch)
+            obs_batch = obs[chunk_index]
 
-            obs_batch = np.stack(obs_batch)
+            actions_batch = actions[chunk_index]
 
-            actions_batch = np.stack(actions_batch)
-
-            idv_actions_dists_batch = np.stack(idv_actions_dists_batch)
-            team_actions_dists_batch = np.stack(team_actions_dists_batch)
+            idv_actions_dists_batch = idv_actions_dists[chunk_index]
+            team_actions_dists_batch = team_actions_dists[chunk_index]
 
             if self.available_actions is not None:
-                available_actions_batch = np.stack(available_actions_batch)
-
-            idv_value_preds_batch = np.stack(idv_value_preds_batch)
-            team_value_preds_batch = np.stack(team_value_preds_batch)
-
-            idv_return_batch = np.stack(idv_return_batch)
-            team_return_batch = np.stack(team_return_batch)
-
-            masks_batch = np.stack(masks_batch)
-            active_masks_batch = np.stack(active_masks_batch)
-
-            idv_action_log_probs_batch = np.stack(idv_action_log_probs_batch)
-            team_action_log_probs_batch = np.stack(team_action_log_probs_batch)
-
-            idv_adv_targ = np.stack(idv_adv_targ)
-            team_adv_targ = np.stack(team_adv_targ)
-
-            # States is just a (N, -1) from_numpy
-            idv_rnn_states_batch = np.stack(idv_rnn_states_batch).reshape(N, *self.idv_rnn_states.shape[2:])
-            team_rnn_states_batch = np.stack(team_rnn_states_batch).reshape(N, *self.team_rnn_states.shape[2:])
-
-            idv_rnn_states_critic_batch = np.stack(idv_rnn_states_critic_batch).reshape(
-                N, *self.idv_rnn_states_critic.shape[2:])
-            team_rnn_states_critic_batch = np.stack(team_rnn_states_critic_batch).reshape(
-                N, *self.team_rnn_states_critic.shape[2:])
-
-            # Flatten the (L, N, ...) from_numpys to (L * N, ...)
-            idv_share_obs_batch = _flatten(L, N, idv_share_obs_batch)
-            team_share_obs_batch = _flatten(L, N, team_share_obs_batch)
-
-            obs_batch = _flatten(L, N, obs_batch)
-
-            actions_batch = _flatten(L, N, actions_batch)
-
-            idv_actions_dists_batch = _flatten(L, N, idv_actions_dists_batch)
-            team_actions_dists_batch = _flatten(L, N, team_actions_dists_batch)
-
-            if self.available_actions is not None:
-                available_actions_batch = _flatten(L, N, available_actions_batch)
+                available_actions_batch = available_actions[chunk_index]
             else:
                 available_actions_batch = None
 
-            idv_value_preds_batch = _flatten(L, N, idv_value_preds_batch)
-            team_value_preds_batch = _flatten(L, N, team_value_preds_batch)
+            idv_value_preds_batch = idv_value_preds[chunk_index]
+            team_value_preds_batch = team_value_preds[chunk_index]
+
+            idv_return_batch = idv_returns[chunk_index]
+            team_return_batch = team_returns[chunk_index]
+
+            masks_batch = masks[chunk_index]
+            active_masks_batch = active_masks[chunk_index]
 
-            idv_return_batch = _flatten(L, N, idv_return_batch)
-            team_return_batch = _flatten(L, N, team_return_batch)
+            idv_action_log_probs_batch = idv_action_log_probs[chunk_index]
+            team_action_log_probs_batch = team_action_log_probs[chunk_index]
 
-            masks_batch = _flatten(L, N, masks_batch)
-            active_masks_batch = _flatten(L, N, active_masks_batch)
+            idv_adv_targ = idv_advantages[chunk_index]
+            team_adv_targ = team_advantages[chunk_index]
 
-            idv_action_log_probs_batch = _flatten(L, N, idv_action_log_probs_batch)
-            team_action_log_probs_batch = _flatten(L, N, team_action_log_probs_batch)
+            # States are taken at the first step of every chunk, size [T*N,Dim]-->[N,Dim]
+            start_index = indices * L
+            idv_rnn_states_batch = idv_rnn_states[start_index]
+            team_rnn_states_batch = team_rnn_states[start_index]
 
-            idv_adv_targ = _flatten(L, N, idv_adv_targ)
-            team_adv_targ = _flatten(L, N, team_adv_targ)
+            idv_rnn_states_critic_batch = idv_rnn_states_critic[start_index]
+            team_rnn_states_critic_batch = team_rnn_states_critic[start_index]
 
             yield idv_share_obs_batch, team_share_obs_batch, obs_batch, \
                   idv_rnn_states_batch, team_rnn_states_batch, idv_rnn_states_critic_batch, team_rnn_states_critic_batch,\
@@ -0,0 +1,130 @@
+import os
+import time
+from contextlib import nullcontext
+
+import torch
+
+
+class PhaseTimer(object):
+    """
+    Accumulates the wall time spent in the named phases of the training loop (env step, policy inference, buffer
+    insert, compute, train and the parts of a ppo update) and logs the seconds per episode of every phase. Phases may
+    nest, a nested phase is counted in the phase around it as well. Optionally captures a torch.profiler trace of a
+    window of episodes, in which the phases show up as labelled ranges.
+    Every method returns right away if neither the timing nor the trace is enabled.
+    :param enabled: (bool) whether to record the wall time of the phases.
+    :param device: (torch.device) the device is synchronized at the phase boundaries if it is a gpu, so that the
+                   asynchronous kernels are counted in the phase that launched them.
+    :param profile_start: (int) first episode of the torch.profiler trace, -1 to not capture one.
+    :param profile_episodes: (int) number of episodes of the trace.
+    :param trace_dir: (str) directory the trace is written to, readable by the tensorboard profiler plugin.
+    """
+
+    def __init__(self, enabled=False, device=torch.device("cpu"), profile_start=-1, profile_episodes=1,
+                 trace_dir=None):
+        self.enabled = enabled
+        self.synchronize = enabled and device.type == "cuda"
+        self.profile_start = profile_start
+        self.profile_stop = profile_start + profile_episodes
+        self.trace_dir = trace_dir
+
+        self.profiler = None
+        self.active = enabled
+        self.totals = {}
+        self.starts = {}
+        self.ranges = {}
+        self.episodes = 0
+
+    def episode(self, episode):
+        """
+        Mark the start of an episode, opens and closes the torch.profiler window.
+        :param episode: (int) index of the episode.
+        """
+        if self.profile_start < 0:
+            if self.enabled:
+                self.episodes += 1
+            return
+        if episode == self.profile_stop:
+            self.close()
+        elif episode == self.profile_start:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            os.makedirs(self.trace_dir, exist_ok=True)
+            self.profiler = torch.profiler.profile(
+                activities=activities, on_trace_ready=torch.profiler.tensorboard_trace_handler(self.trace_dir))
+            self.profiler.start()
+        self.active = self.enabled or self.profiler is not None
+        if self.enabled:
+            self.episodes += 1
+
+    def close(self):
+        """Stop the torch.profiler window if it is still open and write its trace."""
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+            self.active = self.enabled
+
+    def start(self, name):
+        """
+        Start a phase, for phases that span a long stretch of code. Has to be followed by stop(name).
+        :param name: (str) name of the phase.
+        """
+        if not self.active:
+            return
+        if self.profiler is not None:
+            self.ranges[name] = torch.profiler.record_function(name)
+            self.ranges[name].__enter__()
+        if self.enabled:
+            if self.synchronize:
+                torch.cuda.synchronize()
+            self.starts[name] = time.perf_counter()
+
+    def stop(self, name):
+        """
+        End a phase started by start(name).
+        :param name: (str) name of the phase.
+        """
+        if not self.active:
+            return
+        if self.enabled:
+            if self.synchronize:
+                torch.cuda.synchronize()
+            self.totals[name] = self.totals.get(name, 0.) + time.perf_counter() - self.starts.pop(name)
+        if name in self.ranges:
+            self.ranges.pop(name).__exit__(None, None, None)
+
+    def phase(self, name):
+        """
+        Context manager timing the code in its block as a phase.
+        :param name: (str) name of the phase.
+        """
+        if not self.active:
+            return nullcontext()
+        return _Phase(self, name)
+
+    def log(self, total_num_steps, writter):
+        """
+        Log the seconds per episode of every phase since the last call as timing/<phase>, then reset them.
+        :param total_num_steps: (int) x value of the logged scalars.
+        :param writter: (MetricsSink) metrics sink of the runner.
+        """
+        if not self.enabled or self.episodes == 0:
+            return
+        timings = {"timing/" + name: total / self.episodes for name, total in self.totals.items()}
+        for k, v in timings.items():
+            writter.add_scalar(k, v, total_num_steps)
+        self.totals = {}
+        self.episodes = 0
+
+
+class _Phase(object):
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer.start(self.name)
+
+    def __exit__(self, *exc):
+        self.timer.stop(self.name)
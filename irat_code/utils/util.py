@@ -1,11 +1,26 @@
+import copy
 import numpy as np
 import math
 import torch
 
 def check(input):
-    if type(input) == np.ndarray:
-        return torch.from_numpy(input)
-        
+    output = torch.from_numpy(input) if type(input) == np.ndarray else input
+    return output
+
+def buffer_to_device(buffer, device):
+    """
+    Copy the storage of a replay buffer to the training device, e.g. once per PPO update.
+    :param buffer: (SharedReplayBuffer / SeparatedReplayBuffer) buffer holding np.ndarrays.
+    :param device: (torch.device) training device.
+
+    :return device_buffer: shallow copy of buffer whose np.ndarrays are replaced by float32 torch.Tensors on device.
+    """
+    device_buffer = copy.copy(buffer)
+    for name, value in vars(buffer).items():
+        if isinstance(value, np.ndarray):
+            setattr(device_buffer, name, torch.from_numpy(value).to(dtype=torch.float32, device=device))
+    return device_buffer
+
 def get_gard_norm(it):
     sum_grad = 0
     for x in it:
@@ -51,6 +66,43 @@ def get_shape_from_act_space(act_space):
     return act_shape
 
 
+def get_dist_shape_from_act_space(act_space):
+    if act_space.__class__.__name__ == 'Discrete':
+        dist_shape = act_space.n
+    elif act_space.__class__.__name__ == "MultiDiscrete":
+        dist_shape = int(np.sum(act_space.high - act_space.low + 1))
+    elif act_space.__class__.__name__ == "Box":
+        dist_shape = 2 * act_space.shape[0]
+    elif act_space.__class__.__name__ == "MultiBinary":
+        dist_shape = act_space.shape[0]
+    else:  # discrete + continous
+        dist_shape = 2 * act_space[0].shape[0] + act_space[1].n
+    return dist_shape
+
+
+def get_info_rewards(infos, num_agents):
+    """
+    Individual and team rewards of a step of the vec envs.
+    :param infos: per-env infos, either dicts with 'individual_reward' and 'team_reward' per agent, or the
+                  (n_envs, n_agents, 2) array of the individual and team rewards of envs built with info_dicts=False.
+    :param num_agents: (int) number of agents.
+
+    :return idv_rewards: (np.ndarray) individual rewards, (n_envs, n_agents, 1).
+    :return team_rewards: (np.ndarray) team rewards, (n_envs, n_agents, 1).
+    """
+    if isinstance(infos, np.ndarray) and infos.dtype != object:
+        return infos[..., 0:1], infos[..., 1:2]
+    idv_rewards, team_rewards = [], []
+    for info in infos:
+        irw, trw = [], []
+        for i in range(num_agents):
+            irw.append([info[i]["individual_reward"]])
+            trw.append([info[i]["team_reward"]])
+        idv_rewards.append(irw)
+        team_rewards.append(trw)
+    return np.array(idv_rewards), np.array(team_rewards)
+
+
 def tile_images(img_nhwc):
     """
     Tile N images into one big PxQ image
@@ -65,7 +65,7 @@ class ValueNorm(nn.Module):
         
         return out
 
-    def denormalize(self, input_vector):
+    def denormalize(self, input_vector, to_numpy=True):
         """ Transform normalized data back into original distribution """
         if type(input_vector) == np.ndarray:
             input_vector = torch.from_numpy(input_vector)
@@ -74,6 +74,7 @@ class ValueNorm(nn.Module):
         mean, var = self.running_mean_var()
         out = input_vector * torch.sqrt(var)[(None,) * self.norm_axes] + mean[(None,) * self.norm_axes]
         
-        out = out.cpu().numpy()
+        if to_numpy:
+            out = out.cpu().numpy()
         
         return out